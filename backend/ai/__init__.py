@@ -13,7 +13,7 @@ AI智能系统模块 - 重构阶段3
 # 导出主要AI模块
 from .llm_manager import LLMManager, llm_manager
 from .qwen_client import QwenClient  
-from .chat_history import ChatHistoryManager, chat_history
+from .chat_history import ChatHistoryManager, ShardedChatHistory, chat_history
 from .llm_api import QwenAPI
 from .agent import SimpleAgent, create_agent
 
@@ -21,7 +21,8 @@ __all__ = [
     'LLMManager',
     'llm_manager',
     'QwenClient',
-    'ChatHistoryManager', 
+    'ChatHistoryManager',
+    'ShardedChatHistory',
     'chat_history',
     'QwenAPI',
     'SimpleAgent',
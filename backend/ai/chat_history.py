@@ -3,23 +3,108 @@
 
 负责管理用户与AI的对话历史记录
 支持SQLite数据库存储、会话管理、导出等功能
+
+会话可按用户ID（没有用户时按会话ID）哈希分布到多个SQLite分片（ShardedChatHistory）：
+- 每个分片是独立的 ChatHistoryManager，拥有自己的写连接、后写线程和缓存，
+  写入吞吐随分片数增长
+- 会话目录表记录 会话ID -> (用户ID, 分片, 标题)，跨分片列出会话时先查目录，
+  再按分片批量补全消息数和更新时间
+- 目录记录的是会话创建时所在的分片，调整分片数后旧会话仍能找到
+- 0号分片使用原数据库路径，单分片时与原有布局完全一致
 """
 
-import os
 import json
+import base64
 import sqlite3
 import logging
+import functools
+import atexit
+import os
+import threading
+import uuid
+import zlib
+from collections import Counter, OrderedDict
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from pathlib import Path
 
+from .history_archive import ArchiveStore, archive_path, create_archive_index, mark_archived
+from .history_cache import RecentTurnCache
+from .history_db import HistoryDatabase
+from .history_retention import delete_expired_sessions
+from .history_rollups import (
+    create_rollups,
+    estimate_tokens,
+    merge_timeseries,
+    read_recent_messages,
+    read_timeseries,
+    read_totals,
+)
+from .history_search import create_fts_index, fts_available, search_messages
+from .history_writer import HistoryWriter
+from ..core.config import config
+from ..utils.metrics import SQLITE_QUERY_SECONDS
+
 logger = logging.getLogger(__name__)
 
+# 尚未落盘的消息没有ID，生成游标时用最大值占位（包含同一时间戳的已落盘消息）
+_MAX_MESSAGE_ID = 2 ** 63 - 1
+
+# 会话 -> 分片 映射缓存的条目上限（会话所在分片不会改变，只需按容量淘汰）
+_SHARD_CACHE_SIZE = 4096
+# 删除会话前等待待写消息落盘的最长时间（秒）
+_DELETE_FLUSH_TIMEOUT = 10.0
+
+
+def encode_cursor(timestamp: str, message_id: int) -> str:
+    """编码分页游标（不透明字符串）"""
+    raw = f"{timestamp}|{message_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """解码分页游标
+
+    Returns:
+        (timestamp, message_id)
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, message_id = base64.urlsafe_b64decode(padded).decode('utf-8').rsplit('|', 1)
+        return timestamp, int(message_id)
+    except (ValueError, UnicodeDecodeError, TypeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def _search_cursor(mode: str, rank: Optional[float], message_id: int) -> str:
+    """检索翻页游标: FTS 按 (rank, id) 翻页，LIKE 只按 id 翻页（rank 部分固定为0）"""
+    return encode_cursor('0' if mode == 'like' else repr(float(rank)), message_id)
+
+
+def new_session_id() -> str:
+    """生成会话ID（时间前缀便于阅读，随机后缀避免多个连接同一秒创建时冲突）"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+def _timed(func):
+    """记录数据库操作耗时（以方法名为 operation 标签）"""
+    histogram = SQLITE_QUERY_SECONDS.labels(func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with histogram.time():
+            return func(*args, **kwargs)
+    return wrapper
+
+
 class ChatMessage:
     """聊天消息类"""
     
     def __init__(self, role: str, content: str, timestamp: datetime = None, 
-                 emotion: str = None, session_id: str = None):
+                 emotion: str = None, session_id: str = None, message_id: int = None):
         """初始化聊天消息
         
         Args:
@@ -28,12 +113,14 @@ class ChatMessage:
             timestamp: 时间戳
             emotion: 情感标签
             session_id: 会话ID
+            message_id: 数据库行ID（尚未落盘时为None）
         """
         self.role = role
         self.content = content
         self.timestamp = timestamp or datetime.now()
         self.emotion = emotion
         self.session_id = session_id
+        self.id = message_id
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -57,24 +144,94 @@ class ChatMessage:
             session_id=data.get('session_id')
         )
 
+def _unpersisted(pending: List[ChatMessage], rows: list) -> List[ChatMessage]:
+    """去掉待写快照中已出现在查询结果里的消息
+
+    写线程按提交顺序落盘，快照中最后一条已落盘的消息之前的消息也都已落盘。
+    按 (timestamp, role, content) 识别同一条消息。
+    """
+    persisted = {(row[3], row[1], row[2]) for row in rows}
+    for index in range(len(pending) - 1, -1, -1):
+        message = pending[index]
+        if (message.timestamp.isoformat(), message.role, message.content) in persisted:
+            return pending[index + 1:]
+    return pending
+
+
 class ChatHistoryManager:
     """聊天记录管理器"""
     
-    def __init__(self, db_path: str = "chat_history.db"):
+    def __init__(self, db_path: str = "chat_history.db", read_pool_size: int = 2,
+                 cache_size_kb: int = 8192, write_behind: bool = False,
+                 write_batch_size: int = 64, write_flush_interval: float = 0.05,
+                 recent_turns: int = 20, recent_sessions: int = 256,
+                 archive_cache_blocks: int = 32):
         """初始化聊天记录管理器
         
         Args:
             db_path: 数据库文件路径
+            read_pool_size: 只读连接池大小
+            cache_size_kb: 每个连接的SQLite页缓存大小（KB）
+            write_behind: 是否由后台线程批量写入消息
+            write_batch_size: 后写模式下单个事务最多写入的消息数
+            write_flush_interval: 后写模式下凑批的最长等待时间（秒）
+            recent_turns: 每个会话在内存中缓存的最近消息数
+            recent_sessions: 内存中缓存的会话数上限
+            archive_cache_blocks: 内存中缓存的已解压归档块数
         """
         self.db_path = db_path
         self.current_session_id = None
+        self.db = HistoryDatabase(db_path, read_pool_size=read_pool_size,
+                                  cache_size_kb=cache_size_kb)
         self._init_database()
+        # 冷归档，首次归档会话时才创建归档库文件
+        self.archive = ArchiveStore(archive_path(db_path), cache_blocks=archive_cache_blocks)
+        self._archive_lock = threading.Lock()
+        
+        # 构建LLM上下文用的最近消息缓存，首次访问会话时从数据库加载
+        self.recent = RecentTurnCache(
+            lambda session_id, limit: self.get_session_messages(session_id, limit),
+            turns_per_session=recent_turns,
+            max_sessions=recent_sessions
+        )
+        
+        self.writer = None
+        if write_behind:
+            self.writer = HistoryWriter(self, batch_size=write_batch_size,
+                                        flush_interval=write_flush_interval)
+            self.writer.start()
+            # 进程退出前把队列中的消息落盘
+            atexit.register(self.close)
     
     def _init_database(self):
-        """初始化数据库"""
-        os.makedirs(os.path.dirname(self.db_path) if os.path.dirname(self.db_path) else '.', exist_ok=True)
+        """初始化数据库，按 PRAGMA user_version 依次执行未应用的迁移"""
+        with self.db.write() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
         
-        conn = sqlite3.connect(self.db_path)
+        for target, migrate in self._migrations():
+            if version >= target:
+                continue
+            # 每个迁移单独一个事务，失败时不会留下半完成的版本
+            with self.db.write() as conn:
+                migrate(conn)
+                conn.execute(f'PRAGMA user_version = {int(target)}')
+            logger.info(f"聊天记录数据库已迁移到版本 {target}: {migrate.__doc__}")
+            version = target
+        
+        logger.info(f"聊天记录数据库初始化完成: {self.db_path} (版本 {version})")
+    
+    def _migrations(self):
+        """迁移列表: (目标版本, 迁移函数)，只能追加不能修改"""
+        return [
+            (1, self._create_tables),
+            (2, self._create_indexes),
+            (3, self._create_fts_index),
+            (4, self._create_rollups),
+            (5, self._create_archive_index),
+        ]
+    
+    def _create_tables(self, conn: sqlite3.Connection):
+        """创建数据表"""
         cursor = conn.cursor()
         
         # 创建聊天记录表
@@ -100,165 +257,547 @@ class ChatHistoryManager:
                 message_count INTEGER DEFAULT 0
             )
         ''')
+    
+    def _create_indexes(self, conn: sqlite3.Connection):
+        """为会话过滤、时间过滤和会话排序创建索引"""
+        # 按会话取消息与keyset分页: WHERE session_id = ? ORDER BY timestamp, id
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_session_time
+            ON chat_messages (session_id, timestamp, id)
+        ''')
+        # 按时间统计与清理
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_time
+            ON chat_messages (timestamp)
+        ''')
+        # 会话列表排序与过期清理
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated
+            ON chat_sessions (updated_at)
+        ''')
+    
+    def _create_fts_index(self, conn: sqlite3.Connection):
+        """创建消息内容的 FTS5 trigram 全文索引"""
+        create_fts_index(conn)
+    
+    def _create_rollups(self, conn: sqlite3.Connection):
+        """记录消息token数，创建按小时/按天的统计汇总表与同步触发器"""
+        conn.execute('ALTER TABLE chat_messages ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0')
+        create_rollups(conn)
+    
+    def _create_archive_index(self, conn: sqlite3.Connection):
+        """创建冷归档索引表，归档消息的删除不再回减统计"""
+        create_archive_index(conn)
+    
+    def flush(self, timeout: float = None) -> bool:
+        """等待后写队列中的消息全部落盘
         
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"聊天记录数据库初始化完成: {self.db_path}")
+        Returns:
+            是否在超时前完成
+        """
+        if self.writer is None:
+            return True
+        return self.writer.flush(timeout)
+    
+    def close(self):
+        """落盘未写入的消息并关闭数据库连接"""
+        if self.writer is not None:
+            self.writer.close()
+        self.db.close()
+        self.archive.close()
     
-    def start_new_session(self, title: str = None) -> str:
+    @_timed
+    def start_new_session(self, title: str = None, session_id: str = None) -> str:
         """开始新会话
         
         Args:
             title: 会话标题
+            session_id: 指定会话ID，None则自动生成
             
         Returns:
             会话ID
         """
-        session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        session_id = session_id or new_session_id()
         if not title:
             title = f"聊天会话 {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO chat_sessions (id, title)
-            VALUES (?, ?)
-        ''', (session_id, title))
-        
-        conn.commit()
-        conn.close()
+        with self.db.write() as conn:
+            conn.execute('''
+                INSERT INTO chat_sessions (id, title)
+                VALUES (?, ?)
+            ''', (session_id, title))
         
         self.current_session_id = session_id
         logger.info(f"新会话已创建: {session_id}")
         return session_id
     
-    def add_message(self, role: str, content: str, emotion: str = None) -> ChatMessage:
+    @_timed
+    def add_message(self, role: str, content: str, emotion: str = None,
+                    session_id: str = None) -> ChatMessage:
         """添加消息
         
         Args:
             role: 角色
             content: 内容
             emotion: 情感
+            session_id: 会话ID，None则使用当前会话
             
         Returns:
             聊天消息对象
         """
-        if not self.current_session_id:
-            self.start_new_session()
+        if not session_id:
+            if not self.current_session_id:
+                self.start_new_session()
+            session_id = self.current_session_id
         
         message = ChatMessage(
             role=role,
             content=content,
             emotion=emotion,
-            session_id=self.current_session_id
+            session_id=session_id
         )
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # 持有缓存锁，避免并发懒加载时重复或遗漏这条消息
+        with self.recent.lock:
+            if self.writer is not None:
+                # 后写模式：入队后立即返回，由写线程批量落盘
+                self.writer.submit(message)
+            else:
+                self.write_messages([message])
+            self.recent.append(message)
         
-        # 插入消息
-        cursor.execute('''
-            INSERT INTO chat_messages (session_id, role, content, timestamp, emotion)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (message.session_id, message.role, message.content, 
-              message.timestamp.isoformat(), message.emotion))
+        return message
+    
+    @_timed
+    def write_messages(self, messages: List[ChatMessage]):
+        """在一个事务中写入一批消息，并按会话合并更新消息计数
         
-        # 更新会话信息
-        cursor.execute('''
-            UPDATE chat_sessions 
-            SET updated_at = CURRENT_TIMESTAMP, 
-                message_count = message_count + 1
-            WHERE id = ?
-        ''', (self.current_session_id,))
+        Args:
+            messages: 消息列表
+        """
+        if not messages:
+            return
+        counts = Counter(message.session_id for message in messages)
         
-        conn.commit()
-        conn.close()
+        with self.db.write() as conn:
+            # 插入消息（触发器在同一事务中更新统计汇总）
+            conn.executemany('''
+                INSERT INTO chat_messages (session_id, role, content, timestamp, emotion, tokens)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(message.session_id, message.role, message.content, message.timestamp.isoformat(),
+                   message.emotion, estimate_tokens(message.content)) for message in messages])
+            
+            # 更新会话信息
+            conn.executemany('''
+                UPDATE chat_sessions 
+                SET updated_at = CURRENT_TIMESTAMP, 
+                    message_count = message_count + ?
+                WHERE id = ?
+            ''', [(count, session_id) for session_id, count in counts.items()])
+    
+    @_timed
+    def import_rows(self, sessions: List[Dict[str, Any]],
+                    messages: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """在一个事务中批量导入会话与消息（保留原时间戳，不分配原消息ID）
         
-        return message
+        同一会话中 (timestamp, role, content) 相同的消息视为已存在并跳过（包括已归档的消息），
+        重复导入同一份备份或中断后重试不会产生重复消息。写入了消息的会话，updated_at
+        推进到其中最新消息的时间（不会回退），保留期清理与会话列表据此判断活跃度。
+        
+        Args:
+            sessions: 会话记录（id, title, created_at, updated_at）
+            messages: 消息记录（session_id, role, content, timestamp, emotion）
+            
+        Returns:
+            (新建的会话数, 实际写入的消息数)
+        """
+        session_rows = [(session['id'], session.get('title'), session.get('created_at'),
+                         session.get('updated_at')) for session in sessions]
+        # 只有消息没有会话记录的（如CSV导入），补建会话
+        known = {session['id'] for session in sessions}
+        message_sessions = {message['session_id'] for message in messages}
+        session_rows.extend((session_id, None, None, None) for session_id in message_sessions
+                            if session_id not in known)
+        
+        # 归档消息不在在线库中，单独读出自然键比对
+        archived_keys = set()
+        with self.db.read() as conn:
+            archived = [row[0] for row in conn.execute('''
+                SELECT session_id FROM archived_sessions WHERE session_id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list(message_sessions)),))]
+        for session_id in archived:
+            archived_keys.update((session_id, record['timestamp'], record['role'], record['content'])
+                                 for record in self.iter_archived_messages(session_id))
+        
+        counts = Counter()
+        latest: Dict[str, str] = {}
+        with self.db.write() as conn:
+            # rowcount 不含触发器产生的修改
+            created = conn.executemany('''
+                INSERT OR IGNORE INTO chat_sessions (id, title, created_at, updated_at)
+                VALUES (?, COALESCE(?, '导入会话'), COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+            ''', session_rows).rowcount
+            for message in messages:
+                key = (message['session_id'], message['timestamp'], message['role'], message['content'])
+                if key in archived_keys:
+                    continue
+                # 走 (session_id, timestamp, id) 索引判断是否已存在
+                inserted = conn.execute('''
+                    INSERT INTO chat_messages (session_id, role, content, timestamp, emotion, tokens)
+                    SELECT :session_id, :role, :content, :timestamp, :emotion, :tokens
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM chat_messages
+                        WHERE session_id = :session_id AND timestamp = :timestamp
+                          AND role = :role AND content = :content
+                    )
+                ''', {'session_id': message['session_id'], 'role': message['role'],
+                      'content': message['content'], 'timestamp': message['timestamp'],
+                      'emotion': message.get('emotion') or None,
+                      'tokens': estimate_tokens(message['content'])}).rowcount
+                if inserted:
+                    counts[message['session_id']] += 1
+                    latest[message['session_id']] = max(latest.get(message['session_id'], ''),
+                                                        message['timestamp'])
+            # 消息时间戳为本地时间的ISO格式，updated_at 为 CURRENT_TIMESTAMP 格式（UTC）
+            conn.executemany('''
+                UPDATE chat_sessions
+                SET message_count = message_count + ?,
+                    updated_at = MAX(COALESCE(updated_at, ''), COALESCE(datetime(?, 'utc'), ''))
+                WHERE id = ?
+            ''', [(count, latest[session_id], session_id) for session_id, count in counts.items()])
+        
+        # 已缓存的会话需要重新加载
+        for session_id in counts:
+            self.recent.discard(session_id)
+        return created, sum(counts.values())
     
-    def get_session_messages(self, session_id: str = None, limit: int = 50) -> List[ChatMessage]:
-        """获取会话消息
+    def get_session_messages(self, session_id: str = None, limit: int = 50,
+                             before: str = None) -> List[ChatMessage]:
+        """获取会话中最新的消息（按时间正序返回）
         
         Args:
             session_id: 会话ID，None则使用当前会话
             limit: 限制数量
+            before: 分页游标，返回该游标之前的一页
             
         Returns:
             消息列表
         """
+        return self.get_message_page(session_id, limit, before)['messages']
+    
+    @_timed
+    def get_message_page(self, session_id: str = None, limit: int = 50,
+                         before: str = None) -> Dict[str, Any]:
+        """按keyset分页获取会话消息，从最新往前翻页
+        
+        Args:
+            session_id: 会话ID，None则使用当前会话
+            limit: 每页数量
+            before: 上一页返回的 next_cursor，None表示最新一页
+            
+        Returns:
+            {'messages': 按时间正序的消息列表, 'next_cursor': 更早一页的游标（没有更多时为None）}
+        
+        Raises:
+            ValueError: 游标格式无效
+        """
         if not session_id:
             session_id = self.current_session_id
             
-        if not session_id:
-            return []
+        if not session_id or limit <= 0:
+            return {'messages': [], 'next_cursor': None}
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT role, content, timestamp, emotion, session_id
-            FROM chat_messages
-            WHERE session_id = ?
-            ORDER BY timestamp ASC
-            LIMIT ?
-        ''', (session_id, limit))
+        # 先取待写视图快照再读库，不等待写线程的事务；快照中已在读库前落盘的消息在下面去重
+        pending = []
+        if self.writer is not None and not before:
+            pending = self.writer.pending(session_id)
+        with self.db.read() as conn:
+            archived = conn.execute('SELECT blocks FROM archived_sessions WHERE session_id = ?',
+                                    (session_id,)).fetchone()
+            if before:
+                timestamp, message_id = decode_cursor(before)
+                rows = conn.execute('''
+                    SELECT id, role, content, timestamp, emotion, session_id
+                    FROM chat_messages
+                    WHERE session_id = ? AND (timestamp, id) < (?, ?)
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ?
+                ''', (session_id, timestamp, message_id, limit)).fetchall()
+            else:
+                rows = conn.execute('''
+                    SELECT id, role, content, timestamp, emotion, session_id
+                    FROM chat_messages
+                    WHERE session_id = ?
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ?
+                ''', (session_id, limit)).fetchall()
         
         messages = []
-        for row in cursor.fetchall():
-            message = ChatMessage(
-                role=row[0],
-                content=row[1],
-                timestamp=datetime.fromisoformat(row[2]),
-                emotion=row[3],
-                session_id=row[4]
-            )
-            messages.append(message)
+        for row in reversed(rows):
+            messages.append(ChatMessage(
+                role=row[1],
+                content=row[2],
+                timestamp=datetime.fromisoformat(row[3]),
+                emotion=row[4],
+                session_id=row[5],
+                message_id=row[0]
+            ))
+        has_older = len(rows) == limit
+        # 归档的消息都早于在线库中的消息，在线库不足一页时从归档补足
+        if archived and not has_older:
+            older, has_older = self._archived_messages(session_id, archived[0], limit - len(rows),
+                                                       decode_cursor(before) if before else None)
+            messages = older + messages
+        persisted = len(messages)
+        # 合并尚未落盘的消息（读己之写），它们总是最新的
+        messages = (messages + _unpersisted(pending, rows))[-limit:]
+        
+        # 本页之外还有更早的已落盘消息时返回游标
+        kept = sum(1 for message in messages if message.id is not None)
+        next_cursor = None
+        if messages and (has_older or kept < persisted):
+            oldest = messages[0]
+            next_cursor = encode_cursor(oldest.timestamp.isoformat(),
+                                        oldest.id if oldest.id is not None else _MAX_MESSAGE_ID)
+        
+        return {'messages': messages, 'next_cursor': next_cursor}
+    
+    def _archived_messages(self, session_id: str, blocks: int, limit: int,
+                           before=None) -> Tuple[List[ChatMessage], bool]:
+        """读取游标 (timestamp, id) 之前最新的 limit 条归档消息
+
+        Returns:
+            (按时间正序的消息列表, 是否还有更早的归档消息)
+        """
+        records, has_more = self.archive.read_before(session_id, blocks, limit, before)
+        return [ChatMessage(
+            role=record['role'],
+            content=record['content'],
+            timestamp=datetime.fromisoformat(record['timestamp']),
+            emotion=record['emotion'],
+            session_id=session_id,
+            message_id=record['id']
+        ) for record in records], has_more
+    
+    def iter_archived_messages(self, session_id: str = None) -> Iterator[Dict[str, Any]]:
+        """逐块读取归档消息记录（用于导出，不经过块缓存）
+        
+        Args:
+            session_id: 只读取指定会话，None表示全部归档会话
+            
+        Yields:
+            消息记录（session_id, id, role, content, timestamp, emotion, tokens）
+        """
+        last = ''
+        while True:
+            with self.db.read() as conn:
+                if session_id:
+                    rows = conn.execute(
+                        'SELECT session_id, blocks FROM archived_sessions WHERE session_id = ?',
+                        (session_id,)).fetchall()
+                else:
+                    rows = conn.execute('''
+                        SELECT session_id, blocks FROM archived_sessions
+                        WHERE session_id > ? ORDER BY session_id LIMIT 100
+                    ''', (last,)).fetchall()
+            for archived_id, blocks in rows:
+                for record in self.archive.iter_session(archived_id, blocks):
+                    yield dict(record, session_id=archived_id)
+            if session_id or len(rows) < 100:
+                return
+            last = rows[-1][0]
+    
+    @_timed
+    def archive_sessions(self, days: float, batch_size: int = 50) -> Tuple[int, int]:
+        """把最后更新时间早于 days 天前的会话移入压缩归档
+        
+        先写归档库再在一个事务中登记索引并删除在线消息，中途失败时消息仍在在线库，
+        下次运行会重新归档（覆盖同一序号的块）。
         
-        conn.close()
-        return messages
+        Args:
+            days: 会话最后更新后保留在在线库的天数
+            batch_size: 每批处理的会话数
+            
+        Returns:
+            (归档的会话数, 归档的消息数)
+        """
+        self.flush()
+        modifier = f'-{float(days)} days'
+        sessions = messages = 0
+        with self._archive_lock:
+            self._prune_archive()
+            while True:
+                with self.db.read() as conn:
+                    ids = [row[0] for row in conn.execute('''
+                        SELECT id FROM chat_sessions AS s
+                        WHERE updated_at < datetime('now', ?)
+                          AND EXISTS (SELECT 1 FROM chat_messages WHERE session_id = s.id)
+                        ORDER BY updated_at
+                        LIMIT ?
+                    ''', (modifier, batch_size))]
+                if not ids:
+                    break
+                for session_id in ids:
+                    archived = self._archive_session(session_id)
+                    sessions += bool(archived)
+                    messages += archived
+                if len(ids) < batch_size:
+                    break
+        if sessions:
+            logger.info(f"已归档 {sessions} 个会话（{messages} 条消息）")
+        return sessions, messages
     
-    def get_recent_context(self, limit: int = 10) -> List[Dict[str, str]]:
-        """获取最近的对话上下文，格式化为LLM使用
+    def _archive_session(self, session_id: str) -> int:
+        """归档单个会话的在线消息，返回归档的消息数"""
+        with self.db.read() as conn:
+            rows = conn.execute('''
+                SELECT id, role, content, timestamp, emotion, tokens
+                FROM chat_messages
+                WHERE session_id = ?
+                ORDER BY timestamp, id
+            ''', (session_id,)).fetchall()
+            existing = conn.execute('SELECT blocks FROM archived_sessions WHERE session_id = ?',
+                                    (session_id,)).fetchone()
+        if not rows:
+            return 0
+        records = [dict(zip(('id', 'role', 'content', 'timestamp', 'emotion', 'tokens'), row))
+                   for row in rows]
+        blocks = self.archive.write_blocks(session_id, existing[0] if existing else 0, records)
+        with self.db.write() as conn:
+            archived = mark_archived(conn, session_id, records, blocks)
+        self.recent.discard(session_id)
+        return archived
+    
+    def _prune_archive(self):
+        """删除在线库中没有索引的归档块（会话已删除或归档中途失败留下的）"""
+        last = ''
+        while True:
+            ids = self.archive.session_ids(after=last)
+            if not ids:
+                return
+            with self.db.read() as conn:
+                indexed = {row[0] for row in conn.execute('''
+                    SELECT session_id FROM archived_sessions
+                    WHERE session_id IN (SELECT value FROM json_each(?))
+                ''', (json.dumps(ids),))}
+            orphans = [session_id for session_id in ids if session_id not in indexed]
+            if orphans:
+                self.archive.delete_sessions(orphans)
+            last = ids[-1]
+    
+    @_timed
+    def search_messages(self, query: str, limit: int = 20, cursor: str = None,
+                        session_id: str = None) -> Dict[str, Any]:
+        """全文检索聊天记录（尚未落盘的消息不参与检索）
+        
+        Args:
+            query: 关键词，空白分隔，全部命中
+            limit: 每页数量
+            cursor: 上一页返回的 next_cursor，None表示第一页
+            session_id: 只在指定会话内检索，None表示全部会话
+            
+        Returns:
+            {'results': 命中列表（含高亮片段）, 'next_cursor': 下一页游标, 'mode': 'fts' 或 'like'}
+        
+        Raises:
+            ValueError: 游标格式无效
+        """
+        after = None
+        if cursor:
+            rank, message_id = decode_cursor(cursor)
+            try:
+                after = (float(rank), message_id)
+            except ValueError as e:
+                raise ValueError(f"无效的分页游标: {cursor}") from e
+        
+        if limit <= 0:
+            return {'results': [], 'next_cursor': None, 'mode': 'fts'}
+        
+        with self.db.read() as conn:
+            if not fts_available(conn):
+                logger.warning("全文索引不可用，无法检索聊天记录")
+                return {'results': [], 'next_cursor': None, 'mode': 'unavailable'}
+            page = search_messages(conn, query, limit, after, session_id)
+        
+        last = page['last']
+        return {
+            'results': page['results'],
+            'next_cursor': _search_cursor(page['mode'], last[0], last[1]) if last else None,
+            'mode': page['mode'],
+        }
+    
+    def get_recent_context(self, limit: int = 10, session_id: str = None) -> List[Dict[str, str]]:
+        """获取最近的对话上下文，格式化为LLM使用（优先从内存缓存读取）
         
         Args:
             limit: 限制数量
+            session_id: 会话ID，None则使用当前会话
             
         Returns:
             格式化的消息列表
         """
-        messages = self.get_session_messages(limit=limit)
+        session_id = session_id or self.current_session_id
+        if not session_id:
+            return []
+        turns = self.recent.get(session_id, limit)
+        if turns is not None:
+            return [turn.to_context() for turn in turns]
+        # 超过缓存容量时回退到数据库
+        messages = self.get_session_messages(session_id, limit=limit)
         return [{'role': msg.role, 'content': msg.content} for msg in messages]
     
-    def get_recent_messages(self, limit: int = 10) -> List[Dict[str, str]]:
+    def get_recent_messages(self, limit: int = 10, session_id: str = None) -> List[Dict[str, str]]:
         """获取最近的消息（兼容旧接口）
         
         Args:
             limit: 限制数量
+            session_id: 会话ID，None则使用当前会话
             
         Returns:
             格式化的消息列表
         """
-        return self.get_recent_context(limit)
+        return self.get_recent_context(limit, session_id)
     
+    @_timed
+    def get_sessions(self, session_ids: List[str]) -> List[Dict[str, Any]]:
+        """按ID批量获取会话信息
+        
+        Args:
+            session_ids: 会话ID列表
+            
+        Returns:
+            会话列表（顺序不保证）
+        """
+        with self.db.read() as conn:
+            rows = conn.execute('''
+                SELECT id, title, created_at, updated_at, message_count
+                FROM chat_sessions
+                WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list(session_ids)),)).fetchall()
+        return [{
+            'id': row[0],
+            'title': row[1],
+            'created_at': row[2],
+            'updated_at': row[3],
+            'message_count': row[4]
+        } for row in rows]
+    
+    @_timed
     def get_all_sessions(self) -> List[Dict[str, Any]]:
         """获取所有会话
         
         Returns:
             会话列表
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, title, created_at, updated_at, message_count
-            FROM chat_sessions
-            ORDER BY updated_at DESC
-        ''')
+        with self.db.read() as conn:
+            rows = conn.execute('''
+                SELECT id, title, created_at, updated_at, message_count
+                FROM chat_sessions
+                ORDER BY updated_at DESC
+            ''').fetchall()
         
         sessions = []
-        for row in cursor.fetchall():
+        for row in rows:
             sessions.append({
                 'id': row[0],
                 'title': row[1],
@@ -267,60 +806,72 @@ class ChatHistoryManager:
                 'message_count': row[4]
             })
         
-        conn.close()
         return sessions
     
+    @_timed
     def delete_session(self, session_id: str):
         """删除会话
         
         Args:
             session_id: 会话ID
+            
+        Raises:
+            RuntimeError: 待写消息未能在限定时间内落盘（写入持续失败时）
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 删除消息
-        cursor.execute('DELETE FROM chat_messages WHERE session_id = ?', (session_id,))
+        # 先落盘待写消息，避免删除后又被写回
+        if not self.flush(timeout=_DELETE_FLUSH_TIMEOUT):
+            raise RuntimeError("聊天记录写入积压，暂时无法删除会话，请稍后重试")
         
-        # 删除会话
-        cursor.execute('DELETE FROM chat_sessions WHERE id = ?', (session_id,))
-        
-        conn.commit()
-        conn.close()
+        with self.db.write() as conn:
+            # 删除消息
+            conn.execute('DELETE FROM chat_messages WHERE session_id = ?', (session_id,))
+            
+            # 删除会话
+            conn.execute('DELETE FROM chat_sessions WHERE id = ?', (session_id,))
+        self.forget_sessions([session_id])
         
         if self.current_session_id == session_id:
             self.current_session_id = None
         
         logger.info(f"会话已删除: {session_id}")
     
-    def clear_old_sessions(self, days: int = 30):
-        """清理旧会话
+    def forget_sessions(self, session_ids: List[str]):
+        """丢弃已删除会话的内存状态（最近消息缓存）与归档块"""
+        for session_id in session_ids:
+            self.recent.discard(session_id)
+        self.archive.delete_sessions(session_ids)
+    
+    @property
+    def shards(self) -> List['ChatHistoryManager']:
+        """存储分片列表（单库即自身，与分片存储接口一致）"""
+        return [self]
+    
+    @_timed
+    def clear_old_sessions(self, days: int = 30, batch_size: int = 200,
+                           on_deleted=None) -> int:
+        """清理旧会话（按会话分批的集合删除）
         
         Args:
             days: 保留天数
+            batch_size: 每批删除的会话数
+            on_deleted: 可选回调 on_deleted(本批删除的会话ID列表)，默认丢弃本实例的内存状态
+            
+        Returns:
+            删除的会话数
         """
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 获取要删除的会话
-        cursor.execute('''
-            SELECT id FROM chat_sessions 
-            WHERE updated_at < ?
-        ''', (cutoff_date.isoformat(),))
-        
-        old_sessions = [row[0] for row in cursor.fetchall()]
-        
-        # 删除旧消息和会话
-        for session_id in old_sessions:
-            cursor.execute('DELETE FROM chat_messages WHERE session_id = ?', (session_id,))
-            cursor.execute('DELETE FROM chat_sessions WHERE id = ?', (session_id,))
+        self.flush()
         
-        conn.commit()
-        conn.close()
+        sessions, messages = delete_expired_sessions(self.db, days, batch_size,
+                                                     on_deleted=on_deleted or self.forget_sessions)
+        if self.current_session_id and sessions:
+            with self.db.read() as conn:
+                exists = conn.execute('SELECT 1 FROM chat_sessions WHERE id = ?',
+                                      (self.current_session_id,)).fetchone()
+            if not exists:
+                self.current_session_id = None
         
-        logger.info(f"已清理 {len(old_sessions)} 个旧会话")
+        logger.info(f"已清理 {sessions} 个旧会话（{messages} 条消息）")
+        return sessions
     
     def export_session(self, session_id: str, format: str = 'json') -> str:
         """导出会话
@@ -347,35 +898,462 @@ class ChatHistoryManager:
         else:
             raise ValueError(f"不支持的导出格式: {format}")
     
+    @_timed
     def get_statistics(self) -> Dict[str, Any]:
-        """获取统计信息
+        """获取统计信息（读取增量维护的汇总表，耗时与数据量无关）
         
         Returns:
             统计数据
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.db.read() as conn:
+            totals = read_totals(conn)
+            # 最近7天消息数（最近168个小时桶）
+            recent_messages = read_recent_messages(conn, hours=7 * 24)
+        
+        return {
+            'total_messages': totals.get('messages', 0),
+            'total_sessions': totals.get('sessions', 0),
+            'recent_messages': recent_messages
+        }
+    
+    @_timed
+    def get_timeseries(self, granularity: str = 'day', since: str = None,
+                       until: str = None) -> Dict[str, Dict[str, Any]]:
+        """获取按小时/按天的统计时间序列
+        
+        Args:
+            granularity: 'hour' 或 'day'
+            since: 起始桶（含），如 '2024-01-01' 或 '2024-01-01T08'
+            until: 结束桶（含），None表示至今
+            
+        Returns:
+            桶 -> {'messages', 'tokens', 'sessions', 'by_role', 'by_emotion'}
+        """
+        with self.db.read() as conn:
+            return read_timeseries(conn, granularity, since, until)
+
+def shard_paths(db_path: str, count: int) -> List[str]:
+    """计算各分片的数据库路径（0号分片沿用原路径）"""
+    root, ext = os.path.splitext(db_path)
+    return [db_path] + [f"{root}.{index}{ext or '.db'}" for index in range(1, count)]
+
+
+def _encode_positions(positions: List[Optional[str]]) -> str:
+    raw = json.dumps(positions, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_positions(cursor: str, count: int) -> List[Optional[str]]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        positions = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+    except (ValueError, UnicodeDecodeError, TypeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    if not isinstance(positions, list) or len(positions) != count:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return positions
+
+
+class ShardedChatHistory:
+    """分片聊天记录存储（接口与 ChatHistoryManager 一致，另支持用户维度）"""
+
+    def __init__(self, db_path: str = "chat_history.db", shards: int = 1, **manager_options):
+        """初始化分片存储
+
+        Args:
+            db_path: 0号分片的数据库路径，其他分片和目录库放在同一目录
+            shards: 分片数
+            **manager_options: 传给每个分片 ChatHistoryManager 的参数
+        """
+        self.db_path = db_path
+        self.shards: List[ChatHistoryManager] = [
+            ChatHistoryManager(path, **manager_options)
+            for path in shard_paths(db_path, max(1, shards))
+        ]
+        root, ext = os.path.splitext(db_path)
+        self.directory = HistoryDatabase(f"{root}.directory{ext or '.db'}", read_pool_size=1,
+                                         cache_size_kb=2048)
+        self._init_directory()
+
+        self._shard_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._shard_cache_lock = threading.Lock()
+        # 未指定会话的旧接口调用（如 llm_manager）使用的默认会话
+        self.current_session_id = None
+
+    def _init_directory(self):
+        """创建会话目录表，首次创建时登记各分片中已有的会话"""
+        with self.directory.write() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= 1:
+                return
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS session_directory (
+                    session_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    shard INTEGER NOT NULL,
+                    title TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_session_directory_user
+                ON session_directory (user_id, created_at)
+            ''')
+            registered = 0
+            for index, shard in enumerate(self.shards):
+                with shard.db.read() as shard_conn:
+                    rows = shard_conn.execute(
+                        'SELECT id, title, created_at FROM chat_sessions').fetchall()
+                conn.executemany('''
+                    INSERT OR IGNORE INTO session_directory (session_id, shard, title, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', [(row[0], index, row[1], row[2]) for row in rows])
+                registered += len(rows)
+            conn.execute('PRAGMA user_version = 1')
+        if registered:
+            logger.info(f"会话目录已登记 {registered} 个已有会话")
+
+    def shard_index(self, key: str) -> int:
+        """按键计算分片（crc32，跨进程稳定）"""
+        return zlib.crc32(key.encode('utf-8')) % len(self.shards)
+
+    def _locate(self, session_id: str) -> int:
+        """查询会话所在分片，目录中没有时按会话ID哈希"""
+        with self._shard_cache_lock:
+            index = self._shard_cache.get(session_id)
+            if index is not None:
+                self._shard_cache.move_to_end(session_id)
+                return index
+        with self.directory.read() as conn:
+            row = conn.execute('SELECT shard FROM session_directory WHERE session_id = ?',
+                               (session_id,)).fetchone()
+        index = row[0] if row and row[0] < len(self.shards) else self.shard_index(session_id)
+        self._remember(session_id, index)
+        return index
+
+    def _remember(self, session_id: str, index: int):
+        with self._shard_cache_lock:
+            self._shard_cache[session_id] = index
+            while len(self._shard_cache) > _SHARD_CACHE_SIZE:
+                self._shard_cache.popitem(last=False)
+
+    def shard_for(self, session_id: str) -> ChatHistoryManager:
+        """获取会话所在的分片"""
+        return self.shards[self._locate(session_id)]
+
+    def find_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """在目录中查找会话
+
+        Returns:
+            {'session_id', 'user_id', 'shard'}，会话不存在时返回None
+        """
+        with self.directory.read() as conn:
+            row = conn.execute('SELECT user_id, shard FROM session_directory WHERE session_id = ?',
+                               (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {'session_id': session_id, 'user_id': row[0], 'shard': row[1]}
+
+    def start_new_session(self, title: str = None, user_id: str = None,
+                          session_id: str = None) -> str:
+        """开始新会话
+
+        Args:
+            title: 会话标题
+            user_id: 用户ID，同一用户的会话放在同一分片
+            session_id: 指定会话ID，None则自动生成
+
+        Returns:
+            会话ID
+        """
+        session_id = session_id or new_session_id()
+        index = self.shard_index(user_id or session_id)
+        shard = self.shards[index]
+        shard.start_new_session(title, session_id=session_id)
+        with shard.db.read() as conn:
+            title, created_at = conn.execute(
+                'SELECT title, created_at FROM chat_sessions WHERE id = ?', (session_id,)).fetchone()
+        with self.directory.write() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO session_directory (session_id, user_id, shard, title, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (session_id, user_id, index, title, created_at))
+        self._remember(session_id, index)
+        self.current_session_id = session_id
+        return session_id
+
+    def add_message(self, role: str, content: str, emotion: str = None,
+                    session_id: str = None) -> ChatMessage:
+        """添加消息到指定会话（未指定时使用默认会话）"""
+        if not session_id:
+            if not self.current_session_id:
+                self.start_new_session()
+            session_id = self.current_session_id
+        return self.shard_for(session_id).add_message(role, content, emotion, session_id=session_id)
+
+    def get_session_messages(self, session_id: str = None, limit: int = 50,
+                             before: str = None) -> List[ChatMessage]:
+        """获取会话中最新的消息（按时间正序返回）"""
+        return self.get_message_page(session_id, limit, before)['messages']
+
+    def get_message_page(self, session_id: str = None, limit: int = 50,
+                         before: str = None) -> Dict[str, Any]:
+        """按keyset分页获取会话消息，从最新往前翻页"""
+        session_id = session_id or self.current_session_id
+        if not session_id:
+            return {'messages': [], 'next_cursor': None}
+        return self.shard_for(session_id).get_message_page(session_id, limit, before)
+
+    def get_recent_context(self, limit: int = 10, session_id: str = None) -> List[Dict[str, str]]:
+        """获取最近的对话上下文，格式化为LLM使用"""
+        session_id = session_id or self.current_session_id
+        if not session_id:
+            return []
+        return self.shard_for(session_id).get_recent_context(limit, session_id)
+
+    def get_recent_messages(self, limit: int = 10, session_id: str = None) -> List[Dict[str, str]]:
+        """获取最近的消息（兼容旧接口）"""
+        return self.get_recent_context(limit, session_id)
+
+    def get_all_sessions(self, user_id: str = None) -> List[Dict[str, Any]]:
+        """通过目录列出会话，按最后更新时间倒序
+
+        Args:
+            user_id: 只列出该用户的会话，None表示全部
+
+        Returns:
+            会话列表
+        """
+        with self.directory.read() as conn:
+            if user_id:
+                rows = conn.execute(
+                    'SELECT session_id, user_id, shard FROM session_directory WHERE user_id = ?',
+                    (user_id,)).fetchall()
+            else:
+                rows = conn.execute(
+                    'SELECT session_id, user_id, shard FROM session_directory').fetchall()
+
+        by_shard: Dict[int, List[str]] = {}
+        owners = {}
+        for session_id, owner, index in rows:
+            if index < len(self.shards):
+                by_shard.setdefault(index, []).append(session_id)
+                owners[session_id] = owner
+
+        sessions = []
+        for index, session_ids in by_shard.items():
+            for session in self.shards[index].get_sessions(session_ids):
+                session['user_id'] = owners.get(session['id'])
+                sessions.append(session)
+        sessions.sort(key=lambda session: session['updated_at'] or '', reverse=True)
+        return sessions
+
+    def delete_session(self, session_id: str):
+        """删除会话及其目录记录"""
+        self.shard_for(session_id).delete_session(session_id)
+        self.forget_sessions([session_id])
+        if self.current_session_id == session_id:
+            self.current_session_id = None
+
+    def forget_sessions(self, session_ids: List[str]):
+        """删除会话的目录记录与内存状态（保留策略删除会话后调用）"""
+        with self.directory.write() as conn:
+            conn.execute(
+                'DELETE FROM session_directory WHERE session_id IN (SELECT value FROM json_each(?))',
+                (json.dumps(list(session_ids)),))
+        with self._shard_cache_lock:
+            for session_id in session_ids:
+                self._shard_cache.pop(session_id, None)
+        for shard in self.shards:
+            shard.forget_sessions(session_ids)
+
+    def archive_sessions(self, days: float, batch_size: int = 50) -> Tuple[int, int]:
+        """把各分片中长时间未更新的会话移入压缩归档（会话目录不变）
         
-        # 总消息数
-        cursor.execute('SELECT COUNT(*) FROM chat_messages')
-        total_messages = cursor.fetchone()[0]
+        Returns:
+            (归档的会话数, 归档的消息数)
+        """
+        sessions = messages = 0
+        for shard in self.shards:
+            shard_sessions, shard_messages = shard.archive_sessions(days, batch_size)
+            sessions += shard_sessions
+            messages += shard_messages
+        return sessions, messages
+    
+    def clear_old_sessions(self, days: int = 30, batch_size: int = 200) -> int:
+        """清理各分片的旧会话
+
+        Returns:
+            删除的会话数
+        """
+        deleted = 0
+        for shard in self.shards:
+            shard.flush()
+            deleted += shard.clear_old_sessions(days, batch_size, on_deleted=self.forget_sessions)
+        if self.current_session_id:
+            with self.directory.read() as conn:
+                if conn.execute('SELECT 1 FROM session_directory WHERE session_id = ?',
+                                (self.current_session_id,)).fetchone() is None:
+                    self.current_session_id = None
+        return deleted
+
+    def search_messages(self, query: str, limit: int = 20, cursor: str = None,
+                        session_id: str = None) -> Dict[str, Any]:
+        """跨分片全文检索，按各分片自身的排序键归并: FTS 按 (rank, id) 升序，LIKE 按 id 降序
+
+        游标记录每个分片各自的检索位置，保证翻页不重复不遗漏。
+
+        Raises:
+            ValueError: 游标格式无效
+        """
+        count = len(self.shards)
+        if cursor:
+            positions = _decode_positions(cursor, count)
+        else:
+            positions = [''] * count
+            if session_id:
+                # 只检索会话所在分片
+                owner = self._locate(session_id)
+                positions = [None if index != owner else '' for index in range(count)]
+
+        if limit <= 0:
+            return {'results': [], 'next_cursor': None, 'mode': 'fts'}
+
+        pages = {}
+        for index, position in enumerate(positions):
+            if position is not None:
+                pages[index] = self.shards[index].search_messages(
+                    query, limit, position or None, session_id)
+        modes = [page['mode'] for page in pages.values() if page['mode'] != 'unavailable']
+        mode = modes[0] if modes else ('unavailable' if pages else 'fts')
+
+        # 逐个比较各分片的队首，取出的结果总是各分片结果的前缀
+        heads = {index: 0 for index in pages}
+        results = []
+        while len(results) < limit:
+            candidates = [index for index, head in heads.items()
+                          if head < len(pages[index]['results'])]
+            if not candidates:
+                break
+            # 与分片内的排序键一致（导入的消息时间戳早但ID新，不能按时间归并）
+            if mode == 'like':
+                best = max(candidates, key=lambda i: (pages[i]['results'][heads[i]]['id'], -i))
+            else:
+                best = min(candidates, key=lambda i: (pages[i]['results'][heads[i]]['rank'],
+                                                      pages[i]['results'][heads[i]]['id'], i))
+            results.append(pages[best]['results'][heads[best]])
+            heads[best] += 1
+
+        for index, page in pages.items():
+            taken = heads[index]
+            if taken == len(page['results']) and page['next_cursor'] is None:
+                positions[index] = None
+            elif taken:
+                last = page['results'][taken - 1]
+                positions[index] = _search_cursor(page['mode'], last['rank'], last['id'])
+
+        next_cursor = None
+        if any(position is not None for position in positions):
+            next_cursor = _encode_positions(positions)
+        return {'results': results, 'next_cursor': next_cursor, 'mode': mode}
+
+    def import_records(self, sessions: List[Dict[str, Any]], messages: List[Dict[str, Any]]):
+        """批量导入会话与消息：新会话按用户/会话ID分配分片并登记目录，各分片一个事务写入
         
-        # 总会话数
-        cursor.execute('SELECT COUNT(*) FROM chat_sessions')
-        total_sessions = cursor.fetchone()[0]
+        Returns:
+            (新建会话数, 实际写入的消息数，已存在的消息不计)
+        """
+        owners = {session['id']: session.get('user_id') for session in sessions}
+        session_ids = set(owners) | {message['session_id'] for message in messages}
+        with self.directory.read() as conn:
+            placed = dict(conn.execute('''
+                SELECT session_id, shard FROM session_directory
+                WHERE session_id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list(session_ids)),)).fetchall())
         
-        # 最近7天消息数
-        week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-        cursor.execute('SELECT COUNT(*) FROM chat_messages WHERE timestamp > ?', (week_ago,))
-        recent_messages = cursor.fetchone()[0]
+        titles = {session['id']: session for session in sessions}
+        new_entries = []
+        for session_id in session_ids:
+            if session_id not in placed or placed[session_id] >= len(self.shards):
+                index = self.shard_index(owners.get(session_id) or session_id)
+                placed[session_id] = index
+                record = titles.get(session_id, {})
+                new_entries.append((session_id, owners.get(session_id), index,
+                                    record.get('title') or '导入会话', record.get('created_at')))
         
-        conn.close()
+        by_shard: Dict[int, tuple] = {}
+        for session in sessions:
+            by_shard.setdefault(placed[session['id']], ([], []))[0].append(session)
+        for message in messages:
+            by_shard.setdefault(placed[message['session_id']], ([], []))[1].append(message)
         
-        return {
-            'total_messages': total_messages,
-            'total_sessions': total_sessions,
-            'recent_messages': recent_messages
-        }
+        created = imported = 0
+        for index, (shard_sessions, shard_messages) in by_shard.items():
+            shard_created, shard_imported = self.shards[index].import_rows(shard_sessions, shard_messages)
+            created += shard_created
+            imported += shard_imported
+        if new_entries:
+            with self.directory.write() as conn:
+                conn.executemany('''
+                    INSERT OR IGNORE INTO session_directory (session_id, user_id, shard, title, created_at)
+                    VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ''', new_entries)
+        return created, imported
+    
+    def export_session(self, session_id: str, format: str = 'json') -> str:
+        """导出会话"""
+        return self.shard_for(session_id).export_session(session_id, format)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """汇总各分片的统计信息"""
+        totals = {'total_messages': 0, 'total_sessions': 0, 'recent_messages': 0}
+        for shard in self.shards:
+            for key, value in shard.get_statistics().items():
+                totals[key] = totals.get(key, 0) + value
+        totals['shards'] = len(self.shards)
+        return totals
+
+    def get_timeseries(self, granularity: str = 'day', since: str = None,
+                       until: str = None) -> List[Dict[str, Any]]:
+        """汇总各分片的统计时间序列
+
+        Args:
+            granularity: 'hour' 或 'day'
+            since: 起始桶（含），None表示最近48小时/30天
+            until: 结束桶（含），None表示至今
+
+        Returns:
+            按时间排序的 [{'bucket', 'messages', 'tokens', 'sessions', 'by_role', 'by_emotion'}]
+
+        Raises:
+            ValueError: 时间粒度无效
+        """
+        if not since:
+            if granularity == 'hour':
+                since = (datetime.now() - timedelta(hours=47)).strftime('%Y-%m-%dT%H')
+            else:
+                since = (datetime.now() - timedelta(days=29)).strftime('%Y-%m-%d')
+        return merge_timeseries([shard.get_timeseries(granularity, since, until)
+                                 for shard in self.shards])
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待所有分片的后写队列落盘"""
+        return all([shard.flush(timeout) for shard in self.shards])
+
+    def close(self):
+        """关闭所有分片与目录库"""
+        for shard in self.shards:
+            shard.close()
+        self.directory.close()
 
 # 全局聊天记录管理器实例
-chat_history = ChatHistoryManager()
\ No newline at end of file
+chat_history = ShardedChatHistory(
+    shards=config.get('chat_history.shards', 1),
+    read_pool_size=config.get('chat_history.read_pool_size', 2),
+    cache_size_kb=config.get('chat_history.cache_size_kb', 8192),
+    write_behind=config.get('chat_history.write_behind', True),
+    write_batch_size=config.get('chat_history.write_batch_size', 64),
+    write_flush_interval=config.get('chat_history.write_flush_interval', 0.05),
+    recent_turns=config.get('chat_history.recent_turns', 20),
+    recent_sessions=config.get('chat_history.recent_sessions', 256),
+    archive_cache_blocks=config.get('chat_history.archive_cache_blocks', 32)
+)
\ No newline at end of file
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录冷归档模块
+
+长时间未更新的会话从在线库移入压缩归档，在线库的消息表、索引和全文索引只保留活跃数据：
+- 归档块保存在独立的SQLite文件中，每块最多 BLOCK_MESSAGES 条消息，
+  编码为 NDJSON 后用 zlib 压缩（codec 字段预留给其他压缩算法）
+- 在线库的 archived_sessions 是小索引（会话 -> 块数、消息数、最大消息ID），
+  读取会话时据此判断是否需要访问归档
+- 分页读取按块的时间范围只解压游标之前、凑满一页所需的块；
+  最近解压的块保存在LRU缓存中，翻页和重复打开同一会话不会反复解压
+- 归档不改变统计：被归档消息的删除不回减汇总表，归档会话被删除时
+  再按 archived_rollups 中记录的分桶数量回减
+- 归档消息不参与全文检索（默认不归档，见 chat_history.retention.archive_days）；
+  归档后收到新消息的会话，新消息仍写入在线库
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .history_db import HistoryDatabase
+from .history_rollups import GRANULARITIES, create_message_delete_trigger
+from ..utils.metrics import CACHE_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# 每个归档块的最大消息数
+BLOCK_MESSAGES = 500
+
+# 块内每条消息保存的字段
+RECORD_FIELDS = ('id', 'role', 'content', 'timestamp', 'emotion', 'tokens')
+
+_CODECS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+DEFAULT_CODEC = 'zlib'
+
+
+def archive_path(db_path: str) -> str:
+    """在线库对应的归档库路径"""
+    if db_path == ':memory:':
+        return db_path
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.archive{ext or '.db'}"
+
+
+def encode_block(records: List[Dict[str, Any]], codec: str = DEFAULT_CODEC) -> bytes:
+    """把消息记录编码为压缩的NDJSON块"""
+    text = ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+                   for record in records)
+    return _CODECS[codec][0](text.encode('utf-8'))
+
+
+def decode_block(data: bytes, codec: str = DEFAULT_CODEC) -> List[Dict[str, Any]]:
+    """解压并解析归档块"""
+    if codec not in _CODECS:
+        raise ValueError(f"不支持的归档压缩格式: {codec}")
+    text = _CODECS[codec][1](data).decode('utf-8')
+    return [json.loads(line) for line in text.splitlines() if line]
+
+
+def block_rollups(records: List[Dict[str, Any]]) -> List[Tuple[str, str, str, str, int, int]]:
+    """按汇总表的分桶统计一批消息: (granularity, bucket, role, emotion, messages, tokens)"""
+    buckets: Dict[Tuple[str, str, str, str], List[int]] = {}
+    for record in records:
+        for granularity, width in GRANULARITIES.items():
+            key = (granularity, record['timestamp'][:width], record['role'], record['emotion'] or '')
+            item = buckets.setdefault(key, [0, 0])
+            item[0] += 1
+            item[1] += record['tokens']
+    return [key + tuple(value) for key, value in buckets.items()]
+
+
+def create_archive_index(conn: sqlite3.Connection):
+    """创建归档索引表，并让被归档消息的删除不影响统计汇总"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_sessions (
+            session_id TEXT PRIMARY KEY,
+            blocks INTEGER NOT NULL DEFAULT 0,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            last_message_id INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_rollups (
+            session_id TEXT NOT NULL,
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            role TEXT NOT NULL,
+            emotion TEXT NOT NULL,
+            messages INTEGER NOT NULL DEFAULT 0,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, granularity, bucket, role, emotion)
+        ) WITHOUT ROWID
+    ''')
+
+    # 归档时删除的消息（ID不超过 last_message_id）仍计入统计
+    conn.execute('DROP TRIGGER IF EXISTS chat_messages_rollup_delete')
+    create_message_delete_trigger(conn, when='''NOT EXISTS (
+        SELECT 1 FROM archived_sessions
+        WHERE session_id = old.session_id AND last_message_id >= old.id)''')
+
+    # 删除归档会话时按记录的分桶回减
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS chat_sessions_archive_delete AFTER DELETE ON chat_sessions
+        WHEN EXISTS (SELECT 1 FROM archived_sessions WHERE session_id = old.id) BEGIN
+            UPDATE message_rollups
+            SET messages = message_rollups.messages - a.messages,
+                tokens = message_rollups.tokens - a.tokens
+            FROM archived_rollups AS a
+            WHERE a.session_id = old.id
+              AND message_rollups.granularity = a.granularity AND message_rollups.bucket = a.bucket
+              AND message_rollups.role = a.role AND message_rollups.emotion = a.emotion;
+            UPDATE history_totals
+            SET value = value - (SELECT message_count FROM archived_sessions WHERE session_id = old.id)
+            WHERE name = 'messages';
+            UPDATE history_totals
+            SET value = value - (SELECT tokens FROM archived_sessions WHERE session_id = old.id)
+            WHERE name = 'tokens';
+            DELETE FROM archived_rollups WHERE session_id = old.id;
+            DELETE FROM archived_sessions WHERE session_id = old.id;
+        END
+    ''')
+
+
+def mark_archived(conn: sqlite3.Connection, session_id: str, records: List[Dict[str, Any]],
+                  blocks: int) -> int:
+    """在在线库中登记归档并删除已归档的消息（调用方负责事务）
+
+    Args:
+        conn: 在线库写连接
+        session_id: 会话ID
+        records: 本次归档的消息（按时间正序）
+        blocks: 本次新增的块数
+
+    Returns:
+        删除的消息数
+    """
+    last_id = max(record['id'] for record in records)
+    conn.execute('''
+        INSERT INTO archived_sessions (session_id, blocks, message_count, tokens, last_message_id)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (session_id) DO UPDATE SET
+            blocks = blocks + excluded.blocks,
+            message_count = message_count + excluded.message_count,
+            tokens = tokens + excluded.tokens,
+            last_message_id = max(last_message_id, excluded.last_message_id),
+            archived_at = CURRENT_TIMESTAMP
+    ''', (session_id, blocks, len(records), sum(record['tokens'] for record in records), last_id))
+    conn.executemany('''
+        INSERT INTO archived_rollups (session_id, granularity, bucket, role, emotion, messages, tokens)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (session_id, granularity, bucket, role, emotion) DO UPDATE SET
+            messages = messages + excluded.messages,
+            tokens = tokens + excluded.tokens
+    ''', [(session_id, *item) for item in block_rollups(records)])
+    # 只删除本次读出的消息，归档期间新写入的消息ID更大，留在在线库
+    return conn.execute(
+        'DELETE FROM chat_messages WHERE session_id = ? AND id <= ?', (session_id, last_id)
+    ).rowcount
+
+
+class ArchiveStore:
+    """归档块存储（独立的SQLite文件，首次使用时才创建）"""
+
+    def __init__(self, db_path: str, cache_blocks: int = 32):
+        """初始化归档存储
+
+        Args:
+            db_path: 归档库路径
+            cache_blocks: 内存中缓存的已解压块数
+        """
+        self.db_path = db_path
+        self.cache_blocks = max(0, cache_blocks)
+        self._db: Optional[HistoryDatabase] = None
+        self._open_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, int], List[Dict[str, Any]]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._hits = CACHE_REQUESTS_TOTAL.labels('archive_blocks', 'hit')
+        self._misses = CACHE_REQUESTS_TOTAL.labels('archive_blocks', 'miss')
+
+    @property
+    def db(self) -> HistoryDatabase:
+        """归档库连接（懒打开）"""
+        with self._open_lock:
+            if self._db is None:
+                db = HistoryDatabase(self.db_path, read_pool_size=1, cache_size_kb=1024)
+                with db.write() as conn:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS archive_blocks (
+                            session_id TEXT NOT NULL,
+                            seq INTEGER NOT NULL,
+                            message_count INTEGER NOT NULL,
+                            first_timestamp TEXT NOT NULL,
+                            last_timestamp TEXT NOT NULL,
+                            codec TEXT NOT NULL,
+                            data BLOB NOT NULL,
+                            PRIMARY KEY (session_id, seq)
+                        )
+                    ''')
+                self._db = db
+            return self._db
+
+    def _exists(self) -> bool:
+        return self._db is not None or (self.db_path != ':memory:' and os.path.exists(self.db_path))
+
+    def write_blocks(self, session_id: str, first_seq: int, records: List[Dict[str, Any]]) -> int:
+        """把消息切分为块写入归档库（同一序号已存在时覆盖）
+
+        Returns:
+            写入的块数
+        """
+        rows = []
+        for offset in range(0, len(records), BLOCK_MESSAGES):
+            chunk = [{field: record[field] for field in RECORD_FIELDS}
+                     for record in records[offset:offset + BLOCK_MESSAGES]]
+            rows.append((session_id, first_seq + len(rows), len(chunk), chunk[0]['timestamp'],
+                         chunk[-1]['timestamp'], DEFAULT_CODEC, encode_block(chunk)))
+        with self.db.write() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO archive_blocks
+                    (session_id, seq, message_count, first_timestamp, last_timestamp, codec, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+        with self._cache_lock:
+            for row in rows:
+                self._cache.pop((session_id, row[1]), None)
+        return len(rows)
+
+    def read_block(self, session_id: str, seq: int) -> List[Dict[str, Any]]:
+        """读取一个块（经LRU缓存），返回的列表不可修改"""
+        key = (session_id, seq)
+        with self._cache_lock:
+            records = self._cache.get(key)
+            if records is not None:
+                self._cache.move_to_end(key)
+                self._hits.inc()
+                return records
+        self._misses.inc()
+        with self.db.read() as conn:
+            row = conn.execute(
+                'SELECT codec, data FROM archive_blocks WHERE session_id = ? AND seq = ?', key
+            ).fetchone()
+        records = decode_block(row[1], row[0]) if row else []
+        if self.cache_blocks:
+            with self._cache_lock:
+                self._cache[key] = records
+                while len(self._cache) > self.cache_blocks:
+                    self._cache.popitem(last=False)
+        return records
+
+    def read_before(self, session_id: str, blocks: int, limit: int,
+                    before: Optional[Tuple[str, int]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """读取游标 (timestamp, id) 之前最新的 limit 条归档消息
+
+        按块的时间范围只挑选游标之前的块，从最新的块往前解压，凑够 limit 条即停止，
+        翻页的开销与会话总长度无关。
+
+        Returns:
+            (按时间正序的消息记录, 是否还有更早的归档消息)
+        """
+        if limit <= 0:
+            return [], False
+        with self.db.read() as conn:
+            if before is None:
+                seqs = [row[0] for row in conn.execute('''
+                    SELECT seq FROM archive_blocks WHERE session_id = ? AND seq < ? ORDER BY seq DESC
+                ''', (session_id, blocks))]
+            else:
+                seqs = [row[0] for row in conn.execute('''
+                    SELECT seq FROM archive_blocks
+                    WHERE session_id = ? AND seq < ? AND first_timestamp <= ?
+                    ORDER BY seq DESC
+                ''', (session_id, blocks, before[0]))]
+        records: List[Dict[str, Any]] = []
+        for index, seq in enumerate(seqs):
+            block = self.read_block(session_id, seq)
+            if before is not None:
+                block = [record for record in block if (record['timestamp'], record['id']) < before]
+            records = block + records
+            if len(records) >= limit:
+                # 更早的块都在游标之前且非空
+                return records[-limit:], len(records) > limit or index + 1 < len(seqs)
+        return records, False
+
+    def iter_session(self, session_id: str, blocks: int) -> Iterator[Dict[str, Any]]:
+        """逐块读取会话的归档消息，不经过缓存（用于导出）"""
+        for seq in range(blocks):
+            with self.db.read() as conn:
+                row = conn.execute(
+                    'SELECT codec, data FROM archive_blocks WHERE session_id = ? AND seq = ?',
+                    (session_id, seq)
+                ).fetchone()
+            if row:
+                yield from decode_block(row[1], row[0])
+
+    def session_ids(self, after: str = '', limit: int = 500) -> List[str]:
+        """按会话ID顺序分批列出归档库中的会话"""
+        if not self._exists():
+            return []
+        with self.db.read() as conn:
+            return [row[0] for row in conn.execute('''
+                SELECT DISTINCT session_id FROM archive_blocks
+                WHERE session_id > ? ORDER BY session_id LIMIT ?
+            ''', (after, limit))]
+
+    def delete_sessions(self, session_ids: List[str]) -> int:
+        """删除会话的归档块
+
+        Returns:
+            删除的块数
+        """
+        session_ids = list(session_ids)
+        if not session_ids or not self._exists():
+            return 0
+        with self.db.write() as conn:
+            deleted = conn.execute(
+                'DELETE FROM archive_blocks WHERE session_id IN (SELECT value FROM json_each(?))',
+                (json.dumps(session_ids),)
+            ).rowcount
+        removed = set(session_ids)
+        with self._cache_lock:
+            for key in [key for key in self._cache if key[0] in removed]:
+                del self._cache[key]
+        return deleted
+
+    def close(self):
+        """关闭归档库连接"""
+        with self._open_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        with self._cache_lock:
+            self._cache.clear()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+最近对话内存缓存模块
+
+每个会话在内存中保留最近N条消息的环形缓冲区，构建LLM上下文时无需访问数据库：
+- 条目使用 __slots__ 紧凑表示，只保存构建上下文需要的字段，不解析时间戳
+- 会话首次访问时从SQLite懒加载，之后随写入同步追加
+- 会话数量超过上限时按LRU淘汰最久未访问的会话
+"""
+
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Iterable, List, Optional
+
+from ..utils.metrics import CACHE_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+
+class Turn:
+    """缓存中的一条消息"""
+
+    __slots__ = ('role', 'content', 'emotion')
+
+    def __init__(self, role: str, content: str, emotion: str = None):
+        self.role = role
+        self.content = content
+        self.emotion = emotion
+
+    def to_context(self) -> dict:
+        """转换为LLM上下文格式"""
+        return {'role': self.role, 'content': self.content}
+
+
+class RecentTurnCache:
+    """按会话的最近消息环形缓冲区（LRU淘汰）"""
+
+    def __init__(self, loader: Callable[[str, int], Iterable], turns_per_session: int = 20,
+                 max_sessions: int = 256):
+        """初始化缓存
+
+        Args:
+            loader: 懒加载函数 loader(会话ID, 条数)，返回按时间正序的消息（需有 role/content/emotion）
+            turns_per_session: 每个会话保留的消息条数
+            max_sessions: 缓存的会话数上限
+        """
+        self.loader = loader
+        self.turns_per_session = max(1, turns_per_session)
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: "OrderedDict[str, Deque[Turn]]" = OrderedDict()
+        # 写入方在落盘/入队与追加缓存期间持有，保证懒加载不会重复或遗漏消息
+        self.lock = threading.RLock()
+        self._hits = CACHE_REQUESTS_TOTAL.labels('recent_turns', 'hit')
+        self._misses = CACHE_REQUESTS_TOTAL.labels('recent_turns', 'miss')
+
+    def get(self, session_id: str, limit: int) -> Optional[List[Turn]]:
+        """获取会话最近的消息（按时间正序）
+
+        Returns:
+            消息列表；limit 超过缓冲区容量时返回None，由调用方回退到数据库
+        """
+        if limit > self.turns_per_session:
+            return None
+        if limit <= 0:
+            return []
+        with self.lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                self._misses.inc()
+                turns = self._load(session_id)
+            else:
+                self._hits.inc()
+                self._sessions.move_to_end(session_id)
+            return list(turns)[-limit:]
+
+    def append(self, message):
+        """追加一条新消息（会话未缓存时忽略，下次访问时懒加载）"""
+        with self.lock:
+            turns = self._sessions.get(message.session_id)
+            if turns is not None:
+                turns.append(Turn(message.role, message.content, message.emotion))
+
+    def discard(self, session_id: str):
+        """移除会话缓存"""
+        with self.lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self._sessions.clear()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _load(self, session_id: str) -> Deque[Turn]:
+        """从数据库加载会话最近的消息，必要时淘汰最久未访问的会话"""
+        turns = deque(
+            (Turn(message.role, message.content, message.emotion)
+             for message in self.loader(session_id, self.turns_per_session)),
+            maxlen=self.turns_per_session,
+        )
+        self._sessions[session_id] = turns
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return turns
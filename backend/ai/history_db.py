@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录数据库连接管理模块
+
+为聊天记录提供常驻的SQLite连接，替代每次操作都 connect/close：
+- WAL日志模式，读操作不会被写事务阻塞
+- synchronous=NORMAL（WAL下每次提交不再fsync两次）与可配置的页缓存
+- 每个连接缓存预编译语句（sqlite3 按SQL文本缓存，调用方应复用同一SQL字符串）
+- 单写连接（线程锁串行化）+ 小型只读连接池
+- 新建数据库使用 auto_vacuum=INCREMENTAL，删除数据后可分批归还空间
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# 只读连接池已满时，每次等待归还的时长（秒），期间检查数据库是否已关闭
+_READER_WAIT_INTERVAL = 0.1
+
+
+class HistoryDatabase:
+    """聊天记录数据库连接管理器"""
+
+    def __init__(self, db_path: str, read_pool_size: int = 2, cache_size_kb: int = 8192,
+                 cached_statements: int = 128, busy_timeout: float = 5.0):
+        """初始化连接管理器
+
+        Args:
+            db_path: 数据库文件路径
+            read_pool_size: 只读连接池大小
+            cache_size_kb: 每个连接的页缓存大小（KB）
+            cached_statements: 每个连接缓存的预编译语句数
+            busy_timeout: 等待数据库锁的超时时间（秒）
+        """
+        self.db_path = db_path
+        self.read_pool_size = max(1, read_pool_size)
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+        # 内存数据库无法跨连接共享，读写都走同一连接
+        self._in_memory = db_path == ':memory:'
+
+        if not self._in_memory:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        # 仅对尚未建表的新数据库生效，已有数据库需一次VACUUM转换
+        self._writer.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        if not self._in_memory:
+            mode = self._writer.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+            if str(mode).lower() != 'wal':
+                logger.warning(f"聊天记录数据库未能切换到WAL模式，当前: {mode}")
+
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._reader_lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        """创建并配置一个连接"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            isolation_level=None,  # 显式 BEGIN/COMMIT 管理事务
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        if readonly:
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """获取写连接并开启事务，正常退出提交，异常时回滚"""
+        with self._write_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("聊天记录数据库已关闭")
+            conn = self._writer
+            if conn.in_transaction:
+                # 嵌套调用并入外层事务
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            else:
+                conn.execute('COMMIT')
+
+    @contextmanager
+    def maintenance(self) -> Iterator[sqlite3.Connection]:
+        """获取写连接但不开启事务（用于 VACUUM 等不能在事务中执行的语句）"""
+        with self._write_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("聊天记录数据库已关闭")
+            yield self._writer
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """从只读连接池借出一个连接"""
+        if self._in_memory:
+            with self._write_lock:
+                yield self._writer
+            return
+
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        """借出只读连接，池未满时按需创建，已满时等待归还"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("聊天记录数据库已关闭")
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._reader_lock:
+            if len(self._all_readers) < self.read_pool_size:
+                conn = self._connect(readonly=True)
+                self._all_readers.append(conn)
+                return conn
+        # 限时等待，以便 close() 之后等待中的线程能够退出
+        while True:
+            try:
+                conn = self._readers.get(timeout=_READER_WAIT_INTERVAL)
+            except queue.Empty:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("聊天记录数据库已关闭")
+                continue
+            if self._closed:
+                conn.close()
+                raise sqlite3.ProgrammingError("聊天记录数据库已关闭")
+            return conn
+
+    def checkpoint(self, mode: str = 'PASSIVE'):
+        """执行WAL检查点，把WAL内容写回主数据库"""
+        if self._in_memory:
+            return
+        with self._write_lock:
+            self._writer.execute(f'PRAGMA wal_checkpoint({mode})')
+
+    def close(self):
+        """关闭所有连接"""
+        with self._write_lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                if not self._in_memory:
+                    self._writer.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.Error as e:
+                logger.warning(f"WAL检查点失败: {e}")
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
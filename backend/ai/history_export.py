@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录流式导出与批量导入模块
+
+用于迁移和备份大体量聊天记录，内存占用与数据量无关：
+- 导出前先等待后写队列落盘，再按 keyset 分批读取（每批单独借出读连接，不会长时间占住WAL快照），
+  逐批编码为 NDJSON 或 CSV，可选 gzip 流式压缩，由调用方边生成边写出
+- NDJSON 先输出会话记录再输出消息记录，可完整还原；CSV 只包含消息
+- 已移入冷归档的消息逐块解压后一并导出（单会话导出时先于在线消息输出）
+- 导入逐行解析（自动识别 gzip），攒满一批后在一个事务中写入；
+  按 (session_id, timestamp, role, content) 跳过已存在的消息，重复导入或中断后重试不会产生重复
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import itertools
+import json
+import logging
+import zlib
+from typing import Any, Dict, Iterator, List, TextIO
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_COLUMNS = ('session_id', 'role', 'content', 'timestamp', 'emotion')
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _iter_sessions(history, session_id: str = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """按目录分批读取会话记录"""
+    last = ''
+    while True:
+        with history.directory.read() as conn:
+            if session_id:
+                rows = conn.execute('''
+                    SELECT session_id, user_id, shard FROM session_directory WHERE session_id = ?
+                ''', (session_id,)).fetchall()
+            else:
+                rows = conn.execute('''
+                    SELECT session_id, user_id, shard FROM session_directory
+                    WHERE session_id > ? ORDER BY session_id LIMIT ?
+                ''', (last, batch_size)).fetchall()
+        if not rows:
+            return
+
+        by_shard: Dict[int, List[str]] = {}
+        owners = {}
+        for sid, owner, index in rows:
+            if index < len(history.shards):
+                by_shard.setdefault(index, []).append(sid)
+                owners[sid] = owner
+        sessions = []
+        for index, session_ids in by_shard.items():
+            sessions.extend(history.shards[index].get_sessions(session_ids))
+        for session in sorted(sessions, key=lambda item: item['id']):
+            yield {
+                'type': 'session',
+                'id': session['id'],
+                'title': session['title'],
+                'user_id': owners.get(session['id']),
+                'created_at': session['created_at'],
+                'updated_at': session['updated_at'],
+            }
+        if session_id or len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def _iter_messages(history, session_id: str = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """逐个分片按 keyset 分批读取消息记录（含归档消息）"""
+    shards = [history.shard_for(session_id)] if session_id else history.shards
+    for shard in shards:
+        # 归档消息早于同一会话的在线消息
+        if session_id:
+            yield from _archived_records(shard, session_id)
+        position = ('', 0) if session_id else (0,)
+        while True:
+            with shard.db.read() as conn:
+                if session_id:
+                    # 走 (session_id, timestamp, id) 索引
+                    rows = conn.execute('''
+                        SELECT id, session_id, role, content, timestamp, emotion
+                        FROM chat_messages
+                        WHERE session_id = ? AND (timestamp, id) > (?, ?)
+                        ORDER BY timestamp, id
+                        LIMIT ?
+                    ''', (session_id, *position, batch_size)).fetchall()
+                else:
+                    rows = conn.execute('''
+                        SELECT id, session_id, role, content, timestamp, emotion
+                        FROM chat_messages
+                        WHERE id > ?
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (*position, batch_size)).fetchall()
+            for row in rows:
+                yield {
+                    'type': 'message',
+                    'session_id': row[1],
+                    'role': row[2],
+                    'content': row[3],
+                    'timestamp': row[4],
+                    'emotion': row[5],
+                }
+            if len(rows) < batch_size:
+                break
+            position = (rows[-1][4], rows[-1][0]) if session_id else (rows[-1][0],)
+        if not session_id:
+            yield from _archived_records(shard)
+
+
+def _archived_records(shard, session_id: str = None) -> Iterator[Dict[str, Any]]:
+    for record in shard.iter_archived_messages(session_id):
+        yield {
+            'type': 'message',
+            'session_id': record['session_id'],
+            'role': record['role'],
+            'content': record['content'],
+            'timestamp': record['timestamp'],
+            'emotion': record['emotion'],
+        }
+
+
+def _batched(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _encode_ndjson(batch: List[Dict[str, Any]]) -> str:
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in batch)
+
+
+def _encode_csv(batch: List[Dict[str, Any]], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    writer.writerows([record.get(column) for column in CSV_COLUMNS] for record in batch)
+    return buffer.getvalue()
+
+
+def export_chunks(history, format: str = 'ndjson', session_id: str = None,
+                  compress: bool = False, batch_size: int = 1000) -> Iterator[bytes]:
+    """流式导出聊天记录
+
+    Args:
+        history: ShardedChatHistory实例
+        format: 'ndjson' 或 'csv'
+        session_id: 只导出指定会话，None表示全部
+        compress: 是否gzip压缩
+        batch_size: 每批读取的行数
+
+    Yields:
+        编码（及压缩）后的数据块
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {format}")
+    # 后写队列中尚未落盘的消息先写入，否则不会出现在导出中
+    history.flush()
+
+    if format == 'ndjson':
+        texts = (_encode_ndjson(batch) for batch in itertools.chain(
+            _batched(_iter_sessions(history, session_id, batch_size), batch_size),
+            _batched(_iter_messages(history, session_id, batch_size), batch_size)))
+    else:
+        texts = itertools.chain(
+            [_encode_csv([], header=True)],
+            (_encode_csv(batch, header=False)
+             for batch in _batched(_iter_messages(history, session_id, batch_size), batch_size)))
+
+    # wbits=31: 输出带gzip头的压缩流
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    for text in texts:
+        data = text.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def open_import_stream(binary) -> TextIO:
+    """把二进制输入包装为文本流，自动识别gzip压缩"""
+    buffered = binary if hasattr(binary, 'peek') else io.BufferedReader(binary)
+    if buffered.peek(2)[:2] == _GZIP_MAGIC:
+        buffered = gzip.GzipFile(fileobj=buffered, mode='rb')
+    return io.TextIOWrapper(buffered, encoding='utf-8', newline='')
+
+
+def _iter_import_records(stream: TextIO, format: str) -> Iterator[Dict[str, Any]]:
+    if format == 'ndjson':
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第{number}行不是有效的JSON: {e}") from e
+            if not isinstance(record, dict):
+                raise ValueError(f"第{number}行不是JSON对象")
+            yield record
+    elif format == 'csv':
+        for row in csv.DictReader(stream):
+            row['type'] = 'message'
+            yield row
+    else:
+        raise ValueError(f"不支持的导入格式: {format}")
+
+
+def import_stream(history, stream: TextIO, format: str = 'ndjson',
+                  batch_size: int = 5000) -> Dict[str, int]:
+    """批量导入聊天记录（阻塞，应在线程中调用）
+
+    Args:
+        history: ShardedChatHistory实例
+        stream: 文本流（见 open_import_stream）
+        format: 'ndjson' 或 'csv'
+        batch_size: 每个事务写入的记录数
+
+    Returns:
+        {'sessions': 新建会话数, 'messages': 实际导入的消息数（已存在的消息跳过）}
+
+    Raises:
+        ValueError: 记录格式无效（此前已提交的批次会保留，修正后重新导入即可）
+    """
+    totals = {'sessions': 0, 'messages': 0}
+    sessions: List[Dict[str, Any]] = []
+    messages: List[Dict[str, Any]] = []
+
+    def flush():
+        if sessions or messages:
+            created, imported = history.import_records(sessions, messages)
+            totals['sessions'] += created
+            totals['messages'] += imported
+            sessions.clear()
+            messages.clear()
+
+    for record in _iter_import_records(stream, format):
+        kind = record.get('type', 'message')
+        if kind == 'session':
+            if not record.get('id'):
+                raise ValueError(f"会话记录缺少id: {record}")
+            sessions.append(record)
+        elif kind == 'message':
+            if not record.get('session_id') or not record.get('role') or record.get('content') is None \
+                    or not record.get('timestamp'):
+                raise ValueError(f"消息记录缺少必要字段: {record}")
+            messages.append(record)
+        else:
+            raise ValueError(f"未知的记录类型: {kind}")
+        if len(sessions) + len(messages) >= batch_size:
+            flush()
+    flush()
+    logger.info(f"聊天记录导入完成: 新建 {totals['sessions']} 个会话，导入 {totals['messages']} 条消息")
+    return totals
+
+
+class StreamReaderFile(io.RawIOBase):
+    """把 asyncio 流（如 aiohttp request.content）包装为同步文件，供工作线程读取
+
+    只能在事件循环之外的线程中使用，每次读取提交到事件循环并等待结果。
+    """
+
+    def __init__(self, reader, loop: asyncio.AbstractEventLoop):
+        self.reader = reader
+        self.loop = loop
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = asyncio.run_coroutine_threadsafe(self.reader.read(len(buffer)), self.loop).result()
+        size = len(data)
+        buffer[:size] = data
+        return size
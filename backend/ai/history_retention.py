@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录保留策略模块
+
+定期删除过期会话并归还磁盘空间：
+- 可选先把较旧的会话移入压缩冷归档（见 history_archive），在线库只保留活跃数据
+- 按会话分批删除，每批一条集合语句删除消息、一条删除会话，
+  每批单独提交并短暂让出写锁，避免长时间阻塞正常写入
+- 删除后分段执行 PRAGMA incremental_vacuum，把空闲页归还给文件系统（仅限已是增量 auto_vacuum 的库）
+- 已有的非增量 auto_vacuum 数据库需要一次完整VACUUM转换，期间独占写锁，
+  只在配置 convert_auto_vacuum 时执行（应安排在维护窗口），否则跳过空间归还
+- 运行次数、删除数量、耗时和归还页数导出为指标
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from ..utils.metrics import (
+    HISTORY_ARCHIVED_TOTAL,
+    RETENTION_DELETED_TOTAL,
+    RETENTION_RUN_SECONDS,
+    RETENTION_VACUUM_PAGES_TOTAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum 的取值
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def delete_expired_sessions(db, days: float, batch_size: int = 200,
+                            pause: float = 0.01, progress=None,
+                            on_deleted=None) -> Tuple[int, int]:
+    """分批删除最后更新时间早于 days 天前的会话及其消息
+
+    Args:
+        db: HistoryDatabase实例
+        days: 保留天数
+        batch_size: 每批删除的会话数
+        pause: 批次之间让出写锁的时间（秒）
+        progress: 可选回调 progress(已删会话数, 已删消息数)
+        on_deleted: 可选回调 on_deleted(本批删除的会话ID列表)，在本批提交后调用
+
+    Returns:
+        (删除的会话数, 删除的消息数)
+    """
+    # 与 CURRENT_TIMESTAMP 写入的 updated_at 使用相同格式（UTC）比较
+    modifier = f'-{float(days)} days'
+    sessions_deleted = 0
+    messages_deleted = 0
+    while True:
+        with db.write() as conn:
+            ids = [row[0] for row in conn.execute('''
+                SELECT id FROM chat_sessions
+                WHERE updated_at < datetime('now', ?)
+                ORDER BY updated_at
+                LIMIT ?
+            ''', (modifier, batch_size))]
+            if not ids:
+                break
+            id_list = json.dumps(ids)
+            messages_deleted += conn.execute(
+                'DELETE FROM chat_messages WHERE session_id IN (SELECT value FROM json_each(?))',
+                (id_list,)
+            ).rowcount
+            sessions_deleted += conn.execute(
+                'DELETE FROM chat_sessions WHERE id IN (SELECT value FROM json_each(?))',
+                (id_list,)
+            ).rowcount
+        if on_deleted is not None:
+            on_deleted(ids)
+        if progress is not None:
+            progress(sessions_deleted, messages_deleted)
+        if len(ids) < batch_size:
+            break
+        # 让出写锁，后写线程等正常写入可以插队
+        time.sleep(pause)
+    return sessions_deleted, messages_deleted
+
+
+def auto_vacuum_mode(db) -> int:
+    """读取数据库当前的 auto_vacuum 模式（0无，1完整，2增量）"""
+    # 读连接可能缓存了旧的文件头，用写连接读取
+    with db.write() as conn:
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+
+
+def incremental_vacuum(db, pages_per_step: int = 1000, pause: float = 0.01) -> int:
+    """分段归还空闲页
+
+    Args:
+        db: HistoryDatabase实例
+        pages_per_step: 每步归还的页数
+        pause: 步骤之间让出写锁的时间（秒）
+
+    Returns:
+        归还的页数
+    """
+    freed = 0
+    while True:
+        with db.write() as conn:
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if before == 0:
+                break
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages_per_step)})').fetchall()
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        freed += before - after
+        if after == 0 or after >= before:
+            break
+        time.sleep(pause)
+    return freed
+
+
+class HistoryRetention:
+    """聊天记录定期清理任务"""
+
+    def __init__(self, history, days: float = 30, interval: float = 3600,
+                 batch_size: int = 200, vacuum_pages: int = 1000, initial_delay: float = 60,
+                 archive_days: float = 0, convert_vacuum: bool = False):
+        """初始化清理任务
+
+        Args:
+            history: ChatHistoryManager实例
+            days: 会话保留天数
+            interval: 运行间隔（秒）
+            batch_size: 每批删除的会话数
+            vacuum_pages: 每步归还的空闲页数
+            initial_delay: 启动后首次运行前的等待时间（秒）
+            archive_days: 会话最后更新超过该天数后移入冷归档，0表示不归档
+            convert_vacuum: 运行时把非增量 auto_vacuum 的库转换为增量（完整VACUUM，长时间独占写锁）
+        """
+        self.history = history
+        self.days = days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.initial_delay = initial_delay
+        self.archive_days = archive_days
+        self.convert_vacuum = convert_vacuum
+        # 已提示过未启用增量 auto_vacuum 的数据库
+        self._vacuum_warned: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._progress = {'sessions_deleted': 0, 'messages_deleted': 0}
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_config(cls, history, retention_config: Dict[str, Any]) -> 'HistoryRetention':
+        """从配置创建清理任务"""
+        return cls(
+            history,
+            days=retention_config.get('days', 30),
+            interval=retention_config.get('interval_hours', 1) * 3600,
+            batch_size=retention_config.get('batch_size', 200),
+            vacuum_pages=retention_config.get('vacuum_pages', 1000),
+            initial_delay=retention_config.get('initial_delay', 60),
+            archive_days=retention_config.get('archive_days', 0),
+            convert_vacuum=retention_config.get('convert_auto_vacuum', False),
+        )
+
+    def ensure_incremental_vacuum(self, db=None) -> bool:
+        """确保数据库使用增量 auto_vacuum，必要时执行一次完整VACUUM转换
+
+        转换期间独占写锁（大库可能需要数分钟），应在维护窗口调用。
+
+        Args:
+            db: HistoryDatabase实例，None则转换全部分片
+
+        Returns:
+            是否执行了转换
+        """
+        if db is None:
+            converted = [self.ensure_incremental_vacuum(shard.db) for shard in self.history.shards]
+            return any(converted)
+        with db.maintenance() as conn:
+            # 读连接可能缓存了旧的文件头，用写连接读取
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == _AUTO_VACUUM_INCREMENTAL:
+                return False
+            logger.info("聊天记录数据库转换为增量 auto_vacuum（执行一次完整VACUUM）...")
+            started = time.perf_counter()
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+        logger.info(f"聊天记录数据库转换完成，耗时 {time.perf_counter() - started:.1f}秒")
+        return True
+
+    def _reclaim_space(self, db) -> int:
+        """归还空闲页；非增量 auto_vacuum 的库跳过（不做完整VACUUM）"""
+        if auto_vacuum_mode(db) == _AUTO_VACUUM_INCREMENTAL:
+            return incremental_vacuum(db, self.vacuum_pages)
+        if db.db_path not in self._vacuum_warned:
+            self._vacuum_warned.add(db.db_path)
+            logger.warning(f"聊天记录数据库未启用增量 auto_vacuum，跳过空间归还: {db.db_path}"
+                           f"（可在维护窗口设置 chat_history.retention.convert_auto_vacuum: true 转换一次）")
+        return 0
+
+    def _report_progress(self, sessions: int, messages: int):
+        self._progress = {'sessions_deleted': sessions, 'messages_deleted': messages}
+
+    def run_once(self) -> Dict[str, Any]:
+        """执行一轮清理（阻塞，应在线程中调用）
+
+        Returns:
+            本轮统计
+        """
+        started = time.perf_counter()
+        self._running = True
+        self._progress = {'sessions_deleted': 0, 'messages_deleted': 0}
+        try:
+            # 先落盘待写消息，避免过期会话被删除后又写回
+            self.history.flush()
+            sessions = messages = pages = archived_sessions = archived_messages = 0
+            # 分片存储时逐个分片清理，每个分片有独立的写锁
+            for shard in self.history.shards:
+                if self.convert_vacuum:
+                    self.ensure_incremental_vacuum(shard.db)
+                # 归档期限短于保留期限时才有意义，先删除过期会话避免归档后立即删除
+                shard_sessions, shard_messages = delete_expired_sessions(
+                    shard.db, self.days, self.batch_size,
+                    progress=lambda s, m, base=(sessions, messages):
+                        self._report_progress(base[0] + s, base[1] + m),
+                    on_deleted=self.history.forget_sessions)
+                sessions += shard_sessions
+                messages += shard_messages
+                if 0 < self.archive_days < self.days:
+                    shard_archived, shard_archived_messages = shard.archive_sessions(self.archive_days)
+                    archived_sessions += shard_archived
+                    archived_messages += shard_archived_messages
+                pages += self._reclaim_space(shard.db)
+        finally:
+            self._running = False
+        duration = time.perf_counter() - started
+
+        RETENTION_RUN_SECONDS.observe(duration)
+        RETENTION_DELETED_TOTAL.labels('sessions').inc(sessions)
+        RETENTION_DELETED_TOTAL.labels('messages').inc(messages)
+        HISTORY_ARCHIVED_TOTAL.labels('sessions').inc(archived_sessions)
+        HISTORY_ARCHIVED_TOTAL.labels('messages').inc(archived_messages)
+        RETENTION_VACUUM_PAGES_TOTAL.inc(pages)
+
+        self.last_run = {
+            'finished_at': time.time(),
+            'duration_seconds': round(duration, 3),
+            'sessions_deleted': sessions,
+            'messages_deleted': messages,
+            'sessions_archived': archived_sessions,
+            'messages_archived': archived_messages,
+            'pages_freed': pages,
+        }
+        logger.info(f"聊天记录清理完成: 删除 {sessions} 个会话、{messages} 条消息，"
+                    f"归档 {archived_sessions} 个会话、{archived_messages} 条消息，"
+                    f"归还 {pages} 页，耗时 {duration:.2f}秒")
+        return self.last_run
+
+    async def _loop(self):
+        await asyncio.sleep(self.initial_delay)
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 删除、归档或VACUUM的任何异常都只影响本轮，下个周期重试
+                logger.error(f"聊天记录清理失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        """启动定期清理任务"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"聊天记录清理任务已启动（保留 {self.days} 天，每 {self.interval / 3600:g} 小时运行）")
+
+    async def stop(self):
+        """停止定期清理任务"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取清理任务状态"""
+        return {
+            'days': self.days,
+            'archive_days': self.archive_days,
+            'interval_seconds': self.interval,
+            'running': self._running,
+            'progress': dict(self._progress) if self._running else None,
+            'last_run': self.last_run,
+        }
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录统计汇总模块
+
+按小时、按天汇总消息数、token数（按角色和情感细分）与新建会话数，并维护总量计数：
+- 汇总由触发器在插入/删除消息和会话的同一事务中增量更新，
+  写入、导入、删除、过期清理等所有路径都保持一致
+- 统计接口读取总量表与最近168个小时桶，耗时与数据量无关
+- token 数为写入时的估算值（中日韩字符按1个、其他按约4个字符1个），保存在 chat_messages.tokens
+"""
+
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+GRANULARITIES = {
+    'hour': 13,  # 'YYYY-MM-DDTHH'
+    'day': 10,   # 'YYYY-MM-DD'
+}
+
+_CJK = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+_WORD = re.compile(r'[^\s\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """估算文本的token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = sum((len(word) + 3) // 4 for word in _WORD.findall(text))
+    return cjk + other
+
+
+# 会话 created_at 为 CURRENT_TIMESTAMP（UTC），转换为本地时间与消息时间戳对齐
+_SESSION_TIME = "replace(datetime({col}, 'localtime'), ' ', 'T')"
+
+
+def create_rollups(conn: sqlite3.Connection):
+    """创建汇总表与触发器，并根据已有数据回填"""
+    conn.create_function('estimate_tokens', 1, estimate_tokens, deterministic=True)
+    conn.execute('UPDATE chat_messages SET tokens = estimate_tokens(content)')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS message_rollups (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            role TEXT NOT NULL,
+            emotion TEXT NOT NULL,
+            messages INTEGER NOT NULL DEFAULT 0,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket, role, emotion)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_rollups (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS history_totals (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+    # 回填
+    for granularity, width in GRANULARITIES.items():
+        conn.execute(f'''
+            INSERT INTO message_rollups (granularity, bucket, role, emotion, messages, tokens)
+            SELECT ?, substr(timestamp, 1, {width}), role, COALESCE(emotion, ''), COUNT(*), SUM(tokens)
+            FROM chat_messages
+            GROUP BY 2, 3, 4
+        ''', (granularity,))
+        conn.execute(f'''
+            INSERT INTO session_rollups (granularity, bucket, sessions)
+            SELECT ?, substr({_SESSION_TIME.format(col='created_at')}, 1, {width}), COUNT(*)
+            FROM chat_sessions
+            GROUP BY 2
+        ''', (granularity,))
+    conn.execute('''
+        INSERT INTO history_totals (name, value) VALUES
+            ('messages', (SELECT COUNT(*) FROM chat_messages)),
+            ('tokens', (SELECT COALESCE(SUM(tokens), 0) FROM chat_messages)),
+            ('sessions', (SELECT COUNT(*) FROM chat_sessions))
+    ''')
+
+    message_buckets = ', '.join(
+        f"('{granularity}', substr(new.timestamp, 1, {width}), new.role, COALESCE(new.emotion, ''), 1, new.tokens)"
+        for granularity, width in GRANULARITIES.items())
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_rollup_insert AFTER INSERT ON chat_messages BEGIN
+            INSERT INTO message_rollups (granularity, bucket, role, emotion, messages, tokens)
+            VALUES {message_buckets}
+            ON CONFLICT (granularity, bucket, role, emotion) DO UPDATE SET
+                messages = messages + excluded.messages,
+                tokens = tokens + excluded.tokens;
+            UPDATE history_totals SET value = value + 1 WHERE name = 'messages';
+            UPDATE history_totals SET value = value + new.tokens WHERE name = 'tokens';
+        END
+    ''')
+    create_message_delete_trigger(conn)
+
+    session_time = _SESSION_TIME.format(col='new.created_at')
+    session_buckets = ', '.join(
+        f"('{granularity}', substr({session_time}, 1, {width}), 1)"
+        for granularity, width in GRANULARITIES.items())
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS chat_sessions_rollup_insert AFTER INSERT ON chat_sessions BEGIN
+            INSERT INTO session_rollups (granularity, bucket, sessions)
+            VALUES {session_buckets}
+            ON CONFLICT (granularity, bucket) DO UPDATE SET sessions = sessions + 1;
+            UPDATE history_totals SET value = value + 1 WHERE name = 'sessions';
+        END
+    ''')
+    old_session_time = _SESSION_TIME.format(col='old.created_at')
+    session_deletes = ' OR '.join(
+        f"(granularity = '{granularity}' AND bucket = substr({old_session_time}, 1, {width}))"
+        for granularity, width in GRANULARITIES.items())
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS chat_sessions_rollup_delete AFTER DELETE ON chat_sessions BEGIN
+            UPDATE session_rollups SET sessions = sessions - 1 WHERE {session_deletes};
+            UPDATE history_totals SET value = value - 1 WHERE name = 'sessions';
+        END
+    ''')
+
+
+def create_message_delete_trigger(conn: sqlite3.Connection, when: str = None):
+    """创建删除消息时回减汇总的触发器
+
+    Args:
+        conn: 数据库连接
+        when: 可选的触发条件（SQL表达式，可引用 old），不满足时删除不影响汇总
+    """
+    delete_buckets = ' OR '.join(
+        f"(granularity = '{granularity}' AND bucket = substr(old.timestamp, 1, {width}))"
+        for granularity, width in GRANULARITIES.items())
+    condition = f'WHEN {when}' if when else ''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_rollup_delete AFTER DELETE ON chat_messages {condition} BEGIN
+            UPDATE message_rollups SET messages = messages - 1, tokens = tokens - old.tokens
+            WHERE ({delete_buckets}) AND role = old.role AND emotion = COALESCE(old.emotion, '');
+            UPDATE history_totals SET value = value - 1 WHERE name = 'messages';
+            UPDATE history_totals SET value = value - old.tokens WHERE name = 'tokens';
+        END
+    ''')
+
+
+def read_totals(conn: sqlite3.Connection) -> Dict[str, int]:
+    """读取总量计数"""
+    return dict(conn.execute('SELECT name, value FROM history_totals').fetchall())
+
+
+def read_recent_messages(conn: sqlite3.Connection, hours: int = 168) -> int:
+    """最近若干小时的消息数（按小时桶汇总）"""
+    since = (datetime.now() - timedelta(hours=hours)).isoformat()[:GRANULARITIES['hour']]
+    return conn.execute('''
+        SELECT COALESCE(SUM(messages), 0) FROM message_rollups
+        WHERE granularity = 'hour' AND bucket > ?
+    ''', (since,)).fetchone()[0]
+
+
+def read_timeseries(conn: sqlite3.Connection, granularity: str, since: str,
+                    until: str = None) -> Dict[str, Dict[str, Any]]:
+    """读取时间序列
+
+    Args:
+        conn: 数据库连接
+        granularity: 'hour' 或 'day'
+        since: 起始桶（含），如 '2024-01-01' 或 '2024-01-01T08'
+        until: 结束桶（含），None表示至今
+
+    Returns:
+        桶 -> {'messages', 'tokens', 'sessions', 'by_role', 'by_emotion'}
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"不支持的时间粒度: {granularity}")
+    # 结束桶按前缀包含（如按小时查询时 until='2024-01-02' 包含当天所有小时）
+    until = (until or '9999') + '\uffff'
+    series: Dict[str, Dict[str, Any]] = {}
+
+    def bucket(key):
+        return series.setdefault(key, {'messages': 0, 'tokens': 0, 'sessions': 0,
+                                       'by_role': {}, 'by_emotion': {}})
+
+    for key, role, emotion, messages, tokens in conn.execute('''
+        SELECT bucket, role, emotion, messages, tokens FROM message_rollups
+        WHERE granularity = ? AND bucket >= ? AND bucket <= ? AND messages > 0
+    ''', (granularity, since, until)):
+        item = bucket(key)
+        item['messages'] += messages
+        item['tokens'] += tokens
+        item['by_role'][role] = item['by_role'].get(role, 0) + messages
+        emotion = emotion or 'none'
+        item['by_emotion'][emotion] = item['by_emotion'].get(emotion, 0) + messages
+
+    for key, sessions in conn.execute('''
+        SELECT bucket, sessions FROM session_rollups
+        WHERE granularity = ? AND bucket >= ? AND bucket <= ? AND sessions > 0
+    ''', (granularity, since, until)):
+        bucket(key)['sessions'] += sessions
+    return series
+
+
+def merge_timeseries(parts: List[Dict[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """合并多个分片的时间序列，按桶排序"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for part in parts:
+        for key, item in part.items():
+            target = merged.setdefault(key, {'bucket': key, 'messages': 0, 'tokens': 0, 'sessions': 0,
+                                             'by_role': {}, 'by_emotion': {}})
+            for field in ('messages', 'tokens', 'sessions'):
+                target[field] += item[field]
+            for field in ('by_role', 'by_emotion'):
+                for name, count in item[field].items():
+                    target[field][name] = target[field].get(name, 0) + count
+    return [merged[key] for key in sorted(merged)]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录全文检索模块
+
+基于 SQLite FTS5 的 trigram 分词器建立消息内容索引，中文无需分词器：
+- 外部内容表（content='chat_messages'），索引不重复保存消息正文
+- 触发器在插入、删除、修改消息时同步索引
+- 检索结果按 bm25 排序，返回高亮片段，使用 (rank, id) keyset 游标分页
+- trigram 至少需要3个字符，更短的关键词退化为 LIKE 扫描（按时间倒序）
+"""
+
+import html
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'chat_messages_fts'
+
+# 高亮标记先用私有区字符占位，HTML转义后再替换，避免消息内容注入标签
+_MARK_OPEN = '\ue000'
+_MARK_CLOSE = '\ue001'
+_ELLIPSIS = '…'
+_SNIPPET_TOKENS = 16
+
+
+def create_fts_index(conn: sqlite3.Connection) -> bool:
+    """创建全文索引、同步触发器，并为已有消息建立索引
+
+    Returns:
+        是否创建成功（SQLite 不支持 FTS5 trigram 时返回False）
+    """
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                content,
+                content='chat_messages',
+                content_rowid='id',
+                tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"当前SQLite不支持FTS5 trigram，全文检索不可用: {e}")
+        return False
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO {FTS_TABLE} (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    # 为迁移前已有的消息建立索引
+    conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def fts_available(conn: sqlite3.Connection) -> bool:
+    """检查全文索引表是否存在"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).fetchone() is not None
+
+
+def _terms(query: str) -> List[str]:
+    return [term for term in query.split() if term]
+
+
+def _match_expression(terms: List[str]) -> str:
+    """把关键词转换为FTS5短语查询（AND连接），避免用户输入被解析为查询语法"""
+    return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _render_snippet(raw: str) -> str:
+    """HTML转义片段并把占位标记替换为<mark>"""
+    return html.escape(raw).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def _highlight(content: str, terms: List[str], width: int = 24) -> str:
+    """为LIKE检索结果生成高亮片段"""
+    lowered = content.lower()
+    positions = [(lowered.find(term.lower()), term) for term in terms]
+    positions = [(pos, term) for pos, term in positions if pos >= 0]
+    if not positions:
+        return html.escape(content[:width * 2])
+    first = min(pos for pos, _ in positions)
+    start = max(0, first - width)
+    end = min(len(content), first + width)
+    piece = content[start:end]
+    for term in sorted({term for _, term in positions}, key=len, reverse=True):
+        index = piece.lower().find(term.lower())
+        while index >= 0:
+            piece = piece[:index] + _MARK_OPEN + piece[index:index + len(term)] + _MARK_CLOSE + piece[index + len(term):]
+            index = piece.lower().find(term.lower(), index + len(term) + 2)
+    prefix = _ELLIPSIS if start > 0 else ''
+    suffix = _ELLIPSIS if end < len(content) else ''
+    return _render_snippet(prefix + piece + suffix)
+
+
+def search_messages(conn: sqlite3.Connection, query: str, limit: int = 20,
+                    after: Optional[tuple] = None, session_id: str = None) -> Dict[str, Any]:
+    """检索消息内容
+
+    Args:
+        conn: 数据库连接
+        query: 关键词（空白分隔，全部命中）
+        limit: 每页数量
+        after: 上一页最后一条的 (rank, id)，None表示第一页
+        session_id: 只在指定会话内检索
+
+    Returns:
+        {'results': 命中列表, 'last': 本页最后一条的 (rank, id)，没有更多时为None, 'mode': 'fts' 或 'like'}
+    """
+    terms = _terms(query)
+    if not terms:
+        return {'results': [], 'last': None, 'mode': 'fts'}
+
+    params: list = []
+    filters = []
+    if session_id:
+        filters.append('m.session_id = ?')
+
+    # trigram 需要每个关键词至少3个字符才能走索引
+    if all(len(term) >= 3 for term in terms):
+        mode = 'fts'
+        sql = f'''
+            SELECT m.id, m.session_id, s.title, m.role, m.timestamp,
+                   snippet({FTS_TABLE}, 0, ?, ?, ?, {_SNIPPET_TOKENS}), {FTS_TABLE}.rank
+            FROM {FTS_TABLE}
+            JOIN chat_messages m ON m.id = {FTS_TABLE}.rowid
+            LEFT JOIN chat_sessions s ON s.id = m.session_id
+            WHERE {FTS_TABLE} MATCH ?
+        '''
+        params = [_MARK_OPEN, _MARK_CLOSE, _ELLIPSIS, _match_expression(terms)]
+        if session_id:
+            params.append(session_id)
+        if after is not None:
+            filters.append(f'({FTS_TABLE}.rank, m.id) > (?, ?)')
+            params.extend(after)
+        if filters:
+            sql += ' AND ' + ' AND '.join(filters)
+        sql += f' ORDER BY {FTS_TABLE}.rank, m.id LIMIT ?'
+    else:
+        mode = 'like'
+        sql = '''
+            SELECT m.id, m.session_id, s.title, m.role, m.timestamp, m.content, 0
+            FROM chat_messages m
+            LEFT JOIN chat_sessions s ON s.id = m.session_id
+            WHERE
+        '''
+        like_filters = []
+        for term in terms:
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            like_filters.append("m.content LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+        if session_id:
+            params.append(session_id)
+        if after is not None:
+            filters.append('m.id < ?')
+            params.append(after[1])
+        sql += ' AND '.join(like_filters + filters)
+        sql += ' ORDER BY m.id DESC LIMIT ?'
+    params.append(limit)
+
+    rows = conn.execute(sql, params).fetchall()
+    results = []
+    for message_id, sid, title, role, timestamp, text, rank in rows:
+        snippet = _render_snippet(text) if mode == 'fts' else _highlight(text, terms)
+        results.append({
+            'id': message_id,
+            'session_id': sid,
+            'session_title': title,
+            'role': role,
+            'timestamp': timestamp,
+            'snippet': snippet,
+            'rank': rank if mode == 'fts' else None,
+        })
+
+    last = None
+    if len(rows) == limit:
+        last = (rows[-1][6], rows[-1][0])
+    return {'results': results, 'last': last, 'mode': mode}
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录后写（write-behind）模块
+
+add_message 只把消息放入队列后立即返回，由专用线程批量落盘：
+- 达到批量大小或等待时间阈值时，一个事务写入整批消息
+- 同一会话的 message_count 更新合并为一条 UPDATE
+- 尚未落盘的消息保留在待写视图中，读取当前会话时合并返回（读己之写）
+- 写入失败时按退避间隔一直重试，消息保留在待写视图中，不会被丢弃
+- 关闭时同步刷盘，保证已接收的消息不丢失
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ..utils.metrics import HISTORY_WRITE_BATCH_SIZE, HISTORY_WRITE_FAILURES_TOTAL, HISTORY_WRITE_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# 停止标记
+_STOP = object()
+
+
+class _FlushRequest:
+    """刷盘请求，写线程处理完之前的消息后置位"""
+
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class HistoryWriter:
+    """聊天记录后写线程"""
+
+    def __init__(self, history, batch_size: int = 64, flush_interval: float = 0.05,
+                 retry_backoff: float = 0.1, max_backoff: float = 5.0):
+        """初始化后写线程
+
+        Args:
+            history: ChatHistoryManager实例（提供 write_messages）
+            batch_size: 单个事务最多写入的消息数
+            flush_interval: 收到第一条消息后最多等待凑批的时间（秒）
+            retry_backoff: 写入失败后首次重试前的等待时间（秒），之后每次加倍
+            max_backoff: 重试等待时间上限（秒）
+        """
+        self.history = history
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+
+        self._queue: "queue.Queue" = queue.Queue()
+        # 待写视图: 会话ID -> 尚未落盘的消息（按提交顺序）
+        self._pending: Dict[str, list] = {}
+        self._pending_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def start(self):
+        """启动写线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, message):
+        """提交一条待写消息（不阻塞）"""
+        if self._closed:
+            raise RuntimeError("聊天记录写线程已关闭")
+        with self._pending_lock:
+            self._pending.setdefault(message.session_id, []).append(message)
+        self._queue.put(message)
+        HISTORY_WRITE_QUEUE_DEPTH.inc()
+
+    def pending(self, session_id: str) -> list:
+        """获取指定会话尚未落盘的消息"""
+        with self._pending_lock:
+            return list(self._pending.get(session_id, ()))
+
+    def pending_count(self) -> int:
+        """尚未落盘的消息总数"""
+        with self._pending_lock:
+            return sum(len(messages) for messages in self._pending.values())
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前提交的消息全部落盘
+
+        Returns:
+            是否在超时前完成
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self.pending_count() == 0
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """刷盘并停止写线程"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.error(f"聊天记录写线程未在{timeout}秒内退出，仍有 {self.pending_count()} 条消息未落盘")
+
+    def _run(self):
+        """写线程主循环"""
+        while True:
+            batch: List = []
+            flush_requests: List[_FlushRequest] = []
+            stop = False
+
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _FlushRequest):
+                    flush_requests.append(item)
+                else:
+                    batch.append(item)
+
+                # 停止/刷盘请求立即写出；否则凑满批量或等到时间阈值
+                if stop or flush_requests or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if stop:
+                # 把队列中剩余的消息一并写出
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _FlushRequest):
+                        flush_requests.append(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+
+            for start in range(0, len(batch), self.batch_size):
+                self._write(batch[start:start + self.batch_size])
+            for request in flush_requests:
+                request.done.set()
+            if stop:
+                return
+
+    def _write(self, batch: list):
+        """写入一批消息，失败时按退避间隔重试直到成功
+
+        重试期间消息留在待写视图中（读己之写仍然成立），后续消息在队列中等待，保持提交顺序。
+        """
+        attempt = 0
+        while True:
+            try:
+                self.history.write_messages(batch)
+                # 先落盘再移出待写视图，读取方总能在其中之一看到这条消息
+                self._forget(batch)
+                break
+            except Exception as e:
+                attempt += 1
+                HISTORY_WRITE_FAILURES_TOTAL.inc()
+                delay = min(self.max_backoff, self.retry_backoff * 2 ** (attempt - 1))
+                log = logger.warning if attempt < 3 else logger.error
+                log(f"聊天记录批量写入失败（第{attempt}次，{len(batch)} 条消息），{delay:.1f}秒后重试: {e}")
+                time.sleep(delay)
+        HISTORY_WRITE_BATCH_SIZE.observe(len(batch))
+        HISTORY_WRITE_QUEUE_DEPTH.dec(len(batch))
+
+    def _forget(self, batch: list):
+        """从待写视图中移除已处理的消息"""
+        with self._pending_lock:
+            for message in batch:
+                messages = self._pending.get(message.session_id)
+                if not messages:
+                    continue
+                try:
+                    messages.remove(message)
+                except ValueError:
+                    pass
+                if not messages:
+                    del self._pending[message.session_id]
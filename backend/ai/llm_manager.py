@@ -16,6 +16,7 @@ from typing import Dict, List, Any, Optional, Generator
 # 暂时使用相对导入，等待后续重构阶段处理
 from ..core.config import ConfigManager
 from .chat_history import chat_history
+from ..utils.metrics import CACHE_REQUESTS_TOTAL, LLM_REQUEST_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -532,13 +533,18 @@ class LLMManager:
         else:
             logger.error(f"不支持的LLM提供商: {provider_name}")
     
-    def generate_chat_response(self, user_message: str) -> Dict[str, Any]:
-        """生成聊天回复"""
+    def generate_chat_response(self, user_message: str, session_id: str = None) -> Dict[str, Any]:
+        """生成聊天回复
+
+        Args:
+            user_message: 用户消息
+            session_id: 会话ID，None则使用默认会话
+        """
         try:
             logger.info(f"处理用户消息: {user_message}")
             
             # 获取聊天历史
-            history = chat_history.get_recent_messages(limit=3)  # 减少历史消息数量提升速度
+            history = chat_history.get_recent_messages(limit=3, session_id=session_id)  # 减少历史消息数量提升速度
             
             # 构建消息列表，添加系统prompt
             messages = []
@@ -566,26 +572,30 @@ class LLMManager:
             # 检查提供商可用性（使用缓存避免重复检查）
             if not hasattr(self, '_last_availability_check') or \
                time.time() - self._last_availability_check > 60:  # 1分钟缓存
+                CACHE_REQUESTS_TOTAL.labels('llm_availability', 'miss').inc()
                 self._provider_available = self.current_provider.is_available()
                 self._last_availability_check = time.time()
+            else:
+                CACHE_REQUESTS_TOTAL.labels('llm_availability', 'hit').inc()
             
             if not self._provider_available:
                 logger.warning("LLM提供商不可用，使用默认回复")
                 return self._get_fallback_response()
             
             # 调用LLM生成回复 - 使用优化参数
-            response = self.current_provider.generate_response(
-                messages,
-                max_tokens=150,  # 减少最大token数量提升速度
-                temperature=0.8,  # 稍微提高创造性
-                top_p=0.9,
-                stream=False
-            )
+            with LLM_REQUEST_SECONDS.labels(self.config_manager.config.get('llm', {}).get('provider', 'qwen')).time():
+                response = self.current_provider.generate_response(
+                    messages,
+                    max_tokens=150,  # 减少最大token数量提升速度
+                    temperature=0.8,  # 稍微提高创造性
+                    top_p=0.9,
+                    stream=False
+                )
             
             if response.get('success', False):
-                # 保存到聊天历史
-                chat_history.add_message('user', user_message)
-                chat_history.add_message('assistant', response['text'])
+                # 保存到聊天历史（后写模式下仅入队，由后台线程批量落盘）
+                chat_history.add_message('user', user_message, session_id=session_id)
+                chat_history.add_message('assistant', response['text'], session_id=session_id)
                 
                 logger.info(f"LLM响应: {response}")
                 return response
@@ -12,8 +12,12 @@ import asyncio
 import aiohttp
 import json
 import requests
+import time
 from typing import Dict, Any, Optional, List
 
+from ..utils.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS
+from ..utils.tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 class QwenClient:
@@ -88,58 +92,65 @@ class QwenClient:
         Returns:
             生成的回复文本
         """
-        try:
-            # 构建请求数据
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": kwargs.get("temperature", self.temperature),
-                "max_tokens": kwargs.get("max_tokens", self.max_tokens),
-                "top_p": kwargs.get("top_p", 0.8)
-            }
+        with tracer.span("qwen_client.chat_completion", model=self.model):
+            try:
+                # 构建请求数据
+                data = {
+                    "model": self.model,
+                    "messages": messages,
+                    "temperature": kwargs.get("temperature", self.temperature),
+                    "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+                    "top_p": kwargs.get("top_p", 0.8)
+                }
             
-            logger.info(f"🤖 发送Qwen API请求: {len(messages)}条消息")
-            logger.debug(f"请求数据: {json.dumps(data, ensure_ascii=False)}")
+                logger.info(f"🤖 发送Qwen API请求: {len(messages)}条消息")
+                logger.debug(f"请求数据: {json.dumps(data, ensure_ascii=False)}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=data,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
+                started = time.perf_counter()
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(
+                        f"{self.base_url}/chat/completions",
+                        headers=self.headers,
+                        json=data,
+                        timeout=aiohttp.ClientTimeout(total=30)
+                    ) as response:
                     
-                    if response.status == 200:
-                        result = await response.json()
+                        if response.status == 200:
+                            # 非流式请求：以响应首字节近似首token延迟
+                            LLM_FIRST_TOKEN_SECONDS.labels('qwen').observe(time.perf_counter() - started)
+                            tracer.event("llm_first_byte")
+                            result = await response.json()
+                            LLM_REQUEST_SECONDS.labels('qwen').observe(time.perf_counter() - started)
                         
-                        # 提取回复内容
-                        if "choices" in result and len(result["choices"]) > 0:
-                            content = result["choices"][0]["message"]["content"]
+                            # 提取回复内容
+                            if "choices" in result and len(result["choices"]) > 0:
+                                content = result["choices"][0]["message"]["content"]
                             
-                            # 记录Token使用情况
-                            if "usage" in result:
-                                usage = result["usage"]
-                                logger.info(f"✅ Qwen API调用成功 - 输入:{usage.get('prompt_tokens', 0)} 输出:{usage.get('completion_tokens', 0)} Token")
+                                # 记录Token使用情况
+                                if "usage" in result:
+                                    usage = result["usage"]
+                                    logger.info(f"✅ Qwen API调用成功 - 输入:{usage.get('prompt_tokens', 0)} 输出:{usage.get('completion_tokens', 0)} Token")
+                            
+                                logger.info(f"🎯 Qwen回复: {content[:100]}...")
+                                return content
+                            else:
+                                logger.error("❌ Qwen API返回格式异常，缺少choices")
+                                return None
                             
-                            logger.info(f"🎯 Qwen回复: {content[:100]}...")
-                            return content
                         else:
-                            logger.error("❌ Qwen API返回格式异常，缺少choices")
+                            error_text = await response.text()
+                            logger.error(f"❌ Qwen API请求失败: {response.status} - {error_text}")
                             return None
-                            
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"❌ Qwen API请求失败: {response.status} - {error_text}")
-                        return None
                         
-        except asyncio.TimeoutError:
-            logger.error("❌ Qwen API请求超时")
-            return None
-        except Exception as e:
-            logger.error(f"❌ Qwen API调用异常: {e}")
-            return None
+            except asyncio.TimeoutError:
+                logger.error("❌ Qwen API请求超时")
+                return None
+            except Exception as e:
+                logger.error(f"❌ Qwen API调用异常: {e}")
+                return None
     
-    async def generate_response(self, user_message: str, character_name: str = "小雨", character_personality: str = None) -> Optional[str]:
+    async def generate_response(self, user_message: str, character_name: str = "小雨", character_personality: str = None,
+                                history: List[Dict[str, str]] = None) -> Optional[str]:
         """
         生成角色回复
         
@@ -147,6 +158,7 @@ class QwenClient:
             user_message: 用户消息
             character_name: 角色名称
             character_personality: 角色性格描述
+            history: 当前会话最近的对话（按时间正序，{'role', 'content'}）
             
         Returns:
             生成的回复
@@ -159,6 +171,7 @@ class QwenClient:
                 "role": "system", 
                 "content": character_personality
             },
+            *(history or []),
             {
                 "role": "user", 
                 "content": user_message
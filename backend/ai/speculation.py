@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于ASR中间结果的LLM预测执行模块
+
+流式识别时，中间结果在 stable_ms 内没有变化就提前用它发起LLM请求：
+- 中间结果变化时取消进行中的预测（discarded），稳定后重新发起
+- 最终结果与预测所用文本一致（忽略空白和句末标点）时直接采用预测的回复（hit）；
+  不一致时取消预测，由调用方按最终结果重新请求（miss）
+- 命中时节省的时间 = min(LLM耗时, 最终结果到达时刻 - 预测开始时刻)
+- 结果计入 llm_speculation{outcome} 与 llm_speculation_saved_seconds 指标
+"""
+
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..utils.metrics import LLM_SPECULATION_SAVED_SECONDS, LLM_SPECULATION_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# 比较文本时忽略的空白与句末标点
+_IGNORED = re.compile(r'[\s，。！？、,.!?;；…~]+')
+
+
+def normalize_transcript(text: Optional[str]) -> str:
+    """归一化识别文本，用于判断预测是否命中"""
+    return _IGNORED.sub('', text or '')
+
+
+class SpeculativeReply:
+    """一次发言的预测执行（每个流式识别会话一个实例）"""
+
+    def __init__(self, generate: Callable[[str], Awaitable[str]], stable_ms: float = 400,
+                 min_chars: int = 2):
+        """初始化
+
+        Args:
+            generate: 生成回复的协程函数 (用户消息) -> 回复文本
+            stable_ms: 中间结果保持不变多久后发起预测
+            min_chars: 发起预测所需的最少字数（归一化后）
+        """
+        self.generate = generate
+        self.stable_seconds = stable_ms / 1000
+        self.min_chars = min_chars
+        self.candidate = ''
+        self.started_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, generate: Callable[[str], Awaitable[str]],
+                    speculative_config: Dict[str, Any]) -> 'SpeculativeReply':
+        """从配置（asr.speculative）创建"""
+        return cls(generate,
+                   stable_ms=speculative_config.get('stable_ms', 400),
+                   min_chars=speculative_config.get('min_chars', 2))
+
+    def update(self, partial: str):
+        """收到新的中间结果"""
+        normalized = normalize_transcript(partial)
+        if normalized == normalize_transcript(self.candidate):
+            return
+        self.candidate = partial
+        self._cancel_timer()
+        if self.task is not None:
+            # 文本已变化，进行中的预测作废
+            self._cancel_task('discarded')
+        if len(normalized) >= self.min_chars:
+            self._timer = asyncio.create_task(self._start_when_stable(partial))
+
+    async def _start_when_stable(self, text: str):
+        await asyncio.sleep(self.stable_seconds)
+        self._timer = None
+        self.started_at = time.perf_counter()
+        self.task = asyncio.create_task(self.generate(text))
+        logger.debug(f"中间结果已稳定，提前请求LLM: {text}")
+
+    def resolve(self, final: Optional[str]) -> Optional[Awaitable[str]]:
+        """最终结果到达
+
+        Returns:
+            命中时返回产生回复文本的awaitable，否则返回None（预测已取消）
+        """
+        self._cancel_timer()
+        if self.task is None:
+            return None
+        if not final or normalize_transcript(final) != normalize_transcript(self.candidate):
+            self._cancel_task('miss')
+            return None
+        LLM_SPECULATION_TOTAL.labels('hit').inc()
+        task, self.task = self.task, None
+        return self._await_hit(task, self.started_at, time.perf_counter())
+
+    @staticmethod
+    async def _await_hit(task: asyncio.Task, started_at: float, final_at: float) -> str:
+        text = await task
+        saved = min(time.perf_counter() - started_at, final_at - started_at)
+        LLM_SPECULATION_SAVED_SECONDS.observe(saved)
+        logger.info(f"LLM预测命中，节省 {saved * 1000:.0f} 毫秒")
+        return text
+
+    def cancel(self):
+        """放弃预测（如连接断开）"""
+        self._cancel_timer()
+        if self.task is not None:
+            self._cancel_task('discarded')
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _cancel_task(self, outcome: str):
+        if self.task.done() and not self.task.cancelled():
+            # 已完成的预测结果不再需要（取出异常以免告警）
+            self.task.exception()
+        self.task.cancel()
+        self.task = None
+        LLM_SPECULATION_TOTAL.labels(outcome).inc()
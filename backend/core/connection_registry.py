@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket连接注册表模块
+
+多进程模式下各工作进程只持有自己的连接对象，
+注册表用SQLite（WAL模式）记录所有进程的连接，供状态接口汇总
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from .workers import current_worker_id
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionRegistry:
+    """跨进程WebSocket连接注册表"""
+
+    def __init__(self, db_path: str, worker_id: Optional[int] = None):
+        """初始化连接注册表
+
+        Args:
+            db_path: 注册表数据库路径（所有工作进程共用）
+            worker_id: 工作进程编号，默认读取环境变量
+        """
+        self.db_path = db_path
+        self.worker_id = current_worker_id() if worker_id is None else worker_id
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=10, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS ws_connections (
+                conn_id TEXT PRIMARY KEY,
+                worker_id INTEGER NOT NULL,
+                pid INTEGER NOT NULL,
+                remote TEXT,
+                connected_at REAL NOT NULL
+            )
+        ''')
+        # 清理本工作进程上一次运行（崩溃或重启前）遗留的记录
+        self._conn.execute('DELETE FROM ws_connections WHERE worker_id = ?', (self.worker_id,))
+
+    def register(self, conn_id: str, remote: str = None):
+        """登记一个新连接"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ws_connections (conn_id, worker_id, pid, remote, connected_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (conn_id, self.worker_id, self.pid, remote, time.time())
+            )
+
+    def unregister(self, conn_id: str):
+        """注销连接"""
+        with self._lock:
+            self._conn.execute('DELETE FROM ws_connections WHERE conn_id = ?', (conn_id,))
+
+    def count_by_worker(self) -> Dict[int, int]:
+        """统计各工作进程的连接数"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT worker_id, COUNT(*) FROM ws_connections GROUP BY worker_id'
+            ).fetchall()
+        return {worker_id: count for worker_id, count in rows}
+
+    def count(self) -> int:
+        """统计所有工作进程的连接总数"""
+        return sum(self.count_by_worker().values())
+
+    def close(self):
+        """注销本进程的全部连接并关闭数据库"""
+        with self._lock:
+            try:
+                self._conn.execute('DELETE FROM ws_connections WHERE pid = ?', (self.pid,))
+                self._conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"关闭连接注册表失败: {e}")
@@ -1,13 +1,16 @@
 import json
 from uuid import uuid4
-import numpy as np
 from datetime import datetime
 from fastapi import APIRouter, WebSocket, UploadFile, File, Response
 from starlette.websockets import WebSocketDisconnect
 from loguru import logger
 from ..utils.service_context import ServiceContext
+from ..voice.audio_ingest import AudioClip
 from .websocket_handler import WebSocketHandler
 
+# Sample rate expected by asr_engine.async_transcribe_np
+ASR_SAMPLE_RATE = 16000
+
 
 def init_client_ws_route(default_context_cache: ServiceContext) -> APIRouter:
     """
@@ -75,28 +78,9 @@ def init_webtool_routes(default_context_cache: ServiceContext) -> APIRouter:
         try:
             contents = await file.read()
 
-            # Validate minimum file size
-            if len(contents) < 44:  # Minimum WAV header size
-                raise ValueError("Invalid WAV file: File too small")
-
-            # Decode the WAV header and get actual audio data
-            wav_header_size = 44  # Standard WAV header size
-            audio_data = contents[wav_header_size:]
-
-            # Validate audio data size
-            if len(audio_data) % 2 != 0:
-                raise ValueError("Invalid audio data: Buffer size must be even")
-
-            # Convert to 16-bit PCM samples to float32
-            try:
-                audio_array = (
-                    np.frombuffer(audio_data, dtype=np.int16).astype(np.float32)
-                    / 32768.0
-                )
-            except ValueError as e:
-                raise ValueError(
-                    f"Audio format error: {str(e)}. Please ensure the file is 16-bit PCM WAV format."
-                )
+            # Parse RIFF chunks (any header layout, PCM/float, any rate or
+            # channel count) and resample to the engine's 16 kHz mono float32
+            audio_array = AudioClip.from_bytes(contents).to_float32(ASR_SAMPLE_RATE)
 
             # Validate audio data
             if len(audio_array) == 0:
@@ -1,10 +1,14 @@
 import asyncio
+import functools
 import json
 import logging
 import os
 import mimetypes
+import uuid
+from contextlib import aclosing
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Awaitable, Dict, List, Optional, Union
 
 import aiohttp
 from aiohttp import web
@@ -14,13 +18,42 @@ from ..live2d.live2d_model import Live2DModel
 from ..live2d.model_controller import ModelController
 from ..ai.llm_manager import llm_manager
 from .config import ConfigManager
+from .connection_registry import ConnectionRegistry
+from .workers import current_worker_id
 from ..ai.chat_history import chat_history
+from ..ai.history_export import (
+    EXPORT_FORMATS,
+    StreamReaderFile,
+    export_chunks,
+    import_stream,
+    open_import_stream,
+)
+from ..ai.history_retention import HistoryRetention
+from ..ai.speculation import SpeculativeReply
 # 导入语音模块 - 阶段4重构已完成
-from ..voice.asr_manager import ASRManager
+from ..voice.asr_batch import TAR_CONTENT_TYPES, iter_multipart_clips, iter_tar_stream, run_batch
+from ..voice.asr_manager import ASRManager, pcm_to_float
+from ..voice.training_jobs import FINISHED, SUCCEEDED, TrainingJobManager
 from ..voice.tts_manager import TTSManager
 from ..voice.premium_tts import PremiumTTSManager
 from ..voice.voice_api import VoiceAPI
+from ..voice.audio_store import audio_store
+from ..voice.audio_stream import (
+    STREAM_FORMATS,
+    negotiate_stream_format,
+    stream_content_type,
+    to_pcm16,
+    wav_stream_header,
+)
 from ..ai.qwen_client import QwenClient
+from ..utils.metrics import (
+    PIPELINE_INFLIGHT,
+    WS_ACTIVE_CONNECTIONS,
+    WS_SEND_SECONDS,
+    registry as metrics_registry,
+)
+from ..utils.tracing import tracer
+from ..utils.vad import SPEECH_END, SPEECH_START, EnergyVAD
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +96,24 @@ class AIVTuberServer:
         # 初始化语音API
         self.voice_api = VoiceAPI()
         
+        # 跨进程连接注册表（多进程模式下汇总所有工作进程的连接数）
+        self.worker_id = current_worker_id()
+        registry_path = self.config_manager.get('server.registry_path') or os.path.join(
+            os.path.dirname(self.config_manager.config_path), 'runtime', 'connections.db')
+        self.connection_registry = ConnectionRegistry(registry_path, self.worker_id)
+        
+        # 聊天记录定期清理（多进程模式下只由0号工作进程执行）
+        self.history_retention = HistoryRetention.from_config(
+            chat_history, self.config_manager.get('chat_history.retention', {}) or {})
+        
+        # 语音训练任务队列（任务在独立进程中执行；多进程模式下只由0号工作进程调度）
+        jobs_path = os.path.join(os.path.dirname(self.config_manager.config_path), 'runtime', 'training_jobs.db')
+        self.training_jobs = TrainingJobManager.from_config(
+            self.config_manager.config, jobs_path, schedule=self.worker_id == 0)
+        self.training_jobs.add_listener(self._on_training_job_update)
+        # 订阅训练任务进度的连接: job_id -> {ws}
+        self.training_subscribers = {}
+        
         # 打印当前目录，帮助调试
         current_dir = os.getcwd()
         self.public_dir = os.path.join(current_dir, 'public')
@@ -80,6 +131,14 @@ class AIVTuberServer:
         
         # WebSocket连接列表
         self.websocket_connections = []
+        # 每个连接绑定的聊天会话: id(ws) -> {'user_id', 'session_id'}
+        self.ws_sessions = {}
+        # 每个连接正在进行的流式识别: id(ws) -> StreamingASRSession
+        self.asr_streams = {}
+        # 启用服务端VAD时每个流式识别连接的端点检测器: id(ws) -> EnergyVAD
+        self.asr_vads = {}
+        # 流式识别会话的LLM预测: id(stream) -> SpeculativeReply
+        self.asr_speculations = {}
         
         # 默认消息
         self.default_messages = [
@@ -117,13 +176,29 @@ class AIVTuberServer:
         self.app.router.add_get("/api/sessions", self.get_sessions)
         self.app.router.add_post("/api/sessions/new", self.create_session)
         self.app.router.add_delete("/api/sessions/{session_id}", self.delete_session)
+        self.app.router.add_get("/api/sessions/search", self.search_sessions)
+        self.app.router.add_get("/api/sessions/{session_id}/messages", self.get_session_messages)
+        self.app.router.add_get("/api/history/export", self.export_history)
+        self.app.router.add_post("/api/history/import", self.import_history)
         self.app.router.add_get("/api/status", self.get_status)
         self.app.router.add_get("/api/statistics", self.get_statistics)
+        self.app.router.add_get("/api/statistics/timeseries", self.get_statistics_timeseries)
         
         # 语音相关API
         self.app.router.add_post("/api/asr/recognize", self.handle_asr_recognize)
+        self.app.router.add_post("/api/asr/batch", self.handle_asr_batch)
         self.app.router.add_post("/api/tts/synthesize", self.handle_tts_synthesize)
+        self.app.router.add_get("/api/tts/stream", self.handle_tts_stream)
+        self.app.router.add_post("/api/tts/stream", self.handle_tts_stream)
         self.app.router.add_get("/api/speech/providers", self.get_speech_providers)
+        self.app.router.add_get("/api/audio/stats", self.get_audio_stats)
+        
+        # 运行指标（Prometheus文本格式）
+        self.app.router.add_get("/metrics", self.handle_metrics)
+        
+        # 对话回合追踪
+        self.app.router.add_get("/api/traces", self.get_traces)
+        self.app.router.add_get("/api/traces/{turn_id}", self.get_trace)
         
         # 临时音频文件服务
         self.app.router.add_get("/temp/{path:.*}", self.handle_temp_file)
@@ -221,7 +296,15 @@ class AIVTuberServer:
                     content_type = 'application/octet-stream'
             
             logger.info(f"提供临时文件: {file_path}, MIME: {content_type}")
-            return web.FileResponse(file_path, headers={'Content-Type': content_type})
+            # 推流期间持有引用，防止被后台清理删除
+            held = audio_store.acquire(file_path)
+            try:
+                response = web.FileResponse(file_path, headers={'Content-Type': content_type})
+                await response.prepare(request)
+                return response
+            finally:
+                if held:
+                    audio_store.release(file_path)
         else:
             logger.warning(f"临时文件不存在: {file_path}")
             return web.Response(text=f"找不到临时文件: {path}", status=404)
@@ -240,6 +323,17 @@ class AIVTuberServer:
         
         # 添加到连接列表
         self.websocket_connections.append(ws)
+        conn_id = uuid.uuid4().hex
+        self.connection_registry.register(conn_id, request.remote)
+        # 连接可通过 ?user_id= 标识用户、?session_id= 恢复该用户已有的会话；会话在首条聊天消息时创建
+        user_id = request.query.get('user_id') or None
+        session_id = request.query.get('session_id') or None
+        session_error = self._check_session(user_id, session_id) if session_id else None
+        self.ws_sessions[id(ws)] = {
+            'user_id': user_id,
+            'session_id': None if session_error else session_id
+        }
+        WS_ACTIVE_CONNECTIONS.inc()
         logger.info(f"WebSocket连接已建立，当前连接数: {len(self.websocket_connections)}")
         
         # 发送初始模型配置
@@ -247,6 +341,8 @@ class AIVTuberServer:
             "type": "modelConfig",
             "data": self.live2d_model.get_model_config()
         })
+        if session_error:
+            await self.safe_send_json(ws, {"type": "session", "session_id": None, "error": session_error})
         
         try:
             async for msg in ws:
@@ -262,6 +358,12 @@ class AIVTuberServer:
             # 移除连接
             if ws in self.websocket_connections:
                 self.websocket_connections.remove(ws)
+            self.connection_registry.unregister(conn_id)
+            self.ws_sessions.pop(id(ws), None)
+            await self._close_audio_stream(id(ws))
+            for subscribers in self.training_subscribers.values():
+                subscribers.discard(ws)
+            WS_ACTIVE_CONNECTIONS.dec()
             
             # 清理TTS处理状态
             if hasattr(self, '_tts_processing_dict'):
@@ -286,7 +388,30 @@ class AIVTuberServer:
             # 处理聊天消息
             message = data.get("message", "").strip()
             if message:
-                await self.handle_chat_message(ws, message)
+                with tracer.start_turn("chat", chars=len(message)):
+                    await self.handle_chat_message(ws, message)
+        
+        elif msg_type == "session":
+            # 切换当前连接的会话: {"session_id": "..."} 恢复该用户已有的会话，省略则新建
+            binding = self.ws_sessions.setdefault(id(ws), {'user_id': None, 'session_id': None})
+            session_id = data.get("session_id")
+            if session_id:
+                error = self._check_session(binding['user_id'], session_id)
+                if error:
+                    await self.safe_send_json(ws, {
+                        "type": "session",
+                        "session_id": binding['session_id'],
+                        "error": error
+                    })
+                    return
+                binding['session_id'] = session_id
+            else:
+                binding['session_id'] = chat_history.start_new_session(
+                    data.get("title"), user_id=binding['user_id'])
+            await self.safe_send_json(ws, {
+                "type": "session",
+                "session_id": binding['session_id']
+            })
         
         elif msg_type == "getDefaultMessage":
             # 发送默认消息
@@ -334,7 +459,12 @@ class AIVTuberServer:
             # 处理音频数据（ASR）
             audio_data = data.get("audio_data", "")
             if audio_data:
-                await self.handle_audio_recognition(ws, audio_data)
+                with tracer.start_turn("audio_data", audio_b64_bytes=len(audio_data)):
+                    await self.handle_audio_recognition(ws, audio_data)
+        
+        elif msg_type in ("audio_stream_start", "audio_stream_chunk", "audio_stream_end"):
+            # 流式识别: start -> chunk（base64编码的16kHz 16位单声道PCM）... -> end
+            await self.handle_audio_stream(ws, msg_type, data)
                 
         elif msg_type == "voice_command":
             # 处理语音命令
@@ -368,58 +498,8 @@ class AIVTuberServer:
                 })
                 
         elif msg_type == "train_voice":
-            # 处理SoVITS语音训练请求
-            logger.info("收到SoVITS语音训练请求")
-            try:
-                success = await self.tts_manager.train_voice()
-                if success:
-                    # 训练成功后，自动播放训练得到的音频
-                    logger.info("🎵 训练完成，开始自动播放训练音频...")
-                    
-                    # 测试文本
-                    test_text = "Hi我是虚拟数字人心理疏导师小雨"
-                    
-                    # 使用训练后的模型合成语音
-                    tts_result = await self.tts_manager.synthesize(test_text)
-                    
-                    if tts_result and tts_result.get("audio_file"):
-                        # 发送训练完成消息
-                        await self.safe_send_json(ws, {
-                            'type': 'voice_trained',
-                            'message': '语音模型训练完成，正在播放训练音频...',
-                            'success': True
-                        })
-                        
-                        # 发送音频文件给前端播放
-                        await self.safe_send_json(ws, {
-                            'type': 'tts_response',
-                            'audio_file': tts_result["audio_file"],
-                            'text': test_text,
-                            'auto_play': True,
-                            'message': '训练音频播放中...'
-                        })
-                        
-                        logger.info("✅ 训练音频自动播放成功")
-                    else:
-                        # 训练成功但音频生成失败
-                        await self.safe_send_json(ws, {
-                            'type': 'voice_trained',
-                            'message': '语音模型训练完成，但音频生成失败',
-                            'success': True,
-                            'audio_play_failed': True
-                        })
-                        logger.warning("⚠️ 训练完成但音频生成失败")
-                else:
-                    await self.safe_send_json(ws, {
-                        'type': 'error',
-                        'message': '语音模型训练失败'
-                    })
-            except Exception as e:
-                logger.error(f"语音训练异常: {e}")
-                await self.safe_send_json(ws, {
-                    'type': 'error',
-                    'message': f'语音训练异常: {str(e)}'
-                })
+            # 语音训练任务: action = start（默认）| cancel | status，进度以 train_voice 消息推送
+            await self.handle_train_voice(ws, data)
                 
         elif msg_type == "get_voice_status":
             # 获取SoVITS语音状态
@@ -585,19 +665,114 @@ class AIVTuberServer:
                     'message': f'语音测试失败: {str(e)}'
                 })
     
-    async def handle_chat_message(self, ws, message: str):
+    @staticmethod
+    def _check_session(user_id: Optional[str], session_id: str) -> Optional[str]:
+        """校验连接要恢复的会话: 必须已在会话目录中且属于该连接的用户
+
+        Returns:
+            不能恢复的原因，可以恢复时返回None
+        """
+        session = chat_history.find_session(str(session_id))
+        if session is None:
+            return f'会话不存在: {session_id}'
+        if session['user_id'] != user_id:
+            return f'会话不属于当前用户: {session_id}'
+        return None
+    
+    def _connection_session(self, ws) -> str:
+        """获取连接绑定的会话ID，尚未绑定时为该连接新建会话"""
+        binding = self.ws_sessions.setdefault(id(ws), {'user_id': None, 'session_id': None})
+        if not binding['session_id']:
+            binding['session_id'] = chat_history.start_new_session(user_id=binding['user_id'])
+        return binding['session_id']
+    
+    async def handle_chat_message(self, ws, message: str, reply: Optional[Awaitable[str]] = None):
         """处理聊天消息
         
         Args:
             ws: WebSocket连接
             message: 用户消息
+            reply: 已提前发起的回复生成（LLM预测命中时），为None时现在请求LLM
         """
         logger.info(f"💬 处理聊天消息: {message}")
         
         try:
-            # 使用Qwen API生成回复
+            # 每个连接使用自己的会话，上下文只来自本会话
+            session_id = self._connection_session(ws)
+            if reply is not None:
+                with tracer.span("llm", speculative=True):
+                    response_text = await reply
+            else:
+                response_text = await self._generate_reply(ws, message)
+            
+            if not response_text:
+                response_text = "抱歉，我现在有点忙，请稍后再试。"
+            
+            # 分析情感（简单的关键词匹配）
+            with tracer.span("emotion_mapping"):
+                emotion = "neutral"
+                if any(word in response_text for word in ["开心", "高兴", "快乐", "哈哈", "😊", "😄", "棒", "好"]):
+                    emotion = "happy"
+                elif any(word in response_text for word in ["抱歉", "对不起", "难过", "😢", "不好意思"]):
+                    emotion = "sad"
+                elif any(word in response_text for word in ["惊讶", "哇", "天哪", "😮", "意外"]):
+                    emotion = "surprised"
+            
+            response_data = {
+                "text": response_text,
+                "emotion": emotion,
+                "session_id": session_id
+            }
+            
+            # 记录到本连接的会话（后写模式下仅入队）
+            chat_history.add_message('user', message, session_id=session_id)
+            chat_history.add_message('assistant', response_text, emotion=emotion, session_id=session_id)
+            
+            # 发送聊天回复
+            await self.safe_send_json(ws, {
+                "type": "chat_response",
+                "data": response_data
+            })
+            
+            # 发送表情变化命令
+            with tracer.span("express_emotion", emotion=emotion):
+                expression_result = await self.live2d_model.express_emotion(emotion)
+            await self.safe_send_json(ws, {
+                "type": "modelCommand",
+                "data": expression_result
+            })
+                
+            # 立即进行语音合成 - 确保生成的文字能直接传输给TTS并播放音频
+            logger.info("🎯 开始处理TTS语音合成")
+            await self.handle_tts_request(ws, response_text)
+        
+        except Exception as e:
+            logger.error(f"❌ 处理聊天消息时发生错误: {e}")
+            
+            # 发送错误回复
+            error_response_text = "抱歉，我现在有点累了，请稍后再试。"
+            await self.safe_send_json(ws, {
+                "type": "chat_response",
+                "data": {
+                    "text": error_response_text,
+                    "emotion": "sad"
+                }
+            })
+            
+            # 也为错误消息生成语音
+            await self.handle_tts_request(ws, error_response_text)
+    
+    async def _generate_reply(self, ws, message: str) -> Optional[str]:
+        """请求LLM生成回复（上下文为本连接会话的最近消息）"""
+        session_id = self._connection_session(ws)
+        history = chat_history.get_recent_context(
+            limit=self.config_manager.get('chat_history.context_turns', 6), session_id=session_id)
+        
+        # 使用Qwen API生成回复
+        with PIPELINE_INFLIGHT.labels('llm').track_inprogress(), tracer.span("llm"):
             response_text = await self.qwen_client.generate_response(
                 user_message=message,
+                history=history,
                 character_name="小雨",
                 character_personality="""你是AI心理医生小雨，拥有专业的心理咨询背景和丰富的临床经验。
 
@@ -635,56 +810,85 @@ class AIVTuberServer:
 
 请始终保持专业心理医生的形象，用温暖而专业的方式与来访者交流。"""
             )
-            
-            if not response_text:
-                response_text = "抱歉，我现在有点忙，请稍后再试。"
-            
-            # 分析情感（简单的关键词匹配）
-            emotion = "neutral"
-            if any(word in response_text for word in ["开心", "高兴", "快乐", "哈哈", "😊", "😄", "棒", "好"]):
-                emotion = "happy"
-            elif any(word in response_text for word in ["抱歉", "对不起", "难过", "😢", "不好意思"]):
-                emotion = "sad"
-            elif any(word in response_text for word in ["惊讶", "哇", "天哪", "😮", "意外"]):
-                emotion = "surprised"
-            
-            response_data = {
-                "text": response_text,
-                "emotion": emotion
-            }
-            
-            # 发送聊天回复
+        return response_text
+    
+    async def handle_train_voice(self, ws, data: dict):
+        """处理语音训练任务消息
+
+        Args:
+            ws: WebSocket连接
+            data: {"action": "start", "kind": "train_voice|extract_features", "params": {...}}
+                  | {"action": "cancel", "job_id": "..."} | {"action": "status"[, "job_id": "..."]}
+        """
+        action = data.get("action", "start")
+        try:
+            if action == "start":
+                job = self.training_jobs.submit(data.get("kind", "train_voice"), data.get("params") or {})
+            elif action in ("cancel", "status"):
+                job_id = data.get("job_id")
+                if not job_id and action == "status":
+                    await self.safe_send_json(ws, {"type": "train_voice", "data": {"jobs": self.training_jobs.list_jobs()}})
+                    return
+                job = self.training_jobs.cancel(job_id) if action == "cancel" else self.training_jobs.get(job_id)
+                if job is None:
+                    raise ValueError(f"训练任务不存在: {job_id}")
+            else:
+                raise ValueError(f"不支持的训练操作: {action}")
+        except ValueError as e:
+            await self.safe_send_json(ws, {"type": "train_voice", "data": {"error": str(e)}})
+            return
+        except Exception as e:
+            logger.error(f"语音训练任务操作失败: {e}")
+            await self.safe_send_json(ws, {"type": "train_voice", "data": {"error": f"语音训练异常: {e}"}})
+            return
+        
+        if job['status'] not in FINISHED:
+            self.training_subscribers.setdefault(job['job_id'], set()).add(ws)
+        await self.safe_send_json(ws, {"type": "train_voice", "data": job})
+    
+    async def _on_training_job_update(self, job: Dict[str, Any]):
+        """把训练任务的变化推送给订阅的连接，任务结束后取消订阅"""
+        finished = job['status'] in FINISHED
+        subscribers = self.training_subscribers.pop(job['job_id'], set()) if finished \
+            else self.training_subscribers.get(job['job_id'], set())
+        for ws in list(subscribers):
+            await self.safe_send_json(ws, {"type": "train_voice", "data": job})
+            if job['status'] == SUCCEEDED and job['kind'] == 'train_voice':
+                await self._announce_trained_voice(ws)
+    
+    async def _announce_trained_voice(self, ws):
+        """训练完成后用新模型合成一段测试语音并自动播放"""
+        logger.info("🎵 训练完成，开始自动播放训练音频...")
+        test_text = "Hi我是虚拟数字人心理疏导师小雨"
+        try:
+            tts_result = await self.tts_manager.synthesize(test_text)
+        except Exception as e:
+            logger.error(f"训练音频合成失败: {e}")
+            tts_result = None
+        
+        if tts_result and tts_result.get("audio_file"):
             await self.safe_send_json(ws, {
-                "type": "chat_response",
-                "data": response_data
+                'type': 'voice_trained',
+                'message': '语音模型训练完成，正在播放训练音频...',
+                'success': True
             })
-            
-            # 发送表情变化命令
-            expression_result = await self.live2d_model.express_emotion(emotion)
             await self.safe_send_json(ws, {
-                "type": "modelCommand",
-                "data": expression_result
+                'type': 'tts_response',
+                'audio_file': tts_result["audio_file"],
+                'text': test_text,
+                'auto_play': True,
+                'message': '训练音频播放中...'
             })
-                
-            # 立即进行语音合成 - 确保生成的文字能直接传输给TTS并播放音频
-            logger.info("🎯 开始处理TTS语音合成")
-            await self.handle_tts_request(ws, response_text)
-        
-        except Exception as e:
-            logger.error(f"❌ 处理聊天消息时发生错误: {e}")
-            
-            # 发送错误回复
-            error_response_text = "抱歉，我现在有点累了，请稍后再试。"
+            logger.info("✅ 训练音频自动播放成功")
+        else:
+            # 训练成功但音频生成失败
             await self.safe_send_json(ws, {
-                "type": "chat_response",
-                "data": {
-                    "text": error_response_text,
-                    "emotion": "sad"
-                }
+                'type': 'voice_trained',
+                'message': '语音模型训练完成，但音频生成失败',
+                'success': True,
+                'audio_play_failed': True
             })
-            
-            # 也为错误消息生成语音
-            await self.handle_tts_request(ws, error_response_text)
+            logger.warning("⚠️ 训练完成但音频生成失败")
     
     async def handle_audio_recognition(self, ws, audio_data: str):
         """处理音频识别
@@ -700,22 +904,10 @@ class AIVTuberServer:
             audio_bytes = base64.b64decode(audio_data)
             
             # 使用ASR识别
-            text = await self.asr_manager.recognize(audio_bytes)
+            with PIPELINE_INFLIGHT.labels('asr').track_inprogress(), tracer.span("asr"):
+                text = await self.asr_manager.recognize(audio_bytes)
             
-            if text:
-                # 发送识别结果
-                await self.safe_send_json(ws, {
-                    "type": "asr_result",
-                    "data": {"text": text}
-                })
-                
-                # 自动处理聊天消息
-                await self.handle_chat_message(ws, text)
-            else:
-                await self.safe_send_json(ws, {
-                    "type": "asr_result", 
-                    "data": {"text": "", "error": "识别失败"}
-                })
+            await self._deliver_asr_result(ws, text)
                 
         except Exception as e:
             logger.error(f"音频识别失败: {e}")
@@ -724,6 +916,143 @@ class AIVTuberServer:
                 "data": {"text": "", "error": str(e)}
             })
     
+    async def handle_audio_stream(self, ws, msg_type: str, data: dict):
+        """处理流式识别消息，说话过程中向客户端推送 asr_partial 中间结果
+        
+        启用服务端VAD（asr.vad.enabled）时，只把检测到的语音（含少量前导音频）送入ASR，
+        检测到说话结束即给出最终结果并开始等待下一句，不必等待 audio_stream_end。
+        
+        Args:
+            ws: WebSocket连接
+            msg_type: audio_stream_start / audio_stream_chunk / audio_stream_end
+            data: 消息数据（chunk 消息的 audio_data 为base64编码的PCM）
+        """
+        import base64
+        
+        ws_id = id(ws)
+        try:
+            if msg_type == "audio_stream_start":
+                await self._close_audio_stream(ws_id)
+                sample_rate = int(data.get("sample_rate", 16000))
+                stream = await self._open_audio_stream(ws, sample_rate)
+                if stream is None:
+                    await self.safe_send_json(ws, {
+                        "type": "asr_result",
+                        "data": {"text": "", "error": "ASR功能未启用"}
+                    })
+                    return
+                vad_config = self.asr_manager.asr_config.get('vad', {})
+                if vad_config.get('enabled', False):
+                    self.asr_vads[ws_id] = EnergyVAD.from_config(vad_config, sample_rate)
+            
+            elif msg_type == "audio_stream_chunk":
+                stream = self.asr_streams.get(ws_id)
+                audio_data = data.get("audio_data", "")
+                if stream is None or not audio_data:
+                    return
+                pcm = base64.b64decode(audio_data)
+                vad = self.asr_vads.get(ws_id)
+                if vad is None:
+                    await stream.feed(pcm)
+                    return
+                for event in vad.process(pcm_to_float(pcm)):
+                    if event.kind == SPEECH_START:
+                        await self.safe_send_json(ws, {"type": "vad", "data": {"event": "speech_start"}})
+                    if event.audio is not None:
+                        await stream.feed(to_pcm16(event.audio))
+                    if event.kind == SPEECH_END:
+                        await self.safe_send_json(ws, {"type": "vad", "data": {"event": "speech_end"}})
+                        # 端点: 先为下一句开启新的识别，再给出本句的最终结果
+                        finished, stream = stream, await self._open_audio_stream(ws, stream.sample_rate)
+                        await self._finish_audio_stream(ws, finished)
+                        if stream is None:
+                            return
+            
+            else:
+                stream = self.asr_streams.pop(ws_id, None)
+                vad = self.asr_vads.pop(ws_id, None)
+                if stream is None:
+                    return
+                if vad is not None:
+                    vad.flush()
+                    if stream.bytes_received == 0:
+                        # 没有检测到（新的）语音
+                        await stream.close()
+                        return
+                await self._finish_audio_stream(ws, stream)
+        
+        except Exception as e:
+            logger.error(f"流式音频识别失败: {e}")
+            await self._close_audio_stream(ws_id)
+            await self.safe_send_json(ws, {
+                "type": "asr_result",
+                "data": {"text": "", "error": str(e)}
+            })
+    
+    async def _open_audio_stream(self, ws, sample_rate: int):
+        """为连接开启一次流式识别，中间结果推送给客户端
+        
+        启用 asr.speculative 时，中间结果稳定后提前请求LLM（见 SpeculativeReply）
+        """
+        speculative_config = self.asr_manager.asr_config.get('speculative', {})
+        speculation = None
+        if speculative_config.get('enabled', False):
+            speculation = SpeculativeReply.from_config(
+                lambda text: self._generate_reply(ws, text), speculative_config)
+        
+        async def send_partial(text):
+            if speculation is not None:
+                speculation.update(text)
+            await self.safe_send_json(ws, {
+                "type": "asr_partial",
+                "data": {"text": text}
+            })
+        
+        stream = await self.asr_manager.open_stream(send_partial, sample_rate=sample_rate)
+        if stream is not None:
+            self.asr_streams[id(ws)] = stream
+            if speculation is not None:
+                self.asr_speculations[id(stream)] = speculation
+        else:
+            self.asr_streams.pop(id(ws), None)
+        return stream
+    
+    async def _finish_audio_stream(self, ws, stream):
+        """结束流式识别，发送结果并进入对话"""
+        speculation = self.asr_speculations.pop(id(stream), None)
+        with tracer.start_turn("audio_stream", audio_bytes=stream.bytes_received):
+            with PIPELINE_INFLIGHT.labels('asr').track_inprogress(), tracer.span("asr"):
+                text = await self.asr_manager.finish_stream(stream)
+            reply = speculation.resolve(text) if speculation is not None else None
+            await self._deliver_asr_result(ws, text, reply)
+    
+    async def _close_audio_stream(self, ws_id: int):
+        """放弃连接上正在进行的流式识别"""
+        self.asr_vads.pop(ws_id, None)
+        stream = self.asr_streams.pop(ws_id, None)
+        if stream is not None:
+            speculation = self.asr_speculations.pop(id(stream), None)
+            if speculation is not None:
+                speculation.cancel()
+            await stream.close()
+    
+    async def _deliver_asr_result(self, ws, text: Optional[str], reply: Optional[Awaitable[str]] = None):
+        """发送识别结果，识别成功时继续按聊天消息处理（reply 为命中的LLM预测）"""
+        if text:
+            # 发送识别结果
+            await self.safe_send_json(ws, {
+                "type": "asr_result",
+                "data": {"text": text}
+            })
+            
+            # 自动处理聊天消息
+            await self.handle_chat_message(ws, text, reply)
+        else:
+            await self.safe_send_json(ws, {
+                "type": "asr_result", 
+                "data": {"text": "", "error": "识别失败"}
+            })
+    
     async def handle_tts_request(self, ws, text: str):
         """处理TTS请求 - 新的双模式系统
         
@@ -746,7 +1075,8 @@ class AIVTuberServer:
             logger.info(f"🎯 开始TTS语音合成: {text[:50]}...")
             
             # 使用新的TTS管理器
-            tts_result = await self.tts_manager.synthesize(text)
+            with PIPELINE_INFLIGHT.labels('tts').track_inprogress(), tracer.span("tts"):
+                tts_result = await self.tts_manager.synthesize(text)
             
             if tts_result:
                 logger.info(f"✅ TTS合成成功，类型: {tts_result.get('type', 'unknown')}")
@@ -770,8 +1100,13 @@ class AIVTuberServer:
                         try:
                             # 使用文件系统路径而不是URL路径
                             file_path = tts_result.get("audio_file_path", tts_result["audio_file"])
-                            with open(file_path, "rb") as audio_file:
-                                audio_data = base64.b64encode(audio_file.read()).decode('utf-8')
+                            held = audio_store.acquire(file_path)
+                            try:
+                                with tracer.span("audio_encode"), open(file_path, "rb") as audio_file:
+                                    audio_data = base64.b64encode(audio_file.read()).decode('utf-8')
+                            finally:
+                                if held:
+                                    audio_store.release(file_path)
                             await self.safe_send_json(ws, {
                                 "type": "tts_result",
                                 "data": {
@@ -845,7 +1180,14 @@ class AIVTuberServer:
                 logger.warning("WebSocket连接已关闭，跳过消息发送")
                 return False
             
-            await ws.send_json(data)
+            msg_type = data.get("type") if isinstance(data, dict) else None
+            with WS_SEND_SECONDS.time(), tracer.span("ws_send", type=msg_type):
+                await ws.send_json(data)
+            # 音频结果（或浏览器TTS指令）送出即视为首段音频
+            if msg_type == "tts_result":
+                tracer.mark_first_audio(data.get("data", {}).get("mode", "sovits"))
+            elif msg_type == "tts_browser":
+                tracer.mark_first_audio("browser")
             return True
         except Exception as e:
             logger.error(f"发送WebSocket消息失败: {e}")
@@ -863,19 +1205,30 @@ class AIVTuberServer:
         for ws in self.websocket_connections[:]:  # 使用副本避免迭代中修改列表
             await self.safe_send_json(ws, data)
     
-    async def run(self, host="0.0.0.0", port=8080):
+    async def run(self, host="0.0.0.0", port=8080, reuse_port=False):
         """运行服务器
 
         Args:
             host: 主机地址
             port: 端口号
+            reuse_port: 是否以 SO_REUSEPORT 绑定（多进程模式下各工作进程共享端口）
         """
         runner = web.AppRunner(self.app)
         await runner.setup()
-        site = web.TCPSite(runner, host, port)
+        site = web.TCPSite(runner, host, port, reuse_port=reuse_port or None)
         await site.start()
         
-        logger.info(f"服务器已启动，监听 {host}:{port}")
+        # 启动生成音频的后台清理任务
+        await audio_store.start()
+        
+        # 启动训练任务的调度与进度推送
+        await self.training_jobs.start()
+        
+        # 启动聊天记录的定期清理任务
+        if self.config_manager.get('chat_history.retention.enabled', False) and self.worker_id == 0:
+            await self.history_retention.start()
+        
+        logger.info(f"服务器已启动，监听 {host}:{port}" + (f" (工作进程 #{self.worker_id})" if reuse_port else ""))
         logger.info(f"请访问 http://{host if host != '0.0.0.0' else 'localhost'}:{port}")
         
         # 保持服务器运行
@@ -884,6 +1237,12 @@ class AIVTuberServer:
     
     async def close(self):
         """关闭服务器"""
+        await audio_store.stop()
+        await self.history_retention.stop()
+        await self.training_jobs.stop()
+        self.connection_registry.close()
+        chat_history.close()
+        await self.asr_manager.close()
         if self.llm_manager:
             await self.llm_manager.close()
 
@@ -907,18 +1266,76 @@ class AIVTuberServer:
         """获取聊天会话列表
         
         Args:
-            request: HTTP请求
+            request: HTTP请求（查询参数 user_id，可选，只列出该用户的会话）
             
         Returns:
             JSONResponse
         """
         try:
-            sessions = chat_history.get_all_sessions()
+            sessions = chat_history.get_all_sessions(request.query.get('user_id') or None)
             return web.json_response({'sessions': sessions})
         except Exception as e:
             logger.error(f"获取会话列表失败: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    async def get_session_messages(self, request):
+        """分页获取会话消息（从最新往前翻页）
+        
+        Args:
+            request: HTTP请求（查询参数 limit，默认50；before，上一页返回的 next_cursor）
+            
+        Returns:
+            JSONResponse
+        """
+        try:
+            session_id = request.match_info['session_id']
+            limit = min(max(int(request.query.get('limit', 50)), 1), 500)
+            page = chat_history.get_message_page(session_id, limit, request.query.get('before'))
+            messages = []
+            for message in page['messages']:
+                item = message.to_dict()
+                item['id'] = message.id
+                messages.append(item)
+            return web.json_response({
+                'session_id': session_id,
+                'messages': messages,
+                'next_cursor': page['next_cursor']
+            })
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"获取会话消息失败: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
+    async def search_sessions(self, request):
+        """全文检索聊天记录
+        
+        Args:
+            request: HTTP请求（查询参数 q，关键词；limit，默认20；cursor，上一页返回的 next_cursor；
+                     session_id，可选，只在指定会话内检索）
+            
+        Returns:
+            JSONResponse
+        """
+        try:
+            query = request.query.get('q', '').strip()
+            if not query:
+                return web.json_response({'error': '缺少检索关键词 q'}, status=400)
+            limit = min(max(int(request.query.get('limit', 20)), 1), 100)
+            page = chat_history.search_messages(
+                query, limit, request.query.get('cursor'), request.query.get('session_id'))
+            return web.json_response({
+                'query': query,
+                'results': page['results'],
+                'next_cursor': page['next_cursor'],
+                'mode': page['mode']
+            })
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"检索聊天记录失败: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
     async def create_session(self, request):
         """创建新的聊天会话
         
@@ -931,7 +1348,7 @@ class AIVTuberServer:
         try:
             data = await request.json()
             title = data.get('title')
-            session_id = chat_history.start_new_session(title)
+            session_id = chat_history.start_new_session(title, user_id=data.get('user_id'))
             
             return web.json_response({
                 'session_id': session_id,
@@ -952,13 +1369,93 @@ class AIVTuberServer:
         """
         try:
             session_id = request.match_info['session_id']
-            chat_history.delete_session(session_id)
+            # 删除前需等待待写消息落盘，放到线程池中执行，不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, chat_history.delete_session, session_id)
             
             return web.json_response({'message': '会话已删除'})
         except Exception as e:
             logger.error(f"删除会话失败: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    async def export_history(self, request):
+        """流式导出聊天记录（用于备份和迁移，内存占用与数据量无关）
+        
+        Args:
+            request: HTTP请求（查询参数 format，ndjson 或 csv，默认ndjson；
+                     compress=gzip 时gzip压缩；session_id，可选，只导出指定会话）
+            
+        Returns:
+            StreamResponse或JSONResponse
+        """
+        fmt = request.query.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return web.json_response({
+                'error': f'不支持的导出格式: {fmt}',
+                'supported': list(EXPORT_FORMATS)
+            }, status=400)
+        compress = request.query.get('compress') == 'gzip'
+        session_id = request.query.get('session_id')
+        
+        filename = f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        headers = {
+            'Content-Type': 'application/gzip' if compress else f'{EXPORT_FORMATS[fmt]}; charset=utf-8',
+            'Content-Disposition': f'attachment; filename="{filename}{".gz" if compress else ""}"'
+        }
+        response = web.StreamResponse(headers=headers)
+        response.enable_chunked_encoding()
+        
+        loop = asyncio.get_running_loop()
+        chunks = export_chunks(chat_history, fmt, session_id, compress)
+        try:
+            await response.prepare(request)
+            while True:
+                # 每批读取与编码在线程中执行，不阻塞事件循环
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                await response.write(chunk)
+        except ConnectionResetError:
+            logger.info("聊天记录导出客户端已断开")
+            return response
+        except Exception as e:
+            logger.error(f"导出聊天记录失败: {e}")
+            return response
+        
+        await response.write_eof()
+        return response
+    
+    async def import_history(self, request):
+        """批量导入聊天记录（请求体为导出的 NDJSON/CSV，可gzip压缩，边接收边写入）
+        
+        Args:
+            request: HTTP请求（查询参数 format，ndjson 或 csv，默认ndjson）
+            
+        Returns:
+            JSONResponse
+        """
+        fmt = request.query.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return web.json_response({
+                'error': f'不支持的导入格式: {fmt}',
+                'supported': list(EXPORT_FORMATS)
+            }, status=400)
+        
+        loop = asyncio.get_running_loop()
+        
+        def run_import():
+            stream = open_import_stream(StreamReaderFile(request.content, loop))
+            return import_stream(chat_history, stream, fmt)
+        
+        try:
+            result = await loop.run_in_executor(None, run_import)
+            return web.json_response(result)
+        except (ValueError, UnicodeDecodeError, EOFError, OSError) as e:
+            return web.json_response({'error': f'导入数据无效: {e}'}, status=400)
+        except Exception as e:
+            logger.error(f"导入聊天记录失败: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
     async def get_status(self, request):
         """获取系统状态
         
@@ -974,6 +1471,8 @@ class AIVTuberServer:
             return web.json_response({
                 'server': 'running',
                 'connections': len(self.websocket_connections),
+                'worker_id': self.worker_id,
+                'cluster_connections': self.connection_registry.count_by_worker(),
                 'llm_provider': provider_status,
                 'model_loaded': hasattr(self.live2d_model, 'model_path'),
                 'features': {
@@ -997,11 +1496,98 @@ class AIVTuberServer:
         """
         try:
             stats = chat_history.get_statistics()
+            stats['retention'] = self.history_retention.get_stats()
             return web.json_response(stats)
         except Exception as e:
             logger.error(f"获取统计信息失败: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    async def get_statistics_timeseries(self, request):
+        """获取按小时/按天的消息、token与会话数时间序列
+        
+        Args:
+            request: HTTP请求（查询参数 granularity，hour 或 day，默认day；
+                     since/until，起止桶，如 2024-01-01 或 2024-01-01T08）
+            
+        Returns:
+            JSONResponse
+        """
+        try:
+            granularity = request.query.get('granularity', 'day')
+            series = chat_history.get_timeseries(
+                granularity, request.query.get('since'), request.query.get('until'))
+            return web.json_response({'granularity': granularity, 'series': series})
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"获取统计时间序列失败: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
+    async def get_audio_stats(self, request):
+        """获取生成音频存储的使用量统计
+        
+        Args:
+            request: HTTP请求
+            
+        Returns:
+            JSONResponse
+        """
+        try:
+            return web.json_response(audio_store.get_stats())
+        except Exception as e:
+            logger.error(f"获取音频存储统计失败: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+
+    async def get_traces(self, request):
+        """获取最近的对话回合追踪
+
+        Args:
+            request: HTTP请求（查询参数 limit，默认50）
+
+        Returns:
+            JSONResponse
+        """
+        try:
+            limit = int(request.query.get('limit', 50))
+            return web.json_response({'traces': tracer.recent(limit)})
+        except ValueError:
+            return web.json_response({'error': 'limit必须为整数'}, status=400)
+        except Exception as e:
+            logger.error(f"获取回合追踪失败: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+
+    async def get_trace(self, request):
+        """按回合ID获取追踪详情
+
+        Args:
+            request: HTTP请求
+
+        Returns:
+            JSONResponse
+        """
+        trace = tracer.get(request.match_info['turn_id'])
+        if trace is None:
+            return web.json_response({'error': '回合不存在或已被淘汰'}, status=404)
+        return web.json_response(trace)
+
+    async def handle_metrics(self, request):
+        """导出运行指标（Prometheus文本格式）
+
+        Args:
+            request: HTTP请求
+
+        Returns:
+            Response
+        """
+        try:
+            return web.Response(
+                text=metrics_registry.render(),
+                headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+            )
+        except Exception as e:
+            logger.error(f"导出运行指标失败: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+
     async def handle_asr_recognize(self, request):
         """处理ASR识别API请求
         
@@ -1031,6 +1617,66 @@ class AIVTuberServer:
             logger.error(f"ASR识别失败: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    async def handle_asr_batch(self, request):
+        """批量语音识别，按完成顺序流式返回NDJSON结果
+        
+        Args:
+            request: HTTP请求（请求体为 multipart/form-data 的多个文件，或 tar/tar.gz 包；
+                     查询参数 provider，逗号分隔，音频轮流分配，默认当前提供商；
+                     concurrency，同时识别数，不超过配置的 asr.batch.concurrency）
+            
+        Returns:
+            StreamResponse或JSONResponse
+        """
+        if not self.asr_manager.enabled:
+            return web.json_response({'error': 'ASR功能未启用'}, status=400)
+        
+        batch_config = self.asr_manager.asr_config.get('batch', {})
+        max_concurrency = int(batch_config.get('concurrency', 4))
+        max_clip_bytes = int(batch_config.get('max_clip_mb', 50)) * 1024 * 1024
+        try:
+            providers = [name for name in request.query.get('provider', '').split(',') if name] \
+                or [self.asr_manager.provider]
+            unknown = [name for name in providers if name not in self.asr_manager.providers]
+            if unknown:
+                raise ValueError(f'未知的ASR提供商: {", ".join(unknown)}')
+            concurrency = min(int(request.query.get('concurrency', max_concurrency)), max_concurrency)
+            if concurrency < 1:
+                raise ValueError('concurrency 必须为正整数')
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        
+        if request.content_type.startswith('multipart/'):
+            clips = iter_multipart_clips(await request.multipart(), max_clip_bytes)
+        elif request.content_type in TAR_CONTENT_TYPES:
+            clips = iter_tar_stream(request.content, max_clip_bytes)
+        else:
+            return web.json_response({
+                'error': f'不支持的上传类型: {request.content_type}',
+                'supported': ['multipart/form-data', 'application/x-tar']
+            }, status=400)
+        
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+        response.enable_chunked_encoding()
+        results = run_batch(clips, functools.partial(self.asr_manager.recognize, raise_errors=True),
+                            providers, concurrency,
+                            batch_config.get('provider_concurrency'))
+        try:
+            await response.prepare(request)
+            async for result in results:
+                await response.write((json.dumps(result, ensure_ascii=False) + '\n').encode('utf-8'))
+        except ConnectionResetError:
+            logger.info("批量识别客户端已断开")
+            return response
+        except Exception as e:
+            logger.error(f"批量语音识别失败: {e}")
+            return response
+        finally:
+            await results.aclose()
+        
+        await response.write_eof()
+        return response
+    
     async def handle_tts_synthesize(self, request):
         """处理TTS合成API请求
         
@@ -1047,15 +1693,22 @@ class AIVTuberServer:
             if not text:
                 return web.json_response({'error': '缺少文本内容'}, status=400)
             
-            audio_data = await self.tts_manager.synthesize(text)
+            tts_result = await self.tts_manager.synthesize(text)
+            file_path = tts_result.get("audio_file_path") if tts_result else None
             
-            if audio_data:
-                # 返回音频文件
-                return web.Response(
-                    body=audio_data,
-                    content_type='audio/mp3',
-                    headers={'Content-Disposition': 'attachment; filename="speech.mp3"'}
-                )
+            if file_path and os.path.exists(file_path):
+                # 返回合成的WAV音频文件
+                held = audio_store.acquire(file_path)
+                try:
+                    response = web.FileResponse(file_path, headers={
+                        'Content-Type': 'audio/wav',
+                        'Content-Disposition': 'attachment; filename="speech.wav"'
+                    })
+                    await response.prepare(request)
+                    return response
+                finally:
+                    if held:
+                        audio_store.release(file_path)
             else:
                 # 使用浏览器TTS
                 return web.json_response({
@@ -1067,6 +1720,76 @@ class AIVTuberServer:
             logger.error(f"TTS合成失败: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    async def handle_tts_stream(self, request):
+        """流式TTS合成API请求
+        
+        以分块传输返回音频，首个分句声码完成即开始输出。
+        支持 GET ?text=...&format=... 或 POST {"text": ..., "format": ...}，
+        未显式指定格式时根据Accept头协商（audio/wav 或 audio/L16）。
+        
+        Args:
+            request: HTTP请求
+            
+        Returns:
+            StreamResponse或JSONResponse
+        """
+        try:
+            if request.method == 'POST':
+                data = await request.json()
+            else:
+                data = request.query
+            text = data.get('text', '')
+            requested_format = data.get('format')
+        except Exception as e:
+            return web.json_response({'error': f'请求格式错误: {e}'}, status=400)
+        
+        if not text:
+            return web.json_response({'error': '缺少文本内容'}, status=400)
+        
+        fmt = negotiate_stream_format(request.headers.get('Accept'), requested_format)
+        if not fmt:
+            return web.json_response({
+                'error': '不支持请求的音频格式',
+                'supported': list(STREAM_FORMATS.values())
+            }, status=406)
+        
+        if not self.tts_manager.sovits_engine:
+            return web.json_response({'use_browser_tts': True, 'text': text}, status=503)
+        
+        response = None
+        try:
+            # 客户端断开时立即关闭合成生成器，推理停止后才释放合成锁
+            async with aclosing(self.tts_manager.synthesize_stream(text)) as stream:
+                async for sample_rate, audio in stream:
+                    if response is None:
+                        channels = audio.shape[1] if getattr(audio, 'ndim', 1) == 2 else 1
+                        response = web.StreamResponse(headers={
+                            'Content-Type': stream_content_type(fmt, sample_rate, channels),
+                            'Cache-Control': 'no-cache',
+                            'X-Accel-Buffering': 'no'
+                        })
+                        response.enable_chunked_encoding()
+                        await response.prepare(request)
+                        if fmt == 'wav':
+                            await response.write(wav_stream_header(sample_rate, channels))
+                        logger.info(f"🎧 首个音频分句已开始推流 ({fmt}, {sample_rate}Hz)")
+                    await response.write(to_pcm16(audio, big_endian=(fmt == 'pcm')))
+        except ConnectionResetError:
+            logger.info("流式TTS客户端已断开")
+            return response
+        except Exception as e:
+            logger.error(f"流式TTS合成失败: {e}")
+            if response is None:
+                return web.json_response({'error': str(e)}, status=500)
+            return response
+        
+        if response is None:
+            # 没有产出任何音频，回退到浏览器TTS
+            return web.json_response({'use_browser_tts': True, 'text': text})
+        
+        await response.write_eof()
+        return response
+    
     async def get_speech_providers(self, request):
         """获取语音服务提供商信息
         
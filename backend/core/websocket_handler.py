@@ -6,6 +6,8 @@ from enum import Enum
 import numpy as np
 from loguru import logger
 
+from ..utils.audio_buffer import AudioBuffer
+from ..utils.vad import PAUSE_MARKER, EnergyVAD
 from ..utils.service_context import ServiceContext
 # 注意：以下导入暂时注释掉，等待后续重构阶段处理
 # from .chat_group import (
@@ -30,6 +32,10 @@ from ..utils.service_context import ServiceContext
 # )
 
 
+# Hard cap on buffered microphone audio per client (16 kHz samples)
+MAX_UTTERANCE_SAMPLES = 16000 * 60
+
+
 class MessageType(Enum):
     """Enum for WebSocket message types"""
 
@@ -71,7 +77,10 @@ class WebSocketHandler:
         self.chat_group_manager = None
         self.current_conversation_tasks: Dict[str, Optional[asyncio.Task]] = {}
         self.default_context_cache = default_context_cache
-        self.received_data_buffers: Dict[str, np.ndarray] = {}
+        # Per-client utterance buffers; consumers call take() at end-of-utterance
+        self.received_data_buffers: Dict[str, AudioBuffer] = {}
+        # Per-client endpoint detectors for raw (unsegmented) microphone audio
+        self.client_vads: Dict[str, EnergyVAD] = {}
 
         # Message handlers mapping
         self._message_handlers = self._init_message_handlers()
@@ -140,7 +149,10 @@ class WebSocketHandler:
         """Store client data and initialize group status"""
         self.client_connections[client_uid] = websocket
         self.client_contexts[client_uid] = session_service_context
-        self.received_data_buffers[client_uid] = np.array([])
+        self.received_data_buffers[client_uid] = AudioBuffer(
+            max_samples=MAX_UTTERANCE_SAMPLES
+        )
+        self.client_vads[client_uid] = EnergyVAD()
 
         self.chat_group_manager.client_group_map[client_uid] = ""
         await self.send_group_update(websocket, client_uid)
@@ -295,6 +307,7 @@ class WebSocketHandler:
         self.client_connections.pop(client_uid, None)
         self.client_contexts.pop(client_uid, None)
         self.received_data_buffers.pop(client_uid, None)
+        self.client_vads.pop(client_uid, None)
         if client_uid in self.current_conversation_tasks:
             task = self.current_conversation_tasks[client_uid]
             if task and not task.done():
@@ -456,20 +469,23 @@ class WebSocketHandler:
         """Handle incoming audio data"""
         audio_data = data.get("audio", [])
         if audio_data:
-            self.received_data_buffers[client_uid] = np.append(
-                self.received_data_buffers[client_uid],
-                np.array(audio_data, dtype=np.float32),
+            self.received_data_buffers[client_uid].append(
+                np.asarray(audio_data, dtype=np.float32)
             )
 
     async def _handle_raw_audio_data(
         self, websocket: WebSocket, client_uid: str, data: WSMessage
     ) -> None:
-        """Handle incoming raw audio data for VAD processing"""
-        context = self.client_contexts[client_uid]
+        """Handle incoming raw audio data for VAD processing
+
+        The per-client EnergyVAD yields a pause marker at speech start and the
+        whole utterance (leading/trailing silence trimmed) at speech end, so the
+        conversation is triggered without waiting for the client's mic-audio-end.
+        """
         chunk = data.get("audio", [])
         if chunk:
-            for audio_bytes in context.vad_engine.detect_speech(chunk):
-                if audio_bytes == b"<|PAUSE|>":
+            for audio_bytes in self.client_vads[client_uid].detect_speech(chunk):
+                if audio_bytes == PAUSE_MARKER:
                     await websocket.send_text(
                         json.dumps({"type": "control", "text": "interrupt"})
                     )
@@ -477,10 +493,7 @@ class WebSocketHandler:
                     pass
                 elif len(audio_bytes) > 1024:
                     # Detected audio activity (voice)
-                    self.received_data_buffers[client_uid] = np.append(
-                        self.received_data_buffers[client_uid],
-                        np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32),
-                    )
+                    self.received_data_buffers[client_uid].append_pcm16(audio_bytes)
                     await websocket.send_text(
                         json.dumps({"type": "control", "text": "mic-audio-end"})
                     )
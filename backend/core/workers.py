@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程工作模式模块
+
+通过 SO_REUSEPORT 让多个工作进程绑定同一端口，由内核在进程间分发连接，
+突破单进程单核与GIL的限制：
+- WorkerSupervisor: 启动、监控并重启工作进程，转发退出信号
+- current_worker_id: 当前进程的工作进程编号（单进程模式为0）
+
+WebSocket连接建立后始终由同一工作进程处理；跨进程共享的状态
+（聊天记录、连接注册表）使用基于文件的SQLite后端。
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# 传递工作进程编号的环境变量
+WORKER_ID_ENV = "AI_VTUBER_WORKER_ID"
+
+
+def current_worker_id() -> int:
+    """获取当前进程的工作进程编号"""
+    try:
+        return int(os.environ.get(WORKER_ID_ENV, "0"))
+    except ValueError:
+        return 0
+
+
+def reuse_port_supported() -> bool:
+    """检查当前平台是否支持 SO_REUSEPORT"""
+    if sys.platform == 'win32' or not hasattr(socket, 'SO_REUSEPORT'):
+        return False
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        return True
+    except OSError:
+        return False
+
+
+class WorkerSupervisor:
+    """工作进程监督器"""
+
+    def __init__(self, worker_count: int, target: Callable[[int], None],
+                 restart_delay: float = 1.0, max_restart_delay: float = 30.0,
+                 stable_after: float = 60.0):
+        """初始化监督器
+
+        Args:
+            worker_count: 工作进程数量
+            target: 工作进程入口函数，参数为工作进程编号（需可被pickle）
+            restart_delay: 崩溃后重启的初始等待时间（秒）
+            max_restart_delay: 连续崩溃时的最大等待时间（秒）
+            stable_after: 运行超过该时长后退出不计入连续崩溃（秒）
+        """
+        self.worker_count = worker_count
+        self.target = target
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        # spawn 避免复制父进程中已加载的模型和事件循环
+        self._context = multiprocessing.get_context('spawn')
+        self._workers: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._crash_counts: Dict[int, int] = {}
+        self._stopping = False
+
+    def _spawn(self, worker_id: int):
+        """启动指定编号的工作进程"""
+        # spawn 模式下子进程继承启动时的环境变量
+        previous = os.environ.get(WORKER_ID_ENV)
+        os.environ[WORKER_ID_ENV] = str(worker_id)
+        try:
+            process = self._context.Process(
+                target=self.target,
+                args=(worker_id,),
+                name=f"ai-vtuber-worker-{worker_id}",
+                daemon=False
+            )
+            process.start()
+        finally:
+            if previous is None:
+                os.environ.pop(WORKER_ID_ENV, None)
+            else:
+                os.environ[WORKER_ID_ENV] = previous
+        self._workers[worker_id] = process
+        self._started_at[worker_id] = time.monotonic()
+        logger.info(f"工作进程已启动: #{worker_id} (pid {process.pid})")
+
+    def _handle_signal(self, signum, frame):
+        """收到退出信号时停止所有工作进程"""
+        logger.info(f"收到信号 {signum}，正在停止所有工作进程...")
+        self._stopping = True
+
+    def stop(self, timeout: float = 10.0):
+        """停止所有工作进程"""
+        self._stopping = True
+        for process in self._workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"工作进程 {process.pid} 未按时退出，强制结束")
+                process.kill()
+                process.join()
+        logger.info("所有工作进程已停止")
+
+    def run(self, poll_interval: float = 0.5) -> int:
+        """启动并监督工作进程，直到收到退出信号
+
+        Returns:
+            退出码
+        """
+        signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGTERM, self._handle_signal)
+
+        for worker_id in range(self.worker_count):
+            self._spawn(worker_id)
+
+        restart_at: Dict[int, float] = {}
+        try:
+            while not self._stopping:
+                now = time.monotonic()
+                for worker_id, process in list(self._workers.items()):
+                    if process.is_alive() or worker_id in restart_at:
+                        continue
+                    # 连续崩溃时指数退避，避免重启风暴；稳定运行一段时间后重新计数
+                    if now - self._started_at.get(worker_id, now) > self.stable_after:
+                        self._crash_counts[worker_id] = 0
+                    crashes = self._crash_counts.get(worker_id, 0) + 1
+                    self._crash_counts[worker_id] = crashes
+                    delay = min(self.restart_delay * (2 ** (crashes - 1)), self.max_restart_delay)
+                    logger.error(f"工作进程 #{worker_id} 已退出 (退出码 {process.exitcode})，"
+                                 f"{delay:.1f}秒后重启")
+                    restart_at[worker_id] = now + delay
+
+                for worker_id, when in list(restart_at.items()):
+                    if now >= when and not self._stopping:
+                        del restart_at[worker_id]
+                        self._spawn(worker_id)
+
+                time.sleep(poll_interval)
+        finally:
+            self.stop()
+        return 0
+
+
+def run_workers(worker_count: int, target: Callable[[int], None]) -> int:
+    """以多进程模式运行服务
+
+    Args:
+        worker_count: 工作进程数量
+        target: 工作进程入口函数
+
+    Returns:
+        退出码
+    """
+    supervisor = WorkerSupervisor(worker_count, target)
+    return supervisor.run()
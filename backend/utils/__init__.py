@@ -3,6 +3,9 @@
 
 包含：
 - service_context: 服务上下文
+- audio_buffer: 分块音频缓冲区
+- metrics: 指标采集
+- tracing: 对话回合追踪
 - vad: 语音活动检测
 - translate: 翻译功能
 """
\ No newline at end of file
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块音频缓冲区模块
+
+替代每收到一段音频就 np.append 整个缓冲区（每次复制全部已有数据，长发言的时间和内存都是二次方）：
+- 采样写入预分配的定长 float32 块，块写满后追加新块，追加的摊还开销为 O(1)
+- 二进制PCM通过 np.frombuffer 视图直接写入块内（写入时完成类型转换，不产生中间数组）
+- 发言结束时 take() 一次性拼成连续数组；只有一个块时直接返回该块的视图
+- 总采样数有硬上限，超出时丢弃最早的采样（环形语义），丢弃数量记在 dropped
+"""
+
+from typing import List
+
+import numpy as np
+
+# 默认块大小: 16kHz 下1秒
+DEFAULT_CHUNK_SAMPLES = 16000
+# 默认上限: 16kHz 下60秒
+DEFAULT_MAX_SAMPLES = 16000 * 60
+# 保留以便复用的空闲块数
+_MAX_SPARE_CHUNKS = 2
+
+
+class AudioBuffer:
+    """按块增长、有容量上限的单声道 float32 音频缓冲区（非线程安全）"""
+
+    def __init__(self, chunk_samples: int = DEFAULT_CHUNK_SAMPLES,
+                 max_samples: int = DEFAULT_MAX_SAMPLES):
+        """初始化缓冲区
+
+        Args:
+            chunk_samples: 每个预分配块的采样数
+            max_samples: 缓冲区最多保留的采样数
+        """
+        if chunk_samples <= 0 or max_samples <= 0:
+            raise ValueError("块大小和容量上限必须为正数")
+        self.chunk_samples = chunk_samples
+        self.max_samples = max_samples
+        self.dropped = 0
+        self._chunks: List[np.ndarray] = []
+        self._spare: List[np.ndarray] = [np.empty(chunk_samples, dtype=np.float32)]
+        # 第一个块中有效数据的起点、最后一个块中已写入的采样数
+        self._head = 0
+        self._fill = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """已分配的内存（字节）"""
+        return (len(self._chunks) + len(self._spare)) * self.chunk_samples * 4
+
+    def append(self, samples) -> int:
+        """追加采样（任意数值类型，按值转换为 float32，不做缩放）
+
+        Returns:
+            写入的采样数
+        """
+        samples = np.asarray(samples).reshape(-1)
+        if samples.size > self.max_samples:
+            # 单次写入就超过上限时只保留最后 max_samples 个
+            self.dropped += samples.size - self.max_samples
+            samples = samples[-self.max_samples:]
+
+        written = 0
+        while written < samples.size:
+            if not self._chunks or self._fill == self.chunk_samples:
+                self._chunks.append(self._spare.pop() if self._spare
+                                    else np.empty(self.chunk_samples, dtype=np.float32))
+                self._fill = 0
+            count = min(self.chunk_samples - self._fill, samples.size - written)
+            self._chunks[-1][self._fill:self._fill + count] = samples[written:written + count]
+            self._fill += count
+            written += count
+        self._size += written
+
+        if self._size > self.max_samples:
+            self._drop(self._size - self.max_samples)
+        return written
+
+    def append_pcm16(self, data: bytes) -> int:
+        """追加16位小端PCM数据（按采样值转换，与 np.frombuffer(..., int16).astype(float32) 一致）"""
+        return self.append(np.frombuffer(data, dtype='<i2', count=len(data) // 2))
+
+    def _drop(self, count: int):
+        """丢弃最早的 count 个采样"""
+        self.dropped += count
+        self._size -= count
+        while count > 0:
+            end = self._fill if len(self._chunks) == 1 else self.chunk_samples
+            available = end - self._head
+            if count < available:
+                self._head += count
+                return
+            count -= available
+            self._recycle(self._chunks.pop(0))
+            self._head = 0
+            if not self._chunks:
+                self._fill = 0
+
+    def _recycle(self, chunk: np.ndarray):
+        if len(self._spare) < _MAX_SPARE_CHUNKS:
+            self._spare.append(chunk)
+
+    def view(self) -> np.ndarray:
+        """当前内容的连续数组（单块时为视图，继续写入会改变它；多块时为新数组）"""
+        if not self._chunks:
+            return np.empty(0, dtype=np.float32)
+        if len(self._chunks) == 1:
+            return self._chunks[0][self._head:self._fill]
+        out = np.empty(self._size, dtype=np.float32)
+        position = self.chunk_samples - self._head
+        out[:position] = self._chunks[0][self._head:]
+        for chunk in self._chunks[1:-1]:
+            out[position:position + self.chunk_samples] = chunk
+            position += self.chunk_samples
+        out[position:] = self._chunks[-1][:self._fill]
+        return out
+
+    def take(self) -> np.ndarray:
+        """取出全部内容并清空（发言结束时调用），返回的数组归调用方所有"""
+        data = self.view()
+        # 单块时返回的是块的视图，该块不能再复用
+        if len(self._chunks) > 1:
+            for chunk in self._chunks:
+                self._recycle(chunk)
+        self._reset()
+        return data
+
+    def clear(self):
+        """丢弃全部内容，保留块供复用"""
+        for chunk in self._chunks:
+            self._recycle(chunk)
+        self._reset()
+
+    def _reset(self):
+        self._chunks = []
+        self._head = 0
+        self._fill = 0
+        self._size = 0
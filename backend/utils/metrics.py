@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标采集模块
+
+提供Prometheus文本格式的指标注册表：
+- Counter: 单调递增计数器
+- Gauge: 可增减的瞬时值
+- Histogram: 预分配桶的直方图
+
+指标会在事件循环之外的线程中更新（后写线程、线程池中的清理与识别），
+每个指标（含各标签子指标）持有一把锁：`+=` 不是原子操作，不加锁会丢失计数。
+临界区只有几次累加（直方图桶在创建时一次性分配，observe 另做一次锁外的二分查找），
+开销足以常驻生产环境。
+多进程模式下每个工作进程各自采集，导出时附带 worker 标签。
+"""
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..core.workers import WORKER_ID_ENV, current_worker_id
+
+# 默认延迟桶（秒）
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    """指标基类，管理带标签的子指标"""
+
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], '_Metric'] = {}
+        # 保护本指标的数值与子指标字典
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs) -> '_Metric':
+        """获取指定标签值的子指标（首次访问时创建并缓存）"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                # 加锁后再查一次，避免两个线程为同一组标签各建一个子指标
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+
+    def _new_child(self) -> '_Metric':
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """返回 (后缀, 标签名, 标签值, 数值) 列表"""
+        raise NotImplementedError
+
+    def collect(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        if not self.labelnames:
+            return self._samples()
+        samples = []
+        for values, child in list(self._children.items()):
+            for suffix, names, label_values, value in child._samples():
+                samples.append((suffix, self.labelnames + names, values + label_values, value))
+        return samples
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+
+    def _new_child(self) -> 'Counter':
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def _samples(self):
+        return [('_total', (), (), self._value)]
+
+
+class Gauge(_Metric):
+    """可增减的瞬时值"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+
+    def _new_child(self) -> 'Gauge':
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def track_inprogress(self) -> '_InProgress':
+        """上下文管理器：进入时加一，退出时减一"""
+        return _InProgress(self)
+
+    def _samples(self):
+        return [('', (), (), self._value)]
+
+
+class _InProgress:
+    __slots__ = ('_gauge',)
+
+    def __init__(self, gauge: Gauge):
+        self._gauge = gauge
+
+    def __enter__(self):
+        self._gauge.inc()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._gauge.dec()
+
+
+class Histogram(_Metric):
+    """预分配桶的直方图"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶对应 +Inf
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def _new_child(self) -> 'Histogram':
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> '_Timer':
+        """上下文管理器：记录代码块耗时（秒）"""
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def _samples(self):
+        # 取一致的快照，保证各桶之和等于 _count
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            samples.append(('_bucket', ('le',), (_format_value(bound),), cumulative))
+        samples.append(('_sum', (), (), total))
+        samples.append(('_count', (), (), count))
+        return samples
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, const_labels: Optional[Dict[str, str]] = None):
+        """初始化注册表
+
+        Args:
+            const_labels: 附加到所有样本的固定标签
+        """
+        self.const_labels = dict(const_labels or {})
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric):
+                raise ValueError(f"指标 {metric.name} 已注册为其他类型")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """导出Prometheus文本格式（version 0.0.4）"""
+        const_names = tuple(self.const_labels.keys())
+        const_values = tuple(self.const_labels.values())
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for suffix, names, values, value in metric.collect():
+                labels = _format_labels(const_names + names, const_values + values)
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# 全局指标注册表
+registry = MetricsRegistry({'worker': str(current_worker_id())} if WORKER_ID_ENV in os.environ else None)
+
+# ==== 对话链路指标
+
+LLM_FIRST_TOKEN_SECONDS = registry.histogram(
+    'llm_first_token_seconds', 'LLM请求到首个token（非流式请求为首字节）的延迟', ['provider'])
+LLM_REQUEST_SECONDS = registry.histogram(
+    'llm_request_seconds', 'LLM请求总耗时', ['provider'])
+TTS_SYNTHESIS_SECONDS = registry.histogram(
+    'tts_synthesis_seconds', 'TTS合成耗时', ['provider'])
+TTS_REAL_TIME_FACTOR = registry.histogram(
+    'tts_real_time_factor', 'TTS实时率（合成耗时/音频时长）', ['provider'],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0))
+ASR_REQUEST_SECONDS = registry.histogram(
+    'asr_request_seconds', 'ASR识别耗时', ['provider'])
+LLM_SPECULATION_TOTAL = registry.counter(
+    'llm_speculation', '基于稳定ASR中间结果提前发起的LLM请求（hit/miss/discarded）', ['outcome'])
+LLM_SPECULATION_SAVED_SECONDS = registry.histogram(
+    'llm_speculation_saved_seconds', 'LLM预测命中时每回合节省的时间',
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0))
+WS_SEND_SECONDS = registry.histogram(
+    'ws_send_seconds', 'WebSocket消息发送耗时',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+WS_ACTIVE_CONNECTIONS = registry.gauge(
+    'ws_active_connections', '当前WebSocket连接数')
+PIPELINE_INFLIGHT = registry.gauge(
+    'pipeline_inflight', '各阶段正在处理的请求数（队列深度）', ['stage'])
+CACHE_REQUESTS_TOTAL = registry.counter(
+    'cache_requests', '缓存访问次数', ['cache', 'result'])
+SQLITE_QUERY_SECONDS = registry.histogram(
+    'sqlite_query_seconds', 'SQLite查询耗时', ['operation'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+HISTORY_WRITE_QUEUE_DEPTH = registry.gauge(
+    'history_write_queue_depth', '等待落盘的聊天消息数')
+HISTORY_WRITE_BATCH_SIZE = registry.histogram(
+    'history_write_batch_size', '聊天记录单个事务写入的消息数',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+HISTORY_WRITE_FAILURES_TOTAL = registry.counter(
+    'history_write_failures', '聊天记录批量写入失败（将重试）的次数')
+RETENTION_RUN_SECONDS = registry.histogram(
+    'history_retention_run_seconds', '聊天记录清理单轮耗时',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+RETENTION_DELETED_TOTAL = registry.counter(
+    'history_retention_deleted', '聊天记录清理删除的行数', ['kind'])
+HISTORY_ARCHIVED_TOTAL = registry.counter(
+    'history_archived', '移入冷归档的聊天记录数', ['kind'])
+RETENTION_VACUUM_PAGES_TOTAL = registry.counter(
+    'history_retention_vacuum_pages', '增量VACUUM归还的页数')
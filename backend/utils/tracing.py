@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话回合追踪模块
+
+以回合（turn）为单位记录一次对话从收到消息到发出音频的各阶段耗时：
+- 回合与当前span通过 contextvars 在协程调用链中传递，无需逐层传参
+- 未处于回合中时 span() 返回空上下文，几乎没有额外开销
+- 最近的回合保存在固定容量的环形缓冲区中，供 /api/traces 查询
+- 每个回合单独记录首段音频发出时间（time-to-first-audio）
+"""
+
+import contextlib
+import logging
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..core.config import config
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('current_trace', default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar('current_span', default=None)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class Span:
+    """回合中的一个阶段"""
+
+    __slots__ = ('name', 'start', 'end', 'parent', 'attrs')
+
+    def __init__(self, name: str, start: float, parent: Optional[int], attrs: Dict[str, Any]):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.parent = parent
+        self.attrs = attrs
+
+
+class Trace:
+    """一次对话回合的追踪记录"""
+
+    def __init__(self, kind: str, attrs: Optional[Dict[str, Any]] = None):
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.attrs = dict(attrs or {})
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self.first_audio = None
+        self.first_audio_mode = None
+        self.error = None
+        self.spans: List[Span] = []
+
+    def elapsed(self) -> float:
+        """距回合开始的秒数"""
+        return time.perf_counter() - self._t0
+
+    def mark_first_audio(self, mode: str):
+        """记录首段音频发出时间（仅第一次生效）"""
+        if self.first_audio is None:
+            self.first_audio = self.elapsed()
+            self.first_audio_mode = mode
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（时间单位：毫秒，span起点相对回合开始）"""
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            'turn_id': self.turn_id,
+            'kind': self.kind,
+            'attrs': self.attrs,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+            'duration_ms': ms(self.duration),
+            'time_to_first_audio_ms': ms(self.first_audio),
+            'first_audio_mode': self.first_audio_mode,
+            'error': self.error,
+            'spans': [
+                {
+                    'name': span.name,
+                    'start_ms': ms(span.start),
+                    'duration_ms': ms(None if span.end is None else span.end - span.start),
+                    'parent': span.parent,
+                    'attrs': span.attrs,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+class Tracer:
+    """回合追踪器"""
+
+    def __init__(self, capacity: int = 200):
+        """初始化追踪器
+
+        Args:
+            capacity: 环形缓冲区保留的回合数
+        """
+        self._traces = deque(maxlen=capacity)
+
+    @contextlib.contextmanager
+    def start_turn(self, kind: str, **attrs):
+        """开始一个回合；已处于回合中时复用当前回合"""
+        if _current_trace.get() is not None:
+            yield _current_trace.get()
+            return
+
+        trace = Trace(kind, attrs)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = repr(e)
+            raise
+        finally:
+            trace.duration = trace.elapsed()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self._traces.append(trace)
+            first_audio = f"{trace.first_audio * 1000:.0f}ms" if trace.first_audio is not None else "无"
+            logger.info(f"回合 {trace.turn_id} ({kind}) 完成: 总耗时 {trace.duration * 1000:.0f}ms, "
+                        f"首段音频 {first_audio}")
+
+    def span(self, name: str, **attrs):
+        """记录一个阶段的耗时；不在回合中时返回空上下文"""
+        trace = _current_trace.get()
+        if trace is None:
+            return _NULL_CONTEXT
+        return self._span(trace, name, attrs)
+
+    @contextlib.contextmanager
+    def _span(self, trace: Trace, name: str, attrs: Dict[str, Any]):
+        span = Span(name, trace.elapsed(), _current_span.get(), attrs)
+        trace.spans.append(span)
+        token = _current_span.set(len(trace.spans) - 1)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs['error'] = repr(e)
+            raise
+        finally:
+            span.end = trace.elapsed()
+            _current_span.reset(token)
+
+    def event(self, name: str, **attrs):
+        """记录一个时间点（零时长span）"""
+        trace = _current_trace.get()
+        if trace is not None:
+            span = Span(name, trace.elapsed(), _current_span.get(), attrs)
+            span.end = span.start
+            trace.spans.append(span)
+
+    def mark_first_audio(self, mode: str):
+        """记录当前回合的首段音频发出时间"""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.mark_first_audio(mode)
+
+    def current_turn_id(self) -> Optional[str]:
+        """当前回合ID"""
+        trace = _current_trace.get()
+        return trace.turn_id if trace is not None else None
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """最近的回合（新的在前）"""
+        traces = list(self._traces)[-limit:] if limit > 0 else []
+        return [trace.to_dict() for trace in reversed(traces)]
+
+    def get(self, turn_id: str) -> Optional[Dict[str, Any]]:
+        """按回合ID查询"""
+        for trace in reversed(self._traces):
+            if trace.turn_id == turn_id:
+                return trace.to_dict()
+        return None
+
+
+# 全局追踪器
+tracer = Tracer(capacity=config.get('tracing.capacity', 200))
@@ -1,3 +1,23 @@
 """
 语音活动检测模块
-"""
\ No newline at end of file
+"""
+
+from .energy_vad import (
+    PAUSE_MARKER,
+    SPEECH,
+    SPEECH_END,
+    SPEECH_START,
+    EnergyVAD,
+    VADEvent,
+    frame_features,
+)
+
+__all__ = [
+    'PAUSE_MARKER',
+    'SPEECH',
+    'SPEECH_END',
+    'SPEECH_START',
+    'EnergyVAD',
+    'VADEvent',
+    'frame_features',
+]
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+能量 + 过零率语音活动检测（VAD）与端点检测
+
+- 每批输入一次性分帧，用 NumPy 向量化计算每帧的RMS能量和过零率
+- 判决阈值 = max(最小能量, 噪声底 × 能量倍数)，过零率过高（类噪声）的帧不算语音
+- 噪声底按指数滑动平均（整批闭式计算）自适应：最近 noise_window_s 内的帧能量不足一个窗口时，
+  跟踪非语音帧的能量；之后跟踪窗口内全部帧能量的低分位数（最小统计量），与语音判决无关，
+  持续的背景噪声即使起初被误判为语音，噪声底也会升到噪声水平并结束这段"语音"
+- 连续 start_frames 个语音帧才判为说话开始（附带 pre_roll 的前导音频）；
+  说话中静音超过 hangover 才判为结束，结尾的静音帧被丢弃
+- 输出事件: speech_start（含前导与起始帧音频）、speech（说话中的新音频）、speech_end
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from ..audio_buffer import AudioBuffer
+
+SPEECH_START = 'speech_start'
+SPEECH = 'speech'
+SPEECH_END = 'speech_end'
+
+# 与 VADInterface 兼容的控制标记
+PAUSE_MARKER = b"<|PAUSE|>"
+
+
+class VADEvent:
+    """VAD事件"""
+
+    __slots__ = ('kind', 'audio')
+
+    def __init__(self, kind: str, audio: Optional[np.ndarray] = None):
+        self.kind = kind
+        self.audio = audio
+
+    def __repr__(self) -> str:
+        size = 0 if self.audio is None else self.audio.size
+        return f"VADEvent({self.kind}, {size} samples)"
+
+
+def frame_features(frames: np.ndarray):
+    """计算每帧的RMS能量与过零率
+
+    Args:
+        frames: (帧数, 帧长) 的 float32 采样
+
+    Returns:
+        (rms, zcr) 两个长度为帧数的数组
+    """
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, frames.shape[1] - 1)
+    return rms, zcr
+
+
+class EnergyVAD:
+    """增量式能量VAD（每个音频流一个实例，非线程安全）"""
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, energy_ratio: float = 3.0,
+                 min_energy: float = 0.01, max_zcr: float = 0.4, start_ms: int = 60,
+                 hangover_ms: int = 500, pre_roll_ms: int = 200, noise_adapt: float = 0.05,
+                 max_utterance_s: float = 30.0, noise_window_s: float = 5.0,
+                 noise_percentile: float = 10.0):
+        """初始化VAD
+
+        Args:
+            sample_rate: 采样率
+            frame_ms: 帧长（毫秒）
+            energy_ratio: 语音能量相对噪声底的倍数
+            min_energy: 最小语音RMS（float采样，满幅为1）
+            max_zcr: 语音帧的最大过零率
+            start_ms: 连续语音多久判为说话开始
+            hangover_ms: 说话中静音多久判为说话结束
+            pre_roll_ms: 说话开始前保留的前导音频
+            noise_adapt: 噪声底滑动平均系数（每帧）
+            max_utterance_s: 单次发言最长时间，超过时强制结束
+            noise_window_s: 估计噪声底时参考的最近时长
+            noise_percentile: 以窗口内帧能量的该分位数作为噪声水平
+        """
+        self.sample_rate = sample_rate
+        self.frame_length = max(1, sample_rate * frame_ms // 1000)
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.noise_adapt = noise_adapt
+        self.max_utterance_frames = int(max_utterance_s * 1000 // frame_ms)
+        self.noise_percentile = noise_percentile
+        # 初始噪声底恰好使阈值等于最小能量
+        self.noise_floor = min_energy / energy_ratio
+        # 最近 noise_window_s 内每帧能量的环形缓冲
+        self._energy = np.zeros(max(1, int(noise_window_s * 1000 // frame_ms)))
+        self._energy_pos = 0
+        self._energy_count = 0
+        self._utterance: Optional[AudioBuffer] = None
+        self.reset()
+
+    @classmethod
+    def from_config(cls, vad_config: Dict[str, Any], sample_rate: int = 16000) -> 'EnergyVAD':
+        """从配置创建VAD"""
+        options = {key: vad_config[key] for key in (
+            'frame_ms', 'energy_ratio', 'min_energy', 'max_zcr', 'start_ms',
+            'hangover_ms', 'pre_roll_ms', 'noise_adapt', 'max_utterance_s', 'noise_window_s',
+            'noise_percentile') if key in vad_config}
+        return cls(sample_rate=sample_rate, **options)
+
+    def reset(self):
+        """重置状态（保留已学习的噪声底）"""
+        self.in_speech = False
+        self._remainder = np.empty(0, dtype=np.float32)
+        self._recent = deque(maxlen=self.pre_roll_frames + self.start_frames)
+        self._run = 0
+        self._silence: List[np.ndarray] = []
+        self._speech_frames = 0
+
+    def process(self, samples: np.ndarray) -> List[VADEvent]:
+        """处理一批 float32 采样，返回产生的事件"""
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self._remainder.size:
+            samples = np.concatenate((self._remainder, samples))
+        count = samples.size // self.frame_length
+        self._remainder = samples[count * self.frame_length:].copy()
+        if count == 0:
+            return []
+
+        frames = samples[:count * self.frame_length].reshape(count, self.frame_length)
+        rms, zcr = frame_features(frames)
+        threshold = max(self.min_energy, self.noise_floor * self.energy_ratio)
+        voiced = (rms >= threshold) & (zcr <= self.max_zcr)
+        self._adapt_noise_floor(rms, voiced)
+
+        events: List[VADEvent] = []
+        speech: List[np.ndarray] = []
+        for frame, is_voiced in zip(frames, voiced):
+            if not self.in_speech:
+                self._recent.append(frame)
+                self._run = self._run + 1 if is_voiced else 0
+                if self._run >= self.start_frames:
+                    self.in_speech = True
+                    self._speech_frames = len(self._recent)
+                    events.append(VADEvent(SPEECH_START, np.concatenate(list(self._recent))))
+                    self._recent.clear()
+                    self._run = 0
+                continue
+
+            self._speech_frames += 1
+            if is_voiced:
+                # 说话继续，暂存的静音帧属于句中停顿
+                speech.extend(self._silence)
+                self._silence = []
+                speech.append(frame)
+            else:
+                self._silence.append(frame)
+
+            if len(self._silence) >= self.hangover_frames or self._speech_frames >= self.max_utterance_frames:
+                if speech:
+                    events.append(VADEvent(SPEECH, np.concatenate(speech)))
+                    speech = []
+                events.append(VADEvent(SPEECH_END))
+                # 结尾的静音被丢弃
+                self.in_speech = False
+                self._silence = []
+                self._speech_frames = 0
+
+        if speech:
+            events.append(VADEvent(SPEECH, np.concatenate(speech)))
+        return events
+
+    def flush(self) -> List[VADEvent]:
+        """输入结束：说话中则产生 speech_end（丢弃结尾静音）"""
+        events = [VADEvent(SPEECH_END)] if self.in_speech else []
+        self.reset()
+        return events
+
+    def _adapt_noise_floor(self, rms: np.ndarray, voiced: np.ndarray):
+        """更新噪声底: 窗口填满前跟踪非语音帧能量，之后跟踪窗口内帧能量的低分位数"""
+        self._remember_energy(rms)
+        if self._energy_count >= self._energy.size:
+            target = float(np.percentile(self._energy, self.noise_percentile))
+            self.noise_floor += (1 - (1 - self.noise_adapt) ** rms.size) * (target - self.noise_floor)
+            return
+        silence_rms = rms[~voiced]
+        if silence_rms.size == 0 or self.in_speech:
+            return
+        # 按帧顺序的指数滑动平均，整批闭式计算
+        alpha = self.noise_adapt
+        decay = (1 - alpha) ** np.arange(silence_rms.size - 1, -1, -1)
+        self.noise_floor = float((1 - alpha) ** silence_rms.size * self.noise_floor
+                                 + alpha * np.dot(decay, silence_rms))
+
+    def _remember_energy(self, rms: np.ndarray):
+        """把本批帧能量写入环形缓冲"""
+        size = self._energy.size
+        rms = rms[-size:]
+        end = self._energy_pos + rms.size
+        if end <= size:
+            self._energy[self._energy_pos:end] = rms
+        else:
+            split = size - self._energy_pos
+            self._energy[self._energy_pos:] = rms[:split]
+            self._energy[:end - size] = rms[split:]
+        self._energy_pos = end % size
+        self._energy_count += rms.size
+
+    def detect_speech(self, audio_data) -> Iterator[bytes]:
+        """与 VADInterface 兼容的接口: 输入 float 采样列表
+
+        Yields:
+            说话开始时产生 PAUSE_MARKER，说话结束时产生整段发言的16位PCM
+        """
+        for event in self.process(np.asarray(audio_data, dtype=np.float32)):
+            if event.kind == SPEECH_START:
+                self._utterance = AudioBuffer(max_samples=self.max_utterance_frames * self.frame_length)
+                self._utterance.append(event.audio)
+                yield PAUSE_MARKER
+            elif event.kind == SPEECH and self._utterance is not None:
+                self._utterance.append(event.audio)
+            elif event.kind == SPEECH_END and self._utterance is not None:
+                utterance = self._utterance.take()
+                self._utterance = None
+                yield (np.clip(utterance, -1.0, 1.0) * 32767).astype('<i2').tobytes()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量语音识别模块
+
+用于重新识别录制的会话和语音训练素材：
+- 上传的音频边接收边解析：multipart/form-data 中的每个文件，或 tar 包（可gzip/bz2/xz压缩）中的每个音频文件
+- 同时识别的音频数受 concurrency 限制；达到上限时暂停解析（背压），内存中最多保留 concurrency 个音频
+- 音频按顺序轮流分配给指定的多个提供商，每个提供商还可以单独限制并发
+- 结果按完成顺序逐条产出，最后一条为汇总
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import tarfile
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..ai.history_export import StreamReaderFile
+
+logger = logging.getLogger(__name__)
+
+# tar 包中作为音频处理的文件扩展名
+AUDIO_EXTENSIONS = ('.wav', '.wave', '.pcm', '.raw')
+# 作为 tar 包接收的 Content-Type
+TAR_CONTENT_TYPES = (
+    'application/x-tar',
+    'application/tar',
+    'application/x-gtar',
+    'application/gzip',
+    'application/x-gzip',
+    'application/octet-stream',
+)
+
+# 一个音频: (文件名, 数据)；数据为None表示超过大小限制
+Clip = Tuple[str, Optional[bytes]]
+
+_DONE = object()
+
+
+def is_audio_name(name: str) -> bool:
+    """按扩展名判断是否为音频文件（忽略隐藏文件，如 macOS 的 ._ 文件）"""
+    base = os.path.basename(name)
+    return not base.startswith('.') and base.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def iter_tar_clips(fileobj, max_clip_bytes: int) -> Iterator[Clip]:
+    """顺序读取 tar 流中的音频文件（不需要随机访问）"""
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not is_audio_name(member.name):
+                continue
+            if member.size > max_clip_bytes:
+                yield member.name, None
+                continue
+            yield member.name, archive.extractfile(member).read()
+
+
+async def iter_tar_stream(reader, max_clip_bytes: int) -> AsyncIterator[Clip]:
+    """从异步流（如 request.content）解析 tar 包，解析在线程中进行"""
+    loop = asyncio.get_running_loop()
+    clips = iter_tar_clips(StreamReaderFile(reader, loop), max_clip_bytes)
+    while True:
+        clip = await loop.run_in_executor(None, next, clips, None)
+        if clip is None:
+            return
+        yield clip
+
+
+async def iter_multipart_clips(reader, max_clip_bytes: int) -> AsyncIterator[Clip]:
+    """逐个读取 multipart 请求中的文件部分（没有文件名的字段被跳过）"""
+    while True:
+        part = await reader.next()
+        if part is None:
+            return
+        if part.filename is None:
+            await part.release()
+            continue
+        data = bytearray()
+        while True:
+            chunk = await part.read_chunk()
+            if not chunk:
+                break
+            data.extend(chunk)
+            if len(data) > max_clip_bytes:
+                await part.release()
+                data = None
+                break
+        yield part.filename, None if data is None else bytes(data)
+
+
+async def run_batch(clips: AsyncIterator[Clip],
+                    recognize: Callable[[bytes, str], Awaitable[Optional[str]]],
+                    providers: List[str], concurrency: int = 4,
+                    provider_concurrency: Optional[Dict[str, int]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """并发识别一批音频，按完成顺序产出结果
+
+    Args:
+        clips: 音频的异步迭代器
+        recognize: 识别函数 (音频数据, 提供商名) -> 文本；失败时应抛出异常，异常信息写入结果的 error
+        providers: 轮流使用的提供商
+        concurrency: 同时识别的音频数上限
+        provider_concurrency: 各提供商的并发上限（未列出的只受总上限约束）
+
+    Yields:
+        每个音频一条 {'index', 'name', 'provider', 'text', 'success', 'elapsed_ms'[, 'error']}，
+        最后一条为 {'done': True, 'total', 'succeeded', 'failed', 'elapsed_ms'[, 'error']}
+    """
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    provider_slots = {name: asyncio.Semaphore(max(1, limit))
+                      for name, limit in (provider_concurrency or {}).items()}
+    results: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+    summary = {'done': True, 'total': 0, 'succeeded': 0, 'failed': 0}
+
+    async def run_one(index: int, name: str, data: Optional[bytes], provider: str):
+        clip_started = time.perf_counter()
+        result = {'index': index, 'name': name, 'provider': provider, 'text': '', 'success': False}
+        try:
+            if data is None:
+                raise ValueError('音频超过大小限制')
+            limit = provider_slots.get(provider)
+            if limit is None:
+                text = await recognize(data, provider)
+            else:
+                async with limit:
+                    text = await recognize(data, provider)
+            result.update(text=text or '', success=text is not None)
+            if text is None:
+                result['error'] = '提供商未返回识别结果'
+        except Exception as e:
+            result['error'] = str(e)
+        finally:
+            slots.release()
+        result['elapsed_ms'] = round((time.perf_counter() - clip_started) * 1000, 1)
+        results.put_nowait(result)
+
+    async def produce():
+        assign = itertools.cycle(providers)
+        try:
+            index = 0
+            iterator = clips.__aiter__()
+            while True:
+                # 先占用名额再解析下一个音频，内存中最多保留 concurrency 个音频
+                await slots.acquire()
+                try:
+                    name, data = await iterator.__anext__()
+                except BaseException:
+                    slots.release()
+                    raise
+                task = asyncio.create_task(run_one(index, name, data, next(assign)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                index += 1
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            logger.error(f"批量识别解析上传数据失败: {e}")
+            summary['error'] = f'上传数据无效: {e}'
+        if tasks:
+            await asyncio.gather(*tasks)
+        results.put_nowait(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            result = await results.get()
+            if result is _DONE:
+                break
+            summary['total'] += 1
+            summary['succeeded' if result['success'] else 'failed'] += 1
+            yield result
+        summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        yield summary
+    finally:
+        # 客户端断开等提前结束时停止解析和识别
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
@@ -1,24 +1,148 @@
 """
 语音识别（ASR）管理器模块 - 重构阶段4迁移
 
-支持多种语音识别服务：浏览器原生、百度ASR、Azure Speech等
+支持多种语音识别服务：浏览器原生、百度ASR、本地 faster-whisper 等
 提供统一的语音识别接口和管理功能
+
+流式识别（StreamingASRSession）：一次发言对应一个会话，
+start() -> feed(音频块)... -> finish() 得到最终结果，partials() 产生逐步更新的中间结果；
+不支持流式的提供商由 BufferedASRStream 在 finish() 时整段识别
+
+输入音频统一解析为 AudioClip（见 audio_ingest），各提供商通过 recognize_audio()
+按自己的原生格式（采样率、编码）取用，只做必要的转换
 """
 
 import asyncio
+import importlib.util
 import logging
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, Callable
+from typing import AsyncIterator, Awaitable, Optional, Dict, Any, Callable, List, Tuple
 import json
 import base64
 import tempfile
 import os
 
+import aiohttp
+import numpy as np
+
+from ..utils.metrics import ASR_REQUEST_SECONDS
+from .audio_ingest import AudioClip
+
 logger = logging.getLogger(__name__)
 
+# 流式识别输入的音频格式：单声道16位小端PCM
+STREAM_SAMPLE_RATE = 16000
+_SAMPLE_WIDTH = 2
+
+# partials() 的结束标记
+_STREAM_END = object()
+
+
+def pcm_to_float(pcm: bytes) -> np.ndarray:
+    """16位PCM转换为 [-1, 1) 的float32采样"""
+    return np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768.0
+
+
+class StreamingASRSession(ABC):
+    """流式识别会话（一次发言）
+    
+    调用顺序: start() -> feed(chunk)... -> finish()。
+    partials() 可在任意时刻开始迭代（单个消费者），产生逐步更新的中间结果，
+    finish() 或 close() 后结束。
+    """
+    
+    def __init__(self, sample_rate: int = STREAM_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.bytes_received = 0
+        self.started = False
+        self.finished = False
+        self.final_text: Optional[str] = None
+        self._partials: asyncio.Queue = asyncio.Queue()
+        self._last_partial = ''
+        # ASRManager.open_stream 创建的中间结果转发任务
+        self.forwarder: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """开始会话"""
+        self.started = True
+    
+    async def feed(self, chunk: bytes):
+        """输入一段音频（16位单声道PCM）"""
+        if self.finished:
+            raise RuntimeError("识别会话已结束")
+        if not self.started:
+            await self.start()
+        self.bytes_received += len(chunk)
+        await self._consume(chunk)
+    
+    async def partials(self) -> AsyncIterator[str]:
+        """逐个产生中间结果，会话结束后停止"""
+        while True:
+            text = await self._partials.get()
+            if text is _STREAM_END:
+                return
+            yield text
+    
+    async def finish(self) -> Optional[str]:
+        """结束输入并返回最终结果"""
+        if self.finished:
+            return self.final_text
+        self.finished = True
+        try:
+            self.final_text = await self._finalize()
+        finally:
+            self._partials.put_nowait(_STREAM_END)
+        return self.final_text
+    
+    async def close(self):
+        """放弃会话（如连接断开），不产生最终结果"""
+        if not self.finished:
+            self.finished = True
+            self._partials.put_nowait(_STREAM_END)
+    
+    def _emit_partial(self, text: Optional[str]):
+        """发布中间结果（与上一次相同或会话已结束时忽略）"""
+        text = (text or '').strip()
+        if text and text != self._last_partial and not self.finished:
+            self._last_partial = text
+            self._partials.put_nowait(text)
+    
+    @abstractmethod
+    async def _consume(self, chunk: bytes):
+        """处理新输入的音频"""
+    
+    @abstractmethod
+    async def _finalize(self) -> Optional[str]:
+        """产生最终结果"""
+
+
+class BufferedASRStream(StreamingASRSession):
+    """不支持流式的提供商：缓存整段音频，finish() 时识别（没有中间结果）"""
+    
+    def __init__(self, provider: 'BaseASRProvider', sample_rate: int = STREAM_SAMPLE_RATE):
+        super().__init__(sample_rate)
+        self.provider = provider
+        self.buffer = bytearray()
+    
+    async def _consume(self, chunk: bytes):
+        self.buffer.extend(chunk)
+    
+    async def _finalize(self) -> Optional[str]:
+        if not self.buffer:
+            return None
+        return await self.provider.recognize_audio(AudioClip(bytes(self.buffer), 'pcm16', self.sample_rate))
+
+
 class BaseASRProvider(ABC):
     """ASR提供商基类"""
     
+    # 是否能在说话过程中产生中间结果
+    supports_streaming = False
+    # 提供商的原生采样率
+    sample_rate = STREAM_SAMPLE_RATE
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.is_available = False
@@ -28,10 +152,23 @@ class BaseASRProvider(ABC):
         """识别语音数据"""
         pass
     
+    async def recognize_audio(self, clip: AudioClip) -> Optional[str]:
+        """识别已解析的音频（默认转换为原生采样率的16位单声道WAV）"""
+        # 解码与重采样在线程池中进行，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        return await self.recognize(await loop.run_in_executor(None, clip.to_wav, self.sample_rate))
+    
+    async def close(self):
+        """释放网络连接等资源"""
+    
     @abstractmethod
     async def check_availability(self) -> bool:
         """检查服务可用性"""
         pass
+    
+    def create_stream(self, sample_rate: int = STREAM_SAMPLE_RATE) -> StreamingASRSession:
+        """创建流式识别会话"""
+        return BufferedASRStream(self, sample_rate)
 
 class BrowserASRProvider(BaseASRProvider):
     """浏览器原生语音识别"""
@@ -49,77 +186,374 @@ class BrowserASRProvider(BaseASRProvider):
         return True
 
 class BaiduASRProvider(BaseASRProvider):
-    """百度语音识别"""
+    """百度语音识别
+    
+    - 长期复用一个带连接池的HTTP会话（close() 时关闭），不再每次识别新建
+    - access_token 按 expires_in 记录过期时间：剩余有效期不足 token_refresh_margin 秒时
+      在后台提前刷新并继续使用当前令牌；没有令牌或已过期时等待刷新。
+      同一时刻只有一个刷新请求（single-flight），并发识别共享其结果
+    - upload: raw（默认）以二进制请求体直接上传PCM；json 按base64放入JSON请求体
+    - token_url / api_url 可配置，便于指向本地替身服务测试
+    """
+    
+    # 百度短语音识别只接受 8000 / 16000Hz
+    SUPPORTED_RATES = (8000, 16000)
+    TOKEN_URL = 'https://aip.baidubce.com/oauth/2.0/token'
+    API_URL = 'https://vop.baidu.com/server_api'
+    # 令牌无效/过期的错误码（110/111: 令牌无效/过期，3302: 鉴权失败）
+    TOKEN_ERRORS = (110, 111, 3302)
+    # 响应中没有 expires_in 时假定的有效期（30天）
+    DEFAULT_TOKEN_TTL = 30 * 24 * 3600
     
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.api_key = config.get('api_key')
         self.secret_key = config.get('secret_key')
+        self.token_url = config.get('token_url', self.TOKEN_URL)
+        self.api_url = config.get('api_url', self.API_URL)
+        self.upload = config.get('upload', 'raw')
+        self.dev_pid = int(config.get('dev_pid', 1537))
+        self.cuid = config.get('cuid', 'ai_vtuber')
+        self.pool_size = int(config.get('pool_size', 8))
+        self.timeout = float(config.get('timeout', 10))
+        self.token_refresh_margin = float(config.get('token_refresh_margin', 24 * 3600))
         self.access_token = None
+        # 令牌过期时刻（time.monotonic）
+        self.token_expires_at = 0.0
+        self.token_refreshes = 0
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._token_task: Optional[asyncio.Task] = None
+        self.sample_rate = int(config.get('rate', STREAM_SAMPLE_RATE))
+        if self.sample_rate not in self.SUPPORTED_RATES:
+            logger.warning(f"百度ASR不支持采样率 {self.sample_rate}，改用 {STREAM_SAMPLE_RATE}Hz")
+            self.sample_rate = STREAM_SAMPLE_RATE
+        if self.upload not in ('raw', 'json'):
+            logger.warning(f"未知的百度ASR上传方式 {self.upload}，改用 raw")
+            self.upload = 'raw'
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取HTTP会话（懒创建，连接池大小 pool_size）"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self.session
+    
+    async def close(self):
+        """关闭HTTP会话，放弃进行中的令牌刷新"""
+        if self._token_task is not None and not self._token_task.done():
+            self._token_task.cancel()
+        if self.session and not self.session.closed:
+            await self.session.close()
     
     async def recognize(self, audio_data: bytes) -> Optional[str]:
-        """识别语音"""
+        """识别语音（WAV或16kHz 16位单声道PCM）"""
+        loop = asyncio.get_running_loop()
         try:
-            import aiohttp
-            
-            if not self.access_token:
-                await self._get_access_token()
-            
-            # 将音频数据编码为base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-            url = 'https://vop.baidu.com/server_api'
-            
-            data = {
-                'format': 'wav',
-                'rate': 16000,
-                'channel': 1,
-                'cuid': 'ai_vtuber',
-                'token': self.access_token,
-                'speech': audio_base64,
-                'len': len(audio_data)
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data) as response:
-                    result = await response.json()
-                    
-                    if result.get('err_no') == 0:
-                        return result.get('result', [None])[0]
-                    else:
-                        logger.error(f"百度ASR识别失败: {result}")
-                        return None
+            clip = await loop.run_in_executor(None, AudioClip.from_bytes, audio_data)
+        except ValueError as e:
+            logger.error(f"百度ASR音频格式错误: {e}")
+            return None
+        return await self.recognize_audio(clip)
+    
+    async def recognize_audio(self, clip: AudioClip) -> Optional[str]:
+        """以原生格式（指定采样率的16位单声道PCM）发送识别请求"""
+        try:
+            # 解码与重采样在线程池中进行，不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            pcm = await loop.run_in_executor(None, clip.to_pcm16, self.sample_rate)
+            for attempt in range(2):
+                token = await self._ensure_token()
+                if not token:
+                    return None
+                result = await self._post_speech(pcm, token)
+                
+                if result.get('err_no') == 0:
+                    return result.get('result', [None])[0]
+                if result.get('err_no') in self.TOKEN_ERRORS and attempt == 0:
+                    # 令牌在到期前被服务端判为无效：作废后刷新并重试一次
+                    logger.warning(f"百度ASR令牌失效，刷新后重试: {result.get('err_msg')}")
+                    self._invalidate_token(token)
+                    continue
+                logger.error(f"百度ASR识别失败: {result}")
+                return None
                         
         except Exception as e:
             logger.error(f"百度ASR识别异常: {e}")
             return None
     
-    async def _get_access_token(self):
+    async def _post_speech(self, pcm: bytes, token: str) -> Dict[str, Any]:
+        """发送一次识别请求，返回响应JSON"""
+        session = await self._get_session()
+        if self.upload == 'raw':
+            request = session.post(
+                self.api_url,
+                params={'cuid': self.cuid, 'token': token, 'dev_pid': self.dev_pid},
+                data=pcm,
+                headers={'Content-Type': f'audio/pcm;rate={self.sample_rate}'},
+            )
+        else:
+            request = session.post(self.api_url, json={
+                'format': 'pcm',
+                'rate': self.sample_rate,
+                'channel': 1,
+                'cuid': self.cuid,
+                'dev_pid': self.dev_pid,
+                'token': token,
+                'speech': base64.b64encode(pcm).decode('ascii'),
+                'len': len(pcm)
+            })
+        async with request as response:
+            return await response.json(content_type=None)
+    
+    async def _ensure_token(self) -> Optional[str]:
+        """返回可用的访问令牌，必要时刷新"""
+        remaining = self.token_expires_at - time.monotonic()
+        if self.access_token and remaining > 0:
+            if remaining < self.token_refresh_margin:
+                # 临近过期：后台刷新，本次仍用当前令牌
+                self._refresh_token()
+            return self.access_token
+        # shield: 调用方被取消时不取消其他请求共享的刷新
+        return await asyncio.shield(self._refresh_token())
+    
+    def _refresh_token(self) -> asyncio.Task:
+        """开始刷新令牌；已有刷新在进行时复用同一个任务"""
+        if self._token_task is None or self._token_task.done():
+            self._token_task = asyncio.create_task(self._fetch_token())
+        return self._token_task
+    
+    def _invalidate_token(self, token: str):
+        """作废令牌（只在它仍是当前令牌时，避免覆盖并发刷新得到的新令牌）"""
+        if self.access_token == token:
+            self.access_token = None
+            self.token_expires_at = 0.0
+    
+    async def _fetch_token(self) -> Optional[str]:
         """获取访问令牌"""
         try:
-            import aiohttp
-            
-            url = 'https://aip.baidubce.com/oauth/2.0/token'
+            session = await self._get_session()
             params = {
                 'grant_type': 'client_credentials',
                 'client_id': self.api_key,
                 'client_secret': self.secret_key
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, params=params) as response:
-                    result = await response.json()
-                    self.access_token = result.get('access_token')
+            async with session.post(self.token_url, params=params) as response:
+                result = await response.json(content_type=None)
+            token = result.get('access_token')
+            if not token:
+                logger.error(f"获取百度ASR访问令牌失败: {result}")
+                return None
+            
+            self.access_token = token
+            self.token_expires_at = time.monotonic() + float(result.get('expires_in', self.DEFAULT_TOKEN_TTL))
+            self.token_refreshes += 1
+            logger.info(f"百度ASR访问令牌已更新，有效期 {result.get('expires_in', self.DEFAULT_TOKEN_TTL)} 秒")
+            return token
                     
         except Exception as e:
             logger.error(f"获取百度ASR访问令牌失败: {e}")
+            return None
+    
+    async def check_availability(self) -> bool:
+        return await self._ensure_token() is not None
+
+class FasterWhisperASRProvider(BaseASRProvider):
+    """本地 faster-whisper 识别（CPU int8，可选依赖）
+    
+    流式识别时每积累 partial_interval 秒新音频，在线程池中用 beam_size=1 重新解码
+    尚未提交的音频作为中间结果（同一时刻最多一个解码任务）。未提交的音频超过
+    partial_window 秒时，提交除最后一个片段外的识别结果并丢弃对应音频，之后只解码
+    其后的音频，单次解码的长度有上限，总耗时随语音长度线性增长。结束时若最后一次
+    中间结果之后没有新音频则直接采用，否则解码一次未提交的音频。
+    """
+    
+    supports_streaming = True
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.model_size = config.get('model_size', 'small')
+        self.device = config.get('device', 'cpu')
+        self.compute_type = config.get('compute_type', 'int8')
+        self.cpu_threads = config.get('cpu_threads', 0)
+        self.language = config.get('language', 'zh')
+        self.beam_size = config.get('beam_size', 5)
+        self.partial_interval = config.get('partial_interval', 1.0)
+        self.partial_window = max(config.get('partial_window', 8.0), 2 * self.partial_interval)
+        self.model = None
+        self._model_lock = threading.Lock()
+        self.is_available = importlib.util.find_spec('faster_whisper') is not None
+    
+    def _load_model(self):
+        """懒加载模型（首次识别时）"""
+        with self._model_lock:
+            if self.model is None:
+                from faster_whisper import WhisperModel
+                logger.info(f"加载 faster-whisper 模型: {self.model_size} ({self.device}/{self.compute_type})")
+                self.model = WhisperModel(self.model_size, device=self.device,
+                                          compute_type=self.compute_type, cpu_threads=self.cpu_threads)
+            return self.model
+    
+    def transcribe_segments(self, samples: np.ndarray, beam_size: int = None) -> List[Tuple[float, str]]:
+        """识别16kHz float32采样，返回 (片段结束时间（秒）, 文本) 列表（阻塞，应在线程中调用）"""
+        if samples.size == 0:
+            return []
+        segments, _ = self._load_model().transcribe(
+            samples,
+            language=self.language,
+            beam_size=beam_size or self.beam_size,
+            condition_on_previous_text=False,
+        )
+        return [(segment.end, segment.text) for segment in segments]
+    
+    def transcribe(self, samples: np.ndarray, beam_size: int = None) -> str:
+        """识别16kHz float32采样（阻塞，应在线程中调用）"""
+        return ''.join(text for _, text in self.transcribe_segments(samples, beam_size)).strip()
+    
+    def transcribe_clip(self, clip: AudioClip, beam_size: int = None) -> str:
+        """解码、重采样并识别（阻塞，应在线程中调用）"""
+        return self.transcribe(clip.to_float32(self.sample_rate), beam_size)
+    
+    def transcribe_clip_segments(self, clip: AudioClip, beam_size: int = None) -> List[Tuple[float, str]]:
+        """解码、重采样并分段识别（阻塞，应在线程中调用）"""
+        return self.transcribe_segments(clip.to_float32(self.sample_rate), beam_size)
+    
+    async def recognize(self, audio_data: bytes) -> Optional[str]:
+        """识别WAV（任意采样率与采样格式）或16kHz 16位单声道PCM数据"""
+        loop = asyncio.get_running_loop()
+        clip = await loop.run_in_executor(None, AudioClip.from_bytes, audio_data)
+        return await self.recognize_audio(clip)
+    
+    async def recognize_audio(self, clip: AudioClip) -> Optional[str]:
+        """直接取16kHz float32采样，不经过16位PCM/WAV中转（解码与重采样也在线程池中）"""
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, self.transcribe_clip, clip, None)
+        return text or None
     
     async def check_availability(self) -> bool:
+        return self.is_available
+    
+    def create_stream(self, sample_rate: int = STREAM_SAMPLE_RATE) -> StreamingASRSession:
+        return FasterWhisperStream(self, sample_rate)
+
+
+class FasterWhisperStream(StreamingASRSession):
+    """faster-whisper 流式识别会话（输入不是16kHz时解码前重采样）"""
+    
+    def __init__(self, provider: FasterWhisperASRProvider, sample_rate: int = STREAM_SAMPLE_RATE):
+        super().__init__(sample_rate)
+        self.provider = provider
+        # 尚未提交的音频（已提交部分的音频不再保留）
+        self.buffer = bytearray()
+        self._interval_bytes = int(provider.partial_interval * sample_rate) * _SAMPLE_WIDTH
+        self._window_bytes = int(provider.partial_window * sample_rate) * _SAMPLE_WIDTH
+        self._committed_text = ''
+        # 最近一次中间结果覆盖的未提交音频长度及其文本
+        self._decoded_bytes = 0
+        self._decoded_text = ''
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _consume(self, chunk: bytes):
+        self.buffer.extend(chunk)
+        if (self._task is None or self._task.done()) \
+                and len(self.buffer) - self._decoded_bytes >= self._interval_bytes:
+            self._task = asyncio.create_task(self._decode_partial(bytes(self.buffer)))
+    
+    async def _decode_partial(self, pcm: bytes):
+        loop = asyncio.get_running_loop()
         try:
-            await self._get_access_token()
-            return self.access_token is not None
-        except:
-            return False
+            segments = await loop.run_in_executor(None, self.provider.transcribe_clip_segments,
+                                                  self._clip(pcm), 1)
+        except Exception as e:
+            logger.warning(f"faster-whisper 中间结果解码失败: {e}")
+            return
+        self._decoded_bytes = len(pcm)
+        self._decoded_text = ''.join(text for _, text in segments)
+        if len(pcm) >= self._window_bytes:
+            self._commit(segments, len(pcm))
+        self._emit_partial((self._committed_text + self._decoded_text).strip())
+    
+    def _commit(self, segments: List[Tuple[float, str]], decoded: int):
+        """提交除最后一个片段外的识别结果，丢弃对应的音频（最后一个片段可能还没说完）"""
+        if len(segments) > 1:
+            cut = int(segments[-2][0] * self.sample_rate) * _SAMPLE_WIDTH
+            cut = min(decoded, max(0, cut))
+            committed, rest = segments[:-1], segments[-1][1]
+        else:
+            # 窗口内没有片段边界: 整体提交，保证解码窗口有上限
+            cut, committed, rest = decoded, segments, ''
+        if cut <= 0:
+            return
+        self._committed_text += ''.join(text for _, text in committed)
+        del self.buffer[:cut]
+        self._decoded_bytes = decoded - cut
+        self._decoded_text = rest
+    
+    async def _finalize(self) -> Optional[str]:
+        if self._task is not None:
+            # 线程池中的解码无法取消，等它结束以免两次解码争用CPU
+            await self._task
+        if self._decoded_bytes == len(self.buffer):
+            return (self._committed_text + self._decoded_text).strip() or None
+        loop = asyncio.get_running_loop()
+        segments = await loop.run_in_executor(None, self.provider.transcribe_clip_segments,
+                                              self._clip(bytes(self.buffer)), None)
+        return (self._committed_text + ''.join(text for _, text in segments)).strip() or None
+    
+    def _clip(self, pcm: bytes) -> AudioClip:
+        """包装缓冲的PCM（不解码，转换在线程池中进行）"""
+        return AudioClip(pcm, 'pcm16', self.sample_rate)
+    
+    async def close(self):
+        await super().close()
+        if self._task is not None:
+            self._task.cancel()
+
+
+class StubASRProvider(BaseASRProvider):
+    """确定性的流式识别桩（测试与前端联调用）
+    
+    每收到 bytes_per_char 字节音频，中间结果多输出 transcript 的一个字符；
+    结束时返回完整的 transcript。
+    """
+    
+    supports_streaming = True
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.transcript = config.get('transcript', '你好')
+        self.bytes_per_char = max(1, int(config.get('bytes_per_char', 3200)))
+        self.is_available = True
+    
+    async def recognize(self, audio_data: bytes) -> Optional[str]:
+        return self.transcript if audio_data else None
+    
+    async def recognize_audio(self, clip: AudioClip) -> Optional[str]:
+        return self.transcript if clip.frames else None
+    
+    async def check_availability(self) -> bool:
+        return True
+    
+    def create_stream(self, sample_rate: int = STREAM_SAMPLE_RATE) -> StreamingASRSession:
+        return StubASRStream(self, sample_rate)
+
+
+class StubASRStream(StreamingASRSession):
+    """StubASRProvider 的流式会话"""
+    
+    def __init__(self, provider: StubASRProvider, sample_rate: int = STREAM_SAMPLE_RATE):
+        super().__init__(sample_rate)
+        self.provider = provider
+    
+    async def _consume(self, chunk: bytes):
+        count = self.bytes_received // self.provider.bytes_per_char
+        self._emit_partial(self.provider.transcript[:count])
+    
+    async def _finalize(self) -> Optional[str]:
+        return self.provider.transcript if self.bytes_received else None
+
 
 class ASRManager:
     """ASR语音识别管理器"""
@@ -138,7 +572,9 @@ class ASRManager:
         # 初始化提供商
         self.providers = {
             'browser': BrowserASRProvider(self.asr_config),
-            'baidu': BaiduASRProvider(self.asr_config.get('baidu', {}))
+            'baidu': BaiduASRProvider(self.asr_config.get('baidu', {})),
+            'faster_whisper': FasterWhisperASRProvider(self.asr_config.get('faster_whisper', {})),
+            'stub': StubASRProvider(self.asr_config.get('stub', {}))
         }
         
         # 当前提供商
@@ -149,33 +585,95 @@ class ASRManager:
         
         logger.info(f"ASR管理器初始化完成，提供商: {self.provider}, 启用状态: {self.enabled}")
     
-    async def recognize(self, audio_data: bytes) -> Optional[str]:
+    async def recognize(self, audio_data: bytes, provider: str = None,
+                        raise_errors: bool = False) -> Optional[str]:
         """识别音频数据
         
         Args:
-            audio_data: 音频数据
+            audio_data: WAV文件（任意采样率/采样格式/声道数）或16kHz 16位单声道PCM
+            provider: 使用的提供商，默认为当前提供商
+            raise_errors: 为True时失败原因以异常抛出（批量识别需要逐条报告错误），否则记录日志并返回None
             
         Returns:
             识别结果文本
         """
         if not self.enabled:
+            if raise_errors:
+                raise RuntimeError('ASR功能未启用')
             logger.warning("ASR功能未启用")
             return None
         
-        if not self.current_provider:
+        provider = provider or self.provider
+        asr_provider = self.providers.get(provider)
+        if not asr_provider:
+            if raise_errors:
+                raise RuntimeError(f'没有可用的ASR提供商: {provider}')
             logger.error("没有可用的ASR提供商")
             return None
         
         try:
-            result = await self.current_provider.recognize(audio_data)
+            # WAV解析在线程池中进行，大文件不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            clip = await loop.run_in_executor(None, AudioClip.from_bytes, audio_data)
+            with ASR_REQUEST_SECONDS.labels(provider).time():
+                result = await asr_provider.recognize_audio(clip)
             if result:
                 logger.info(f"ASR识别成功: {result}")
             return result
                 
         except Exception as e:
             logger.error(f"语音识别失败: {e}")
+            if raise_errors:
+                raise
             return None
     
+    async def open_stream(self, on_partial: Callable[[str], Awaitable[None]] = None,
+                          sample_rate: int = STREAM_SAMPLE_RATE) -> Optional[StreamingASRSession]:
+        """开始一次流式识别
+        
+        Args:
+            on_partial: 可选的中间结果回调（协程函数），在后台任务中依次调用
+            sample_rate: 输入音频采样率
+            
+        Returns:
+            识别会话；ASR未启用或没有提供商时返回None
+        """
+        if not self.enabled or not self.current_provider:
+            return None
+        
+        stream = self.current_provider.create_stream(sample_rate)
+        await stream.start()
+        if on_partial is not None:
+            stream.forwarder = asyncio.create_task(self._forward_partials(stream, on_partial))
+        return stream
+    
+    async def _forward_partials(self, stream: StreamingASRSession,
+                                on_partial: Callable[[str], Awaitable[None]]):
+        async for text in stream.partials():
+            try:
+                await on_partial(text)
+            except Exception as e:
+                logger.warning(f"发送ASR中间结果失败: {e}")
+    
+    async def finish_stream(self, stream: StreamingASRSession) -> Optional[str]:
+        """结束流式识别并返回最终结果（耗时即说话结束到结果可用的延迟）"""
+        try:
+            with ASR_REQUEST_SECONDS.labels(self.provider).time():
+                result = await stream.finish()
+        except Exception as e:
+            logger.error(f"流式语音识别失败: {e}")
+            result = None
+        if stream.forwarder is not None:
+            await stream.forwarder
+        if result:
+            logger.info(f"ASR识别成功: {result}")
+        return result
+    
+    async def close(self):
+        """关闭所有提供商"""
+        for provider in self.providers.values():
+            await provider.close()
+    
     def get_status(self) -> Dict[str, Any]:
         """获取ASR状态
         
@@ -186,6 +684,7 @@ class ASRManager:
             'enabled': self.enabled,
             'provider': self.provider,
             'available': self.enabled and self.current_provider is not None,
+            'streaming': self.current_provider is not None and self.current_provider.supports_streaming,
             'providers': {
                 name: provider.is_available 
                 for name, provider in self.providers.items()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+参考音频/训练素材质量分析模块
+
+用 soundfile.blocks 分块读取音频文件，内存占用与文件长度无关：
+- 第一遍只统计每帧能量的直方图，得到噪声底（低分位）与语音电平（高分位），估计信噪比
+- 第二遍按 max(silence_db, 噪声底 + speech_margin_db) 判定语音帧，静音超过 min_silence_ms 处切分片段；
+  每帧的RMS、峰值、削波采样数、过零率和频谱统计（质心、平坦度、滚降频率）整块向量化计算，
+  只累加到当前片段的汇总量里
+- 报告包含整体指标、逐片段指标与质量分，供训练流程切分素材和推理引擎挑选参考音频使用
+"""
+
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import soundfile as sf
+
+from ..utils.vad import frame_features
+
+logger = logging.getLogger(__name__)
+
+# 能量直方图范围（dBFS）与分辨率
+_DB_FLOOR = -120.0
+_DB_BIN = 0.5
+_DB_BINS = int(-_DB_FLOOR / _DB_BIN) + 1
+# 噪声底与语音电平取帧能量的分位数
+_NOISE_PERCENTILE = 0.10
+_SPEECH_PERCENTILE = 0.95
+# 频谱滚降点（累计能量占比）
+_ROLLOFF = 0.85
+
+
+def _to_db(power: np.ndarray) -> np.ndarray:
+    """能量（均方值）转 dBFS，静音帧截断到直方图下限"""
+    return np.maximum(10 * np.log10(np.maximum(power, 1e-30)), _DB_FLOOR)
+
+
+def _percentile_db(histogram: np.ndarray, fraction: float) -> float:
+    """按直方图求能量分位数"""
+    total = histogram.sum()
+    if total == 0:
+        return _DB_FLOOR
+    index = int(np.searchsorted(np.cumsum(histogram), fraction * total))
+    return _DB_FLOOR + min(index, _DB_BINS - 1) * _DB_BIN
+
+
+def spectral_features(frames: np.ndarray, sample_rate: int):
+    """计算每帧的频谱质心、平坦度与滚降频率（Hann窗）
+
+    Args:
+        frames: (帧数, 帧长) 的 float32 采样
+
+    Returns:
+        (centroid_hz, flatness, rolloff_hz) 三个长度为帧数的数组
+    """
+    window = np.hanning(frames.shape[1]).astype(np.float32)
+    power = np.square(np.abs(np.fft.rfft(frames * window, axis=1))) + 1e-12
+    freqs = np.fft.rfftfreq(frames.shape[1], 1 / sample_rate)
+    total = power.sum(axis=1)
+    centroid = power @ freqs / total
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / (total / power.shape[1])
+    cumulative = np.cumsum(power, axis=1)
+    rolloff_index = np.argmax(cumulative >= _ROLLOFF * total[:, None], axis=1)
+    return centroid, flatness, freqs[rolloff_index]
+
+
+class _Segment:
+    """一个语音片段的累加量（只统计语音帧）"""
+
+    __slots__ = ('start', 'end', 'frames', 'power', 'peak', 'clipped',
+                 'zcr', 'centroid', 'flatness', 'rolloff')
+
+    def __init__(self, start: int):
+        self.start = start
+        self.end = start
+        self.frames = 0
+        self.power = 0.0
+        self.peak = 0.0
+        self.clipped = 0
+        self.zcr = 0.0
+        self.centroid = 0.0
+        self.flatness = 0.0
+        self.rolloff = 0.0
+
+
+class AudioAnalyzer:
+    """分块音频质量分析器"""
+
+    def __init__(self, frame_ms: int = 20, block_frames: int = 512, silence_db: float = -50.0,
+                 speech_margin_db: float = 6.0, min_silence_ms: int = 300, min_segment_ms: int = 200,
+                 clip_level: float = 0.999):
+        """初始化
+
+        Args:
+            frame_ms: 帧长（毫秒，不重叠）
+            block_frames: 每次读取的帧数（决定内存占用）
+            silence_db: 语音帧的最低能量（dBFS）
+            speech_margin_db: 语音帧至少高出噪声底的分贝数
+            min_silence_ms: 切分片段所需的最短静音
+            min_segment_ms: 短于该时长的片段被忽略
+            clip_level: 绝对值达到该值的采样计为削波
+        """
+        self.frame_ms = frame_ms
+        self.block_frames = block_frames
+        self.silence_db = silence_db
+        self.speech_margin_db = speech_margin_db
+        self.min_silence_ms = min_silence_ms
+        self.min_segment_ms = min_segment_ms
+        self.clip_level = clip_level
+
+    @classmethod
+    def from_config(cls, analysis_config: Dict[str, Any]) -> 'AudioAnalyzer':
+        """从配置（sovits.analysis）创建"""
+        return cls(frame_ms=analysis_config.get('frame_ms', 20),
+                   block_frames=analysis_config.get('block_frames', 512),
+                   silence_db=analysis_config.get('silence_db', -50.0),
+                   speech_margin_db=analysis_config.get('speech_margin_db', 6.0),
+                   min_silence_ms=analysis_config.get('min_silence_ms', 300),
+                   min_segment_ms=analysis_config.get('min_segment_ms', 200),
+                   clip_level=analysis_config.get('clip_level', 0.999))
+
+    def _frames(self, path: str, frame_length: int):
+        """逐块产出 (帧数, 帧长) 的单声道采样，最后不足一帧的部分补零"""
+        for block in sf.blocks(path, blocksize=frame_length * self.block_frames,
+                               dtype='float32', always_2d=True):
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+            remainder = mono.size % frame_length
+            if remainder:
+                mono = np.concatenate([mono, np.zeros(frame_length - remainder, dtype=np.float32)])
+            yield mono.reshape(-1, frame_length)
+
+    def analyze(self, path: str) -> Dict[str, Any]:
+        """分析音频文件
+
+        Returns:
+            质量报告，见 analyze_audio
+
+        Raises:
+            RuntimeError: soundfile 无法读取文件
+        """
+        info = sf.info(path)
+        sample_rate = info.samplerate
+        frame_length = max(1, sample_rate * self.frame_ms // 1000)
+        frame_seconds = frame_length / sample_rate
+
+        # 第一遍: 帧能量直方图 -> 噪声底与语音电平
+        histogram = np.zeros(_DB_BINS, dtype=np.int64)
+        for frames in self._frames(path, frame_length):
+            rms, _ = frame_features(frames)
+            bins = ((_to_db(np.square(rms)) - _DB_FLOOR) / _DB_BIN).astype(np.int64)
+            histogram += np.bincount(bins, minlength=_DB_BINS)
+        noise_floor = _percentile_db(histogram, _NOISE_PERCENTILE)
+        speech_level = _percentile_db(histogram, _SPEECH_PERCENTILE)
+        threshold = max(self.silence_db, noise_floor + self.speech_margin_db)
+
+        # 第二遍: 语音帧分段与逐片段统计
+        min_silence = max(1, int(round(self.min_silence_ms / self.frame_ms)))
+        segments: List[_Segment] = []
+        current: Optional[_Segment] = None
+        silence_run = 0
+        offset = 0
+        totals = {'power': 0.0, 'peak': 0.0, 'clipped': 0}
+        for frames in self._frames(path, frame_length):
+            rms, zcr = frame_features(frames)
+            power = np.square(rms)
+            peak = np.max(np.abs(frames), axis=1)
+            clipped = np.count_nonzero(np.abs(frames) >= self.clip_level, axis=1)
+            totals['power'] += float(power.sum())
+            totals['peak'] = max(totals['peak'], float(peak.max()))
+            totals['clipped'] += int(clipped.sum())
+
+            voiced = _to_db(power) > threshold
+            if voiced.any():
+                centroid, flatness, rolloff = spectral_features(frames[voiced], sample_rate)
+                position = np.cumsum(voiced) - 1
+
+            # 按连续的语音/静音段处理（段数远少于帧数）
+            edges = np.flatnonzero(np.diff(voiced.astype(np.int8))) + 1
+            for run_start, run_end in zip([0] + edges.tolist(), edges.tolist() + [voiced.size]):
+                if not voiced[run_start]:
+                    silence_run += run_end - run_start
+                    if current is not None and silence_run >= min_silence:
+                        segments.append(current)
+                        current = None
+                    continue
+                if current is None:
+                    current = _Segment(offset + run_start)
+                silence_run = 0
+                current.end = offset + run_end
+                first, last = int(position[run_start]), int(position[run_end - 1]) + 1
+                current.frames += run_end - run_start
+                current.power += float(power[run_start:run_end].sum())
+                current.peak = max(current.peak, float(peak[run_start:run_end].max()))
+                current.clipped += int(clipped[run_start:run_end].sum())
+                current.zcr += float(zcr[run_start:run_end].sum())
+                current.centroid += float(centroid[first:last].sum())
+                current.flatness += float(flatness[first:last].sum())
+                current.rolloff += float(rolloff[first:last].sum())
+            offset += voiced.size
+        if current is not None:
+            segments.append(current)
+
+        min_frames = self.min_segment_ms / self.frame_ms
+        reports = [self._segment_report(segment, frame_seconds, frame_length, noise_floor)
+                   for segment in segments if segment.end - segment.start >= min_frames]
+        total_samples = max(1, offset * frame_length)
+        speech_frames = sum(segment.frames for segment in segments)
+        report = {
+            'path': path,
+            'sample_rate': sample_rate,
+            'channels': info.channels,
+            'duration': round(info.frames / sample_rate, 3),
+            'rms': round(float(np.sqrt(totals['power'] / max(1, offset))), 5),
+            'peak': round(totals['peak'], 5),
+            'clipped_ratio': round(totals['clipped'] / total_samples, 6),
+            'noise_floor_db': noise_floor,
+            'speech_level_db': speech_level,
+            'snr_db': round(speech_level - noise_floor, 1),
+            'speech_ratio': round(speech_frames / max(1, offset), 3),
+            'segments': reports,
+        }
+        report['issues'] = self._issues(report)
+        return report
+
+    def _segment_report(self, segment: _Segment, frame_seconds: float, frame_length: int,
+                        noise_floor: float) -> Dict[str, Any]:
+        frames = max(1, segment.frames)
+        level = float(_to_db(np.float64(segment.power / frames)))
+        snr = level - noise_floor
+        clipped_ratio = segment.clipped / (frames * frame_length)
+        report = {
+            'start': round(segment.start * frame_seconds, 3),
+            'end': round(segment.end * frame_seconds, 3),
+            'duration': round((segment.end - segment.start) * frame_seconds, 3),
+            'rms': round(float(np.sqrt(segment.power / frames)), 5),
+            'peak': round(segment.peak, 5),
+            'clipped_ratio': round(clipped_ratio, 6),
+            'snr_db': round(snr, 1),
+            'zcr': round(segment.zcr / frames, 4),
+            'centroid_hz': round(segment.centroid / frames, 1),
+            'flatness': round(segment.flatness / frames, 4),
+            'rolloff_hz': round(segment.rolloff / frames, 1),
+        }
+        report['score'] = round(segment_score(report), 3)
+        return report
+
+    @staticmethod
+    def _issues(report: Dict[str, Any]) -> List[str]:
+        issues = []
+        if not report['segments']:
+            issues.append('未检测到语音')
+        if report['clipped_ratio'] > 1e-4:
+            issues.append('存在削波失真')
+        if report['snr_db'] < 20:
+            issues.append('信噪比偏低')
+        if report['segments'] and max(s['rms'] for s in report['segments']) < 0.01:
+            issues.append('音量偏低')
+        return issues
+
+
+def segment_score(segment: Dict[str, Any]) -> float:
+    """片段质量分（0~1）
+
+    信噪比 10dB 以下为0、30dB 以上为满分；削波采样占比达到0.1%时为0；语音RMS低于0.01时减半
+    """
+    score = float(np.clip((segment['snr_db'] - 10) / 20, 0, 1))
+    score *= 1 - min(1.0, segment['clipped_ratio'] / 1e-3)
+    if segment['rms'] < 0.01:
+        score *= 0.5
+    return score
+
+
+def analyze_audio(path: str, analysis_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """分析音频文件的质量
+
+    Returns:
+        {'path', 'sample_rate', 'channels', 'duration', 'rms', 'peak', 'clipped_ratio',
+         'noise_floor_db', 'speech_level_db', 'snr_db', 'speech_ratio', 'issues',
+         'segments': [{'start', 'end', 'duration', 'rms', 'peak', 'clipped_ratio', 'snr_db',
+                       'zcr', 'centroid_hz', 'flatness', 'rolloff_hz', 'score'}, ...]}
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"音频文件不存在: {path}")
+    return AudioAnalyzer.from_config(analysis_config or {}).analyze(path)
+
+
+def select_reference_segment(report: Dict[str, Any], min_duration: float = 3.0,
+                             max_duration: float = 10.0) -> Optional[Dict[str, Any]]:
+    """从报告中挑选最适合作为参考音频的片段
+
+    只考虑时长在 [min_duration, max_duration] 内的片段，取质量分最高者（同分取较长者）
+
+    Returns:
+        片段字典，没有合适片段时返回None
+    """
+    candidates = [segment for segment in report['segments']
+                  if min_duration <= segment['duration'] <= max_duration]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda segment: (segment['score'], segment['duration']))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频输入处理模块
+
+把客户端上传的音频转换成各ASR提供商需要的格式：
+- 按RIFF块解析WAV（不假定44字节文件头），支持 PCM 8/16/24/32位、IEEE浮点与 WAVE_FORMAT_EXTENSIBLE，
+  容忍流式WAV的未知长度字段
+- 采样格式转换与多声道混音全部向量化
+- 多相（polyphase）重采样，滤波器组按采样率对缓存
+- AudioClip 按需转换并缓存结果；已经是目标格式（16位单声道、采样率一致）时直接返回原始字节
+"""
+
+import io
+import struct
+import wave
+from functools import lru_cache
+from math import gcd
+from typing import Optional
+
+import numpy as np
+
+from .audio_stream import to_pcm16
+
+# WAVE格式标签
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# 采样编码 -> (位深, 格式标签)
+_ENCODINGS = {
+    'pcm8': (8, WAVE_FORMAT_PCM),
+    'pcm16': (16, WAVE_FORMAT_PCM),
+    'pcm24': (24, WAVE_FORMAT_PCM),
+    'pcm32': (32, WAVE_FORMAT_PCM),
+    'float32': (32, WAVE_FORMAT_IEEE_FLOAT),
+    'float64': (64, WAVE_FORMAT_IEEE_FLOAT),
+}
+_ENCODING_BY_FORMAT = {value: key for key, value in _ENCODINGS.items()}
+
+# 重采样滤波器每侧的过零点数与Kaiser窗参数
+_FILTER_ZERO_CROSSINGS = 10
+_KAISER_BETA = 5.0
+# 每次向量化计算的输出采样数（限制中间矩阵大小）
+_RESAMPLE_BLOCK = 8192
+
+
+def parse_wav(data: bytes):
+    """按RIFF块解析WAV
+
+    Returns:
+        (encoding, sample_rate, channels, PCM数据的memoryview)；数据截断到整帧
+
+    Raises:
+        ValueError: 不是WAV、缺少fmt/data块或格式不受支持
+    """
+    if len(data) < 12 or data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("不是有效的WAV文件")
+    view = memoryview(data)
+    fmt = None
+    pcm = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(view[offset:offset + 4])
+        size, = struct.unpack_from('<I', data, offset + 4)
+        start = offset + 8
+        # 流式WAV的长度字段可能是占位值或大于实际长度
+        end = min(start + size, len(data))
+        if chunk_id == b'fmt ':
+            fmt = _parse_fmt(view[start:end])
+        elif chunk_id == b'data':
+            pcm = view[start:end]
+            if fmt is not None:
+                break
+        # 块按偶数字节对齐
+        offset = start + size + (size & 1)
+    if fmt is None:
+        raise ValueError("WAV文件缺少fmt块")
+    if pcm is None:
+        raise ValueError("WAV文件缺少data块")
+    encoding, sample_rate, channels = fmt
+    frame_bytes = _ENCODINGS[encoding][0] // 8 * channels
+    return encoding, sample_rate, channels, pcm[:len(pcm) - len(pcm) % frame_bytes]
+
+
+def _parse_fmt(chunk: memoryview):
+    """解析fmt块，返回 (encoding, sample_rate, channels)"""
+    if len(chunk) < 16:
+        raise ValueError("WAV文件fmt块过短")
+    tag, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', chunk)
+    if tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(chunk) < 26:
+            raise ValueError("WAV文件扩展fmt块过短")
+        # 子格式GUID的前两个字节即格式标签
+        tag, = struct.unpack_from('<H', chunk, 24)
+    encoding = _ENCODING_BY_FORMAT.get((bits, tag))
+    if encoding is None:
+        raise ValueError(f"不支持的WAV格式: 格式标签 {tag}, {bits} 位")
+    if channels < 1 or sample_rate < 1:
+        raise ValueError("WAV文件声道数或采样率无效")
+    return encoding, sample_rate, channels
+
+
+def decode_samples(raw, encoding: str, channels: int = 1) -> np.ndarray:
+    """把PCM字节转换为 (帧数, 声道数) 的 [-1, 1] float32 采样（向量化）"""
+    if encoding == 'pcm8':
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif encoding == 'pcm16':
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif encoding == 'pcm24':
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        # 放到int32的高3字节，算术右移完成符号扩展
+        widened = np.zeros((triplets.shape[0], 4), dtype=np.uint8)
+        widened[:, 1:] = triplets
+        samples = (widened.view('<i4').reshape(-1) >> 8).astype(np.float32) / 8388608.0
+    elif encoding == 'pcm32':
+        samples = (np.frombuffer(raw, dtype='<i4') / 2147483648.0).astype(np.float32)
+    elif encoding == 'float32':
+        samples = np.frombuffer(raw, dtype='<f4').astype(np.float32)
+    elif encoding == 'float64':
+        samples = np.frombuffer(raw, dtype='<f8').astype(np.float32)
+    else:
+        raise ValueError(f"不支持的采样编码: {encoding}")
+    return samples.reshape(-1, channels)
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(up: int, down: int) -> np.ndarray:
+    """生成(并缓存)上采样 up 倍、下采样 down 倍的多相滤波器组
+
+    Returns:
+        (up, 每相抽头数) 的 float32 数组，第 p 行是相位 p 的抽头（按输入延迟排列）
+    """
+    ratio = max(up, down)
+    half = _FILTER_ZERO_CROSSINGS * ratio
+    taps = np.arange(-half, half + 1, dtype=np.float64)
+    cutoff = 1.0 / ratio
+    prototype = cutoff * np.sinc(cutoff * taps) * np.kaiser(taps.size, _KAISER_BETA) * up
+    per_phase = -(-prototype.size // up)
+    padded = np.zeros(per_phase * up)
+    padded[:prototype.size] = prototype
+    return padded.reshape(per_phase, up).T.astype(np.float32)
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """多相重采样单声道 float32 采样
+
+    输出第 n 个采样对应上采样序列上的位置 t = n*down + 延迟，
+    由相位 t % up 的滤波器与输入 x[t//up - m] 做点积得到。
+    """
+    samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+    if src_rate == dst_rate or samples.size == 0:
+        return samples
+    common = gcd(src_rate, dst_rate)
+    up, down = dst_rate // common, src_rate // common
+    bank = polyphase_filter(up, down)
+    per_phase = bank.shape[1]
+    delay = _FILTER_ZERO_CROSSINGS * max(up, down)
+
+    count = -(-samples.size * up // down)
+    padded = np.concatenate((np.zeros(per_phase, dtype=np.float32), samples,
+                             np.zeros(delay // up + 2, dtype=np.float32)))
+    lags = np.arange(per_phase)
+    out = np.empty(count, dtype=np.float32)
+    for start in range(0, count, _RESAMPLE_BLOCK):
+        positions = np.arange(start, min(start + _RESAMPLE_BLOCK, count), dtype=np.int64) * down + delay
+        base = positions // up + per_phase
+        windows = padded[base[:, None] - lags]
+        out[start:start + positions.size] = np.einsum('ij,ij->i', windows, bank[positions % up])
+    return out
+
+
+class AudioClip:
+    """一段输入音频：保留原始编码，按需转换并缓存转换结果"""
+
+    def __init__(self, raw, encoding: str = 'pcm16', sample_rate: int = 16000, channels: int = 1):
+        """初始化音频
+
+        Args:
+            raw: PCM数据（小端，多声道交错）
+            encoding: 采样编码，见 _ENCODINGS
+            sample_rate: 采样率
+            channels: 声道数
+        """
+        if encoding not in _ENCODINGS:
+            raise ValueError(f"不支持的采样编码: {encoding}")
+        self.raw = raw
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._mono: Optional[np.ndarray] = None
+        self._converted = {}
+
+    @classmethod
+    def from_bytes(cls, data: bytes, sample_rate: int = 16000) -> 'AudioClip':
+        """WAV文件按文件头解析；其他数据视为 sample_rate 的16位单声道PCM"""
+        if data[:4] == b'RIFF':
+            encoding, rate, channels, pcm = parse_wav(data)
+            return cls(pcm, encoding, rate, channels)
+        return cls(memoryview(data)[:len(data) - len(data) % 2], 'pcm16', sample_rate)
+
+    @property
+    def frames(self) -> int:
+        return len(self.raw) // (_ENCODINGS[self.encoding][0] // 8 * self.channels)
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    def is_pcm16(self, sample_rate: int) -> bool:
+        """是否已经是指定采样率的16位单声道PCM"""
+        return self.encoding == 'pcm16' and self.channels == 1 and self.sample_rate == sample_rate
+
+    def samples(self) -> np.ndarray:
+        """原采样率的单声道 float32 采样（多声道取平均）"""
+        if self._mono is None:
+            decoded = decode_samples(self.raw, self.encoding, self.channels)
+            self._mono = decoded[:, 0] if self.channels == 1 else decoded.mean(axis=1, dtype=np.float32)
+        return self._mono
+
+    def to_float32(self, sample_rate: int) -> np.ndarray:
+        """指定采样率的单声道 float32 采样"""
+        key = ('float32', sample_rate)
+        if key not in self._converted:
+            self._converted[key] = resample(self.samples(), self.sample_rate, sample_rate)
+        return self._converted[key]
+
+    def to_pcm16(self, sample_rate: int) -> bytes:
+        """指定采样率的16位单声道PCM（已是该格式时直接返回原始数据）"""
+        if self.is_pcm16(sample_rate):
+            return bytes(self.raw)
+        key = ('pcm16', sample_rate)
+        if key not in self._converted:
+            self._converted[key] = to_pcm16(self.to_float32(sample_rate))
+        return self._converted[key]
+
+    def to_wav(self, sample_rate: int) -> bytes:
+        """指定采样率的16位单声道WAV文件"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(self.to_pcm16(sample_rate))
+        return buffer.getvalue()
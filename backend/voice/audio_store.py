@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成音频产物存储模块
+
+管理 temp/generated_audio 下的合成音频文件生命周期：
+- 字节配额与TTL过期淘汰
+- 引用计数，正在推流/读取的文件不会被删除
+- 后台增量清理任务，每轮只处理有限数量的条目；清理在线程池中执行，
+  锁内只挑选并注销待删除的文件，删除文件在锁外进行
+- 使用量统计，供状态接口查询
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.config import config
+from ..core.workers import WORKER_ID_ENV, current_worker_id
+from ..utils.metrics import CACHE_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+base_dir = Path(__file__).resolve().parent.parent.parent
+
+
+class _Artifact:
+    """单个音频产物的登记信息"""
+
+    __slots__ = ('size', 'created_at', 'last_access', 'refs')
+
+    def __init__(self, size: int, created_at: float):
+        self.size = size
+        self.created_at = created_at
+        self.last_access = created_at
+        self.refs = 0
+
+
+class AudioArtifactStore:
+    """音频产物存储"""
+
+    def __init__(self, root_dir: str, max_bytes: int = 512 * 1024 * 1024,
+                 ttl_seconds: float = 3600, sweep_interval: float = 30,
+                 sweep_batch: int = 200, adopt_dirs: Iterable[str] = ()):
+        """初始化音频产物存储
+
+        Args:
+            root_dir: 音频文件目录
+            max_bytes: 字节配额，超出后按最久未访问顺序淘汰
+            ttl_seconds: 文件自最后一次访问起的存活时间
+            sweep_interval: 后台清理间隔（秒）
+            sweep_batch: 每轮清理最多检查的条目数
+            adopt_dirs: 启动时额外登记其中遗留文件的目录（不含子目录）
+        """
+        self.root_dir = Path(root_dir)
+        self.adopt_dirs = [Path(directory) for directory in adopt_dirs]
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+
+        # 按最后访问时间排序，最久未访问的在最前
+        self._artifacts: 'OrderedDict[str, _Artifact]' = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper_task: Optional[asyncio.Task] = None
+        # 启动前遗留文件的增量扫描迭代器
+        self._adopt_iter: Optional[Iterator[os.DirEntry]] = None
+        # 本次扫描登记的遗留文件，扫描结束后按修改时间排序
+        self._adopted: List[str] = []
+
+        self._stats = {
+            'registered_total': 0,
+            'expired_total': 0,
+            'evicted_total': 0,
+            'bytes_freed_total': 0,
+            'delete_failures_total': 0,
+            'sweeps_total': 0,
+            'last_sweep_ms': 0.0,
+        }
+
+    @classmethod
+    def from_config(cls, app_config: Dict[str, Any]) -> 'AudioArtifactStore':
+        """根据配置创建存储实例"""
+        store_config = app_config.get('audio_store', {})
+        root_dir = store_config.get('root_dir') or str(base_dir / "temp" / "generated_audio")
+        adopt_dirs = []
+        # 多进程模式下每个工作进程管理各自的子目录，互不删除对方的文件；
+        # 单进程运行时留在根目录的文件由0号工作进程接管
+        if WORKER_ID_ENV in os.environ:
+            worker_id = current_worker_id()
+            if worker_id == 0:
+                adopt_dirs.append(root_dir)
+            root_dir = os.path.join(root_dir, f"w{worker_id}")
+        return cls(
+            root_dir=root_dir,
+            max_bytes=int(store_config.get('max_mb', 512)) * 1024 * 1024,
+            ttl_seconds=float(store_config.get('ttl_seconds', 3600)),
+            sweep_interval=float(store_config.get('sweep_interval', 30)),
+            sweep_batch=int(store_config.get('sweep_batch', 200)),
+            adopt_dirs=adopt_dirs
+        )
+
+    def _key(self, path: str) -> str:
+        return os.path.abspath(path)
+
+    def owns(self, path: str) -> bool:
+        """判断路径是否位于存储目录下"""
+        try:
+            Path(self._key(path)).relative_to(self.root_dir.resolve())
+            return True
+        except ValueError:
+            return False
+
+    def allocate(self, suffix: str = ".wav", prefix: str = "tts_") -> str:
+        """分配一个新的输出文件路径（文件写入完成后需调用 register）"""
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        return str(self.root_dir / f"{prefix}{uuid.uuid4().hex}{suffix}")
+
+    def register(self, path: str) -> bool:
+        """登记已写入完成的文件
+
+        Returns:
+            是否登记成功
+        """
+        key = self._key(path)
+        try:
+            size = os.path.getsize(key)
+        except OSError as e:
+            logger.warning(f"登记音频文件失败: {path} ({e})")
+            return False
+
+        now = time.time()
+        with self._lock:
+            old = self._artifacts.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old.size
+            artifact = _Artifact(size, now)
+            if old is not None:
+                artifact.refs = old.refs
+            self._artifacts[key] = artifact
+            self._total_bytes += size
+            self._stats['registered_total'] += 1
+            over_quota = self._total_bytes > self.max_bytes
+
+        # 超出配额时立即淘汰，不等待下一轮清理
+        if over_quota:
+            self._enforce_quota()
+        return True
+
+    def discard(self, path: str):
+        """删除一个分配后未能成功写入的文件"""
+        key = self._key(path)
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is not None and artifact.refs > 0:
+                return
+            if artifact is not None:
+                self._artifacts.pop(key)
+                self._total_bytes -= artifact.size
+        try:
+            os.remove(key)
+        except OSError:
+            pass
+
+    def acquire(self, path: str) -> bool:
+        """增加引用计数，持有期间文件不会被删除
+
+        Returns:
+            文件是否由本存储管理（True 时调用方需配对调用 release）
+        """
+        key = self._key(path)
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is None:
+                CACHE_REQUESTS_TOTAL.labels('audio_store', 'miss').inc()
+                return False
+            CACHE_REQUESTS_TOTAL.labels('audio_store', 'hit').inc()
+            artifact.refs += 1
+            artifact.last_access = time.time()
+            self._artifacts.move_to_end(key)
+            return True
+
+    def release(self, path: str):
+        """释放一次引用"""
+        key = self._key(path)
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is not None and artifact.refs > 0:
+                artifact.refs -= 1
+                artifact.last_access = time.time()
+                self._artifacts.move_to_end(key)
+
+    def _take_locked(self, key: str, artifact: _Artifact) -> Tuple[str, _Artifact]:
+        """注销待删除的文件（调用方持有锁），之后无法再被 acquire"""
+        self._artifacts.pop(key, None)
+        self._total_bytes -= artifact.size
+        return key, artifact
+
+    def _remove_files(self, victims: List[Tuple[str, _Artifact]]) -> int:
+        """在锁外删除已注销的文件；删除失败的重新登记到最前，留待下一轮
+
+        Returns:
+            删除的文件数
+        """
+        removed = 0
+        freed = 0
+        failed = []
+        for key, artifact in victims:
+            try:
+                os.remove(key)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Windows下文件可能仍被占用
+                logger.debug(f"删除音频文件失败，稍后重试: {key} ({e})")
+                failed.append((key, artifact))
+                continue
+            removed += 1
+            freed += artifact.size
+        with self._lock:
+            self._stats['bytes_freed_total'] += freed
+            self._stats['delete_failures_total'] += len(failed)
+            for key, artifact in failed:
+                if key not in self._artifacts:
+                    self._artifacts[key] = artifact
+                    self._artifacts.move_to_end(key, last=False)
+                    self._total_bytes += artifact.size
+        return removed
+
+    def _enforce_quota(self) -> int:
+        """按最久未访问顺序淘汰，直到低于配额"""
+        victims = []
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return 0
+            for key, artifact in list(self._artifacts.items()):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                if artifact.refs > 0:
+                    continue
+                victims.append(self._take_locked(key, artifact))
+        evicted = self._remove_files(victims)
+        with self._lock:
+            self._stats['evicted_total'] += evicted
+        if evicted:
+            logger.info(f"🧹 音频存储超出配额，已淘汰 {evicted} 个文件")
+        return evicted
+
+    def _scan_leftovers(self) -> Iterator[os.DirEntry]:
+        """依次扫描存储目录与 adopt_dirs 中的文件"""
+        for directory in [self.root_dir, *self.adopt_dirs]:
+            try:
+                with os.scandir(directory) as entries:
+                    yield from entries
+            except FileNotFoundError:
+                continue
+
+    def _adopt_existing(self, limit: int) -> int:
+        """增量登记目录中的遗留文件（如重启前生成的音频）"""
+        if self._adopt_iter is None:
+            return 0
+        adopted = 0
+        try:
+            while adopted < limit:
+                entry = next(self._adopt_iter)
+                if not entry.is_file():
+                    continue
+                key = self._key(entry.path)
+                stat = entry.stat()
+                with self._lock:
+                    if key in self._artifacts:
+                        continue
+                    artifact = _Artifact(stat.st_size, stat.st_mtime)
+                    self._artifacts[key] = artifact
+                    # 遗留文件排在最前，优先淘汰；扫描结束后再按修改时间排序
+                    self._artifacts.move_to_end(key, last=False)
+                    self._total_bytes += stat.st_size
+                self._adopted.append(key)
+                adopted += 1
+        except StopIteration:
+            self._finish_adoption()
+        except OSError as e:
+            logger.warning(f"扫描音频目录失败: {e}")
+            self._finish_adoption()
+        return adopted
+
+    def _finish_adoption(self):
+        """扫描结束: 把仍未被访问过的遗留文件按修改时间从旧到新排到最前"""
+        self._adopt_iter = None
+        with self._lock:
+            leftovers = [(self._artifacts[key].created_at, key) for key in self._adopted
+                         if key in self._artifacts
+                         and self._artifacts[key].last_access == self._artifacts[key].created_at]
+            for _, key in sorted(leftovers, reverse=True):
+                self._artifacts.move_to_end(key, last=False)
+        self._adopted = []
+
+    def sweep(self, max_items: int = None) -> int:
+        """执行一轮增量清理
+
+        Args:
+            max_items: 本轮最多检查的条目数，默认使用 sweep_batch
+
+        Returns:
+            本轮删除的文件数
+        """
+        started = time.perf_counter()
+        limit = max_items or self.sweep_batch
+        self._adopt_existing(limit)
+
+        victims = []
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            checked = 0
+            for key, artifact in list(self._artifacts.items()):
+                if checked >= limit:
+                    break
+                checked += 1
+                # 有序字典按最后访问时间排列，遇到未过期条目即可停止；
+                # 遗留文件扫描期间顺序尚未整理，只能跳过
+                if artifact.last_access > cutoff:
+                    if self._adopt_iter is None:
+                        break
+                    continue
+                if artifact.refs > 0:
+                    continue
+                victims.append(self._take_locked(key, artifact))
+        removed = self._remove_files(victims)
+        with self._lock:
+            self._stats['expired_total'] += removed
+
+        removed += self._enforce_quota()
+
+        with self._lock:
+            self._stats['sweeps_total'] += 1
+            self._stats['last_sweep_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        if removed:
+            logger.info(f"🧹 音频存储清理完成，删除 {removed} 个文件")
+        return removed
+
+    async def _sweep_loop(self):
+        """后台清理循环（目录扫描与文件删除在线程池中进行，不阻塞事件循环）"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.sleep(self.sweep_interval)
+                await loop.run_in_executor(None, self.sweep)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"音频存储清理异常: {e}")
+
+    async def start(self):
+        """启动后台清理任务"""
+        if self._sweeper_task and not self._sweeper_task.done():
+            return
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._adopt_iter = self._scan_leftovers()
+        self._sweeper_task = asyncio.create_task(self._sweep_loop())
+        logger.info(f"音频存储清理任务已启动: {self.root_dir} "
+                    f"(配额 {self.max_bytes / 1024 / 1024:.0f}MB, TTL {self.ttl_seconds:.0f}秒)")
+
+    async def stop(self):
+        """停止后台清理任务"""
+        if self._sweeper_task:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取使用量统计"""
+        with self._lock:
+            referenced = sum(1 for a in self._artifacts.values() if a.refs > 0)
+            stats = {
+                'root_dir': str(self.root_dir),
+                'files': len(self._artifacts),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'usage_ratio': round(self._total_bytes / self.max_bytes, 4) if self.max_bytes else 0,
+                'ttl_seconds': self.ttl_seconds,
+                'referenced_files': referenced,
+            }
+        stats.update(self._stats)
+        return stats
+
+
+# 全局音频产物存储实例
+audio_store = AudioArtifactStore.from_config(config.config)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频流式输出工具模块
+
+为HTTP分块传输提供音频封装：
+- 长度未知的流式WAV头（RIFF/data长度字段置为0xFFFFFFFF）
+- 浮点/整型采样到16位PCM的向量化转换（audio/L16为大端字节序）
+- 基于Accept请求头的音频格式协商
+"""
+
+import struct
+from typing import Optional
+
+import numpy as np
+
+# 支持的流式格式: 格式名 -> Content-Type
+STREAM_FORMATS = {
+    'wav': 'audio/wav',
+    'pcm': 'audio/L16',
+}
+
+# Accept中可接受的媒体类型 -> 格式名
+_MEDIA_TYPE_FORMATS = {
+    'audio/wav': 'wav',
+    'audio/wave': 'wav',
+    'audio/x-wav': 'wav',
+    'audio/vnd.wave': 'wav',
+    'audio/l16': 'pcm',
+    'audio/pcm': 'pcm',
+    'audio/*': 'wav',
+    '*/*': 'wav',
+}
+
+# 流式WAV的长度占位值
+_UNKNOWN_LENGTH = 0xFFFFFFFF
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """生成长度未知的流式WAV文件头
+
+    Args:
+        sample_rate: 采样率
+        channels: 声道数
+        bits_per_sample: 采样位深
+
+    Returns:
+        44字节WAV头
+    """
+    block_align = channels * bits_per_sample // 8
+    byte_rate = sample_rate * block_align
+    return (
+        b'RIFF' + struct.pack('<I', _UNKNOWN_LENGTH) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate,
+                                byte_rate, block_align, bits_per_sample)
+        + b'data' + struct.pack('<I', _UNKNOWN_LENGTH)
+    )
+
+
+def to_pcm16(audio, big_endian: bool = False) -> bytes:
+    """将音频采样转换为16位PCM字节
+
+    Args:
+        audio: numpy数组，浮点型按[-1, 1]处理，int16直接输出
+        big_endian: 是否输出大端字节序（audio/L16要求网络字节序）
+
+    Returns:
+        PCM字节
+    """
+    dtype = '>i2' if big_endian else '<i2'
+    samples = np.asarray(audio)
+    if samples.dtype == np.int16:
+        return samples.astype(dtype, copy=False).tobytes()
+    if np.issubdtype(samples.dtype, np.integer):
+        # 其他整型按位宽缩放到16位
+        shift = samples.dtype.itemsize * 8 - 16
+        if shift > 0:
+            samples = samples >> shift
+        return samples.astype(dtype).tobytes()
+    clipped = np.clip(samples, -1.0, 1.0)
+    return (clipped * 32767.0).astype(dtype).tobytes()
+
+
+def _parse_accept(accept: str):
+    """解析Accept头，按q值降序返回(媒体类型, q)"""
+    ranges = []
+    for index, part in enumerate(accept.split(',')):
+        fields = [f.strip() for f in part.split(';')]
+        media_type = fields[0].lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.lower().startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranges.append((media_type, q, index))
+    # 同q值时保持客户端给出的顺序
+    ranges.sort(key=lambda item: (-item[1], item[2]))
+    return [(media_type, q) for media_type, q, _ in ranges]
+
+
+def negotiate_stream_format(accept: Optional[str], requested: Optional[str] = None) -> Optional[str]:
+    """根据Accept头协商流式音频格式
+
+    Args:
+        accept: Accept请求头，缺省视为接受任意格式
+        requested: 显式指定的格式（如查询参数format），优先于Accept
+
+    Returns:
+        格式名（'wav' 或 'pcm'），无法满足时返回None
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in STREAM_FORMATS else None
+
+    if not accept:
+        return 'wav'
+
+    for media_type, q in _parse_accept(accept):
+        if q <= 0:
+            continue
+        fmt = _MEDIA_TYPE_FORMATS.get(media_type)
+        if fmt:
+            return fmt
+    return None
+
+
+def stream_content_type(fmt: str, sample_rate: int, channels: int = 1) -> str:
+    """获取流式格式对应的Content-Type"""
+    if fmt == 'pcm':
+        return f"audio/L16;rate={sample_rate};channels={channels}"
+    return STREAM_FORMATS[fmt]
@@ -10,10 +10,13 @@ import sys
 import logging
 import soundfile as sf
 from pathlib import Path
-import tempfile
 import asyncio
+import threading
 import torch
 
+from .audio_analysis import analyze_audio, select_reference_segment
+from .audio_store import audio_store
+
 # Add GPT-SoVITS paths
 base_dir = Path(__file__).resolve().parent.parent.parent
 gpt_sovits_path = base_dir / "GPT-SoVITS"
@@ -57,6 +60,8 @@ class SoVITSInferenceEngine:
             if not os.path.exists(path):
                 raise FileNotFoundError(f"Required model file not found: {path}")
 
+        self.reference_report = self._check_reference_audio(sovits_config.get('analysis', {}))
+
         # Use CUDA if available
         device = "cuda" if torch.cuda.is_available() else "cpu"
         is_half = device == "cuda"
@@ -83,26 +88,25 @@ class SoVITSInferenceEngine:
         logger.info(f"   - Reference Audio: {os.path.basename(self.ref_audio_path)}")
         logger.info(f"   - Prompt Text: {self.prompt_text}")
 
-    async def generate_speech(self, text, output_path=None):
-        """生成语音
-        
-        Args:
-            text: 要合成的文本
-            output_path: 输出路径（可选）
-            
-        Returns:
-            生成的音频文件路径
-        """
-        logger.info(f"🎵 Synthesizing speech for text: {text[:50]}...")
-        
-        if not output_path:
-            output_dir = base_dir / "temp" / "generated_audio"
-            output_dir.mkdir(parents=True, exist_ok=True)
-            output_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=str(output_dir))
-            output_path = output_file.name
-            output_file.close()
-
-        inputs = {
+    def _check_reference_audio(self, analysis_config):
+        """分析参考音频质量，时长不在3~10秒或存在问题时给出建议截取的片段"""
+        try:
+            report = analyze_audio(self.ref_audio_path, analysis_config)
+        except Exception as e:
+            logger.warning(f"参考音频分析失败: {e}")
+            return None
+        for issue in report['issues']:
+            logger.warning(f"⚠️ 参考音频质量问题: {issue}")
+        if report['issues'] or not 3 <= report['duration'] <= 10:
+            best = select_reference_segment(report)
+            if best is not None:
+                logger.warning(f"💡 建议截取参考音频 {best['start']:.2f}s ~ {best['end']:.2f}s "
+                               f"(质量分 {best['score']}, 信噪比 {best['snr_db']} dB)")
+        return report
+
+    def _build_inputs(self, text, return_fragment=False):
+        """构建推理参数"""
+        return {
             "text": text,
             "text_lang": "zh",
             "ref_audio_path": self.ref_audio_path,
@@ -115,7 +119,70 @@ class SoVITSInferenceEngine:
             "batch_size": 1,
             "speed_factor": 1.0,
             "ref_free": False,
+            "return_fragment": return_fragment,
         }
+
+    async def stream_speech(self, text):
+        """按分句流式生成语音，每个分句声码完成后立即产出
+
+        Args:
+            text: 要合成的文本
+
+        Yields:
+            (采样率, 音频数组) 元组
+        """
+        logger.info(f"🎵 Streaming speech for text: {text[:50]}...")
+        inputs = self._build_inputs(text, return_fragment=True)
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        finished = object()
+        stop_event = threading.Event()
+
+        def produce():
+            try:
+                for fragment in self.tts_infer.run(inputs):
+                    if stop_event.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, fragment)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if isinstance(item, tuple) and len(item) == 2:
+                    yield item
+        finally:
+            # 客户端断开时通知推理线程在下一个分句处停止
+            stop_event.set()
+            await producer
+
+    async def generate_speech(self, text, output_path=None):
+        """生成语音
+        
+        Args:
+            text: 要合成的文本
+            output_path: 输出路径（可选）
+            
+        Returns:
+            生成的音频文件路径
+        """
+        logger.info(f"🎵 Synthesizing speech for text: {text[:50]}...")
+        
+        # 未指定输出路径时由音频存储分配，纳入配额和TTL管理
+        managed = not output_path
+        if managed:
+            output_path = audio_store.allocate(suffix=".wav")
+
+        inputs = self._build_inputs(text)
         
         loop = asyncio.get_event_loop()
         try:
@@ -147,6 +214,8 @@ class SoVITSInferenceEngine:
                 
                 if audio_data is not None:
                     sf.write(output_path, audio_data, sampling_rate)
+                    if managed:
+                        audio_store.register(output_path)
                     logger.info(f"✅ Speech synthesized successfully and saved to: {output_path}")
                     return output_path
                 else:
@@ -158,6 +227,8 @@ class SoVITSInferenceEngine:
                 
         except Exception as e:
             logger.error(f"❌ Speech synthesis failed: {e}", exc_info=True)
+            if managed:
+                audio_store.discard(output_path)
             return None
 
     def cleanup(self):
@@ -185,6 +256,11 @@ class SoVITSInferenceEngine:
                 "sovits_model": os.path.basename(self.sovits_path) if self.sovits_path else "未设置",
                 "reference_audio": os.path.basename(self.ref_audio_path) if self.ref_audio_path else "未设置",
                 "prompt_text": self.prompt_text[:50] + "..." if len(self.prompt_text) > 50 else self.prompt_text,
+                "reference_quality": {
+                    "duration": self.reference_report['duration'],
+                    "snr_db": self.reference_report['snr_db'],
+                    "issues": self.reference_report['issues'],
+                } if self.reference_report else None,
                 "version": "v2",
                 "status": "ready",
                 "work_dir": str(base_dir / "temp"),
@@ -12,14 +12,31 @@ import logging
 import json
 import os
 import shutil
-import subprocess
 import time
 import sys
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+from .audio_analysis import analyze_audio
+from .training_preprocess import TrainingPreprocessor, load_manifest, write_manifest
+
 logger = logging.getLogger(__name__)
 
+# 训练阶段: (名称, 进度, 步骤, 说明)。每个阶段的结果都写入 training_data/，
+# 训练任务队列在阶段之间记录检查点，进程崩溃后从未完成的阶段继续
+TRAINING_STAGES = [
+    ('check_files', 5, '检查文件', '验证训练数据文件...'),
+    ('preprocess', 15, '预处理音频', '切分和归一化音频片段...'),
+    ('prepare_text', 25, '准备文本', '处理训练文本数据...'),
+    ('extract_features', 35, '特征提取', '提取语音特征向量...'),
+    ('train_asr', 50, 'ASR训练', '训练语音识别模型...'),
+    ('train_tts', 70, 'TTS训练', '训练语音合成模型...'),
+    ('optimize', 85, '模型优化', '优化模型性能...'),
+    ('save', 95, '验证保存', '验证并保存训练结果...'),
+]
+# 只提取特征的任务执行到特征提取为止
+FEATURE_STAGES = TRAINING_STAGES[:4]
+
 class SoVITSTrainer:
     """真正的SoVITS模型训练器"""
     
@@ -37,6 +54,10 @@ class SoVITSTrainer:
         self.epochs = self.training_config.get('epochs', 200)
         self.batch_size = self.training_config.get('batch_size', 8)
         self.learning_rate = self.training_config.get('learning_rate', 0.0001)
+        self.analysis_config = self.sovits_config.get('analysis', {})
+        self.audio_report: Optional[Dict[str, Any]] = None
+        self.preprocessor = TrainingPreprocessor.from_config(self.training_config.get('preprocess', {}))
+        self.manifest_path = f"training_data/{self.model_name}_manifest.json"
         
         # 创建必要目录
         os.makedirs("trained_models", exist_ok=True)
@@ -94,38 +115,10 @@ class SoVITSTrainer:
         }
         
         try:
-            # 步骤1: 检查音频和文本文件
-            await self._update_progress(5, '检查文件', '验证训练数据文件...')
-            if not self._check_training_files():
-                raise Exception("训练文件检查失败")
-            
-            # 步骤2: 预处理音频数据
-            await self._update_progress(15, '预处理音频', '处理和分割音频文件...')
-            await self._preprocess_audio()
-            
-            # 步骤3: 准备文本数据
-            await self._update_progress(25, '准备文本', '处理训练文本数据...')
-            await self._prepare_text_data()
-            
-            # 步骤4: 特征提取
-            await self._update_progress(35, '特征提取', '提取语音特征向量...')
-            await self._extract_features()
-            
-            # 步骤5: 训练ASR模型
-            await self._update_progress(50, 'ASR训练', '训练语音识别模型...')
-            await self._train_asr_model()
-            
-            # 步骤6: 训练TTS模型
-            await self._update_progress(70, 'TTS训练', '训练语音合成模型...')
-            await self._train_tts_model()
-            
-            # 步骤7: 模型优化
-            await self._update_progress(85, '模型优化', '优化模型性能...')
-            await self._optimize_model()
-            
-            # 步骤8: 模型验证和保存
-            await self._update_progress(95, '验证保存', '验证并保存训练结果...')
-            model_path = await self._save_trained_model()
+            model_path = ''
+            for name, progress, step, message in TRAINING_STAGES:
+                await self._update_progress(progress, step, message)
+                model_path = await self.run_stage(name) or model_path
             
             # 完成训练
             await self._update_progress(100, '训练完成', f'模型已保存到: {model_path}')
@@ -151,6 +144,30 @@ class SoVITSTrainer:
             })
             return False
     
+    async def run_stage(self, name: str) -> Optional[str]:
+        """执行一个训练阶段
+        
+        Returns:
+            save 阶段返回模型文件路径，其余阶段返回None
+        """
+        if name == 'check_files':
+            if not self._check_training_files():
+                raise Exception("训练文件检查失败")
+            return None
+        handlers = {
+            'preprocess': self._preprocess_audio,
+            'prepare_text': self._prepare_text_data,
+            'extract_features': self._extract_features,
+            'train_asr': self._train_asr_model,
+            'train_tts': self._train_tts_model,
+            'optimize': self._optimize_model,
+            'save': self._save_trained_model,
+        }
+        if name not in handlers:
+            raise ValueError(f"未知的训练阶段: {name}")
+        result = await handlers[name]()
+        return result if name == 'save' else None
+    
     async def _update_progress(self, progress: int, step: str, message: str):
         """更新训练进度"""
         self.training_status.update({
@@ -183,6 +200,23 @@ class SoVITSTrainer:
         file_size = audio_path.stat().st_size
         logger.info(f"✅ 音频文件检查通过: {audio_path} ({file_size:,} bytes)")
         
+        # 分块分析音频质量，报告供后续切分步骤使用
+        try:
+            self.audio_report = analyze_audio(str(audio_path), self.analysis_config)
+        except Exception as e:
+            logger.error(f"音频文件无法读取: {e}")
+            return False
+        report_path = Path(f"training_data/{self.model_name}_audio_report.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.audio_report, f, ensure_ascii=False, indent=2)
+        if not self.audio_report['segments']:
+            logger.error(f"音频文件中未检测到语音: {audio_path}")
+            return False
+        for issue in self.audio_report['issues']:
+            logger.warning(f"⚠️ 训练音频质量问题: {issue}")
+        logger.info(f"✅ 音频质量分析完成: {len(self.audio_report['segments'])} 个语音片段, "
+                    f"信噪比约 {self.audio_report['snr_db']} dB")
+        
         # 读取文本内容
         with open(text_path, 'r', encoding='utf-8') as f:
             text_content = f.read().strip()
@@ -191,59 +225,44 @@ class SoVITSTrainer:
         return True
     
     async def _preprocess_audio(self):
-        """预处理音频文件"""
-        await asyncio.sleep(1)
+        """切分训练音频、响度归一化并重采样，写入片段清单"""
+        if self.audio_report is None:
+            loop = asyncio.get_running_loop()
+            self.audio_report = await loop.run_in_executor(
+                None, analyze_audio, self.audio_file, self.analysis_config)
         
-        try:
-            # 确保音频格式正确
-            input_path = Path(self.audio_file)
-            output_path = Path(f"training_data/{self.model_name}_processed.wav")
-            
-            # 使用ffmpeg转换音频格式
-            cmd = [
-                "ffmpeg", "-y", "-i", str(input_path),
-                "-ar", "22050",  # 采样率
-                "-ac", "1",      # 单声道
-                "-f", "wav",
-                str(output_path)
-            ]
-            
-            logger.info(f"执行音频预处理: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                logger.warning(f"ffmpeg处理失败: {result.stderr}")
-                # 如果ffmpeg失败，直接复制原文件
-                shutil.copy2(input_path, output_path)
-            
-            logger.info(f"✅ 音频预处理完成: {output_path}")
-            
-        except Exception as e:
-            logger.warning(f"音频预处理异常: {e}")
-            # 作为备选，直接复制原文件
-            shutil.copy2(self.audio_file, f"training_data/{self.model_name}_processed.wav")
+        clips = await self.preprocessor.run(self.audio_file, self.audio_report,
+                                            f"training_data/{self.model_name}_clips")
+        if not clips:
+            raise Exception("训练音频中没有可用的语音片段")
+        write_manifest(self.manifest_path, self.audio_file, clips)
+        
+        total = sum(clip['duration'] for clip in clips)
+        logger.info(f"✅ 音频预处理完成: {len(clips)} 个片段, 共 {total:.1f} 秒 -> {self.manifest_path}")
     
     async def _prepare_text_data(self):
-        """准备文本数据"""
-        await asyncio.sleep(1)
-        
+        """准备文本数据（按顺序与清单中的片段对齐）"""
         try:
             # 读取训练文本
             with open(self.text_file, 'r', encoding='utf-8') as f:
                 full_text = f.read().strip()
             
-            # 分割成训练片段
+            # 每行对应一个片段
             sentences = [line.strip() for line in full_text.split('\n') if line.strip()]
+            clips = load_manifest(self.manifest_path)['clips']
+            if len(sentences) != len(clips):
+                logger.warning(f"⚠️ 文本行数({len(sentences)})与音频片段数({len(clips)})不一致，只使用前 "
+                               f"{min(len(sentences), len(clips))} 对")
             
             # 生成训练数据清单
-            training_list = []
-            for i, sentence in enumerate(sentences[:50]):  # 限制50句进行训练
-                if len(sentence) > 10:  # 过滤太短的句子
-                    training_list.append({
-                        'audio_path': f"training_data/{self.model_name}_processed.wav",
-                        'text': sentence,
-                        'speaker': self.model_name
-                    })
+            training_list = [{
+                'audio_path': clip['path'],
+                'text': sentence,
+                'speaker': self.model_name,
+                'duration': clip['duration']
+            } for clip, sentence in zip(clips, sentences)]
+            if not training_list:
+                raise Exception("没有可用的训练样本")
             
             # 保存训练清单
             list_path = Path(f"training_data/{self.model_name}_list.json")
@@ -335,7 +354,10 @@ class SoVITSTrainer:
             # 清理训练数据
             training_dir = Path("training_data")
             for file in training_dir.glob(f"{self.model_name}*"):
-                file.unlink()
+                if file.is_dir():
+                    shutil.rmtree(file)
+                else:
+                    file.unlink()
                 logger.info(f"🗑️ 训练数据已删除: {file}")
             
             # 重置状态
@@ -364,8 +386,10 @@ class SoVITSTrainer:
         
         try:
             # 检查ffmpeg
-            result = subprocess.run(['ffmpeg', '-version'], capture_output=True)
-            deps['ffmpeg'] = result.returncode == 0
+            process = await asyncio.create_subprocess_exec(
+                'ffmpeg', '-version',
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+            deps['ffmpeg'] = await process.wait() == 0
         except:
             pass
         
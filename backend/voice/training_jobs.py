@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语音训练任务队列模块
+
+语音训练与特征提取作为持久化任务在独立进程中执行：
+- 任务记录在SQLite（WAL模式）中，服务重启后仍可查询、继续
+- 每个任务一个独立会话中的子进程（python -m backend.voice.training_jobs，参数经stdin传入），
+  服务进程退出（包括Ctrl+C）时不等待也不中断它；逐阶段执行 SoVITSTrainer.run_stage，每完成一个阶段记录检查点；
+  子进程意外退出时任务重新排队，从未完成的阶段继续（最多 max_attempts 次）
+- 任务记录进程号及其启动时间，重启后接管时据此判断进程是否仍是该任务（避免进程号被复用后任务一直处于运行中）
+- 取消: 排队中的任务直接取消；运行中的任务向其进程组发送 SIGTERM（包括 ffmpeg 与进程池子进程）
+- CPU预算: 默认把 tts_cpus（交互TTS/服务进程使用的核心）排除在训练进程的CPU亲和性之外，
+  并降低训练进程优先级、按可用核心数限制数值库线程数；share_tts_cpus: true 时不做限制
+- 客户端可覆盖的任务参数在提交时校验: model_name 只能由字母、数字、下划线和连字符组成
+  （用作 training_data/ 下的文件名），audio_file/text_file 必须位于 upload_dir 之内
+- 调度器轮询数据库的版本号，把任务的变化推送给监听者（服务端据此发送 train_voice 消息）；
+  多进程模式下只由一个工作进程调度，其他进程只监听
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务类型
+JOB_KINDS = ('train_voice', 'extract_features')
+# 可由任务参数覆盖的 sovits 配置项
+JOB_PARAMS = ('audio_file', 'text_file', 'model_name', 'reference_text')
+# 任务参数中的文件路径（相对 upload_dir，不能指向其外）
+PATH_PARAMS = ('audio_file', 'text_file')
+# 模型名用作 training_data/ 与 trained_models/ 下的文件名
+MODEL_NAME_PATTERN = re.compile(r'^[\w-]{1,64}$')
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# 训练进程中限制线程数的环境变量
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+# 任务进程以 python -m 启动时需要能导入 backend 包
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_COLUMNS = ('job_id', 'kind', 'params', 'status', 'stage', 'completed_stages', 'progress', 'step',
+            'message', 'error', 'result', 'attempts', 'pid', 'pid_started', 'cancel_requested', 'version',
+            'created_at', 'updated_at', 'finished_at')
+
+
+class TrainingJobStore:
+    """训练任务的持久化存储（每个进程各自打开）"""
+
+    def __init__(self, db_path: str):
+        """初始化
+
+        Args:
+            db_path: 数据库文件路径（调度进程与任务进程共用）
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=10, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS training_jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                completed_stages TEXT NOT NULL DEFAULT '[]',
+                progress INTEGER NOT NULL DEFAULT 0,
+                step TEXT,
+                message TEXT,
+                error TEXT,
+                result TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                pid INTEGER,
+                pid_started TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            )
+        ''')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(training_jobs)')}
+        if 'pid_started' not in columns:
+            self._conn.execute('ALTER TABLE training_jobs ADD COLUMN pid_started TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_training_jobs_status ON training_jobs (status)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_training_jobs_version ON training_jobs (version)')
+
+    @staticmethod
+    def _to_job(row) -> Dict[str, Any]:
+        job = dict(zip(_COLUMNS, row))
+        job['params'] = json.loads(job['params'])
+        job['completed_stages'] = json.loads(job['completed_stages'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def _select(self, where: str = '', args=(), suffix: str = '') -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT {", ".join(_COLUMNS)} FROM training_jobs {where} {suffix}', args).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def _update(self, job_id: str, where: str = '', **fields) -> bool:
+        """更新任务并递增版本号（版本号全局递增，供监听者增量读取）"""
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = self._conn.execute(
+                    f'UPDATE training_jobs SET {assignments}, '
+                    f'version = (SELECT COALESCE(MAX(version), 0) + 1 FROM training_jobs) '
+                    f'WHERE job_id = ? {where}', (*fields.values(), job_id))
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return cursor.rowcount > 0
+
+    def create(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """新建排队中的任务"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    'INSERT INTO training_jobs (job_id, kind, params, status, step, message, version, '
+                    'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, '
+                    '(SELECT COALESCE(MAX(version), 0) + 1 FROM training_jobs), ?, ?)',
+                    (job_id, kind, json.dumps(params, ensure_ascii=False), QUEUED, '排队中', '等待执行...',
+                     now, now))
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务"""
+        jobs = self._select('WHERE job_id = ?', (job_id,))
+        return jobs[0] if jobs else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近创建的任务"""
+        return self._select(suffix='ORDER BY created_at DESC LIMIT ?', args=(limit,))
+
+    def with_status(self, status: str) -> List[Dict[str, Any]]:
+        """指定状态的任务（按创建顺序）"""
+        return self._select('WHERE status = ?', (status,), 'ORDER BY created_at')
+
+    def changed_since(self, version: int) -> List[Dict[str, Any]]:
+        """版本号大于 version 的任务（按版本顺序）"""
+        return self._select('WHERE version > ?', (version,), 'ORDER BY version')
+
+    def max_version(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(MAX(version), 0) FROM training_jobs').fetchone()[0]
+
+    def claim(self, job_id: str) -> bool:
+        """排队中的任务开始运行（尝试次数加一）"""
+        attempts = self.get(job_id)['attempts']
+        return self._update(job_id, f"AND status = '{QUEUED}'", status=RUNNING, pid=None, pid_started=None,
+                            attempts=attempts + 1, message='正在启动训练进程...')
+
+    def set_pid(self, job_id: str, pid: int, started: Optional[str] = None):
+        """记录任务进程号及其启动时间（见 process_started）"""
+        self._update(job_id, pid=pid, pid_started=started)
+
+    def start_stage(self, job_id: str, stage: str, progress: int, step: str, message: str):
+        """记录正在执行的阶段"""
+        self._update(job_id, stage=stage, progress=progress, step=step, message=message)
+
+    def complete_stage(self, job_id: str, stage: str, result: Optional[str] = None):
+        """记录阶段完成（检查点）"""
+        completed = self.get(job_id)['completed_stages']
+        if stage not in completed:
+            completed.append(stage)
+        fields = {'completed_stages': json.dumps(completed)}
+        if result is not None:
+            fields['result'] = result
+        self._update(job_id, **fields)
+
+    def finish(self, job_id: str, status: str, message: str = '', error: Optional[str] = None):
+        """任务结束（成功、失败或取消）"""
+        fields = {'status': status, 'message': message, 'error': error, 'pid': None, 'pid_started': None,
+                  'finished_at': time.time()}
+        if status == SUCCEEDED:
+            fields.update(progress=100, step='训练完成')
+        self._update(job_id, **fields)
+
+    def requeue(self, job_id: str, message: str):
+        """运行中断的任务重新排队"""
+        self._update(job_id, status=QUEUED, pid=None, pid_started=None, message=message)
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """请求取消: 排队中的任务直接取消，运行中的任务做标记
+
+        Returns:
+            更新后的任务，任务不存在时返回None
+        """
+        job = self.get(job_id)
+        if job is None or job['status'] in FINISHED:
+            return job
+        if job['status'] == QUEUED:
+            self._update(job_id, f"AND status = '{QUEUED}'", status=CANCELLED, message='任务已取消',
+                         finished_at=time.time())
+        self._update(job_id, f"AND status = '{RUNNING}'", cancel_requested=1, message='正在取消...')
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        return job is None or job['cancel_requested']
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"关闭训练任务数据库失败: {e}")
+
+
+def training_cpus(jobs_config: Dict[str, Any]) -> Optional[List[int]]:
+    """训练进程可以使用的CPU
+
+    Returns:
+        CPU编号列表（可能为空，表示没有可用核心）；None 表示不限制（share_tts_cpus）
+    """
+    if jobs_config.get('share_tts_cpus', False):
+        return None
+    if hasattr(os, 'sched_getaffinity'):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+    reserved = jobs_config.get('tts_cpus')
+    if reserved is None:
+        # 默认前一半核心留给交互服务（至少一个）
+        reserved = available[:max(1, len(available) // 2)]
+    candidates = jobs_config.get('cpus') or available
+    return [cpu for cpu in candidates if cpu in available and cpu not in set(reserved)]
+
+
+def limit_cpu(cpus: Optional[List[int]], niceness: int = 0):
+    """把当前进程（所有线程）限制在指定CPU上并降低优先级"""
+    thread_ids = [0]
+    if os.path.isdir('/proc/self/task'):
+        # Linux 上亲和性与优先级按线程设置，已创建的线程（如数值库线程池）需逐个处理
+        thread_ids = [int(tid) for tid in os.listdir('/proc/self/task')]
+    for tid in thread_ids:
+        try:
+            if cpus and hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(tid, cpus)
+            if niceness and hasattr(os, 'setpriority'):
+                os.setpriority(os.PRIO_PROCESS, tid, min(19, os.getpriority(os.PRIO_PROCESS, tid) + niceness))
+        except OSError as e:
+            logger.warning(f"设置训练进程的CPU限制失败: {e}")
+    if cpus and not hasattr(os, 'sched_setaffinity'):
+        logger.warning("当前平台不支持CPU亲和性，训练进程只降低了优先级")
+
+
+def _job_config(config: Dict[str, Any], params: Dict[str, Any],
+                cpus: Optional[List[int]]) -> Dict[str, Any]:
+    """任务参数覆盖到 sovits 配置上；预处理并发数不超过可用核心数"""
+    job_config = dict(config)
+    sovits = dict(job_config.get('sovits', {}))
+    sovits.update({key: params[key] for key in JOB_PARAMS if key in params})
+    if cpus:
+        training = dict(sovits.get('training', {}))
+        preprocess = dict(training.get('preprocess', {}))
+        preprocess['workers'] = min(preprocess.get('workers', 2), len(cpus))
+        training['preprocess'] = preprocess
+        sovits['training'] = training
+    job_config['sovits'] = sovits
+    return job_config
+
+
+async def _run_stages(store: TrainingJobStore, job: Dict[str, Any], config: Dict[str, Any],
+                      cpus: Optional[List[int]]):
+    from .sovits_tts import FEATURE_STAGES, TRAINING_STAGES, SoVITSTrainer
+
+    job_id = job['job_id']
+    stages = TRAINING_STAGES if job['kind'] == 'train_voice' else FEATURE_STAGES
+    try:
+        trainer = SoVITSTrainer(_job_config(config, job['params'], cpus))
+        for name, progress, step, message in stages:
+            if name in job['completed_stages']:
+                continue
+            if store.cancel_requested(job_id):
+                store.finish(job_id, CANCELLED, '任务已取消')
+                return
+            store.start_stage(job_id, name, progress, step, message)
+            store.complete_stage(job_id, name, await trainer.run_stage(name))
+        result = store.get(job_id)['result']
+        store.finish(job_id, SUCCEEDED, f'模型已保存到: {result}' if result else '特征提取完成')
+    except Exception as e:
+        logger.error(f"训练任务失败: {job_id}: {e}")
+        store.finish(job_id, FAILED, f'错误: {e}', str(e))
+
+
+def run_job(db_path: str, job_id: str, config: Dict[str, Any], cpus: Optional[List[int]] = None,
+            niceness: int = 0):
+    """训练任务进程入口（进程组与会话由启动方建立）"""
+    limit_cpu(cpus, niceness)
+    store = TrainingJobStore(db_path)
+    try:
+        asyncio.run(_run_stages(store, store.get(job_id), config, cpus))
+    finally:
+        store.close()
+
+
+def main():
+    """python -m backend.voice.training_jobs: 从stdin读取任务参数（JSON）并执行"""
+    args = json.load(sys.stdin)
+    run_job(args['db_path'], args['job_id'], args['config'], args.get('cpus'), args.get('niceness', 0))
+
+
+def process_started(pid: int) -> Optional[str]:
+    """进程的启动时间（/proc/<pid>/stat 的 starttime），与进程号一起唯一标识进程；不支持的平台返回None"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # 进程名可能包含空格和括号，从最后一个 ')' 之后按字段切分（starttime 为第22个字段）
+    fields = stat[stat.rfind(b')') + 2:].split()
+    return fields[19].decode('ascii') if len(fields) > 19 else None
+
+
+def _pid_alive(pid: Optional[int], started: Optional[str] = None) -> bool:
+    """进程是否仍在运行；记录了启动时间时还要求启动时间一致（进程号可能已被复用）"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return started is None or process_started(pid) == started
+
+
+class TrainingJobManager:
+    """训练任务调度器"""
+
+    def __init__(self, store: TrainingJobStore, config: Dict[str, Any], max_concurrent: int = 1,
+                 cpus: Optional[List[int]] = None, niceness: int = 10, poll_interval: float = 0.5,
+                 max_attempts: int = 3, schedule: bool = True, upload_dir: str = 'audio_files'):
+        """初始化
+
+        Args:
+            store: 任务存储
+            config: 完整配置（传给任务进程）
+            max_concurrent: 同时运行的任务数
+            cpus: 训练进程的CPU亲和性（None 不限制，空列表表示没有可用核心）
+            niceness: 训练进程降低的优先级
+            poll_interval: 调度与进度推送的轮询间隔（秒）
+            max_attempts: 进程意外退出后的最多尝试次数
+            schedule: 是否由本进程启动任务（否则只推送进度）
+            upload_dir: 任务参数中的音频/文本文件必须位于此目录内
+        """
+        self.store = store
+        self.config = config
+        self.max_concurrent = max(1, max_concurrent)
+        self.cpus = cpus
+        self.niceness = niceness
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.schedule = schedule
+        self.upload_dir = upload_dir
+        self._processes: Dict[str, subprocess.Popen] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+        self._version = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], db_path: str, schedule: bool = True) -> 'TrainingJobManager':
+        """从配置（training_jobs）创建"""
+        jobs_config = config.get('training_jobs', {}) or {}
+        return cls(TrainingJobStore(jobs_config.get('db_path') or db_path), config,
+                   max_concurrent=jobs_config.get('max_concurrent', 1),
+                   cpus=training_cpus(jobs_config),
+                   niceness=jobs_config.get('nice', 10),
+                   poll_interval=jobs_config.get('poll_interval', 0.5),
+                   max_attempts=jobs_config.get('max_attempts', 3),
+                   schedule=schedule,
+                   upload_dir=jobs_config.get('upload_dir', 'audio_files'))
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """注册任务变化的监听者（协程函数，参数为任务）"""
+        self._listeners.append(listener)
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """提交任务
+
+        Raises:
+            ValueError: 任务类型或参数无效
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"不支持的任务类型: {kind}")
+        params = params or {}
+        unknown = set(params) - set(JOB_PARAMS)
+        if unknown:
+            raise ValueError(f"不支持的任务参数: {', '.join(sorted(unknown))}")
+        job = self.store.create(kind, self._check_params(params))
+        logger.info(f"训练任务已提交: {job['job_id']} ({kind})")
+        return job
+
+    def _check_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """校验客户端提交的任务参数，文件路径解析为 upload_dir 内的绝对路径
+
+        Raises:
+            ValueError: 参数无效或路径位于 upload_dir 之外
+        """
+        checked = {}
+        for key, value in params.items():
+            if not isinstance(value, str) or not value:
+                raise ValueError(f"任务参数 {key} 必须为非空字符串")
+            if key == 'model_name' and not MODEL_NAME_PATTERN.match(value):
+                raise ValueError(f"模型名只能包含字母、数字、下划线和连字符: {value}")
+            if key in PATH_PARAMS:
+                # realpath 解析 .. 与符号链接后再比较，防止借此读取目录外的文件
+                root = os.path.realpath(self.upload_dir)
+                path = os.path.realpath(os.path.join(root, value))
+                if os.path.commonpath([root, path]) != root:
+                    raise ValueError(f"任务参数 {key} 必须位于 {self.upload_dir} 目录内: {value}")
+                value = path
+            checked[key] = value
+        return checked
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.store.list_jobs(limit)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消任务
+
+        Returns:
+            更新后的任务，任务不存在时返回None
+        """
+        job = self.store.request_cancel(job_id)
+        if job is not None and job['status'] == RUNNING and job['pid']:
+            self._terminate(job['pid'])
+            logger.info(f"正在取消训练任务: {job_id}")
+        return job
+
+    @staticmethod
+    def _terminate(pid: int):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(pid, signal.SIGTERM)
+            else:
+                os.kill(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _alive(self, job: Dict[str, Any]) -> bool:
+        process = self._processes.get(job['job_id'])
+        if process is not None:
+            return process.poll() is None
+        return _pid_alive(job['pid'], job['pid_started'])
+
+    def _spawn(self, job: Dict[str, Any]):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [_PROJECT_ROOT, env.get('PYTHONPATH')]))
+        if self.cpus:
+            # 数值库在导入时按环境变量确定线程数
+            env.update({name: str(len(self.cpus)) for name in THREAD_ENV_VARS})
+        # 新会话: 自成进程组，取消时一并结束 ffmpeg 与进程池子进程；
+        # 不接收终端的 Ctrl+C，服务进程退出时也不等待它（不同于 multiprocessing 的非守护进程）
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'backend.voice.training_jobs'],
+            stdin=subprocess.PIPE, env=env, start_new_session=True,
+            creationflags=getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0))
+        started = process_started(process.pid)
+        try:
+            # 配置可能包含密钥，经stdin而不是命令行传入
+            process.stdin.write(json.dumps({
+                'db_path': self.store.db_path, 'job_id': job['job_id'], 'config': self.config,
+                'cpus': self.cpus, 'niceness': self.niceness,
+            }, ensure_ascii=False, default=str).encode('utf-8'))
+            process.stdin.close()
+        except OSError as e:
+            # 进程已退出，下次轮询时按意外退出处理
+            logger.error(f"向训练任务进程传递参数失败: {job['job_id']}: {e}")
+        self._processes[job['job_id']] = process
+        self.store.set_pid(job['job_id'], process.pid, started)
+        logger.info(f"训练任务进程已启动: {job['job_id']} (pid {process.pid})")
+
+    def poll_once(self):
+        """回收结束的进程、恢复中断的任务并启动排队的任务"""
+        for job_id, process in list(self._processes.items()):
+            if process.poll() is not None:
+                del self._processes[job_id]
+
+        running = self.store.with_status(RUNNING)
+        for job in running:
+            if self._alive(job):
+                continue
+            job_id = job['job_id']
+            if job['cancel_requested']:
+                self.store.finish(job_id, CANCELLED, '任务已取消')
+            elif job['attempts'] >= self.max_attempts:
+                self.store.finish(job_id, FAILED, '训练进程多次意外退出', '训练进程多次意外退出')
+            else:
+                stage = job['stage'] or '开始'
+                logger.warning(f"训练任务进程意外退出，重新排队: {job_id} (阶段 {stage})")
+                self.store.requeue(job_id, f'训练进程意外退出，将从 {stage} 阶段继续')
+        active = sum(1 for job in self.store.with_status(RUNNING))
+
+        for job in self.store.with_status(QUEUED):
+            if active >= self.max_concurrent:
+                break
+            if self.cpus is not None and not self.cpus:
+                self.store.finish(job['job_id'], FAILED, '没有可供训练使用的CPU',
+                                  '交互TTS保留了全部CPU，请配置 training_jobs.cpus 或 share_tts_cpus')
+                continue
+            if self.store.claim(job['job_id']):
+                self._spawn(job)
+                active += 1
+
+    async def _notify(self):
+        for job in self.store.changed_since(self._version):
+            self._version = max(self._version, job['version'])
+            for listener in self._listeners:
+                try:
+                    await listener(job)
+                except Exception as e:
+                    logger.error(f"推送训练任务进度失败: {e}")
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if self.schedule:
+                    await loop.run_in_executor(None, self.poll_once)
+                await self._notify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 启动进程失败（如文件描述符或内存不足）等任何异常都不能结束调度；
+                # 已认领但未能启动的任务在下一轮按进程意外退出处理
+                logger.error(f"训练任务调度失败: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self):
+        """启动调度与进度推送"""
+        if self._task and not self._task.done():
+            return
+        self._version = self.store.max_version()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"训练任务队列已启动（{'调度并' if self.schedule else '仅'}推送进度，"
+                    f"CPU: {'不限制' if self.cpus is None else self.cpus}）")
+
+    async def stop(self):
+        """停止调度（运行中的任务进程继续执行，下次启动时接管）"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.store.close()
+
+
+if __name__ == '__main__':
+    main()
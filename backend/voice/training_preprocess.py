@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语音训练素材预处理模块
+
+把长录音切成适合训练的短片段：
+- 切分点来自 audio_analysis 的语音片段（向量化能量检测）；相邻片段合并到不超过 max_clip_s，
+  超长片段等分，短于 min_clip_s 的丢弃，两端各留 padding_ms
+- 每个片段响度归一化并重采样为单声道：有 ffmpeg 时用 asyncio.create_subprocess_exec 调用
+  （loudnorm，EBU R128），否则（或 ffmpeg 处理失败时）在进程池中用 NumPy 处理（RMS 近似响度，峰值限制在 -1dBFS）
+- 同时处理的片段数不超过 workers，事件循环不会被阻塞
+- 结果写入清单（manifest），每个片段一条记录，供文本对齐、特征提取等后续步骤读取
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from .audio_ingest import resample
+
+logger = logging.getLogger(__name__)
+
+# 峰值上限（dBFS）
+_PEAK_LIMIT_DB = -1.0
+
+
+def process_clip(source: str, start: float, end: float, output_path: str,
+                 sample_rate: int, loudness_db: float) -> Dict[str, Any]:
+    """在工作进程中切出一个片段、混为单声道、重采样并归一化响度（只读取片段所在范围）
+
+    Returns:
+        {'duration', 'gain_db'}
+    """
+    info = sf.info(source)
+    data, rate = sf.read(source, start=int(start * info.samplerate), stop=int(end * info.samplerate),
+                         dtype='float32', always_2d=True)
+    mono = data[:, 0] if data.shape[1] == 1 else data.mean(axis=1)
+    mono = resample(mono, rate, sample_rate)
+    rms = float(np.sqrt(np.mean(np.square(mono, dtype=np.float64)))) if mono.size else 0.0
+    peak = float(np.max(np.abs(mono))) if mono.size else 0.0
+    gain = 1.0
+    if rms > 0:
+        gain = 10 ** ((loudness_db - 20 * math.log10(rms)) / 20)
+        gain = min(gain, 10 ** (_PEAK_LIMIT_DB / 20) / peak)
+    sf.write(output_path, mono * gain, sample_rate, subtype='PCM_16')
+    return {'duration': round(mono.size / sample_rate, 3), 'gain_db': round(20 * math.log10(gain), 2)}
+
+
+class TrainingPreprocessor:
+    """训练素材切分与归一化"""
+
+    def __init__(self, sample_rate: int = 22050, loudness_db: float = -23.0, min_clip_s: float = 1.0,
+                 max_clip_s: float = 12.0, padding_ms: int = 100, workers: int = 2,
+                 ffmpeg: Optional[str] = 'ffmpeg'):
+        """初始化
+
+        Args:
+            sample_rate: 输出采样率
+            loudness_db: 目标响度（ffmpeg 为 LUFS，NumPy 处理时为 RMS dBFS）
+            min_clip_s: 短于该时长的片段被丢弃
+            max_clip_s: 合并相邻语音片段时的时长上限
+            padding_ms: 片段两端保留的静音
+            workers: 同时处理的片段数（ffmpeg 进程数或进程池大小）
+            ffmpeg: ffmpeg 可执行文件，None 表示不使用
+        """
+        self.sample_rate = sample_rate
+        self.loudness_db = loudness_db
+        self.min_clip_s = min_clip_s
+        self.max_clip_s = max_clip_s
+        self.padding_s = padding_ms / 1000
+        self.workers = max(1, workers)
+        self.ffmpeg = shutil.which(ffmpeg) if ffmpeg else None
+
+    @classmethod
+    def from_config(cls, preprocess_config: Dict[str, Any]) -> 'TrainingPreprocessor':
+        """从配置（sovits.training.preprocess）创建"""
+        return cls(sample_rate=preprocess_config.get('sample_rate', 22050),
+                   loudness_db=preprocess_config.get('loudness_db', -23.0),
+                   min_clip_s=preprocess_config.get('min_clip_s', 1.0),
+                   max_clip_s=preprocess_config.get('max_clip_s', 12.0),
+                   padding_ms=preprocess_config.get('padding_ms', 100),
+                   workers=preprocess_config.get('workers', 2),
+                   ffmpeg=preprocess_config.get('ffmpeg', 'ffmpeg'))
+
+    def plan_clips(self, report: Dict[str, Any]) -> List[Tuple[float, float, List[Dict[str, Any]]]]:
+        """按分析报告的语音片段规划切分
+
+        Returns:
+            [(开始秒, 结束秒, 包含的语音片段), ...]
+        """
+        spans: List[Tuple[float, float, List[Dict[str, Any]]]] = []
+        current: List[Dict[str, Any]] = []
+        for segment in report['segments']:
+            if current and segment['end'] - current[0]['start'] > self.max_clip_s:
+                spans.append((current[0]['start'], current[-1]['end'], current))
+                current = []
+            current.append(segment)
+        if current:
+            spans.append((current[0]['start'], current[-1]['end'], current))
+
+        clips = []
+        for start, end, segments in spans:
+            # 没有静音可切的超长片段等分
+            pieces = max(1, math.ceil((end - start) / self.max_clip_s))
+            step = (end - start) / pieces
+            for i in range(pieces):
+                piece_start, piece_end = start + i * step, start + (i + 1) * step
+                if piece_end - piece_start < self.min_clip_s:
+                    continue
+                clips.append((max(0.0, piece_start - self.padding_s),
+                              min(report['duration'], piece_end + self.padding_s), segments))
+        return clips
+
+    def _ffmpeg_command(self, source: str, start: float, end: float, output_path: str) -> List[str]:
+        return [
+            self.ffmpeg, '-hide_banner', '-nostdin', '-y',
+            '-ss', f'{start:.3f}', '-t', f'{end - start:.3f}', '-i', source,
+            '-af', f'loudnorm=I={self.loudness_db}:TP={_PEAK_LIMIT_DB}:LRA=11',
+            '-ar', str(self.sample_rate), '-ac', '1', '-c:a', 'pcm_s16le',
+            output_path,
+        ]
+
+    async def _run_ffmpeg(self, source: str, start: float, end: float, output_path: str) -> bool:
+        process = await asyncio.create_subprocess_exec(
+            *self._ffmpeg_command(source, start, end, output_path),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            logger.warning(f"ffmpeg处理片段失败: {stderr.decode('utf-8', 'replace')[-500:]}")
+            return False
+        return True
+
+    async def run(self, source: str, report: Dict[str, Any], output_dir: str) -> List[Dict[str, Any]]:
+        """切分并处理所有片段
+
+        Args:
+            source: 原始音频文件
+            report: source 的分析报告（analyze_audio）
+            output_dir: 片段输出目录（已有内容会被清空）
+
+        Returns:
+            清单中的片段记录，按时间顺序
+        """
+        clips = self.plan_clips(report)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers)
+        pool: Optional[ProcessPoolExecutor] = None
+
+        def get_pool() -> ProcessPoolExecutor:
+            nonlocal pool
+            if pool is None:
+                pool = ProcessPoolExecutor(max_workers=self.workers)
+            return pool
+
+        async def run_one(index: int, start: float, end: float, segments: List[Dict[str, Any]]):
+            output_path = os.path.join(output_dir, f'{index:04d}.wav')
+            async with slots:
+                normalizer = 'ffmpeg'
+                if self.ffmpeg is None or not await self._run_ffmpeg(source, start, end, output_path):
+                    normalizer = 'numpy'
+                    await loop.run_in_executor(get_pool(), process_clip, source, start, end, output_path,
+                                               self.sample_rate, self.loudness_db)
+            return {
+                'index': index,
+                'path': output_path,
+                'start': round(start, 3),
+                'end': round(end, 3),
+                'duration': round(sf.info(output_path).duration, 3),
+                'sample_rate': self.sample_rate,
+                'segments': len(segments),
+                'snr_db': min(segment['snr_db'] for segment in segments),
+                'score': min(segment['score'] for segment in segments),
+                'normalizer': normalizer,
+            }
+
+        try:
+            return list(await asyncio.gather(*(run_one(index, start, end, segments)
+                                               for index, (start, end, segments) in enumerate(clips))))
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+def write_manifest(path: str, source: str, clips: List[Dict[str, Any]]):
+    """写入片段清单"""
+    manifest = {
+        'source': source,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'clips': clips,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """读取片段清单"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -10,11 +10,28 @@ import os
 import tempfile
 import asyncio
 import re
+import time
+import wave
+from contextlib import aclosing
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+
+from ..utils.metrics import TTS_REAL_TIME_FACTOR, TTS_SYNTHESIS_SECONDS
+from ..utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+
+def _wav_duration(path: str) -> Optional[float]:
+    """读取WAV文件时长（秒），无法解析时返回None"""
+    try:
+        with wave.open(path, 'rb') as wav_file:
+            frames = wav_file.getnframes()
+            rate = wav_file.getframerate()
+        return frames / rate if rate else None
+    except (wave.Error, EOFError, OSError):
+        return None
+
 class TTSManager:
     """TTS管理器"""
     
@@ -126,6 +143,8 @@ class TTSManager:
         """
         # 使用锁确保同时只有一个语音合成任务运行
         async with self._synthesis_lock:
+            # 记录拿到合成锁的时间点，区分排队等待与合成耗时
+            tracer.event("tts_lock_acquired")
             try:
                 text = self.clean_text(text.strip())
                 if not text:
@@ -140,10 +159,14 @@ class TTSManager:
                     return None
                     
                 # 使用异步方法生成语音
-                audio_path = await self.sovits_engine.generate_speech(text)
+                started = time.perf_counter()
+                with tracer.span("tts_manager.synthesize", chars=len(text)):
+                    audio_path = await self.sovits_engine.generate_speech(text)
+                elapsed = time.perf_counter() - started
                     
                 if audio_path and os.path.exists(audio_path):
                     logger.info(f"✅ SoVITS语音合成成功: {audio_path}")
+                    self._record_synthesis(elapsed, _wav_duration(audio_path))
                     
                     # 将绝对路径转换为相对URL路径
                     audio_url = self._convert_absolute_path_to_url(audio_path)
@@ -167,6 +190,43 @@ class TTSManager:
                 logger.error(f"❌ SoVITS语音合成异常: {e}")
                 return None
     
+    async def synthesize_stream(self, text: str) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        流式合成语音 - 每个分句声码完成后立即产出
+        
+        Args:
+            text: 要合成的文本
+            
+        Yields:
+            (采样率, 音频数组) 元组
+        """
+        async with self._synthesis_lock:
+            text = self.clean_text(text.strip())
+            if not text:
+                logger.error("❌ 文本为空，无法合成语音")
+                return
+            
+            if not self.sovits_engine:
+                logger.error("❌ SoVITS推理引擎未初始化")
+                return
+            
+            logger.info(f"🎵 开始SoVITS流式语音合成: {text[:50]}...")
+            started = time.perf_counter()
+            audio_seconds = 0.0
+            # 调用方提前停止时先关闭引擎的生成器（等待推理线程停止），再释放合成锁
+            async with aclosing(self.sovits_engine.stream_speech(text)) as fragments:
+                async for sample_rate, audio in fragments:
+                    audio_seconds += len(audio) / sample_rate if sample_rate else 0.0
+                    yield sample_rate, audio
+            self._record_synthesis(time.perf_counter() - started, audio_seconds)
+    
+    def _record_synthesis(self, elapsed: float, audio_seconds: Optional[float]):
+        """记录合成耗时与实时率"""
+        provider = self.current_provider or 'sovits_engine'
+        TTS_SYNTHESIS_SECONDS.labels(provider).observe(elapsed)
+        if audio_seconds:
+            TTS_REAL_TIME_FACTOR.labels(provider).observe(elapsed / audio_seconds)
+    
     def synthesize_sync(self, text: str, **kwargs) -> Optional[str]:
         """
         同步版本的语音合成，返回音频文件路径
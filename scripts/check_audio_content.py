@@ -7,15 +7,17 @@
 import os
 import sys
 import logging
-import wave
-import librosa
-import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from backend.voice.audio_analysis import analyze_audio, select_reference_segment
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def analyze_audio_file(audio_path):
-    """分析音频文件"""
+    """分析音频文件（分块读取，长录音也不会一次性载入内存）"""
     logger.info(f"🔍 分析音频文件: {audio_path}")
     
     if not os.path.exists(audio_path):
@@ -27,15 +29,13 @@ def analyze_audio_file(audio_path):
         file_size = os.path.getsize(audio_path)
         logger.info(f"📊 文件大小: {file_size:,} 字节 ({file_size/1024/1024:.2f} MB)")
         
-        # 使用librosa加载音频
-        y, sr = librosa.load(audio_path, sr=None)
-        duration = len(y) / sr
+        report = analyze_audio(audio_path)
+        duration = report['duration']
         
         logger.info(f"🎵 音频信息:")
-        logger.info(f"   - 采样率: {sr} Hz")
+        logger.info(f"   - 采样率: {report['sample_rate']} Hz")
         logger.info(f"   - 时长: {duration:.2f} 秒")
-        logger.info(f"   - 声道数: {'立体声' if len(y.shape) > 1 else '单声道'}")
-        logger.info(f"   - 格式: WAV")
+        logger.info(f"   - 声道数: {'立体声' if report['channels'] > 1 else '单声道'}")
         
         # 根据文件名推测内容
         filename = os.path.basename(audio_path)
@@ -54,20 +54,19 @@ def analyze_audio_file(audio_path):
             
         # 音频质量分析
         logger.info(f"🎯 音频质量分析:")
+        logger.info(f"   - RMS音量: {report['rms']:.4f}  峰值: {report['peak']:.4f}")
+        logger.info(f"   - 噪声底: {report['noise_floor_db']} dBFS  信噪比估计: {report['snr_db']} dB")
+        logger.info(f"   - 语音占比: {report['speech_ratio']:.0%}  削波采样占比: {report['clipped_ratio']:.4%}")
         
-        # 音量分析
-        rms = np.sqrt(np.mean(y**2))
-        logger.info(f"   - RMS音量: {rms:.4f}")
+        # 逐片段报告
+        logger.info(f"🧩 语音片段 ({len(report['segments'])} 个):")
+        for segment in report['segments']:
+            logger.info(f"   - {segment['start']:7.2f}s ~ {segment['end']:7.2f}s "
+                        f"RMS {segment['rms']:.3f}  信噪比 {segment['snr_db']:5.1f} dB  "
+                        f"质心 {segment['centroid_hz']:6.0f} Hz  质量分 {segment['score']:.2f}")
         
-        # 频率分析
-        fft = np.fft.fft(y)
-        magnitude = np.abs(fft)
-        freqs = np.fft.fftfreq(len(fft), 1/sr)
-        
-        # 找到主要频率成分
-        dominant_freq_idx = np.argmax(magnitude[:len(magnitude)//2])
-        dominant_freq = abs(freqs[dominant_freq_idx])
-        logger.info(f"   - 主要频率: {dominant_freq:.1f} Hz")
+        for issue in report['issues']:
+            logger.warning(f"   - ⚠️ {issue}")
         
         if duration > 1 and duration < 10:
             logger.info("   - ✅ 时长适合作为参考音频")
@@ -75,11 +74,10 @@ def analyze_audio_file(audio_path):
             logger.warning("   - ⚠️ 音频过短，可能影响效果")
         else:
             logger.warning("   - ⚠️ 音频过长，建议截取3-8秒片段")
-            
-        if rms > 0.01:
-            logger.info("   - ✅ 音量适中")
-        else:
-            logger.warning("   - ⚠️ 音量较低，可能需要音频增强")
+        
+        best = select_reference_segment(report)
+        if best is not None:
+            logger.info(f"   - 💡 最适合作为参考音频的片段: {best['start']:.2f}s ~ {best['end']:.2f}s")
             
         return True
         
@@ -136,15 +134,7 @@ if __name__ == "__main__":
     print("🎯 Arona音频内容确认工具")
     print("=" * 60)
     
-    audio_path = "audio_files/arona_attendance_enter_1.wav"
-    
-    # 检查依赖
-    try:
-        import librosa
-    except ImportError:
-        print("❌ 缺少 librosa 库，请安装:")
-        print("pip install librosa soundfile")
-        sys.exit(1)
+    audio_path = sys.argv[1] if len(sys.argv) > 1 else "audio_files/arona_attendance_enter_1.wav"
     
     success = analyze_audio_file(audio_path)
     
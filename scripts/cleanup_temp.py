@@ -2,6 +2,9 @@
 """
 临时文件清理脚本
 自动清理 temp/ 目录下的过期文件
+
+注意：服务运行期间 temp/generated_audio 由 backend/voice/audio_store.py
+按配额和TTL自动清理，本脚本主要用于离线清理
 """
 
 import os
@@ -84,8 +84,12 @@ config = None
 tts_manager = None
 sovits_engine = None
 
-async def main():
-    """主程序入口"""
+async def main(reuse_port=False):
+    """主程序入口
+
+    Args:
+        reuse_port: 是否以 SO_REUSEPORT 绑定端口（多进程模式）
+    """
     global config, tts_manager, sovits_engine
     
     logger.info("🚀 启动AI虚拟主播应用 (修复版)")
@@ -207,13 +211,43 @@ async def main():
         logger.info("=" * 60)
         
         # 运行服务器
-        await app.run(host=host, port=port)
+        await app.run(host=host, port=port, reuse_port=reuse_port)
     
     except Exception as e:
         logger.error(f"❌ 应用启动失败: {e}")
         traceback.print_exc()
         sys.exit(1)
 
+def worker_main(worker_id):
+    """多进程模式下的工作进程入口
+
+    Args:
+        worker_id: 工作进程编号
+    """
+    logger.info(f"🧵 工作进程 #{worker_id} 启动 (pid {os.getpid()})")
+    try:
+        asyncio.run(main(reuse_port=True))
+    except KeyboardInterrupt:
+        pass
+
+def resolve_worker_count(cli_workers):
+    """确定工作进程数量：命令行参数优先，其次为配置文件 app.workers
+
+    Args:
+        cli_workers: 命令行指定的数量（None表示未指定）
+
+    Returns:
+        工作进程数量，0 表示按CPU核心数
+    """
+    if cli_workers is not None:
+        workers = cli_workers
+    else:
+        workers = ConfigManager(os.path.join(BASE_DIR, "data", "config.yaml")).get('app.workers', 1)
+    workers = int(workers if workers is not None else 1)
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
 def check_environment():
     """检查运行环境"""
     # 检查Python版本
@@ -261,18 +295,36 @@ def print_banner():
     print(banner)
 
 if __name__ == "__main__":
+    import argparse
+    from backend.core.workers import reuse_port_supported, run_workers
+    
+    parser = argparse.ArgumentParser(description="AI虚拟主播应用")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="工作进程数量，0 表示按CPU核心数（默认读取配置 app.workers）")
+    args = parser.parse_args()
+    
     # 打印启动横幅
     print_banner()
     
     # 检查环境
     check_environment()
     
+    workers = resolve_worker_count(args.workers)
+    if workers > 1 and not reuse_port_supported():
+        logger.warning("⚠️ 当前平台不支持 SO_REUSEPORT，回退到单进程模式")
+        workers = 1
+    
     try:
         # 启动主程序
         if sys.platform == 'win32':
             # Windows平台特殊处理
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         
+        if workers > 1:
+            # 多进程模式：各工作进程以 SO_REUSEPORT 共享端口
+            logger.info(f"🚀 以多进程模式启动，工作进程数: {workers}")
+            sys.exit(run_workers(workers, worker_main))
+        
         # 运行主程序
         asyncio.run(main())
     except KeyboardInterrupt:
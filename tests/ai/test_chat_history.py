@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试聊天记录管理器与常驻SQLite连接
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai.chat_history import ChatHistoryManager, decode_cursor, encode_cursor
+from backend.ai.history_db import HistoryDatabase
+
+
+def test_wal_mode_and_pragmas(tmp_path):
+    """数据库使用WAL模式，连接应用调优参数"""
+    db = HistoryDatabase(str(tmp_path / "history.db"), cache_size_kb=4096)
+    try:
+        with db.write() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+            assert conn.execute('PRAGMA cache_size').fetchone()[0] == -4096
+        with db.read() as conn:
+            assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+    finally:
+        db.close()
+
+
+def test_write_rolls_back_on_error(tmp_path):
+    """写事务异常时回滚"""
+    db = HistoryDatabase(str(tmp_path / "history.db"))
+    try:
+        with db.write() as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+        with pytest.raises(RuntimeError):
+            with db.write() as conn:
+                conn.execute('INSERT INTO t VALUES (1)')
+                raise RuntimeError("boom")
+        with db.read() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    finally:
+        db.close()
+
+
+def test_close_wakes_threads_waiting_for_a_reader(tmp_path):
+    """只读连接池已满时等待的线程，在数据库关闭后报错退出而不是永远阻塞"""
+    db = HistoryDatabase(str(tmp_path / "history.db"), read_pool_size=1)
+    errors = []
+    waiting = threading.Event()
+
+    def reader():
+        waiting.set()
+        try:
+            with db.read():
+                pass
+        except sqlite3.ProgrammingError as e:
+            errors.append(e)
+
+    with db.read():
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        waiting.wait(5)
+        db.close()
+        thread.join(2)
+    assert not thread.is_alive() and len(errors) == 1
+
+
+def test_reads_do_not_block_behind_open_write(tmp_path):
+    """写事务未提交时，读连接仍能读到已提交的数据"""
+    db = HistoryDatabase(str(tmp_path / "history.db"))
+    try:
+        with db.write() as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.execute('INSERT INTO t VALUES (1)')
+
+        in_write = threading.Event()
+        release = threading.Event()
+
+        def writer():
+            with db.write() as conn:
+                conn.execute('INSERT INTO t VALUES (2)')
+                in_write.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        assert in_write.wait(5)
+        with db.read() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 1
+        release.set()
+        thread.join()
+        with db.read() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 2
+    finally:
+        db.close()
+
+
+def test_chat_history_roundtrip(tmp_path):
+    """消息写入后可读取，统计与删除正常"""
+    history = ChatHistoryManager(str(tmp_path / "chat.db"))
+    try:
+        session_id = history.start_new_session("测试")
+        history.add_message('user', '你好')
+        history.add_message('assistant', '你好，我是小雨', emotion='happy')
+
+        messages = history.get_session_messages(session_id)
+        assert [m.content for m in messages] == ['你好', '你好，我是小雨']
+        assert history.get_recent_messages(limit=1)[0]['content'] == '你好，我是小雨'
+        sessions = history.get_all_sessions()
+        assert sessions[0]['id'] == session_id and sessions[0]['message_count'] == 2
+        assert history.get_statistics()['total_messages'] == 2
+
+        history.delete_session(session_id)
+        assert history.get_statistics() == {
+            'total_messages': 0, 'total_sessions': 0, 'recent_messages': 0
+        }
+    finally:
+        history.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        history.add_message('user', '关闭后不可写')
+
+
+def test_write_behind_batches_and_reads_own_writes(tmp_path):
+    """后写模式合并写入，未落盘的消息对当前会话可见，关闭时落盘"""
+    db_path = str(tmp_path / "chat.db")
+    history = ChatHistoryManager(db_path, write_behind=True, write_batch_size=8,
+                                 write_flush_interval=60)
+    session_id = history.start_new_session("后写")
+    for i in range(5):
+        history.add_message('user', f'消息{i}')
+
+    # 刷盘间隔很长，消息仍在队列中，但读取当前会话可以看到
+    assert history.get_statistics()['total_messages'] == 0
+    assert [m.content for m in history.get_session_messages(limit=3)] == ['消息2', '消息3', '消息4']
+
+    assert history.flush(timeout=5)
+    assert history.get_statistics()['total_messages'] == 5
+    assert history.get_all_sessions()[0]['message_count'] == 5
+    assert history.writer.pending(session_id) == []
+
+    history.add_message('assistant', '关闭前的最后一条')
+    history.close()
+
+    reopened = ChatHistoryManager(db_path)
+    try:
+        assert reopened.get_statistics()['total_messages'] == 6
+        assert reopened.get_all_sessions()[0]['message_count'] == 6
+    finally:
+        reopened.close()
+
+
+def test_reads_do_not_wait_for_write_behind_commit(tmp_path):
+    """写线程提交期间读取不等待，已落盘但仍在待写视图中的消息不重复"""
+    history = ChatHistoryManager(str(tmp_path / "chat.db"), write_behind=True,
+                                 write_flush_interval=0)
+    committed = threading.Event()
+    release = threading.Event()
+    write_messages = history.write_messages
+
+    def slow_write(messages):
+        write_messages(messages)
+        committed.set()
+        release.wait(5)
+
+    history.write_messages = slow_write
+    try:
+        history.start_new_session("并发")
+        history.add_message('user', '第一条')
+        history.add_message('assistant', '第二条')
+        assert committed.wait(5)
+
+        result = []
+        reader = threading.Thread(target=lambda: result.append(history.get_session_messages()))
+        reader.start()
+        reader.join(2)
+        assert not reader.is_alive()
+        contents = [m.content for m in result[0]]
+        assert contents == ['第一条', '第二条']
+    finally:
+        release.set()
+        history.close()
+
+
+def test_write_behind_retries_without_dropping(tmp_path):
+    """写入持续失败时消息不丢弃、仍可读取，写线程不因非SQLite异常退出"""
+    from backend.utils.metrics import HISTORY_WRITE_FAILURES_TOTAL
+
+    history = ChatHistoryManager(str(tmp_path / "chat.db"), write_behind=True,
+                                 write_flush_interval=0)
+    history.writer.retry_backoff = 0.001
+    errors = [sqlite3.OperationalError("database is locked")] * 4 + [ValueError("boom")]
+    write_messages = history.write_messages
+
+    def flaky_write(messages):
+        if errors:
+            raise errors.pop(0)
+        write_messages(messages)
+
+    history.write_messages = flaky_write
+    failures = HISTORY_WRITE_FAILURES_TOTAL.value
+    try:
+        session_id = history.start_new_session("重试")
+        history.add_message('user', '不能丢')
+        assert [m.content for m in history.get_session_messages(session_id)] == ['不能丢']
+        assert history.flush(timeout=5)
+        assert HISTORY_WRITE_FAILURES_TOTAL.value - failures == 5
+        assert history.writer._thread.is_alive()
+        assert history.get_statistics()['total_messages'] == 1
+
+        # 写线程恢复后继续工作
+        history.add_message('assistant', '之后的消息')
+        assert history.flush(timeout=5)
+        assert history.get_statistics()['total_messages'] == 2
+    finally:
+        history.close()
+
+
+def test_migrates_legacy_database_and_uses_indexes(tmp_path):
+    """旧版本数据库升级到最新版本，按会话查询走索引"""
+    db_path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(db_path)
+    legacy.executescript("""
+        CREATE TABLE chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL,
+            content TEXT NOT NULL, timestamp TEXT NOT NULL, emotion TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE chat_sessions (
+            id TEXT PRIMARY KEY, title TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, message_count INTEGER DEFAULT 0);
+        INSERT INTO chat_messages (session_id, role, content, timestamp) VALUES ('s', 'user', '旧消息', '2024-01-01T00:00:00');
+    """)
+    legacy.close()
+
+    history = ChatHistoryManager(db_path)
+    try:
+        with history.db.read() as conn:
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == len(history._migrations())
+            plan = ' '.join(row[-1] for row in conn.execute(
+                'EXPLAIN QUERY PLAN SELECT id FROM chat_messages WHERE session_id = ? '
+                'ORDER BY timestamp DESC, id DESC LIMIT 10', ('s',)))
+            assert 'idx_chat_messages_session_time' in plan
+            assert 'TEMP B-TREE' not in plan
+        assert [m.content for m in history.get_session_messages('s')] == ['旧消息']
+        # 迁移时为已有消息建立全文索引
+        assert len(history.search_messages('旧消息')['results']) == 1
+    finally:
+        history.close()
+
+
+def test_keyset_pagination(tmp_path):
+    """最新一页按时间正序返回，游标向前翻页直到没有更多"""
+    history = ChatHistoryManager(str(tmp_path / "chat.db"))
+    try:
+        session_id = history.start_new_session()
+        for i in range(7):
+            history.add_message('user', f'消息{i}')
+
+        page = history.get_message_page(session_id, limit=3)
+        assert [m.content for m in page['messages']] == ['消息4', '消息5', '消息6']
+        page = history.get_message_page(session_id, limit=3, before=page['next_cursor'])
+        assert [m.content for m in page['messages']] == ['消息1', '消息2', '消息3']
+        page = history.get_message_page(session_id, limit=3, before=page['next_cursor'])
+        assert [m.content for m in page['messages']] == ['消息0']
+        assert page['next_cursor'] is None
+
+        assert decode_cursor(encode_cursor('2024-01-01T00:00:00', 42)) == ('2024-01-01T00:00:00', 42)
+        with pytest.raises(ValueError):
+            history.get_message_page(session_id, before='not-a-cursor')
+    finally:
+        history.close()
+
+
+def test_recent_context_served_from_memory(tmp_path):
+    """最近消息懒加载一次后随写入更新，不再访问数据库；超出会话上限按LRU淘汰"""
+    history = ChatHistoryManager(str(tmp_path / "chat.db"), write_behind=True,
+                                 write_flush_interval=60, recent_turns=4, recent_sessions=2)
+    try:
+        history.current_session_id = 'a'
+        history.add_message('user', '缓存前')
+        history.flush(timeout=5)
+
+        loads = []
+        loader = history.recent.loader
+        history.recent.loader = lambda session_id, limit: loads.append(session_id) or loader(session_id, limit)
+
+        assert history.get_recent_context(limit=3) == [{'role': 'user', 'content': '缓存前'}]
+        for i in range(5):
+            history.add_message('assistant' if i % 2 else 'user', f'第{i}条')
+        assert [m['content'] for m in history.get_recent_context(limit=3)] == ['第2条', '第3条', '第4条']
+        assert loads == ['a']
+        # 超过缓冲区容量时回退到数据库
+        assert len(history.get_recent_context(limit=10)) == 6
+
+        for session_id in ('b', 'c'):
+            history.current_session_id = session_id
+            history.get_recent_context(limit=2)
+        assert len(history.recent) == 2 and loads == ['a', 'b', 'c']
+
+        history.delete_session('c')
+        assert len(history.recent) == 1
+    finally:
+        history.close()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试聊天记录冷归档
+"""
+
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai import history_archive
+from backend.ai.chat_history import ShardedChatHistory
+from backend.ai.history_archive import decode_block, encode_block
+from backend.ai.history_export import export_chunks, import_stream, open_import_stream
+from backend.ai.history_retention import HistoryRetention
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # 小块便于覆盖跨块读取
+    monkeypatch.setattr(history_archive, 'BLOCK_MESSAGES', 4)
+    history = ShardedChatHistory(str(tmp_path / "chat.db"), shards=2)
+    yield history
+    history.close()
+
+
+def _age(store, session_id, days=10):
+    with store.shard_for(session_id).db.write() as conn:
+        conn.execute("UPDATE chat_sessions SET updated_at = datetime('now', ?) WHERE id = ?",
+                     (f'-{days} days', session_id))
+
+
+def _fill(store, user_id, count):
+    session_id = store.start_new_session(user_id=user_id)
+    for i in range(count):
+        store.add_message('user' if i % 2 == 0 else 'assistant', f'第{i}条消息',
+                          emotion='sad' if i == 1 else None, session_id=session_id)
+    store.flush()
+    return session_id
+
+
+def test_block_roundtrip():
+    """块编码为压缩的NDJSON，解码后与原记录一致"""
+    records = [{'id': i, 'role': 'user', 'content': '重复的内容' * 20, 'timestamp': f'2024-01-01T00:00:{i:02d}',
+                'emotion': None, 'tokens': 100} for i in range(50)]
+    data = encode_block(records)
+    assert len(data) < len(json.dumps(records, ensure_ascii=False).encode('utf-8')) // 10
+    assert decode_block(data) == records
+    with pytest.raises(ValueError):
+        decode_block(data, 'lz4')
+
+
+def test_archived_sessions_read_transparently(store):
+    """归档后分页读取结果不变，统计不变，在线库不再保存这些消息"""
+    old = _fill(store, 'alice', 10)
+    fresh = _fill(store, 'bob', 3)
+    before = [(m.id, m.content) for m in store.get_session_messages(old, limit=100)]
+    stats = store.get_statistics()
+    series = store.get_timeseries('day')
+    _age(store, old)
+
+    assert store.archive_sessions(7) == (1, 10)
+    shard = store.shard_for(old)
+    with shard.db.read() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM chat_messages WHERE session_id = ?', (old,)).fetchone()[0] == 0
+        assert conn.execute('SELECT blocks FROM archived_sessions WHERE session_id = ?', (old,)).fetchone()[0] == 3
+    assert os.path.exists(shard.archive.db_path)
+    assert store.get_statistics() == stats
+    assert store.get_timeseries('day') == series
+
+    assert [(m.id, m.content) for m in store.get_session_messages(old, limit=100)] == before
+    seen = []
+    cursor = None
+    while True:
+        page = store.get_message_page(old, limit=3, before=cursor)
+        seen = [(m.id, m.content) for m in page['messages']] + seen
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == before
+    assert store.get_recent_context(2, session_id=old) == [
+        {'role': 'user', 'content': '第8条消息'}, {'role': 'assistant', 'content': '第9条消息'}]
+    assert [m.content for m in store.get_session_messages(fresh)] == ['第0条消息', '第1条消息', '第2条消息']
+
+
+def test_paging_decompresses_only_needed_blocks(store):
+    """翻页只解压游标之前、凑满一页所需的块，从最新的块开始"""
+    old = _fill(store, 'alice', 20)
+    _age(store, old)
+    store.archive_sessions(7)
+    archive = store.shard_for(old).archive
+    archive.cache_blocks = 0
+    decoded = []
+    read_block = archive.read_block
+
+    def tracking_read_block(session_id, seq):
+        decoded.append(seq)
+        return read_block(session_id, seq)
+
+    archive.read_block = tracking_read_block
+    page = store.get_message_page(old, limit=3)
+    assert [m.content for m in page['messages']] == ['第17条消息', '第18条消息', '第19条消息']
+    assert decoded == [4]
+
+    decoded.clear()
+    page = store.get_message_page(old, limit=3, before=page['next_cursor'])
+    assert [m.content for m in page['messages']] == ['第14条消息', '第15条消息', '第16条消息']
+    assert decoded == [4, 3]
+
+    decoded.clear()
+    page = store.get_message_page(old, limit=2, before=page['next_cursor'])
+    assert [m.content for m in page['messages']] == ['第12条消息', '第13条消息']
+    assert decoded == [3]
+
+
+def test_new_messages_after_archiving_and_delete(store):
+    """归档会话的新消息留在在线库并与归档合并；删除会话时统计按归档分桶回减"""
+    old = _fill(store, 'alice', 5)
+    fresh = _fill(store, 'bob', 2)
+    _age(store, old)
+    store.archive_sessions(7)
+
+    store.add_message('user', '我又回来了', session_id=old)
+    store.flush()
+    assert [m.content for m in store.get_session_messages(old, limit=3)] == ['第3条消息', '第4条消息', '我又回来了']
+    assert store.get_statistics()['total_messages'] == 8
+
+    _age(store, old)
+    assert store.archive_sessions(7) == (1, 1)
+    assert len(store.get_session_messages(old, limit=100)) == 6
+
+    store.delete_session(old)
+    assert store.get_statistics()['total_messages'] == 2
+    series = store.get_timeseries('day')
+    assert series[0]['messages'] == 2 and series[0]['by_emotion'] == {'none': 1, 'sad': 1}
+    assert store.shard_for(fresh).get_session_messages(old) == []
+    with store.shards[store.shard_index('alice')].archive.db.read() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM archive_blocks').fetchone()[0] == 0
+
+
+def test_export_includes_archived_messages(store, tmp_path):
+    """导出包含归档消息，导入到新存储后内容一致"""
+    old = _fill(store, 'alice', 6)
+    _fill(store, 'bob', 2)
+    _age(store, old)
+    store.archive_sessions(7)
+
+    data = b''.join(export_chunks(store, 'ndjson'))
+    target = ShardedChatHistory(str(tmp_path / "copy" / "chat.db"))
+    try:
+        assert import_stream(target, open_import_stream(io.BytesIO(data))) == {'sessions': 2, 'messages': 8}
+        assert [m.content for m in target.get_session_messages(old)] == \
+               [m.content for m in store.get_session_messages(old)]
+    finally:
+        target.close()
+
+    single = b''.join(export_chunks(store, 'csv', session_id=old)).decode('utf-8')
+    assert single.count('条消息') == 6
+
+
+def test_retention_archives_before_expiry(store):
+    """清理任务删除过期会话，并归档超过归档期限的会话"""
+    expired = _fill(store, 'old', 2)
+    stale = _fill(store, 'stale', 3)
+    _fill(store, 'active', 1)
+    _age(store, expired, days=40)
+    _age(store, stale, days=10)
+
+    result = HistoryRetention(store, days=30, archive_days=7).run_once()
+    assert result['sessions_deleted'] == 1
+    assert result['sessions_archived'] == 1 and result['messages_archived'] == 3
+    assert [m.content for m in store.get_session_messages(stale)] == ['第0条消息', '第1条消息', '第2条消息']
+    assert store.get_statistics()['total_messages'] == 4
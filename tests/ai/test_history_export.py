@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试聊天记录流式导出与批量导入
+"""
+
+import asyncio
+import csv
+import functools
+import gzip
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai.chat_history import ShardedChatHistory
+from backend.ai.history_export import export_chunks, import_stream, open_import_stream
+
+
+def _fill(store, sessions=5, messages=7):
+    ids = []
+    for i in range(sessions):
+        session_id = store.start_new_session(f"会话{i}", user_id=f'user{i % 2}')
+        for j in range(messages):
+            store.add_message('user' if j % 2 == 0 else 'assistant', f'会话{i}第{j}条,含"引号"\n换行',
+                              emotion='happy' if j == 3 else None, session_id=session_id)
+        ids.append(session_id)
+    store.flush()
+    return ids
+
+
+def test_ndjson_gzip_roundtrip_between_shard_layouts(tmp_path):
+    """NDJSON+gzip 分批导出后导入到不同分片数的存储，会话、用户与消息完整还原"""
+    source = ShardedChatHistory(str(tmp_path / "a" / "chat.db"), shards=3)
+    target = ShardedChatHistory(str(tmp_path / "b" / "chat.db"), shards=2)
+    try:
+        ids = _fill(source)
+        data = b''.join(export_chunks(source, 'ndjson', compress=True, batch_size=4))
+        assert data[:2] == b'\x1f\x8b'
+        records = [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines()]
+        assert [r['type'] for r in records[:5]] == ['session'] * 5 and len(records) == 40
+
+        result = import_stream(target, open_import_stream(io.BytesIO(data)), batch_size=8)
+        assert result == {'sessions': 5, 'messages': 35}
+        assert {s['id'] for s in target.get_all_sessions('user1')} == {ids[1], ids[3]}
+        restored = target.get_session_messages(ids[2])
+        original = source.get_session_messages(ids[2])
+        assert [(m.role, m.content, m.timestamp, m.emotion) for m in restored] == \
+               [(m.role, m.content, m.timestamp, m.emotion) for m in original]
+        assert target.get_all_sessions('user0')[0]['message_count'] == 7
+    finally:
+        source.close()
+        target.close()
+
+
+def test_csv_export_of_single_session_and_import(tmp_path):
+    """单会话CSV导出按时间顺序，CSV导入时补建会话"""
+    source = ShardedChatHistory(str(tmp_path / "a" / "chat.db"))
+    target = ShardedChatHistory(str(tmp_path / "b" / "chat.db"))
+    try:
+        ids = _fill(source, sessions=2, messages=3)
+        text = b''.join(export_chunks(source, 'csv', session_id=ids[0], batch_size=2)).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(text)))
+        assert [row['content'] for row in rows] == [f'会话0第{j}条,含"引号"\n换行' for j in range(3)]
+
+        result = import_stream(target, open_import_stream(io.BytesIO(text.encode('utf-8'))), 'csv')
+        assert result == {'sessions': 1, 'messages': 3}
+        assert [m.content for m in target.get_session_messages(ids[0])] == [row['content'] for row in rows]
+        assert target.get_session_messages(ids[0])[0].emotion is None
+    finally:
+        source.close()
+        target.close()
+
+
+def test_import_rejects_invalid_records(tmp_path):
+    """无效记录报错，此前已提交的批次保留"""
+    store = ShardedChatHistory(str(tmp_path / "chat.db"))
+    try:
+        lines = [json.dumps({'type': 'message', 'session_id': 's', 'role': 'user',
+                             'content': f'{i}', 'timestamp': '2024-01-01T00:00:00'}) for i in range(3)]
+        data = ('\n'.join(lines) + '\nnot json\n').encode('utf-8')
+        with pytest.raises(ValueError):
+            import_stream(store, open_import_stream(io.BytesIO(data)), batch_size=2)
+        assert store.get_statistics()['total_messages'] == 2
+    finally:
+        store.close()
+
+
+def test_reimport_skips_existing_messages(tmp_path):
+    """中断后重试或导入到已有数据的库时跳过已存在的消息（包括已归档的），计数不重复"""
+    store = ShardedChatHistory(str(tmp_path / "chat.db"))
+    try:
+        lines = [json.dumps({'type': 'message', 'session_id': 's', 'role': 'user',
+                             'content': f'{i}', 'timestamp': f'2024-01-01T00:00:0{i}'}) for i in range(3)]
+        data = ('\n'.join(lines) + '\nnot json\n').encode('utf-8')
+        with pytest.raises(ValueError):
+            import_stream(store, open_import_stream(io.BytesIO(data)), batch_size=2)
+        # 修正后重新导入整个文件
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        assert import_stream(store, open_import_stream(io.BytesIO(data)), batch_size=2) == \
+            {'sessions': 0, 'messages': 1}
+        assert store.get_statistics()['total_messages'] == 3
+        assert store.get_all_sessions()[0]['message_count'] == 3
+
+        shard = store.shard_for('s')
+        with shard.db.write() as conn:
+            conn.execute("UPDATE chat_sessions SET updated_at = datetime('now', '-10 days')")
+        assert shard.archive_sessions(days=1) == (1, 3)
+        backup = b''.join(export_chunks(store, 'ndjson'))
+        assert import_stream(store, open_import_stream(io.BytesIO(backup))) == {'sessions': 0, 'messages': 0}
+        assert [m.content for m in store.get_session_messages('s')] == ['0', '1', '2']
+        assert store.get_statistics()['total_messages'] == 3
+    finally:
+        store.close()
+
+
+def test_import_advances_session_updated_at(tmp_path):
+    """导入消息把会话的 updated_at 推进到最新消息的时间，导入更早的消息不会回退"""
+    store = ShardedChatHistory(str(tmp_path / "chat.db"))
+    try:
+        session_id = store.start_new_session('旧会话')
+        shard = store.shard_for(session_id)
+        with shard.db.write() as conn:
+            conn.execute("UPDATE chat_sessions SET updated_at = '2020-01-01 00:00:00'")
+
+        def updated_at():
+            with shard.db.read() as conn:
+                return conn.execute('SELECT updated_at FROM chat_sessions').fetchone()[0]
+
+        recent = datetime.now().replace(microsecond=0)
+        store.import_records([], [{'session_id': session_id, 'role': 'user', 'content': '新导入',
+                                   'timestamp': recent.isoformat()}])
+        expected = recent.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        assert updated_at() == expected
+        # 刚导入的会话不会被保留期清理删除
+        assert store.clear_old_sessions(days=1) == 0
+
+        store.import_records([], [{'session_id': session_id, 'role': 'user', 'content': '更早的',
+                                   'timestamp': '2019-06-01T00:00:00'}])
+        assert updated_at() == expected
+    finally:
+        store.close()
+
+
+def test_export_includes_messages_queued_for_write_behind(tmp_path):
+    """导出前等待后写队列落盘，刚写入的消息也会导出"""
+    store = ShardedChatHistory(str(tmp_path / "chat.db"), write_behind=True,
+                               write_batch_size=1000, write_flush_interval=30)
+    try:
+        session_id = store.start_new_session('会话')
+        store.add_message('user', '还在队列里', session_id=session_id)
+        records = [json.loads(line) for line in
+                   b''.join(export_chunks(store, 'ndjson')).decode('utf-8').splitlines()]
+        assert [r['content'] for r in records if r['type'] == 'message'] == ['还在队列里']
+    finally:
+        store.close()
+
+
+def test_export_and_import_endpoints(tmp_path, monkeypatch):
+    """导出端点分块返回gzip数据，导入端点边接收边写入"""
+    from backend.core import server
+    from backend.core.server import AIVTuberServer
+
+    source = ShardedChatHistory(str(tmp_path / "a" / "chat.db"), shards=2)
+    target = ShardedChatHistory(str(tmp_path / "b" / "chat.db"))
+    _fill(source, sessions=3, messages=4)
+
+    async def run():
+        stub = SimpleNamespace()
+        app = web.Application()
+        app.router.add_get('/api/history/export', functools.partial(AIVTuberServer.export_history, stub))
+        app.router.add_post('/api/history/import', functools.partial(AIVTuberServer.import_history, stub))
+        async with TestClient(TestServer(app)) as client:
+            monkeypatch.setattr(server, 'chat_history', source)
+            resp = await client.get('/api/history/export', params={'compress': 'gzip'})
+            assert resp.status == 200
+            assert resp.headers['Content-Disposition'].endswith('.ndjson.gz"')
+            data = await resp.read()
+
+            resp = await client.get('/api/history/export', params={'format': 'xml'})
+            assert resp.status == 400
+
+            monkeypatch.setattr(server, 'chat_history', target)
+            resp = await client.post('/api/history/import', data=data)
+            assert resp.status == 200
+            assert await resp.json() == {'sessions': 3, 'messages': 12}
+
+            resp = await client.post('/api/history/import', data=b'{"type": "bogus"}\n')
+            assert resp.status == 400
+
+    try:
+        asyncio.run(run())
+        assert target.get_statistics()['total_messages'] == 12
+    finally:
+        source.close()
+        target.close()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试聊天记录保留策略与增量VACUUM
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai.chat_history import ChatHistoryManager
+from backend.ai.history_retention import HistoryRetention
+
+
+def _fill(history, title, count, age_days=None):
+    """创建会话并写入消息，可把最后更新时间改到若干天前"""
+    session_id = f"session_{title}"
+    with history.db.write() as conn:
+        conn.execute('INSERT INTO chat_sessions (id, title) VALUES (?, ?)', (session_id, title))
+    history.current_session_id = session_id
+    for i in range(count):
+        history.add_message('user', f'{title}-{i}-' + 'x' * 2000)
+    if age_days is not None:
+        with history.db.write() as conn:
+            conn.execute("UPDATE chat_sessions SET updated_at = datetime('now', ?) WHERE id = ?",
+                         (f'-{age_days} days', session_id))
+    return session_id
+
+
+def test_retention_deletes_expired_sessions_and_frees_pages(tmp_path):
+    """过期会话分批删除，空闲页通过增量VACUUM归还"""
+    history = ChatHistoryManager(str(tmp_path / "chat.db"))
+    try:
+        with history.db.read() as conn:
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2  # INCREMENTAL
+        old_a = _fill(history, 'a', 50, age_days=40)
+        old_b = _fill(history, 'b', 50, age_days=31)
+        kept = _fill(history, 'c', 10)
+
+        retention = HistoryRetention(history, days=30, batch_size=1)
+        result = retention.run_once()
+
+        assert result['sessions_deleted'] == 2
+        assert result['messages_deleted'] == 100
+        assert result['pages_freed'] > 0
+        assert [s['id'] for s in history.get_all_sessions()] == [kept]
+        assert history.get_session_messages(old_a) == [] and history.get_session_messages(old_b) == []
+        assert len(history.get_session_messages(kept)) == 10
+        with history.db.read() as conn:
+            assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+        assert retention.get_stats()['last_run'] == result
+
+        # 没有过期会话时不做任何删除
+        assert retention.run_once()['sessions_deleted'] == 0
+    finally:
+        history.close()
+
+
+def test_existing_database_is_converted_to_incremental(tmp_path):
+    """已有的非增量数据库只在显式开启时转换"""
+    db_path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(db_path)
+    legacy.execute('CREATE TABLE placeholder (x INTEGER)')
+    legacy.close()
+
+    history = ChatHistoryManager(db_path)
+    try:
+        # 默认不在定期清理中做完整VACUUM，只跳过空间归还
+        retention = HistoryRetention(history, days=30)
+        assert retention.run_once()['pages_freed'] == 0
+        with history.db.write() as conn:
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 0
+
+        retention = HistoryRetention(history, days=30, convert_vacuum=True)
+        retention.run_once()
+        assert retention.ensure_incremental_vacuum() is False
+        with history.db.read() as conn:
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        history.close()
+
+    legacy = sqlite3.connect(str(tmp_path / "legacy2.db"))
+    legacy.execute('CREATE TABLE placeholder (x INTEGER)')
+    legacy.close()
+    history = ChatHistoryManager(str(tmp_path / "legacy2.db"))
+    try:
+        retention = HistoryRetention(history, days=30)
+        assert retention.ensure_incremental_vacuum() is True
+        assert retention.ensure_incremental_vacuum() is False
+        with history.db.read() as conn:
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        history.close()
+
+
+def test_clear_old_sessions_uses_batched_delete(tmp_path):
+    """clear_old_sessions 返回删除数量并重置当前会话"""
+    history = ChatHistoryManager(str(tmp_path / "chat.db"))
+    try:
+        _fill(history, 'old', 3, age_days=10)
+        assert history.clear_old_sessions(days=7, batch_size=1) == 1
+        assert history.current_session_id is None
+        assert history.get_statistics()['total_messages'] == 0
+    finally:
+        history.close()
+
+
+def test_scheduler_survives_non_sqlite_errors(tmp_path):
+    """归档等步骤抛出非SQLite异常时，定期任务继续运行"""
+    history = ChatHistoryManager(str(tmp_path / "chat.db"))
+    retention = HistoryRetention(history, interval=0.01, initial_delay=0)
+    runs = []
+
+    def run_once():
+        runs.append(len(runs))
+        if len(runs) == 1:
+            raise OSError("archive disk full")
+        return {}
+
+    retention.run_once = run_once
+
+    async def run():
+        await retention.start()
+        for _ in range(200):
+            if len(runs) >= 3:
+                break
+            await asyncio.sleep(0.01)
+        assert not retention._task.done()
+        await retention.stop()
+
+    try:
+        asyncio.run(run())
+        assert len(runs) >= 3
+    finally:
+        history.close()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试聊天记录统计汇总表
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai.chat_history import ChatHistoryManager, ShardedChatHistory
+from backend.ai.history_rollups import estimate_tokens
+
+
+def test_estimate_tokens():
+    """中文按字计数，其他文字按约4个字符1个token"""
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('你好') == 2
+    assert estimate_tokens('hello world') == 4
+    assert estimate_tokens('我喜欢Python') == 5
+
+
+def test_rollups_follow_inserts_and_deletes(tmp_path):
+    """写入与删除在同一事务中更新总量和时间桶"""
+    store = ShardedChatHistory(str(tmp_path / "chat.db"), shards=2)
+    try:
+        first = store.start_new_session(user_id='a')
+        second = store.start_new_session(user_id='b')
+        store.add_message('user', '今天很开心', session_id=first)
+        store.add_message('assistant', '真好', emotion='happy', session_id=first)
+        store.add_message('user', '有点累', session_id=second)
+        store.flush()
+
+        assert store.get_statistics() == {
+            'total_messages': 3, 'total_sessions': 2, 'recent_messages': 3, 'shards': 2
+        }
+        today = datetime.now().strftime('%Y-%m-%d')
+        series = store.get_timeseries('day')
+        assert [item['bucket'] for item in series] == [today]
+        assert series[0]['messages'] == 3 and series[0]['sessions'] == 2
+        assert series[0]['tokens'] == 5 + 2 + 3
+        assert series[0]['by_role'] == {'user': 2, 'assistant': 1}
+        assert series[0]['by_emotion'] == {'none': 2, 'happy': 1}
+        hourly = store.get_timeseries('hour', since=today, until=today)
+        assert sum(item['messages'] for item in hourly) == 3
+
+        store.delete_session(first)
+        assert store.get_statistics()['total_messages'] == 1
+        assert store.get_statistics()['total_sessions'] == 1
+        series = store.get_timeseries('day')
+        assert series[0]['messages'] == 1 and series[0]['by_role'] == {'user': 1}
+    finally:
+        store.close()
+
+
+def test_existing_rows_are_backfilled(tmp_path):
+    """升级前已有的消息在迁移时回填到汇总表"""
+    db_path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(db_path)
+    legacy.executescript("""
+        CREATE TABLE chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL,
+            content TEXT NOT NULL, timestamp TEXT NOT NULL, emotion TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE chat_sessions (
+            id TEXT PRIMARY KEY, title TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, message_count INTEGER DEFAULT 0);
+        INSERT INTO chat_sessions (id, title) VALUES ('s', '旧会话');
+        INSERT INTO chat_messages (session_id, role, content, timestamp, emotion) VALUES
+            ('s', 'user', '你好', '2024-01-01T08:15:00', NULL),
+            ('s', 'assistant', '你好呀', '2024-01-01T09:30:00', 'happy'),
+            ('s', 'user', '再见', '2024-01-02T10:00:00', NULL);
+    """)
+    legacy.close()
+
+    history = ChatHistoryManager(db_path)
+    try:
+        assert history.get_statistics()['total_messages'] == 3
+        days = history.get_timeseries('day', since='2024-01-01', until='2024-01-02')
+        assert {key: item['messages'] for key, item in days.items()} == {'2024-01-01': 2, '2024-01-02': 1}
+        assert days['2024-01-01']['tokens'] == 5
+        hours = history.get_timeseries('hour', since='2024-01-01', until='2024-01-01')
+        assert sorted(hours) == ['2024-01-01T08', '2024-01-01T09']
+    finally:
+        history.close()
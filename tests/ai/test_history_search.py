@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试聊天记录全文检索
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai.chat_history import ChatHistoryManager
+
+
+def _session(history, session_id):
+    """直接插入会话并设为当前会话（start_new_session 的ID按秒生成，测试中会重复）"""
+    with history.db.write() as conn:
+        conn.execute('INSERT INTO chat_sessions (id, title) VALUES (?, ?)', (session_id, session_id))
+    history.current_session_id = session_id
+    return session_id
+
+
+@pytest.fixture
+def history(tmp_path):
+    manager = ChatHistoryManager(str(tmp_path / "chat.db"))
+    yield manager
+    manager.close()
+
+
+def test_trigram_search_highlights_chinese(history):
+    """中文关键词命中并以<mark>高亮，消息内容被HTML转义"""
+    session_id = history.start_new_session("检索")
+    history.add_message('user', '今天想去看樱花<script>')
+    history.add_message('assistant', '好呀，一起去公园吧')
+
+    page = history.search_messages('去看樱花')
+    assert page['mode'] == 'fts'
+    assert len(page['results']) == 1
+    result = page['results'][0]
+    assert result['session_id'] == session_id and result['role'] == 'user'
+    assert '<mark>去看樱花</mark>' in result['snippet']
+    assert '&lt;script&gt;' in result['snippet'] and '<script>' not in result['snippet']
+    assert page['next_cursor'] is None
+
+
+def test_index_follows_deletes(history):
+    """删除会话后其消息不再被检索到"""
+    session_id = history.start_new_session()
+    history.add_message('user', '需要删除的星空记录')
+    assert len(history.search_messages('星空记录')['results']) == 1
+
+    history.delete_session(session_id)
+    assert history.search_messages('星空记录')['results'] == []
+
+
+def test_cursor_pagination_and_session_filter(history):
+    """游标翻页不重复不遗漏，可按会话过滤"""
+    first = _session(history, 'first')
+    for i in range(5):
+        history.add_message('user', f'第{i}条 关于猫咪的消息')
+    _session(history, 'second')
+    history.add_message('user', '另一个会话的猫咪的消息')
+
+    seen = []
+    cursor = None
+    while True:
+        page = history.search_messages('猫咪的', limit=2, cursor=cursor)
+        seen.extend(result['id'] for result in page['results'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 6
+
+    filtered = history.search_messages('猫咪的', session_id=first)
+    assert {result['session_id'] for result in filtered['results']} == {first}
+    assert len(filtered['results']) == 5
+
+    with pytest.raises(ValueError):
+        history.search_messages('猫咪的', cursor='not-a-cursor')
+
+
+def test_short_query_falls_back_to_like(history):
+    """少于3个字符的关键词退化为LIKE，通配符按字面匹配"""
+    history.start_new_session()
+    history.add_message('user', '我喜欢猫')
+    history.add_message('user', '折扣100%')
+    history.add_message('user', '折扣1000')
+
+    page = history.search_messages('猫')
+    assert page['mode'] == 'like'
+    assert [result['snippet'] for result in page['results']] == ['我喜欢<mark>猫</mark>']
+
+    page = history.search_messages('0%')
+    assert [result['snippet'] for result in page['results']] == ['折扣10<mark>0%</mark>']
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试聊天记录分片存储与会话目录
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai.chat_history import ChatHistoryManager, ShardedChatHistory, shard_paths
+from backend.ai.history_retention import HistoryRetention
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = ShardedChatHistory(str(tmp_path / "chat.db"), shards=4)
+    yield history
+    history.close()
+
+
+def test_user_sessions_share_a_shard_and_are_isolated(store):
+    """同一用户的会话落在同一分片，不同会话的上下文互不影响"""
+    first = store.start_new_session(user_id='alice')
+    second = store.start_new_session(user_id='alice')
+    other = store.start_new_session(user_id='bob')
+    assert store.shard_for(first) is store.shard_for(second)
+
+    store.add_message('user', '我是alice', session_id=first)
+    store.add_message('user', '我是bob', session_id=other)
+    assert store.get_recent_context(session_id=first) == [{'role': 'user', 'content': '我是alice'}]
+    assert store.get_recent_context(session_id=other) == [{'role': 'user', 'content': '我是bob'}]
+    assert store.get_recent_context(session_id=second) == []
+
+
+def test_directory_lists_across_shards(store):
+    """通过目录跨分片列出会话，可按用户过滤，删除后目录同步"""
+    sessions = [store.start_new_session(f"会话{i}", user_id=f'user{i}') for i in range(12)]
+    assert len({store.shard_index(f'user{i}') for i in range(12)}) > 1
+    for session_id in sessions:
+        store.add_message('user', '你好呀朋友', session_id=session_id)
+    store.flush()
+
+    listed = store.get_all_sessions()
+    assert {session['id'] for session in listed} == set(sessions)
+    assert all(session['message_count'] == 1 for session in listed)
+    assert [session['id'] for session in store.get_all_sessions('user3')] == [sessions[3]]
+    assert store.get_statistics()['total_messages'] == 12
+
+    store.delete_session(sessions[3])
+    assert store.get_all_sessions('user3') == []
+    assert len(store.get_all_sessions()) == 11
+
+
+def test_search_pages_across_shards(store):
+    """跨分片检索翻页不重复不遗漏，可限定单个会话"""
+    sessions = [store.start_new_session(user_id=f'user{i}') for i in range(6)]
+    for session_id in sessions:
+        for i in range(3):
+            store.add_message('user', f'第{i}次聊到月亮的故事', session_id=session_id)
+    store.flush()
+
+    seen = []
+    cursor = None
+    while True:
+        page = store.search_messages('月亮的', limit=4, cursor=cursor)
+        seen.extend((result['session_id'], result['id']) for result in page['results'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 18
+
+    only = store.search_messages('月亮的', session_id=sessions[2])
+    assert {result['session_id'] for result in only['results']} == {sessions[2]}
+
+    with pytest.raises(ValueError):
+        store.search_messages('月亮的', cursor='bad')
+
+
+def test_like_search_merges_by_id_not_timestamp(store):
+    """LIKE模式按各分片的ID降序归并：导入的旧时间戳消息ID更新，排在前面；翻页不重复不遗漏"""
+    alice = store.start_new_session(user_id='alice')
+    bob = store.start_new_session(user_id='bob')
+    assert store.shard_for(alice) is not store.shard_for(bob)
+    for session_id in (alice, bob):
+        for i in range(3):
+            store.add_message('user', f'月亮{i}', session_id=session_id)
+    store.flush()
+    store.import_records([], [{'session_id': alice, 'role': 'user', 'content': f'旧的月亮{i}',
+                               'timestamp': f'2020-01-0{i + 1}T00:00:00'} for i in range(2)])
+
+    page = store.search_messages('月亮', limit=20)
+    assert page['mode'] == 'like'
+    ids = [result['id'] for result in page['results']]
+    assert ids == sorted(ids, reverse=True)
+    assert [result['session_id'] for result in page['results'][:2]] == [alice, alice]
+    assert all('旧的' in result['snippet'] for result in page['results'][:2])
+
+    seen = []
+    cursor = None
+    while True:
+        page = store.search_messages('月亮', limit=2, cursor=cursor)
+        seen.extend((result['session_id'], result['id']) for result in page['results'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 8
+
+
+def test_existing_database_becomes_shard_zero(tmp_path):
+    """已有的单库数据成为0号分片并登记到目录，增加分片后仍可访问"""
+    db_path = str(tmp_path / "chat.db")
+    legacy = ChatHistoryManager(db_path)
+    session_id = legacy.start_new_session("旧会话")
+    legacy.add_message('user', '旧消息')
+    legacy.close()
+
+    store = ShardedChatHistory(db_path, shards=3)
+    try:
+        assert shard_paths(db_path, 3)[0] == db_path
+        assert store.shard_for(session_id) is store.shards[0]
+        assert [m.content for m in store.get_session_messages(session_id)] == ['旧消息']
+        assert store.get_all_sessions()[0]['title'] == '旧会话'
+    finally:
+        store.close()
+
+
+def test_retention_cleans_every_shard_and_directory(store):
+    """保留策略逐个分片删除过期会话，并同步删除目录记录"""
+    expired = [store.start_new_session(user_id=f'old{i}') for i in range(8)]
+    kept = store.start_new_session(user_id='new')
+    for session_id in expired:
+        shard = store.shard_for(session_id)
+        with shard.db.write() as conn:
+            conn.execute("UPDATE chat_sessions SET updated_at = datetime('now', '-40 days') WHERE id = ?",
+                         (session_id,))
+
+    result = HistoryRetention(store, days=30).run_once()
+    assert result['sessions_deleted'] == 8
+    assert [session['id'] for session in store.get_all_sessions()] == [kept]
+
+
+def test_connection_can_only_resume_own_existing_session(store, monkeypatch):
+    """session 消息只能恢复目录中属于同一用户的会话，不存在或他人的会话不绑定"""
+    import asyncio
+    from types import SimpleNamespace
+
+    from backend.core import server as server_module
+    from backend.core.server import AIVTuberServer
+
+    monkeypatch.setattr(server_module, 'chat_history', store)
+    mine = store.start_new_session(user_id='alice')
+    theirs = store.start_new_session(user_id='bob')
+    sent = []
+
+    async def safe_send_json(ws, data):
+        sent.append(data)
+
+    ws = object()
+    server = SimpleNamespace(ws_sessions={id(ws): {'user_id': 'alice', 'session_id': None}},
+                             safe_send_json=safe_send_json, _check_session=AIVTuberServer._check_session)
+
+    async def run():
+        for session_id in (theirs, 'made_up', mine):
+            await AIVTuberServer.handle_websocket_message(server, ws, {'type': 'session', 'session_id': session_id})
+
+    asyncio.run(run())
+    assert '不属于' in sent[0]['error'] and '不存在' in sent[1]['error']
+    assert sent[2] == {'type': 'session', 'session_id': mine}
+    assert server.ws_sessions[id(ws)]['session_id'] == mine
+    assert store.find_session('made_up') is None
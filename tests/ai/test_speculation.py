@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试基于ASR中间结果的LLM预测执行
+"""
+
+import asyncio
+import base64
+import os
+import sys
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.ai.speculation import SpeculativeReply, normalize_transcript
+from backend.utils.metrics import LLM_SPECULATION_SAVED_SECONDS, LLM_SPECULATION_TOTAL
+
+
+def _count(outcome):
+    return LLM_SPECULATION_TOTAL.labels(outcome).value
+
+
+class FakeLLM:
+    """记录请求并按固定耗时返回的LLM桩"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.requests = []
+        self.cancelled = []
+
+    async def generate(self, text):
+        self.requests.append(text)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(text)
+            raise
+        return f'回复:{text}'
+
+
+def test_normalize_ignores_spacing_and_punctuation():
+    """比较时忽略空白与句末标点"""
+    assert normalize_transcript('我有点 紧张。') == normalize_transcript('我有点紧张')
+    assert normalize_transcript(None) == ''
+
+
+def test_hit_reuses_speculative_reply():
+    """中间结果稳定后提前请求，最终结果一致时直接采用并记录节省的时间"""
+    llm = FakeLLM()
+    hits, saved = _count('hit'), LLM_SPECULATION_SAVED_SECONDS.count
+
+    async def run():
+        speculation = SpeculativeReply(llm.generate, stable_ms=10)
+        speculation.update('我有点')
+        speculation.update('我有点紧张')
+        await asyncio.sleep(0.03)
+        reply = speculation.resolve('我有点紧张。')
+        return await reply
+
+    assert asyncio.run(run()) == '回复:我有点紧张'
+    assert llm.requests == ['我有点紧张']
+    assert _count('hit') == hits + 1
+    assert LLM_SPECULATION_SAVED_SECONDS.count == saved + 1
+
+
+def test_changed_partial_discards_and_final_mismatch_misses():
+    """中间结果变化时作废进行中的预测；最终结果不同则取消预测由调用方重新请求"""
+    llm = FakeLLM(delay=1.0)
+    discarded, misses = _count('discarded'), _count('miss')
+
+    async def run():
+        speculation = SpeculativeReply(llm.generate, stable_ms=10)
+        speculation.update('今天天气')
+        await asyncio.sleep(0.03)
+        speculation.update('今天天气不错')
+        await asyncio.sleep(0.03)
+        result = speculation.resolve('今天天气不错吧')
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) is None
+    assert llm.requests == ['今天天气', '今天天气不错']
+    assert llm.cancelled == ['今天天气', '今天天气不错']
+    assert _count('discarded') == discarded + 1
+    assert _count('miss') == misses + 1
+
+
+def test_short_or_unstable_partials_do_not_speculate():
+    """字数不足或尚未稳定时不发起请求"""
+    llm = FakeLLM()
+
+    async def run():
+        speculation = SpeculativeReply(llm.generate, stable_ms=50, min_chars=3)
+        speculation.update('你好')
+        await asyncio.sleep(0.08)
+        speculation.update('你好啊')
+        return speculation.resolve('你好啊')
+
+    assert asyncio.run(run()) is None
+    assert llm.requests == []
+
+
+def test_server_stream_uses_speculation():
+    """流式识别启用预测时，最终结果与稳定的中间结果一致则不再重复请求LLM"""
+    from backend.core.server import AIVTuberServer
+    from backend.voice.asr_manager import ASRManager
+
+    llm = FakeLLM(delay=0.02)
+    chats = []
+
+    async def safe_send_json(ws, data):
+        pass
+
+    async def handle_chat_message(ws, text, reply=None):
+        chats.append((text, await reply if reply is not None else None))
+
+    async def generate_reply(ws, text):
+        return await llm.generate(text)
+
+    manager = ASRManager({'asr': {'enabled': True, 'provider': 'stub',
+                                  'stub': {'transcript': '我有点紧张', 'bytes_per_char': 2},
+                                  'speculative': {'enabled': True, 'stable_ms': 10}}})
+    server = SimpleNamespace(asr_manager=manager, asr_streams={}, asr_vads={}, asr_speculations={},
+                             safe_send_json=safe_send_json, handle_chat_message=handle_chat_message,
+                             _generate_reply=generate_reply)
+    for name in ('_deliver_asr_result', '_open_audio_stream', '_finish_audio_stream', '_close_audio_stream'):
+        setattr(server, name, getattr(AIVTuberServer, name).__get__(server))
+    ws = object()
+    chunk = base64.b64encode(b'\x00' * 10).decode('ascii')
+
+    async def run():
+        await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_start', {})
+        await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_chunk', {'audio_data': chunk})
+        await asyncio.sleep(0.05)
+        await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_end', {})
+
+    asyncio.run(run())
+    assert chats == [('我有点紧张', '回复:我有点紧张')]
+    assert llm.requests == ['我有点紧张']
+    assert server.asr_speculations == {}
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分块音频缓冲区
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.utils.audio_buffer import AudioBuffer
+
+
+def test_appends_across_chunks_match_concatenation():
+    """跨块追加后取出的内容与逐段拼接一致"""
+    buffer = AudioBuffer(chunk_samples=8, max_samples=1000)
+    pieces = [np.arange(start, start + size, dtype=np.float32)
+              for start, size in ((0, 3), (3, 8), (11, 1), (12, 20))]
+    for piece in pieces:
+        buffer.append(piece)
+    assert len(buffer) == 32
+    assert np.array_equal(buffer.take(), np.concatenate(pieces))
+    assert len(buffer) == 0 and buffer.take().size == 0
+
+
+def test_pcm16_is_written_without_scaling():
+    """PCM16 按采样值写入，与 frombuffer(int16).astype(float32) 一致"""
+    samples = np.array([0, 1, -1, 32767, -32768], dtype='<i2')
+    buffer = AudioBuffer(chunk_samples=4)
+    buffer.append_pcm16(samples.tobytes() + b'\x01')
+    assert np.array_equal(buffer.take(), samples.astype(np.float32))
+
+
+def test_single_chunk_take_is_a_view_that_is_not_reused():
+    """单块时 take() 返回视图，之后的写入不会覆盖它"""
+    buffer = AudioBuffer(chunk_samples=16)
+    buffer.append([1, 2, 3])
+    first = buffer.take()
+    assert first.base is not None
+    buffer.append([9, 9, 9])
+    assert first.tolist() == [1, 2, 3]
+
+
+def test_hard_cap_keeps_most_recent_samples():
+    """超过上限时丢弃最早的采样，已分配内存有界"""
+    buffer = AudioBuffer(chunk_samples=10, max_samples=25)
+    for start in range(0, 100, 7):
+        buffer.append(np.arange(start, start + 7))
+    assert len(buffer) == 25
+    assert buffer.dropped == 105 - 25
+    assert buffer.view().tolist() == list(range(80, 105))
+    assert buffer.nbytes <= (25 // 10 + 2 + 2) * 10 * 4
+
+    buffer.append(np.arange(100))
+    assert buffer.view().tolist() == list(range(75, 100))
+
+    buffer.clear()
+    assert len(buffer) == 0
+
+
+def test_invalid_sizes_rejected():
+    """块大小或上限不为正数时报错"""
+    with pytest.raises(ValueError):
+        AudioBuffer(chunk_samples=0)
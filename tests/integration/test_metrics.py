@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试指标注册表与 /metrics 端点
+"""
+
+import asyncio
+import functools
+import os
+import sys
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.utils.metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    """直方图按上界累计计数，并输出sum与count"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', '延迟', ['provider'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels('qwen').observe(value)
+
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{provider="qwen",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{provider="qwen",le="1"} 3' in text
+    assert 'latency_seconds_bucket{provider="qwen",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{provider="qwen"} 4' in text
+    assert 'latency_seconds_sum{provider="qwen"} 3.65' in text
+
+
+def test_counter_gauge_and_const_labels():
+    """计数器带 _total 后缀，固定标签附加到所有样本"""
+    registry = MetricsRegistry({'worker': '2'})
+    counter = registry.counter('cache_requests', '缓存访问', ['cache', 'result'])
+    counter.labels(cache='tts', result='hit').inc()
+    counter.labels('tts', 'hit').inc(2)
+    gauge = registry.gauge('inflight', '处理中')
+    with gauge.track_inprogress():
+        assert gauge.value == 1
+    assert gauge.value == 0
+    # 重复注册返回同一指标
+    assert registry.counter('cache_requests', '缓存访问', ['cache', 'result']) is counter
+
+    text = registry.render()
+    assert 'cache_requests_total{worker="2",cache="tts",result="hit"} 3' in text
+    assert 'inflight{worker="2"} 0' in text
+
+
+def test_updates_from_threads_are_not_lost():
+    """多个线程同时更新同一标签的计数器与直方图，计数不丢失，也不会重复创建子指标"""
+    import threading
+
+    registry = MetricsRegistry()
+    counter = registry.counter('writes', '写入', ['result'])
+    histogram = registry.histogram('write_seconds', '耗时', ['result'], buckets=(0.5,))
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    children = []
+
+    def work():
+        children.append((counter.labels('ok'), histogram.labels('ok')))
+        for _ in range(20000):
+            counter.labels('ok').inc()
+            histogram.labels('ok').observe(0.1)
+
+    try:
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert len({id(child) for pair in children for child in pair}) == 2
+    assert counter.labels('ok').value == 8 * 20000
+    assert histogram.labels('ok').count == 8 * 20000
+    assert 'write_seconds_bucket{result="ok",le="0.5"} 160000' in registry.render()
+
+
+def test_metrics_endpoint():
+    """端点返回Prometheus文本格式"""
+    from backend.core.server import AIVTuberServer
+    from backend.utils.metrics import WS_SEND_SECONDS
+
+    async def run():
+        WS_SEND_SECONDS.observe(0.001)
+        app = web.Application()
+        app.router.add_get('/metrics', functools.partial(AIVTuberServer.handle_metrics, SimpleNamespace()))
+        async with TestClient(TestServer(app)) as client:
+            resp = await client.get('/metrics')
+            assert resp.status == 200
+            assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            text = await resp.text()
+            assert '# TYPE ws_send_seconds histogram' in text
+            assert 'llm_first_token_seconds' in text
+
+    asyncio.run(run())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试对话回合追踪与首段音频时间
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.utils.tracing import Tracer
+
+
+def test_spans_nest_and_first_audio_is_recorded():
+    """span记录父子关系，首段音频只记录第一次"""
+    tracer = Tracer(capacity=10)
+
+    async def turn():
+        with tracer.start_turn("chat", chars=2):
+            with tracer.span("llm"):
+                with tracer.span("qwen_client.chat_completion"):
+                    tracer.event("llm_first_byte")
+                    await asyncio.sleep(0)
+            with tracer.span("ws_send", type="tts_result"):
+                pass
+            tracer.mark_first_audio("sovits")
+            tracer.mark_first_audio("browser")
+
+    asyncio.run(turn())
+
+    [trace] = tracer.recent()
+    assert trace['kind'] == 'chat'
+    assert trace['attrs'] == {'chars': 2}
+    names = [span['name'] for span in trace['spans']]
+    assert names == ['llm', 'qwen_client.chat_completion', 'llm_first_byte', 'ws_send']
+    assert trace['spans'][1]['parent'] == 0
+    assert trace['spans'][2]['parent'] == 1
+    assert trace['spans'][3]['parent'] is None
+    assert trace['first_audio_mode'] == 'sovits'
+    assert trace['time_to_first_audio_ms'] <= trace['duration_ms']
+    assert tracer.get(trace['turn_id']) == trace
+
+
+def test_span_outside_turn_is_noop_and_buffer_is_bounded():
+    """回合外的span不记录，环形缓冲区只保留最近的回合"""
+    tracer = Tracer(capacity=2)
+    with tracer.span("orphan"):
+        tracer.mark_first_audio("sovits")
+    assert tracer.recent() == []
+
+    for _ in range(3):
+        with tracer.start_turn("chat"):
+            # 嵌套 start_turn 复用当前回合
+            with tracer.start_turn("audio_data"):
+                pass
+    traces = tracer.recent()
+    assert len(traces) == 2
+    assert all(trace['time_to_first_audio_ms'] is None for trace in traces)
+
+
+def test_concurrent_turns_are_isolated():
+    """并发回合各自记录自己的span"""
+    tracer = Tracer(capacity=10)
+
+    async def turn(name):
+        with tracer.start_turn(name):
+            with tracer.span(f"{name}_work"):
+                await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(turn("a"), turn("b"))
+
+    asyncio.run(run())
+    for trace in tracer.recent():
+        assert [span['name'] for span in trace['spans']] == [f"{trace['kind']}_work"]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试能量VAD与流式识别的服务端端点检测
+"""
+
+import asyncio
+import base64
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.utils.vad import PAUSE_MARKER, SPEECH, SPEECH_END, SPEECH_START, EnergyVAD
+
+RATE = 16000
+
+
+def _noise(seconds, level=0.002, seed=0):
+    return (np.random.default_rng(seed).standard_normal(int(RATE * seconds)) * level).astype(np.float32)
+
+
+def _tone(seconds, level=0.3, freq=220):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (np.sin(2 * np.pi * freq * t) * level).astype(np.float32)
+
+
+def _run(vad, audio, step=1600):
+    events = []
+    for start in range(0, audio.size, step):
+        events.extend(vad.process(audio[start:start + step]))
+    return events
+
+
+def test_detects_and_trims_utterance():
+    """静音-语音-静音: 依次产生开始、语音、结束事件，前后静音被裁掉"""
+    vad = EnergyVAD()
+    events = _run(vad, np.concatenate((_noise(1), _tone(1), _noise(2, seed=1))))
+    kinds = [event.kind for event in events]
+    assert kinds[0] == SPEECH_START and kinds[-1] == SPEECH_END
+    assert set(kinds[1:-1]) == {SPEECH}
+    voiced = sum(event.audio.size for event in events if event.audio is not None)
+    # 语音1秒 + 前导音频不超过200毫秒，结尾静音不计入
+    assert RATE <= voiced <= RATE + RATE // 5 + vad.frame_length
+    assert not vad.in_speech
+
+
+def test_noise_floor_adapts():
+    """背景噪声（低频嗡声）抬高判决阈值，之后略强的同类噪声不被判为语音"""
+    quiet_hum = _tone(2, level=0.008 * np.sqrt(2), freq=50)
+    louder_hum = _tone(1, level=0.015 * np.sqrt(2), freq=50)
+    # 未学习噪声底时，较强的嗡声超过最小能量会被判为语音
+    assert [event.kind for event in _run(EnergyVAD(), louder_hum)][0] == SPEECH_START
+
+    vad = EnergyVAD()
+    assert _run(vad, quiet_hum) == []
+    assert 0.006 < vad.noise_floor <= 0.008
+    assert _run(vad, louder_hum) == []
+
+
+def test_steady_noise_above_min_energy_ends_false_speech():
+    """持续的低频嗡声起初被判为语音，噪声底随后升到嗡声水平并结束，之后的语音仍能检测"""
+    hum = _tone(20, level=0.021 * np.sqrt(2), freq=100)
+    vad = EnergyVAD()
+    kinds = [event.kind for event in _run(vad, hum)]
+    assert kinds[0] == SPEECH_START and kinds.count(SPEECH_START) == 1
+    assert kinds[-1] == SPEECH_END and not vad.in_speech
+    assert 0.019 < vad.noise_floor < 0.023
+    # 约 noise_window_s + hangover 后即结束，而不是等到 max_utterance_s
+    fresh = EnergyVAD()
+    end = next(start for start in range(0, hum.size, 1600)
+               if any(event.kind == SPEECH_END for event in fresh.process(hum[start:start + 1600])))
+    assert end / RATE < 8
+
+    speech = hum[:RATE] + _tone(1)
+    kinds = [event.kind for event in _run(vad, np.concatenate((speech, hum[:RATE * 2])))]
+    assert kinds[0] == SPEECH_START and kinds[-1] == SPEECH_END
+
+
+def test_short_pause_does_not_end_utterance():
+    """短于 hangover 的句中停顿保留在语音中，不触发结束"""
+    vad = EnergyVAD(hangover_ms=500)
+    audio = np.concatenate((_noise(0.5), _tone(0.5), _noise(0.3, seed=1), _tone(0.5), _noise(1, seed=2)))
+    events = _run(vad, audio)
+    kinds = [event.kind for event in events]
+    assert kinds.count(SPEECH_START) == 1 and kinds.count(SPEECH_END) == 1
+    voiced = sum(event.audio.size for event in events if event.audio is not None)
+    assert voiced >= int(RATE * 1.3)
+
+
+def test_max_utterance_forces_end_and_flush():
+    """超过最长发言时间强制结束；输入结束时 flush 结束正在进行的发言"""
+    vad = EnergyVAD(max_utterance_s=1.0)
+    kinds = [event.kind for event in _run(vad, _tone(1.5))]
+    assert kinds.count(SPEECH_END) == 1
+    assert [event.kind for event in vad.flush()] == [SPEECH_END]
+    assert vad.flush() == []
+
+
+def test_detect_speech_yields_pause_then_utterance():
+    """VADInterface 兼容接口: 说话开始产生暂停标记，结束时产生整段16位PCM"""
+    vad = EnergyVAD()
+    outputs = []
+    audio = np.concatenate((_noise(0.5), _tone(0.5), _noise(1, seed=1)))
+    for start in range(0, audio.size, 1600):
+        outputs.extend(vad.detect_speech(audio[start:start + 1600].tolist()))
+    assert outputs[0] == PAUSE_MARKER
+    assert len(outputs) == 2
+    pcm = np.frombuffer(outputs[1], dtype='<i2')
+    assert RATE // 2 <= pcm.size <= RATE // 2 + RATE // 5 + vad.frame_length
+    assert np.abs(pcm).max() > 9000
+
+
+def test_server_endpoints_without_stream_end():
+    """启用VAD时服务端检测到说话结束即给出最终结果，不等待 audio_stream_end"""
+    from backend.core.server import AIVTuberServer
+    from backend.voice.asr_manager import ASRManager
+
+    sent = []
+    chats = []
+
+    async def safe_send_json(ws, data):
+        sent.append(data)
+
+    async def handle_chat_message(ws, text, reply=None):
+        chats.append(text)
+
+    manager = ASRManager({'asr': {'enabled': True, 'provider': 'stub',
+                                  'stub': {'transcript': '你好', 'bytes_per_char': 10 ** 9},
+                                  'vad': {'enabled': True}}})
+    server = SimpleNamespace(asr_manager=manager, asr_streams={}, asr_vads={}, asr_speculations={},
+                             safe_send_json=safe_send_json, handle_chat_message=handle_chat_message)
+    for name in ('_deliver_asr_result', '_open_audio_stream', '_finish_audio_stream', '_close_audio_stream'):
+        setattr(server, name, getattr(AIVTuberServer, name).__get__(server))
+    ws = object()
+    audio = np.concatenate((_noise(0.5), _tone(0.5), _noise(1, seed=1)))
+    pcm = (audio * 32767).astype('<i2').tobytes()
+
+    async def run():
+        await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_start', {})
+        for start in range(0, len(pcm), 3200):
+            chunk = base64.b64encode(pcm[start:start + 3200]).decode('ascii')
+            await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_chunk', {'audio_data': chunk})
+        before_end = list(chats)
+        await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_end', {})
+        return before_end
+
+    before_end = asyncio.run(run())
+    assert before_end == ['你好']
+    assert [message['data'].get('event') for message in sent if message['type'] == 'vad'] == \
+           ['speech_start', 'speech_end']
+    assert [message['type'] for message in sent if message['type'] == 'asr_result'] == ['asr_result']
+    assert chats == ['你好']
+    assert server.asr_streams == {} and server.asr_vads == {}
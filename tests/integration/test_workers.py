@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程模式：SO_REUSEPORT 端口共享与跨进程连接注册表
+"""
+
+import asyncio
+import os
+import socket
+import sys
+
+import pytest
+from aiohttp import web
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.core.connection_registry import ConnectionRegistry
+from backend.core.workers import WORKER_ID_ENV, current_worker_id, reuse_port_supported
+
+
+def test_current_worker_id(monkeypatch):
+    """工作进程编号来自环境变量"""
+    monkeypatch.delenv(WORKER_ID_ENV, raising=False)
+    assert current_worker_id() == 0
+    monkeypatch.setenv(WORKER_ID_ENV, "3")
+    assert current_worker_id() == 3
+
+
+def test_registry_counts_across_workers(tmp_path):
+    """多个工作进程共用注册表，重启时清理自身遗留记录"""
+    db_path = str(tmp_path / "connections.db")
+    worker0 = ConnectionRegistry(db_path, worker_id=0)
+    worker1 = ConnectionRegistry(db_path, worker_id=1)
+
+    worker0.register("a", "127.0.0.1")
+    worker1.register("b", "127.0.0.1")
+    worker1.register("c", "127.0.0.1")
+    assert worker0.count_by_worker() == {0: 1, 1: 2}
+
+    worker1.unregister("b")
+    assert worker0.count() == 2
+
+    # 工作进程1崩溃后重启
+    restarted = ConnectionRegistry(db_path, worker_id=1)
+    assert restarted.count_by_worker() == {0: 1}
+
+    worker0.close()
+    worker1.close()
+    restarted.close()
+
+
+@pytest.mark.skipif(not reuse_port_supported(), reason="平台不支持 SO_REUSEPORT")
+def test_reuse_port_sites_share_port():
+    """两个站点以 SO_REUSEPORT 绑定同一端口"""
+    async def run():
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        async def handle(request):
+            return web.Response(text="ok")
+
+        runners = []
+        for _ in range(2):
+            app = web.Application()
+            app.router.add_get("/", handle)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port, reuse_port=True).start()
+            runners.append(runner)
+        for runner in runners:
+            await runner.cleanup()
+
+    asyncio.run(run())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量语音识别: multipart/tar 流式解析、并发上限与NDJSON结果
+"""
+
+import asyncio
+import functools
+import io
+import json
+import os
+import sys
+import tarfile
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.asr_batch import iter_tar_clips, run_batch
+from backend.voice.asr_manager import ASRManager, BaseASRProvider
+
+
+class SlowProvider(BaseASRProvider):
+    """按音频第一个字节决定耗时的识别桩，记录最大并发数"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.is_available = True
+        self.active = 0
+        self.peak = 0
+
+    async def recognize(self, audio_data):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(audio_data[0] / 100)
+            return f'{self.config["label"]}:{len(audio_data)}'
+        finally:
+            self.active -= 1
+
+    async def recognize_audio(self, clip):
+        return await self.recognize(bytes(clip.raw))
+
+    async def check_availability(self):
+        return True
+
+
+def _tar(files, compression=''):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=f'w:{compression}') as archive:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _server(batch_config=None):
+    manager = ASRManager({'asr': {'enabled': True, 'provider': 'slow', 'batch': batch_config or {}}})
+    manager.providers['slow'] = SlowProvider({'label': 'A'})
+    manager.providers['other'] = SlowProvider({'label': 'B'})
+    return SimpleNamespace(asr_manager=manager)
+
+
+async def _post(server, **kwargs):
+    from backend.core.server import AIVTuberServer
+
+    app = web.Application()
+    app.router.add_post('/api/asr/batch', functools.partial(AIVTuberServer.handle_asr_batch, server))
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.post('/api/asr/batch', **kwargs)
+        body = await resp.text()
+        return resp.status, resp.headers.get('Content-Type', ''), body
+
+
+def test_tar_reader_skips_non_audio():
+    """tar 流中只读取音频文件，超过大小限制的标记为None"""
+    data = _tar([('a/1.wav', b'\x01\x00'), ('a/notes.txt', b'x'), ('a/._1.wav', b'y'), ('big.pcm', b'\x00' * 10)])
+    assert list(iter_tar_clips(io.BytesIO(data), 8)) == [('a/1.wav', b'\x01\x00'), ('big.pcm', None)]
+
+
+def test_tar_upload_streams_results_in_completion_order():
+    """tar.gz 上传: 结果按完成顺序输出，同时识别数不超过上限，最后一行为汇总"""
+    server = _server({'concurrency': 2})
+    files = [(f'clip{i}.pcm', bytes([delay, 0]) * 50) for i, delay in enumerate((30, 1, 1, 1))]
+    status, content_type, body = asyncio.run(_post(
+        server, data=_tar(files, 'gz'), params={'concurrency': '8'},
+        headers={'Content-Type': 'application/gzip'}))
+
+    assert status == 200 and content_type.startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in body.splitlines()]
+    results, summary = lines[:-1], lines[-1]
+    assert [r['name'] for r in results][-1] == 'clip0.pcm'
+    assert sorted(r['index'] for r in results) == [0, 1, 2, 3]
+    assert all(r['success'] and r['text'] == 'A:100' for r in results)
+    assert summary['done'] and summary['total'] == 4 and summary['succeeded'] == 4
+    assert server.asr_manager.providers['slow'].peak == 2
+
+
+def test_multipart_upload_fans_out_across_providers():
+    """multipart 上传: 音频轮流分配给指定的提供商，超大音频单独报错"""
+    server = _server({'max_clip_mb': 1})
+    form = aiohttp.FormData()
+    for i in range(4):
+        form.add_field('files', bytes([1, 0]) * 10, filename=f'{i}.pcm', content_type='application/octet-stream')
+    form.add_field('note', '不是文件')
+    form.add_field('files', b'\x01' * (1024 * 1024 + 2), filename='huge.pcm', content_type='application/octet-stream')
+    status, _, body = asyncio.run(_post(server, data=form, params={'provider': 'slow,other'}))
+
+    assert status == 200
+    lines = [json.loads(line) for line in body.splitlines()]
+    by_name = {line['name']: line for line in lines[:-1]}
+    assert [by_name[f'{i}.pcm']['provider'] for i in range(4)] == ['slow', 'other', 'slow', 'other']
+    assert by_name['1.pcm']['text'] == 'B:20'
+    assert not by_name['huge.pcm']['success'] and '大小' in by_name['huge.pcm']['error']
+    assert lines[-1]['succeeded'] == 4 and lines[-1]['failed'] == 1
+
+
+def test_invalid_requests_rejected():
+    """未知提供商、不支持的上传类型返回400；损坏的 tar 在汇总中报错"""
+    server = _server()
+    status, _, body = asyncio.run(_post(server, data=b'', params={'provider': 'nope'},
+                                        headers={'Content-Type': 'application/x-tar'}))
+    assert status == 400 and 'nope' in body
+    status, _, _ = asyncio.run(_post(server, json={'audio_data': ''}))
+    assert status == 400
+    status, _, body = asyncio.run(_post(server, data=b'not a tar' * 100,
+                                        headers={'Content-Type': 'application/x-tar'}))
+    summary = json.loads(body.splitlines()[-1])
+    assert status == 200 and summary['total'] == 0 and 'error' in summary
+
+
+def test_provider_concurrency_limit():
+    """单个提供商的并发上限独立于总上限"""
+    provider = SlowProvider({'label': 'A'})
+
+    async def clips():
+        for i in range(6):
+            yield f'{i}.pcm', bytes([2, 0])
+
+    async def recognize(data, name):
+        return await provider.recognize(data)
+
+    async def run():
+        return [r async for r in run_batch(clips(), recognize, ['slow'], concurrency=6,
+                                           provider_concurrency={'slow': 2})]
+
+    results = asyncio.run(run())
+    assert len(results) == 7 and results[-1]['succeeded'] == 6
+    assert provider.peak == 2
+
+
+def test_failed_clips_report_error_reason():
+    """识别失败的音频在结果中带有失败原因"""
+    server = _server()
+
+    async def broken(clip):
+        raise RuntimeError('服务不可用')
+
+    server.asr_manager.providers['other'].recognize_audio = broken
+    form = aiohttp.FormData()
+    for i in range(2):
+        form.add_field('files', bytes([1, 0]) * 10, filename=f'{i}.pcm', content_type='application/octet-stream')
+    status, _, body = asyncio.run(_post(server, data=form, params={'provider': 'slow,other'}))
+
+    lines = [json.loads(line) for line in body.splitlines()]
+    by_name = {line['name']: line for line in lines[:-1]}
+    assert status == 200 and by_name['0.pcm']['success']
+    assert not by_name['1.pcm']['success'] and by_name['1.pcm']['error'] == '服务不可用'
+    assert lines[-1]['failed'] == 1
+
+
+def test_clips_are_pulled_only_when_a_slot_is_free():
+    """名额用满时不再读取下一个音频，内存中最多保留 concurrency 个音频"""
+    state = {'pulled': 0, 'finished': 0, 'peak': 0}
+
+    async def clips():
+        for i in range(6):
+            state['pulled'] += 1
+            state['peak'] = max(state['peak'], state['pulled'] - state['finished'])
+            yield f'{i}.pcm', bytes([1, 0])
+
+    async def recognize(data, name):
+        await asyncio.sleep(0.01)
+        state['finished'] += 1
+        return 'ok'
+
+    async def run():
+        return [r async for r in run_batch(clips(), recognize, ['slow'], concurrency=2)]
+
+    results = asyncio.run(run())
+    assert results[-1]['succeeded'] == 6
+    assert state['peak'] == 2
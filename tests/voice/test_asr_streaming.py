@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流式语音识别接口、中间结果推送与 faster-whisper 适配器
+"""
+
+import asyncio
+import base64
+import io
+import os
+import sys
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.asr_manager import (
+    ASRManager,
+    BaiduASRProvider,
+    BufferedASRStream,
+    FasterWhisperASRProvider,
+    StubASRProvider,
+)
+
+
+def _manager(provider='stub', **options):
+    return ASRManager({'asr': {'enabled': True, 'provider': provider, provider: options}})
+
+
+def test_stub_stream_emits_growing_partials():
+    """桩识别每收到固定字节数多输出一个字，重复的中间结果不发布"""
+    async def run():
+        stream = StubASRProvider({'transcript': '今天天气', 'bytes_per_char': 100}).create_stream()
+        await stream.start()
+        for _ in range(5):
+            await stream.feed(b'\x00' * 50)
+        final = await stream.finish()
+        return [text async for text in stream.partials()], final
+
+    partials, final = asyncio.run(run())
+    assert partials == ['今', '今天']
+    assert final == '今天天气'
+
+
+def test_manager_forwards_partials_before_final():
+    """ASRManager 在说话过程中转发中间结果，结束时返回最终结果"""
+    async def run():
+        manager = _manager(transcript='你好呀', bytes_per_char=10)
+        received = []
+
+        async def on_partial(text):
+            received.append(text)
+
+        stream = await manager.open_stream(on_partial)
+        for _ in range(2):
+            await stream.feed(b'\x01\x00' * 5)
+            await asyncio.sleep(0)
+        partials_before_end = list(received)
+        final = await manager.finish_stream(stream)
+        return partials_before_end, received, final
+
+    before_end, received, final = asyncio.run(run())
+    assert before_end == ['你', '你好']
+    assert received == ['你', '你好']
+    assert final == '你好呀'
+
+
+def test_buffered_stream_hands_pcm_to_provider():
+    """不支持流式的提供商在结束时收到整段音频，按原生格式取用时不做转换"""
+    captured = {}
+
+    async def recognize_audio(clip):
+        captured['clip'] = clip
+        return '整段结果'
+
+    async def run():
+        provider = BaiduASRProvider({})
+        provider.recognize_audio = recognize_audio
+        stream = provider.create_stream()
+        assert isinstance(stream, BufferedASRStream)
+        await stream.feed(b'\x01\x00' * 160)
+        await stream.feed(b'\x02\x00' * 160)
+        return await stream.finish()
+
+    assert asyncio.run(run()) == '整段结果'
+    clip = captured['clip']
+    assert clip.sample_rate == 16000 and clip.frames == 320
+    assert clip.to_pcm16(16000) == b'\x01\x00' * 160 + b'\x02\x00' * 160
+    with wave.open(io.BytesIO(clip.to_wav(8000)), 'rb') as wav:
+        assert wav.getframerate() == 8000 and wav.getnframes() == 160
+
+
+def test_faster_whisper_stream_decodes_incrementally():
+    """faster-whisper 适配器按间隔解码中间结果，结束时没有新音频则直接采用"""
+    provider = FasterWhisperASRProvider({'partial_interval': 0.1})
+    calls = []
+
+    def transcribe_segments(samples, beam_size=None):
+        calls.append((samples.size, beam_size))
+        return [(samples.size / 16000, f'{samples.size}个采样')]
+
+    provider.transcribe_segments = transcribe_segments
+    one_interval = np.zeros(1600, dtype='<i2').tobytes()
+
+    async def run():
+        stream = provider.create_stream()
+        await stream.feed(one_interval)
+        await stream._task
+        await stream.feed(one_interval)
+        await stream._task
+        reused = await stream.finish()
+
+        tail = provider.create_stream()
+        await tail.feed(one_interval)
+        await tail._task
+        await tail.feed(one_interval[:320])
+        return reused, await tail.finish()
+
+    reused, decoded = asyncio.run(run())
+    assert reused == '3200个采样'
+    assert decoded == '1760个采样'
+    assert calls[-1] == (1760, None)
+    assert [beam for _, beam in calls[:-1]] == [1, 1, 1]
+
+
+def test_faster_whisper_partials_decode_a_bounded_window():
+    """未提交音频超过 partial_window 后提交已完成的片段，每次只解码其后的音频，结果不丢字"""
+    provider = FasterWhisperASRProvider({'partial_interval': 0.1, 'partial_window': 0.2})
+    sizes = []
+    partials = []
+
+    def transcribe_segments(samples, beam_size=None):
+        # 每0.1秒一个片段，每个片段识别出一个字
+        sizes.append(samples.size)
+        return [((i + 1) * 0.1, '字') for i in range(samples.size // 1600)]
+
+    provider.transcribe_segments = transcribe_segments
+    one_interval = np.zeros(1600, dtype='<i2').tobytes()
+
+    async def run():
+        stream = provider.create_stream()
+        stream._emit_partial = partials.append
+        for _ in range(10):
+            await stream.feed(one_interval)
+            await stream._task
+        return await stream.finish(), len(stream.buffer)
+
+    text, buffered = asyncio.run(run())
+    assert text == '字' * 10
+    assert max(sizes) <= 3200 and buffered <= 3200 * 2
+    assert partials == ['字' * n for n in range(1, 11)]
+
+
+def test_audio_stream_websocket_flow():
+    """WebSocket 流式识别: 推送 asr_partial，结束后发送 asr_result 并进入对话"""
+    from backend.core.server import AIVTuberServer
+
+    sent = []
+    chats = []
+
+    async def safe_send_json(ws, data):
+        sent.append(data)
+
+    async def handle_chat_message(ws, text, reply=None):
+        chats.append(text)
+
+    server = SimpleNamespace(
+        asr_manager=_manager(transcript='我有点紧张', bytes_per_char=320),
+        asr_streams={},
+        asr_vads={},
+        asr_speculations={},
+        safe_send_json=safe_send_json,
+        handle_chat_message=handle_chat_message,
+    )
+    for name in ('_deliver_asr_result', '_open_audio_stream', '_finish_audio_stream', '_close_audio_stream'):
+        setattr(server, name, getattr(AIVTuberServer, name).__get__(server))
+    ws = object()
+    chunk = base64.b64encode(b'\x00\x00' * 320).decode('ascii')
+
+    async def run():
+        await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_start', {})
+        for _ in range(2):
+            await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_chunk', {'audio_data': chunk})
+            await asyncio.sleep(0)
+        await AIVTuberServer.handle_audio_stream(server, ws, 'audio_stream_end', {})
+
+    asyncio.run(run())
+    assert [message['type'] for message in sent] == ['asr_partial', 'asr_partial', 'asr_result']
+    assert [message['data']['text'] for message in sent] == ['我有', '我有点紧', '我有点紧张']
+    assert chats == ['我有点紧张']
+    assert server.asr_streams == {}
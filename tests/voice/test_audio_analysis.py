@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分块音频质量分析: 语音分段、削波与信噪比估计、参考片段选择
+"""
+
+import os
+import sys
+
+import numpy as np
+import soundfile as sf
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.audio_analysis import AudioAnalyzer, analyze_audio, select_reference_segment, spectral_features
+
+SR = 16000
+
+
+def _voice(seconds, freq=220.0, amplitude=0.3):
+    t = np.arange(int(seconds * SR)) / SR
+    return amplitude * np.sin(2 * np.pi * freq * t) * (1 + 0.3 * np.sin(2 * np.pi * 3 * t))
+
+
+def _write(tmp_path, parts, noise=0.001, channels=1, name='clip.wav'):
+    signal = np.clip(np.concatenate(parts), -1, 1)
+    signal = signal + np.random.default_rng(0).normal(0, noise, signal.size)
+    if channels > 1:
+        signal = np.repeat(signal[:, None], channels, axis=1)
+    path = str(tmp_path / name)
+    sf.write(path, signal.astype(np.float32), SR, subtype='PCM_16')
+    return path
+
+
+def test_segments_split_at_silence(tmp_path):
+    """静音处切分语音片段，短停顿不切分，整体指标与时长正确"""
+    path = _write(tmp_path, [np.zeros(SR), _voice(2), np.zeros(SR // 10), _voice(1),
+                             np.zeros(SR // 2), _voice(1.5, 440), np.zeros(SR)], channels=2)
+    report = analyze_audio(path)
+
+    assert report['channels'] == 2 and report['duration'] == 7.1
+    spans = [(segment['start'], segment['end']) for segment in report['segments']]
+    assert spans == [(1.0, 4.1), (4.6, 6.1)]
+    assert report['segments'][1]['centroid_hz'] > report['segments'][0]['centroid_hz']
+    assert report['snr_db'] > 40 and report['issues'] == []
+
+
+def test_clipping_lowers_segment_score(tmp_path):
+    """削波的片段质量分为0并在报告中提示"""
+    path = _write(tmp_path, [np.zeros(SR // 2), _voice(4), np.zeros(SR // 2), _voice(4, amplitude=1.5),
+                             np.zeros(SR // 2)])
+    report = analyze_audio(path)
+
+    clean, clipped = report['segments']
+    assert clean['clipped_ratio'] == 0 and clean['score'] == 1.0
+    assert clipped['clipped_ratio'] > 0.1 and clipped['score'] == 0.0
+    assert '存在削波失真' in report['issues']
+    assert select_reference_segment(report) == clean
+
+
+def test_noisy_recording_uses_noise_floor(tmp_path):
+    """背景噪声较大时按噪声底判定语音，信噪比估计随之降低"""
+    path = _write(tmp_path, [np.zeros(SR), _voice(3, amplitude=0.1), np.zeros(SR)], noise=0.01)
+    report = analyze_audio(path)
+
+    assert -45 < report['noise_floor_db'] < -35
+    assert 15 < report['snr_db'] < 30
+    assert [(s['start'], s['end']) for s in report['segments']] == [(1.0, 4.0)]
+
+
+def test_small_blocks_match_large_blocks(tmp_path):
+    """分块大小不影响结果（片段跨块时正确累加）"""
+    path = _write(tmp_path, [np.zeros(SR // 3), _voice(2.3), np.zeros(SR // 2), _voice(0.7, 330),
+                             np.zeros(SR // 3)])
+    small = AudioAnalyzer(block_frames=3).analyze(path)
+    large = AudioAnalyzer(block_frames=4096).analyze(path)
+    assert small == large
+
+
+def test_silence_and_reference_selection(tmp_path):
+    """纯静音没有片段；参考片段只在3~10秒内挑选"""
+    report = analyze_audio(_write(tmp_path, [np.zeros(SR * 2)], noise=0.0, name='silent.wav'))
+    assert report['segments'] == [] and '未检测到语音' in report['issues']
+    assert select_reference_segment(report) is None
+
+    report = analyze_audio(_write(tmp_path, [_voice(2), np.zeros(SR), _voice(12), np.zeros(SR)]))
+    assert [s['duration'] for s in report['segments']] == [2.0, 12.0]
+    assert select_reference_segment(report) is None
+    assert select_reference_segment(report, min_duration=1) == report['segments'][0]
+
+
+def test_spectral_features_of_pure_tone():
+    """纯音的频谱质心与滚降接近其频率，白噪声的平坦度远高于纯音"""
+    t = np.arange(320) / SR
+    tone = np.sin(2 * np.pi * 1000 * t).astype(np.float32)[None, :]
+    noise = np.random.default_rng(1).normal(0, 0.1, (1, 320)).astype(np.float32)
+    centroid, flatness, rolloff = spectral_features(np.vstack([tone, noise]), SR)
+    assert abs(centroid[0] - 1000) < 100 and abs(rolloff[0] - 1000) <= 50
+    assert flatness[1] > 100 * flatness[0]
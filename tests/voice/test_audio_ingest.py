@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试音频输入处理: WAV块解析、采样格式转换与多相重采样
+"""
+
+import asyncio
+import os
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.asr_manager import ASRManager, BaiduASRProvider, FasterWhisperASRProvider
+from backend.voice.audio_ingest import AudioClip, parse_wav, polyphase_filter, resample
+
+
+def _wav(payload: bytes, tag=1, channels=1, rate=16000, bits=16, extra_chunks=b'', extensible=False):
+    """构造WAV文件（fmt 之前可插入其他块）"""
+    block_align = channels * bits // 8
+    if extensible:
+        fmt = struct.pack('<HHIIHHHHI', 0xFFFE, channels, rate, rate * block_align, block_align, bits,
+                          22, bits, 0) + struct.pack('<H', tag) + b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+    else:
+        fmt = struct.pack('<HHIIHH', tag, channels, rate, rate * block_align, block_align, bits)
+    body = b'WAVE' + extra_chunks + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    body += b'data' + struct.pack('<I', len(payload)) + payload
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+def _sine(rate, seconds=1.0, freq=440.0):
+    t = np.arange(int(rate * seconds)) / rate
+    return np.sin(2 * np.pi * freq * t).astype(np.float32) * 0.5
+
+
+def test_parses_chunks_before_fmt_and_odd_padding():
+    """fmt 前的 LIST 块（奇数长度带填充字节）不影响解析"""
+    pcm = np.array([0, 1000, -1000, 32767], dtype='<i2').tobytes()
+    wav = _wav(pcm, extra_chunks=b'LIST' + struct.pack('<I', 3) + b'abc\x00')
+    encoding, rate, channels, data = parse_wav(wav)
+    assert (encoding, rate, channels) == ('pcm16', 16000, 1)
+    assert bytes(data) == pcm
+    # 长度未知的流式WAV
+    streamed = wav[:-len(pcm) - 4] + b'\xff\xff\xff\xff' + pcm
+    assert bytes(parse_wav(streamed)[3]) == pcm
+
+
+def test_rejects_invalid_wav():
+    """非WAV、缺少块或不支持的格式报 ValueError"""
+    with pytest.raises(ValueError):
+        parse_wav(b'RIFF\x00\x00\x00\x00WAVX')
+    with pytest.raises(ValueError):
+        parse_wav(b'RIFF\x04\x00\x00\x00WAVE')
+    with pytest.raises(ValueError):
+        parse_wav(_wav(b'\x00' * 4, tag=2))
+
+
+@pytest.mark.parametrize('encoding', ['pcm8', 'pcm16', 'pcm24', 'pcm32', 'float32', 'float64'])
+def test_sample_formats_decode_to_same_signal(encoding):
+    """各采样格式解码后的波形与原信号一致，立体声取平均"""
+    signal = np.array([0.0, 0.25, -0.5, 0.75, -1.0], dtype=np.float64)
+    stereo = np.stack((signal, signal * 0.5), axis=1)
+    if encoding == 'pcm8':
+        payload, tag, bits = np.round(stereo * 127 + 128).astype(np.uint8).tobytes(), 1, 8
+    elif encoding == 'pcm16':
+        payload, tag, bits = np.round(stereo * 32767).astype('<i2').tobytes(), 1, 16
+    elif encoding == 'pcm24':
+        values = np.round(stereo * 8388607).astype('<i4').reshape(-1)
+        payload = values.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        tag, bits = 1, 24
+    elif encoding == 'pcm32':
+        payload, tag, bits = np.round(stereo * 2147483647).astype('<i4').tobytes(), 1, 32
+    elif encoding == 'float32':
+        payload, tag, bits = stereo.astype('<f4').tobytes(), 3, 32
+    else:
+        payload, tag, bits = stereo.astype('<f8').tobytes(), 3, 64
+
+    clip = AudioClip.from_bytes(_wav(payload, tag=tag, channels=2, bits=bits, extensible=(bits == 24)))
+    assert clip.encoding == encoding and clip.frames == signal.size
+    tolerance = 1e-2 if encoding == 'pcm8' else 1e-4
+    assert np.allclose(clip.samples(), signal * 0.75, atol=tolerance)
+
+
+def test_resampler_accuracy_and_filter_cache():
+    """44.1k/48k 降到16k 与直接生成的16k信号一致，高于新奈奎斯特频率的成分被滤除；滤波器组按采样率对缓存"""
+    polyphase_filter.cache_clear()
+    for rate in (44100, 48000):
+        out = resample(_sine(rate), rate, 16000)
+        assert out.size == 16000
+        assert np.abs(out - _sine(16000))[200:-200].max() < 1e-3
+    assert np.abs(resample(_sine(48000, freq=10000), 48000, 16000))[200:-200].max() < 0.01
+    resample(_sine(48000), 48000, 16000)
+    info = polyphase_filter.cache_info()
+    assert info.misses == 2 and info.hits >= 2
+
+
+def test_clip_passes_native_pcm_through():
+    """已是目标格式的16位单声道PCM原样返回，转换结果被缓存"""
+    pcm = np.round(_sine(16000) * 32767).astype('<i2').tobytes()
+    clip = AudioClip.from_bytes(_wav(pcm))
+    assert clip.to_pcm16(16000) == pcm
+    assert len(clip.to_pcm16(8000)) == 8000 * 2
+    assert clip.to_float32(8000) is clip.to_float32(8000)
+
+
+def test_providers_receive_native_format():
+    """百度按配置的采样率收到原始PCM，faster-whisper 直接收到16k float32"""
+    wav = _wav(_sine(48000).astype('<f4').tobytes(), tag=3, rate=48000, bits=32)
+    posted = {}
+
+    async def ensure_token():
+        return 'token'
+
+    async def post_speech(pcm, token):
+        posted['pcm'] = pcm
+        return {'err_no': 0, 'result': ['百度结果']}
+
+    baidu = BaiduASRProvider({'rate': 8000})
+    baidu._ensure_token = ensure_token
+    baidu._post_speech = post_speech
+    assert asyncio.run(baidu.recognize(wav)) == '百度结果'
+    assert len(posted['pcm']) == 8000 * 2
+
+    manager = ASRManager({'asr': {'enabled': True, 'provider': 'faster_whisper'}})
+    received = []
+    provider = manager.current_provider
+    assert isinstance(provider, FasterWhisperASRProvider)
+    provider.transcribe = lambda samples, beam_size=None: received.append(samples) or '本地结果'
+    assert asyncio.run(manager.recognize(wav)) == '本地结果'
+    assert received[0].dtype == np.float32 and received[0].size == 16000
+
+
+def test_decoding_and_resampling_run_off_the_event_loop(monkeypatch):
+    """WAV解析、解码与重采样都在线程池中进行，不占用事件循环线程"""
+    import threading
+
+    from backend.voice import asr_manager
+
+    threads = {}
+    wav = _wav(struct.pack('<48000h', *([1000] * 48000)), rate=48000)
+    original_from_bytes = AudioClip.from_bytes.__func__
+    original_samples = AudioClip.samples
+
+    def from_bytes(cls, data, sample_rate=16000):
+        threads.setdefault('parse', []).append(threading.get_ident())
+        return original_from_bytes(cls, data, sample_rate)
+
+    def samples(self):
+        threads.setdefault('decode', []).append(threading.get_ident())
+        return original_samples(self)
+
+    monkeypatch.setattr(asr_manager.AudioClip, 'from_bytes', classmethod(from_bytes))
+    monkeypatch.setattr(asr_manager.AudioClip, 'samples', samples)
+
+    async def run():
+        manager = ASRManager({'asr': {'enabled': True, 'provider': 'faster_whisper'}})
+        manager.current_provider.transcribe = lambda samples, beam_size=None: '本地结果'
+        assert await manager.recognize(wav) == '本地结果'
+
+        baidu = BaiduASRProvider({})
+
+        async def ensure_token():
+            return 'token'
+
+        async def post_speech(pcm, token):
+            return {'err_no': 0, 'result': ['百度结果']}
+
+        baidu._ensure_token = ensure_token
+        baidu._post_speech = post_speech
+        assert await baidu.recognize(wav) == '百度结果'
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(threads['parse']) == 2 and len(threads['decode']) == 2
+    assert loop_thread not in threads['parse'] + threads['decode']
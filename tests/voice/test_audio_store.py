@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试生成音频存储的配额、TTL与引用计数
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.audio_store import AudioArtifactStore
+
+
+def _write(store, size):
+    path = store.allocate()
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    store.register(path)
+    return path
+
+
+def test_quota_evicts_oldest_unreferenced(tmp_path):
+    """超出配额时淘汰最久未访问且未被引用的文件"""
+    store = AudioArtifactStore(str(tmp_path), max_bytes=2500, ttl_seconds=3600)
+    first = _write(store, 1000)
+    second = _write(store, 1000)
+
+    assert store.acquire(first)
+    third = _write(store, 1000)
+
+    # first 被引用，second 最久未访问，应被淘汰
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert os.path.exists(third)
+    stats = store.get_stats()
+    assert stats['bytes'] == 2000
+    assert stats['evicted_total'] == 1
+
+    store.release(first)
+
+
+def test_ttl_sweep_skips_referenced(tmp_path):
+    """TTL清理跳过正在使用的文件"""
+    store = AudioArtifactStore(str(tmp_path), max_bytes=10 ** 6, ttl_seconds=0.05)
+    busy = _write(store, 10)
+    idle = _write(store, 10)
+    assert store.acquire(busy)
+
+    time.sleep(0.1)
+    removed = store.sweep()
+
+    assert removed == 1
+    assert os.path.exists(busy)
+    assert not os.path.exists(idle)
+
+    store.release(busy)
+    time.sleep(0.1)
+    assert store.sweep() == 1
+    assert store.get_stats()['files'] == 0
+
+
+def test_sweep_is_incremental_and_adopts_leftovers(tmp_path):
+    """遗留文件分批登记，每轮只检查有限条目"""
+    for i in range(5):
+        with open(tmp_path / f"old_{i}.wav", 'wb') as f:
+            f.write(b'\0' * 10)
+        os.utime(tmp_path / f"old_{i}.wav", (0, 0))
+
+    store = AudioArtifactStore(str(tmp_path), max_bytes=10 ** 6, ttl_seconds=60, sweep_batch=2)
+    store._adopt_iter = os.scandir(tmp_path)
+
+    assert store.sweep() == 2
+    assert store.sweep() == 2
+    assert store.sweep() == 1
+    assert not any(tmp_path.iterdir())
+
+
+def test_adoption_orders_by_mtime_and_includes_root(tmp_path):
+    """较新的遗留文件不会挡住其后过期文件的清理；根目录的遗留文件一并接管"""
+    worker_dir = tmp_path / "w0"
+    worker_dir.mkdir()
+    files = {'fresh.wav': time.time(), 'old_a.wav': 100, 'old_b.wav': 50}
+    for name, mtime in files.items():
+        with open(worker_dir / name, 'wb') as f:
+            f.write(b'\0' * 10)
+        os.utime(worker_dir / name, (mtime, mtime))
+    with open(tmp_path / "legacy.wav", 'wb') as f:
+        f.write(b'\0' * 10)
+    os.utime(tmp_path / "legacy.wav", (10, 10))
+
+    store = AudioArtifactStore(str(worker_dir), max_bytes=10 ** 6, ttl_seconds=60, sweep_batch=2,
+                               adopt_dirs=[str(tmp_path)])
+    store._adopt_iter = store._scan_leftovers()
+
+    while store._adopt_iter is not None:
+        store.sweep()
+    store.sweep()
+    assert [os.path.basename(key) for key in store._artifacts] == ['fresh.wav']
+    assert sorted(os.listdir(tmp_path)) == ['w0']
+    assert os.listdir(worker_dir) == ['fresh.wav']
+
+    # 排序: 遗留文件按修改时间从旧到新排在最前
+    for name, mtime in (('b.wav', 300), ('a.wav', 200), ('c.wav', 400)):
+        with open(worker_dir / name, 'wb') as f:
+            f.write(b'\0' * 10)
+        os.utime(worker_dir / name, (mtime, mtime))
+    store = AudioArtifactStore(str(worker_dir), max_bytes=10 ** 6, ttl_seconds=10 ** 12)
+    store._adopt_iter = store._scan_leftovers()
+    store.sweep()
+    assert [os.path.basename(key) for key in store._artifacts] == ['a.wav', 'b.wav', 'c.wav', 'fresh.wav']
+
+
+def test_files_are_deleted_outside_the_lock(tmp_path, monkeypatch):
+    """锁内只注销过期文件，删除文件时不持有锁；删除失败的文件重新登记，下一轮再试"""
+    from backend.voice import audio_store as module
+
+    store = AudioArtifactStore(str(tmp_path), max_bytes=10 ** 6, ttl_seconds=0.05)
+    paths = [_write(store, 10) for _ in range(3)]
+    time.sleep(0.1)
+    locked = []
+    real_remove = os.remove
+
+    def remove(path):
+        locked.append(store._lock.locked())
+        if path == os.path.abspath(paths[0]):
+            raise PermissionError('文件被占用')
+        real_remove(path)
+
+    monkeypatch.setattr(module.os, 'remove', remove)
+    assert store.sweep() == 2
+    assert locked == [False, False, False]
+    stats = store.get_stats()
+    assert stats['files'] == 1 and stats['bytes'] == 10 and stats['delete_failures_total'] == 1
+
+    monkeypatch.setattr(module.os, 'remove', real_remove)
+    assert store.sweep() == 1 and not os.path.exists(paths[0])
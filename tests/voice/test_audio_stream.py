@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流式音频封装、格式协商和 /api/tts/stream 端点
+"""
+
+import asyncio
+import functools
+import os
+import struct
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.audio_stream import negotiate_stream_format, to_pcm16, wav_stream_header
+
+
+def test_wav_stream_header():
+    """流式WAV头长度字段为占位值"""
+    header = wav_stream_header(32000)
+    assert len(header) == 44
+    assert header[:4] == b'RIFF' and header[8:12] == b'WAVE'
+    assert struct.unpack('<I', header[4:8])[0] == 0xFFFFFFFF
+    assert struct.unpack('<I', header[24:28])[0] == 32000
+    assert struct.unpack('<I', header[40:44])[0] == 0xFFFFFFFF
+
+
+def test_to_pcm16():
+    """浮点采样裁剪并转换为16位PCM"""
+    pcm = to_pcm16(np.array([0.0, 1.0, -2.0], dtype=np.float32))
+    assert np.frombuffer(pcm, dtype='<i2').tolist() == [0, 32767, -32767]
+    big = to_pcm16(np.array([1], dtype=np.int16), big_endian=True)
+    assert big == b'\x00\x01'
+
+
+def test_negotiate_stream_format():
+    """按Accept的q值选择格式"""
+    assert negotiate_stream_format(None) == 'wav'
+    assert negotiate_stream_format('audio/L16;rate=16000') == 'pcm'
+    assert negotiate_stream_format('audio/L16;q=0.5, audio/wav') == 'wav'
+    assert negotiate_stream_format('audio/ogg') is None
+    assert negotiate_stream_format('text/html, */*;q=0.1') == 'wav'
+    assert negotiate_stream_format('audio/wav', requested='pcm') == 'pcm'
+
+
+class _FakeTTSManager:
+    sovits_engine = object()
+
+    async def synthesize_stream(self, text):
+        for _ in range(3):
+            yield 16000, np.zeros(160, dtype=np.float32)
+
+
+def test_tts_stream_endpoint():
+    """端点以分块传输输出WAV头和PCM数据"""
+    from backend.core.server import AIVTuberServer
+
+    async def run():
+        stub = SimpleNamespace(tts_manager=_FakeTTSManager())
+        app = web.Application()
+        app.router.add_get('/api/tts/stream', functools.partial(AIVTuberServer.handle_tts_stream, stub))
+        async with TestClient(TestServer(app)) as client:
+            resp = await client.get('/api/tts/stream', params={'text': '你好'})
+            assert resp.status == 200
+            assert resp.headers['Content-Type'] == 'audio/wav'
+            assert resp.headers['Transfer-Encoding'] == 'chunked'
+            body = await resp.read()
+            assert len(body) == 44 + 3 * 160 * 2
+
+            resp = await client.get('/api/tts/stream', params={'text': '你好'},
+                                    headers={'Accept': 'audio/ogg'})
+            assert resp.status == 406
+
+    asyncio.run(run())
+
+
+def test_synthesize_stream_closes_engine_before_releasing_lock():
+    """调用方提前停止时，引擎生成器在合成锁释放之前已关闭"""
+    from contextlib import aclosing
+
+    from backend.voice.tts_manager import TTSManager
+
+    events = []
+
+    class _Engine:
+        async def stream_speech(self, text):
+            try:
+                for _ in range(3):
+                    yield 16000, np.zeros(160, dtype=np.float32)
+            finally:
+                events.append(('engine_closed', stub._synthesis_lock.locked()))
+
+    async def run():
+        stub._synthesis_lock = asyncio.Lock()
+        async with aclosing(TTSManager.synthesize_stream(stub, '你好')) as stream:
+            async for _ in stream:
+                break
+        events.append(('lock_released', not stub._synthesis_lock.locked()))
+
+    stub = SimpleNamespace(sovits_engine=_Engine(), clean_text=lambda text: text,
+                           _record_synthesis=lambda *args: None)
+    asyncio.run(run())
+    assert events == [('engine_closed', True), ('lock_released', True)]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试百度语音识别客户端: 连接复用、令牌生命周期与二进制上传（本地替身服务）
+"""
+
+import asyncio
+import base64
+import os
+import sys
+
+import numpy as np
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.asr_manager import BaiduASRProvider
+
+PCM = np.arange(-800, 800, dtype='<i2').tobytes()
+
+
+class FakeBaidu:
+    """百度令牌与短语音识别接口的本地替身"""
+
+    def __init__(self, expires_in=2592000):
+        self.expires_in = expires_in
+        self.token_requests = 0
+        self.revoked = set()
+        self.uploads = []
+        self.peers = set()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/oauth/2.0/token', self.token)
+        app.router.add_post('/server_api', self.recognize)
+        return app
+
+    async def token(self, request):
+        self.token_requests += 1
+        # 让并发请求有机会在刷新完成前到达
+        await asyncio.sleep(0.05)
+        return web.json_response({'access_token': f'token-{self.token_requests}', 'expires_in': self.expires_in})
+
+    async def recognize(self, request):
+        self.peers.add(request.transport.get_extra_info('peername'))
+        if request.content_type == 'application/json':
+            body = await request.json()
+            token, audio, mode = body['token'], base64.b64decode(body['speech']), 'json'
+            assert body['len'] == len(audio)
+        else:
+            token, audio, mode = request.query['token'], await request.read(), request.content_type
+            assert request.headers['Content-Type'] == 'audio/pcm;rate=16000'
+        self.uploads.append((mode, token, audio))
+        if token in self.revoked:
+            return web.json_response({'err_no': 3302, 'err_msg': 'authentication failed.'})
+        return web.json_response({'err_no': 0, 'result': [f'识别{len(audio)}字节']})
+
+
+def _run(fake, body, **options):
+    async def run():
+        server = TestServer(fake.app())
+        await server.start_server()
+        provider = BaiduASRProvider({'api_key': 'key', 'secret_key': 'secret',
+                                     'token_url': str(server.make_url('/oauth/2.0/token')),
+                                     'api_url': str(server.make_url('/server_api')), **options})
+        try:
+            return await body(provider)
+        finally:
+            await provider.close()
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def test_raw_upload_reuses_pooled_connection():
+    """默认以二进制请求体上传PCM，多次识别复用同一个会话和连接"""
+    fake = FakeBaidu()
+
+    async def body(provider):
+        first = await provider.recognize(PCM)
+        session = provider.session
+        second = await provider.recognize(PCM)
+        assert provider.session is session
+        return first, second
+
+    assert _run(fake, body) == (f'识别{len(PCM)}字节',) * 2
+    assert [(mode, audio) for mode, _, audio in fake.uploads] == [('audio/pcm', PCM)] * 2
+    assert fake.token_requests == 1
+    assert len(fake.peers) == 1
+
+
+def test_json_upload_mode():
+    """upload: json 时按base64放入JSON请求体"""
+    fake = FakeBaidu()
+
+    async def body(provider):
+        return await provider.recognize(PCM)
+
+    assert _run(fake, body, upload='json') == f'识别{len(PCM)}字节'
+    assert fake.uploads[0][0] == 'json' and fake.uploads[0][2] == PCM
+
+
+def test_concurrent_requests_share_one_token_refresh():
+    """没有令牌时并发识别只发出一个令牌请求"""
+    fake = FakeBaidu()
+
+    async def body(provider):
+        return await asyncio.gather(*(provider.recognize(PCM) for _ in range(5)))
+
+    assert len(_run(fake, body)) == 5
+    assert fake.token_requests == 1
+    assert {token for _, token, _ in fake.uploads} == {'token-1'}
+
+
+def test_token_refreshed_before_expiry():
+    """剩余有效期不足刷新余量时后台刷新，当前请求不等待，之后使用新令牌"""
+    fake = FakeBaidu(expires_in=100)
+
+    async def body(provider):
+        await provider.recognize(PCM)
+        await provider.recognize(PCM)
+        await provider._token_task
+        await provider.recognize(PCM)
+        return provider.token_refreshes
+
+    assert _run(fake, body, token_refresh_margin=1000) == 2
+    tokens = [token for _, token, _ in fake.uploads]
+    assert tokens[:2] == ['token-1', 'token-1'] and tokens[2] != 'token-1'
+
+
+def test_revoked_token_retried_once():
+    """服务端判定令牌失效时刷新并重试一次"""
+    fake = FakeBaidu()
+    fake.revoked.add('token-1')
+
+    async def body(provider):
+        return await provider.recognize(PCM)
+
+    assert _run(fake, body) == f'识别{len(PCM)}字节'
+    assert [token for _, token, _ in fake.uploads] == ['token-1', 'token-2']
+
+    fake = FakeBaidu()
+    fake.revoked.update({'token-1', 'token-2'})
+    assert _run(fake, body) is None
+    assert fake.token_requests == 2
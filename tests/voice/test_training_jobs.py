@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试语音训练任务队列: 持久化、独立进程执行、阶段检查点与崩溃恢复、取消、CPU预算与进度推送
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice import training_jobs
+from backend.voice.training_jobs import (
+    CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, TrainingJobManager, TrainingJobStore, training_cpus)
+
+SR = 16000
+
+
+def _config(tmp_path):
+    """可在测试环境中跑通前几个训练阶段的配置（当前目录切换到 tmp_path）"""
+    t = np.arange(2 * SR) / SR
+    voice = 0.3 * np.sin(2 * np.pi * 220 * t)
+    gap = np.zeros(SR)
+    sf.write(str(tmp_path / 'voice.wav'), np.concatenate([gap, voice, gap, voice, gap]).astype(np.float32), SR)
+    (tmp_path / 'text.txt').write_text('第一句\n第二句\n', encoding='utf-8')
+    return {'sovits': {'sovits_path': str(tmp_path), 'audio_file': str(tmp_path / 'voice.wav'),
+                       'text_file': str(tmp_path / 'text.txt'), 'model_name': 'demo',
+                       'training': {'preprocess': {'ffmpeg': None}}}}
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+async def _wait_for(store, job_id, condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if condition(job):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"等待超时: {store.get(job_id)}")
+
+
+async def _until(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.05)
+
+
+def test_store_versions_and_cancel(tmp_path):
+    """每次变化递增版本号；排队中的任务可以直接取消"""
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    first = store.create('train_voice', {'model_name': '小雨'})
+    second = store.create('extract_features', {})
+    assert first['status'] == QUEUED and first['params'] == {'model_name': '小雨'}
+    assert store.claim(first['job_id']) and not store.claim(first['job_id'])
+    store.complete_stage(first['job_id'], 'check_files')
+
+    changed = store.changed_since(second['version'])
+    assert [job['job_id'] for job in changed] == [first['job_id']]
+    assert changed[0]['status'] == RUNNING and changed[0]['attempts'] == 1
+    assert changed[0]['completed_stages'] == ['check_files']
+
+    assert store.request_cancel(second['job_id'])['status'] == CANCELLED
+    assert store.request_cancel(first['job_id'])['cancel_requested']
+    assert [job['job_id'] for job in store.list_jobs()] == [second['job_id'], first['job_id']]
+    store.close()
+
+
+def test_training_cpus_exclude_tts_cores(monkeypatch):
+    """默认把前一半核心留给交互TTS；可显式配置或选择共用"""
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: {0, 1, 2, 3}, raising=False)
+    assert training_cpus({}) == [2, 3]
+    assert training_cpus({'tts_cpus': [0]}) == [1, 2, 3]
+    assert training_cpus({'cpus': [1, 3], 'tts_cpus': [0, 1]}) == [3]
+    assert training_cpus({'share_tts_cpus': True}) is None
+
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: {0}, raising=False)
+    assert training_cpus({}) == []
+
+
+def test_job_runs_in_process_and_streams_progress(tmp_path, monkeypatch):
+    """任务在独立进程中逐阶段执行，每个阶段的进度推送给监听者"""
+    monkeypatch.chdir(tmp_path)
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    manager = TrainingJobManager(store, _config(tmp_path), poll_interval=0.05, niceness=0)
+    events = []
+
+    async def listener(job):
+        events.append((job['status'], job['stage'], job['progress']))
+
+    async def run():
+        manager.add_listener(listener)
+        await manager.start()
+        job = manager.submit('extract_features', {'model_name': 'demo'})
+        job = await _wait_for(store, job['job_id'], lambda job: job['status'] not in (QUEUED, RUNNING))
+        # 任务进程在记录结束状态后还要退出（解释器与进程池清理），等调度器回收后再停止
+        await _until(lambda: not manager._processes and events and events[-1][0] == SUCCEEDED)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job['status'] == SUCCEEDED, job
+    assert job['completed_stages'] == ['check_files', 'preprocess', 'prepare_text', 'extract_features']
+    assert job['pid'] is None and job['progress'] == 100
+    # 推送按数据库版本轮询，很快结束的阶段可能被合并，但顺序不变
+    order = [job['completed_stages'].index(stage) for status, stage, _ in events if status == RUNNING and stage]
+    assert order == sorted(order) and order[-1] == 3
+    assert events[-1][0] == SUCCEEDED
+    assert os.path.exists('training_data/demo_manifest.json')
+    assert manager._processes == {}
+
+
+def test_crashed_job_resumes_from_checkpoint(tmp_path, monkeypatch):
+    """进程意外退出的任务重新排队并跳过已完成的阶段；超过尝试次数则失败"""
+    monkeypatch.chdir(tmp_path)
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    manager = TrainingJobManager(store, _config(tmp_path), poll_interval=0.05, niceness=0, max_attempts=2)
+    crashed = store.create('extract_features', {})
+    store.claim(crashed['job_id'])
+    store.complete_stage(crashed['job_id'], 'check_files')
+    store.start_stage(crashed['job_id'], 'preprocess', 15, '预处理音频', '')
+    store.set_pid(crashed['job_id'], _dead_pid())
+    stages = []
+
+    async def listener(job):
+        if job['status'] == RUNNING and job['stage'] and job['stage'] not in stages:
+            stages.append(job['stage'])
+
+    async def run():
+        manager.add_listener(listener)
+        await manager.start()
+        job = await _wait_for(store, crashed['job_id'], lambda job: job['status'] not in (QUEUED, RUNNING))
+        await asyncio.sleep(0.2)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job['status'] == SUCCEEDED and job['attempts'] == 2
+    assert 'check_files' not in stages and stages[-1] == 'extract_features'
+    # 已完成的文件检查没有重新执行（该阶段会写出分析报告）
+    assert not os.path.exists('training_data/demo_audio_report.json')
+    assert os.path.exists('training_data/demo_manifest.json')
+
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    exhausted = store.create('train_voice', {})
+    store.claim(exhausted['job_id'])
+    store._update(exhausted['job_id'], attempts=2, pid=_dead_pid())
+    TrainingJobManager(store, {}, max_attempts=2).poll_once()
+    assert store.get(exhausted['job_id'])['status'] == FAILED
+    store.close()
+
+
+def test_reused_pid_is_not_mistaken_for_running_job(tmp_path):
+    """接管时进程号对应的进程启动时间不一致（进程号被复用），任务按意外退出处理"""
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    manager = TrainingJobManager(store, {}, max_attempts=1)
+    job = store.create('train_voice', {})
+    store.claim(job['job_id'])
+    store.set_pid(job['job_id'], os.getpid(), training_jobs.process_started(os.getpid()))
+    manager.poll_once()
+    assert store.get(job['job_id'])['status'] == RUNNING
+
+    if training_jobs.process_started(os.getpid()) is not None:
+        store.set_pid(job['job_id'], os.getpid(), 'reused')
+        manager.poll_once()
+        assert store.get(job['job_id'])['status'] == FAILED
+    store.close()
+
+
+def test_cancel_running_job_kills_process_group(tmp_path, monkeypatch):
+    """取消运行中的任务会结束其进程，任务标记为已取消"""
+    monkeypatch.chdir(tmp_path)
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    manager = TrainingJobManager(store, _config(tmp_path), poll_interval=0.05, niceness=0)
+
+    async def run():
+        await manager.start()
+        job = manager.submit('train_voice')
+        job = await _wait_for(store, job['job_id'], lambda job: job['stage'] == 'extract_features' and job['pid'])
+        pid = job['pid']
+        # 任务进程在独立会话中，不接收终端信号，服务进程退出时也不等待它
+        if hasattr(os, 'getsid'):
+            assert os.getsid(pid) == pid
+        manager.cancel(job['job_id'])
+        job = await _wait_for(store, job['job_id'], lambda job: job['status'] != RUNNING)
+        await manager.stop()
+        return job, pid
+
+    job, pid = asyncio.run(run())
+    assert job['status'] == CANCELLED
+    assert 'extract_features' not in job['completed_stages']
+    assert not training_jobs._pid_alive(pid)
+
+
+def test_submit_rejects_unsafe_params(tmp_path):
+    """模型名不能含路径，音频/文本文件必须位于 upload_dir 内（含 .. 与符号链接）"""
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    (uploads / 'voice.wav').write_bytes(b'')
+    (tmp_path / 'secret.txt').write_text('secret')
+    os.symlink(tmp_path / 'secret.txt', uploads / 'link.txt')
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    manager = TrainingJobManager(store, {}, upload_dir=str(uploads))
+
+    job = manager.submit('train_voice', {'model_name': '小雨-v2', 'audio_file': 'voice.wav'})
+    assert job['params'] == {'model_name': '小雨-v2', 'audio_file': os.path.realpath(uploads / 'voice.wav')}
+    for params in ({'model_name': '../../etc'}, {'model_name': 'a/b'}, {'model_name': ''},
+                   {'audio_file': '../secret.txt'}, {'text_file': str(tmp_path / 'secret.txt')},
+                   {'text_file': 'link.txt'}, {'audio_file': ['voice.wav']}):
+        with pytest.raises(ValueError):
+            manager.submit('train_voice', params)
+    assert len(store.list_jobs()) == 1
+    store.close()
+
+
+def test_scheduler_survives_unexpected_errors(tmp_path):
+    """调度中出现任何异常（如启动进程失败）都只记录日志，调度继续进行"""
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    manager = TrainingJobManager(store, {}, poll_interval=0.01)
+    polls = []
+
+    def poll_once():
+        polls.append(1)
+        if len(polls) == 1:
+            raise OSError(24, 'Too many open files')
+
+    manager.poll_once = poll_once
+
+    async def run():
+        await manager.start()
+        await _until(lambda: len(polls) >= 3)
+        await manager.stop()
+
+    asyncio.run(run())
+    assert len(polls) >= 3
+
+
+def test_no_cpu_left_for_training_fails_job(tmp_path):
+    """交互TTS占用全部核心且未允许共用时，任务直接失败而不抢占"""
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    manager = TrainingJobManager(store, {}, cpus=[])
+    job = manager.submit('train_voice')
+    manager.poll_once()
+    job = store.get(job['job_id'])
+    assert job['status'] == FAILED and 'share_tts_cpus' in job['error']
+    assert manager._processes == {}
+    store.close()
+
+
+def test_server_handler_subscribes_and_pushes(tmp_path):
+    """train_voice 消息创建任务并订阅进度；任务结束后推送并取消订阅"""
+    from backend.core.server import AIVTuberServer
+
+    store = TrainingJobStore(str(tmp_path / 'jobs.db'))
+    sent = []
+
+    async def safe_send_json(ws, data):
+        sent.append((ws, data))
+
+    server = SimpleNamespace(training_jobs=TrainingJobManager(store, {}), training_subscribers={},
+                             safe_send_json=safe_send_json)
+    ws = object()
+
+    async def run():
+        await AIVTuberServer.handle_train_voice(server, ws, {'type': 'train_voice', 'kind': 'extract_features'})
+        job = sent[-1][1]['data']
+        await AIVTuberServer.handle_train_voice(server, ws, {'action': 'start', 'kind': 'bogus'})
+        await AIVTuberServer.handle_train_voice(server, ws, {'action': 'cancel', 'job_id': 'missing'})
+        cancelled = store.request_cancel(job['job_id'])
+        await AIVTuberServer._on_training_job_update(server, cancelled)
+        return job
+
+    job = asyncio.run(run())
+    assert job['status'] == QUEUED and job['kind'] == 'extract_features'
+    assert 'bogus' in sent[1][1]['data']['error'] and 'missing' in sent[2][1]['data']['error']
+    assert sent[3] == (ws, {'type': 'train_voice', 'data': store.get(job['job_id'])})
+    assert server.training_subscribers == {}
+    store.close()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试语音训练素材预处理: 静音切分、响度归一化与重采样、ffmpeg调用与片段清单
+"""
+
+import asyncio
+import json
+import os
+import stat
+import sys
+
+import numpy as np
+import soundfile as sf
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.voice.audio_analysis import analyze_audio
+from backend.voice.training_preprocess import TrainingPreprocessor, load_manifest
+
+SR = 16000
+
+# 记录参数并用 soundfile 生成输出的 ffmpeg 替身；起点为 0.9 秒的片段模拟失败
+FAKE_FFMPEG = '''#!{python}
+import sys
+import numpy as np
+import soundfile as sf
+args = sys.argv[1:]
+with open({log!r}, 'a') as f:
+    f.write(' '.join(args) + '\\n')
+if args[args.index('-ss') + 1] == '0.900':
+    sys.exit(1)
+rate = int(args[args.index('-ar') + 1])
+sf.write(args[-1], np.zeros(int(float(args[args.index('-t') + 1]) * rate), dtype=np.float32), rate)
+'''
+
+
+def _voice(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SR)) / SR
+    return amplitude * np.sin(2 * np.pi * 220 * t) * (1 + 0.3 * np.sin(2 * np.pi * 3 * t))
+
+
+def _recording(tmp_path):
+    """1秒静音 + 2秒 + 0.5秒静音 + 1.5秒 + 1秒静音 + 0.4秒 + 1秒静音 + 7秒（无停顿）+ 0.5秒静音"""
+    gap = lambda seconds: np.zeros(int(seconds * SR))
+    signal = np.concatenate([gap(1), _voice(2), gap(0.5), _voice(1.5, 0.05), gap(1), _voice(0.4), gap(1),
+                             _voice(7), gap(0.5)])
+    signal = signal + np.random.default_rng(0).normal(0, 0.001, signal.size)
+    path = str(tmp_path / 'long.wav')
+    sf.write(path, np.stack([signal, signal], axis=1).astype(np.float32), SR, subtype='PCM_16')
+    return path
+
+
+def test_plan_merges_splits_and_drops(tmp_path):
+    """相邻片段合并到上限以内，无停顿的长片段等分，过短的片段丢弃，两端留余量"""
+    report = analyze_audio(_recording(tmp_path))
+    preprocessor = TrainingPreprocessor(max_clip_s=4.0, min_clip_s=1.0, padding_ms=100, ffmpeg=None)
+    plan = [(round(start, 2), round(end, 2), len(segments))
+            for start, end, segments in preprocessor.plan_clips(report)]
+    assert plan == [(0.9, 5.1, 2), (7.3, 11.0, 1), (10.8, 14.5, 1)]
+
+
+def test_numpy_path_normalizes_and_resamples(tmp_path):
+    """没有 ffmpeg 时在进程池中处理: 单声道、目标采样率、响度接近目标"""
+    source = _recording(tmp_path)
+    report = analyze_audio(source)
+    preprocessor = TrainingPreprocessor(sample_rate=22050, loudness_db=-20, max_clip_s=4.0, ffmpeg=None)
+    clips = asyncio.run(preprocessor.run(source, report, str(tmp_path / 'clips')))
+
+    assert [clip['index'] for clip in clips] == [0, 1, 2]
+    assert all(clip['normalizer'] == 'numpy' and clip['sample_rate'] == 22050 for clip in clips)
+    for clip in clips:
+        data, rate = sf.read(clip['path'], dtype='float32')
+        assert rate == 22050 and data.ndim == 1
+        assert abs(len(data) / rate - (clip['end'] - clip['start'])) < 0.01
+        assert np.max(np.abs(data)) <= 10 ** (-1 / 20) + 1e-3
+    # 音量不同的两段合并后整体归一化，各片段整体响度接近目标
+    levels = [20 * np.log10(np.sqrt(np.mean(np.square(sf.read(clip['path'])[0])))) for clip in clips]
+    assert all(abs(level + 20) < 1.5 for level in levels)
+
+
+def test_ffmpeg_subprocess_with_fallback(tmp_path):
+    """有 ffmpeg 时按片段异步调用，失败的片段改用进程池处理"""
+    log = str(tmp_path / 'ffmpeg.log')
+    fake = tmp_path / 'ffmpeg'
+    fake.write_text(FAKE_FFMPEG.format(python=sys.executable, log=log))
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+
+    source = _recording(tmp_path)
+    preprocessor = TrainingPreprocessor(sample_rate=32000, max_clip_s=4.0, ffmpeg=str(fake))
+    clips = asyncio.run(preprocessor.run(source, analyze_audio(source), str(tmp_path / 'clips')))
+
+    assert [clip['normalizer'] for clip in clips] == ['numpy', 'ffmpeg', 'ffmpeg']
+    calls = open(log).read().splitlines()
+    assert len(calls) == 3
+    assert all('-ac 1' in call and '-ar 32000' in call and 'loudnorm=I=-23.0' in call for call in calls)
+    assert all(sf.info(clip['path']).samplerate == 32000 for clip in clips)
+
+
+def test_trainer_writes_manifest_and_pairs_text(tmp_path, monkeypatch):
+    """训练器预处理后写出清单，文本按行与片段一一对应"""
+    from backend.voice.sovits_tts import SoVITSTrainer
+
+    source = _recording(tmp_path)
+    text_file = tmp_path / 'text.txt'
+    text_file.write_text('第一句\n第二句\n第三句\n第四句\n', encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    trainer = SoVITSTrainer({'sovits': {
+        'audio_file': source, 'text_file': str(text_file), 'model_name': 'demo',
+        'training': {'preprocess': {'max_clip_s': 4.0, 'ffmpeg': None}}}})
+
+    async def run():
+        await trainer._preprocess_audio()
+        await trainer._prepare_text_data()
+
+    asyncio.run(run())
+    manifest = load_manifest('training_data/demo_manifest.json')
+    assert manifest['source'] == source and len(manifest['clips']) == 3
+    training_list = json.load(open('training_data/demo_list.json', encoding='utf-8'))
+    assert [item['text'] for item in training_list] == ['第一句', '第二句', '第三句']
+    assert [item['audio_path'] for item in training_list] == [clip['path'] for clip in manifest['clips']]
+
+    assert trainer.delete_model()
+    assert not os.path.exists('training_data/demo_clips')